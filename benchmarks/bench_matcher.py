@@ -0,0 +1,106 @@
+"""
+Benchmark for ignore-host matching.
+
+Compares the suffix matcher used by the TLS plugin against the regex paths
+it replaces: the combined alternation built by ``core/entry.py`` and the
+one-regex-per-domain list mitmproxy evaluates for ``ignore_hosts``.
+"""
+
+import os
+import sys
+import re
+import time
+import random
+import argparse
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.matcher import HostMatcher
+
+def generate_domains(count: int, seed: int = 42):
+    """Generate a deterministic corpus of distinct domain names."""
+    rng = random.Random(seed)
+    tlds = ['com', 'net', 'org', 'io', 'co.uk', 'de', 'fr']
+    domains = set()
+    while len(domains) < count:
+        labels = [f"{rng.choice('abcdefghijklmnopqrstuvwxyz')}{rng.randrange(10 ** 6)}"
+                  for _ in range(rng.randint(1, 3))]
+        domains.add('.'.join(labels + [rng.choice(tlds)]))
+    return sorted(domains)
+
+def generate_lookups(domains, count: int, hit_ratio: float = 0.5, seed: int = 7):
+    """Generate lookup hosts, a share of which fall under ignored domains."""
+    rng = random.Random(seed)
+    hosts = []
+    for i in range(count):
+        if rng.random() < hit_ratio:
+            hosts.append(f"cdn{i}.{rng.choice(domains)}")
+        else:
+            hosts.append(f"www{i}.miss{rng.randrange(10 ** 6)}.example")
+    return hosts
+
+def build_combined_regex(domains):
+    """Build the single alternation regex used by core/entry.py."""
+    pattern = '|'.join(re.escape(domain) for domain in domains)
+    return re.compile(rf'(?:^|\.)({pattern})$')
+
+def time_lookups(match, hosts):
+    """Run all lookups and return (seconds, number of matches)."""
+    start = time.perf_counter()
+    matched = 0
+    for host in hosts:
+        if match(host):
+            matched += 1
+    return time.perf_counter() - start, matched
+
+def run(size: int, lookups: int, per_domain_limit: int):
+    """Benchmark all matching strategies for one corpus size and return the results."""
+    domains = generate_domains(size)
+    hosts = generate_lookups(domains, lookups)
+    results = {'size': size, 'lookups': lookups}
+
+    start = time.perf_counter()
+    matcher = HostMatcher(domains)
+    results['matcher_build_s'] = time.perf_counter() - start
+    elapsed, matched = time_lookups(matcher.match, hosts)
+    results['matcher_lookup_us'] = elapsed / lookups * 1e6
+    results['matcher_matches'] = matched
+
+    start = time.perf_counter()
+    combined = build_combined_regex(domains)
+    results['regex_build_s'] = time.perf_counter() - start
+    elapsed, regex_matched = time_lookups(combined.search, hosts)
+    results['regex_lookup_us'] = elapsed / lookups * 1e6
+    if regex_matched != matched:
+        raise AssertionError(f"Regex matched {regex_matched} hosts, matcher matched {matched}")
+
+    if size <= per_domain_limit:
+        # mitmproxy tests every ignore_hosts entry as its own regex
+        patterns = [re.compile(re.escape(domain)) for domain in domains]
+        sample = hosts[:max(1, lookups // 10)]
+        elapsed, _ = time_lookups(lambda host: any(p.search(host) for p in patterns), sample)
+        results['per_domain_lookup_us'] = elapsed / len(sample) * 1e6
+
+    return results
+
+def main():
+    """Benchmark entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark ignore-host matching strategies")
+    parser.add_argument("--sizes", default="100,1000,10000,50000",
+                        help="Comma-separated number of ignored domains")
+    parser.add_argument("--lookups", type=int, default=20000, help="Number of host lookups per size")
+    parser.add_argument("--per-domain-limit", type=int, default=10000,
+                        help="Largest size for which the per-domain regex list is measured")
+    args = parser.parse_args()
+
+    print(f"{'Domains':>8} {'Matcher build':>14} {'Matcher/lookup':>15} "
+          f"{'Regex build':>12} {'Regex/lookup':>13} {'Per-domain/lookup':>18}")
+    for size in (int(value) for value in args.sizes.split(',')):
+        r = run(size, args.lookups, args.per_domain_limit)
+        per_domain = f"{r['per_domain_lookup_us']:.1f} us" if 'per_domain_lookup_us' in r else "skipped"
+        print(f"{size:>8} {r['matcher_build_s'] * 1000:>11.1f} ms {r['matcher_lookup_us']:>12.2f} us "
+              f"{r['regex_build_s'] * 1000:>9.1f} ms {r['regex_lookup_us']:>10.2f} us {per_domain:>18}")
+
+if __name__ == "__main__":
+    main()
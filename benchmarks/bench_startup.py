@@ -0,0 +1,97 @@
+"""
+Benchmark for proxy startup with large ignore lists.
+
+Compares the legacy launcher, which packed every domain of ignore-host.txt
+into one ``--ignore-hosts`` regex on the mitmdump command line, with the
+current handoff: the launcher loads the file into the database and the TLS
+plugin builds its suffix matcher from it.
+"""
+
+import os
+import sys
+import re
+import time
+import shutil
+import tempfile
+import argparse
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.database import IgnoreHostsDB
+from core.matcher import HostMatcher
+from benchmarks.bench_matcher import generate_domains
+
+# Linux rejects any single argv string longer than MAX_ARG_STRLEN (32 pages)
+MAX_ARG_STRLEN = 32 * 4096
+
+def legacy_startup(ignore_file: str, compile_regex: bool):
+    """Replay the old launcher: read the file and build the --ignore-hosts regex."""
+    results = {}
+    start = time.perf_counter()
+    with open(ignore_file, 'r') as file:
+        hosts = [host.strip() for host in file if host.strip() and host.strip() != 'plugin-tls-loaded']
+    pattern = '|'.join([re.escape(host) for host in hosts])
+    regex = rf'(?:^|\.)({pattern})$'
+    results['legacy_build_s'] = time.perf_counter() - start
+    results['legacy_argv_bytes'] = len(regex.encode('utf-8'))
+    results['legacy_argv_fits'] = results['legacy_argv_bytes'] < MAX_ARG_STRLEN
+
+    if compile_regex:
+        start = time.perf_counter()
+        re.compile(regex)
+        results['legacy_compile_s'] = time.perf_counter() - start
+    return results
+
+def current_startup(ignore_file: str, db_path: str):
+    """Replay the current startup: import into the database, then load the matcher."""
+    results = {}
+    db = IgnoreHostsDB(db_path)
+    try:
+        start = time.perf_counter()
+        db.bulk_import_file(ignore_file, "existing_file")
+        results['import_s'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        matcher = HostMatcher(db.get_active_domains())
+        results['matcher_load_s'] = time.perf_counter() - start
+        results['matcher_rules'] = len(matcher)
+    finally:
+        db.close()
+    return results
+
+def run(size: int, regex_compile_limit: int):
+    """Benchmark both startup paths for one list size."""
+    temp_dir = tempfile.mkdtemp()
+    try:
+        ignore_file = os.path.join(temp_dir, 'ignore-host.txt')
+        with open(ignore_file, 'w') as file:
+            for domain in generate_domains(size):
+                file.write(f"{domain}\n")
+            file.write("plugin-tls-loaded\n")
+
+        results = {'size': size}
+        results.update(legacy_startup(ignore_file, size <= regex_compile_limit))
+        results.update(current_startup(ignore_file, os.path.join(temp_dir, 'bench.db')))
+        return results
+    finally:
+        shutil.rmtree(temp_dir)
+
+def main():
+    """Benchmark entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark proxy startup for large ignore lists")
+    parser.add_argument("--sizes", default="1000,100000,1000000", help="Comma-separated number of domains")
+    parser.add_argument("--regex-compile-limit", type=int, default=100000,
+                        help="Largest size for which the legacy regex is compiled")
+    args = parser.parse_args()
+
+    print(f"{'Domains':>8} {'Argv size':>12} {'Fits argv':>9} {'Regex build':>12} {'Regex compile':>14} "
+          f"{'DB import':>10} {'Matcher load':>13}")
+    for size in (int(value) for value in args.sizes.split(',')):
+        r = run(size, args.regex_compile_limit)
+        compile_time = f"{r['legacy_compile_s']:.2f} s" if 'legacy_compile_s' in r else "skipped"
+        print(f"{size:>8} {r['legacy_argv_bytes'] / 1024:>9.0f} KB {'yes' if r['legacy_argv_fits'] else 'no':>9} "
+              f"{r['legacy_build_s']:>10.2f} s {compile_time:>14} {r['import_s']:>8.2f} s {r['matcher_load_s']:>11.2f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+Benchmark suite for the database, matcher and TLS manager hot paths.
+
+Builds a synthetic domain corpus per size, runs every benchmark against it
+and writes the timings as JSON. A previous result file can be passed as a
+baseline; timings that regressed beyond the threshold are reported and make
+the run exit with status 1.
+
+    python benchmarks/run.py --sizes 1000,100000 --output results.json
+    python benchmarks/run.py --baseline results.json
+"""
+
+import os
+import sys
+import json
+import asyncio
+import time
+import shutil
+import sqlite3
+import logging
+import platform
+import tempfile
+import argparse
+from datetime import datetime
+from types import SimpleNamespace
+from unittest import mock
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.database import IgnoreHostsDB
+from core.matcher import HostMatcher
+from core.snapshot import Snapshot, SnapshotMatcher
+from benchmarks.bench_matcher import generate_domains, generate_lookups
+
+# Metrics ending in one of these suffixes are timings, lower is better
+TIMING_SUFFIXES = ('_s', '_ms', '_us')
+
+def load_tls_plugin():
+    """Import plugins/tls.py; building a TlsManager has no side effects until start()."""
+    from plugins import tls
+    return tls
+
+class Corpus:
+    """Synthetic domain corpus and the database loaded with it."""
+
+    def __init__(self, size: int, work_dir: str):
+        self.size = size
+        self.work_dir = work_dir
+        self.domains = generate_domains(size)
+        self.file = os.path.join(work_dir, 'corpus.txt')
+        with open(self.file, 'w') as file:
+            file.write('\n'.join(self.domains) + '\n')
+        self.db_path = os.path.join(work_dir, 'corpus.db')
+        self.db = None
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+
+def timed(func, *args):
+    """Call func and return (seconds, result)."""
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+def run_hook(hook, events):
+    """Await an async plugin hook for every event, one after another, on a new event loop."""
+    async def main():
+        for event in events:
+            await hook(event)
+    asyncio.run(main())
+
+def bench_import_from_file(corpus: Corpus) -> dict:
+    """Bulk import of the corpus file into an empty database."""
+    corpus.db = IgnoreHostsDB(corpus.db_path)
+    elapsed, imported = timed(corpus.db.import_from_file, corpus.file, 'bench')
+    assert imported == corpus.size, f"imported {imported} of {corpus.size} domains"
+    return {'import_s': elapsed, 'import_rows_per_s': corpus.size / elapsed}
+
+def bench_add_domain(corpus: Corpus) -> dict:
+    """Single-row add_domain calls on the loaded database, new and existing domains."""
+    count = min(corpus.size, 1000)
+    elapsed, _ = timed(lambda: [corpus.db.add_domain(f"new{i}.bench.example", 'bench') for i in range(count)])
+    results = {'add_new_us': elapsed / count * 1e6}
+    elapsed, _ = timed(lambda: [corpus.db.add_domain(domain, 'bench') for domain in corpus.domains[:count]])
+    results['add_existing_us'] = elapsed / count * 1e6
+    return results
+
+def bench_get_active_domains(corpus: Corpus) -> dict:
+    """Full load of the active domain list."""
+    elapsed, domains = timed(corpus.db.get_active_domains)
+    assert len(domains) >= corpus.size
+    return {'get_active_domains_s': elapsed}
+
+def bench_iter_domains(corpus: Corpus) -> dict:
+    """Streamed listing of all active domains with keyset pagination."""
+    elapsed, listed = timed(lambda: sum(1 for _ in corpus.db.iter_domains()))
+    assert listed >= corpus.size
+    return {'iter_domains_s': elapsed}
+
+def bench_search(corpus: Corpus) -> dict:
+    """Suffix searches on the reversed-domain index and substring scans."""
+    calls = 100
+    suffixes = ['.'.join(domain.split('.')[-2:]) for domain in corpus.domains[:calls]]
+    elapsed, _ = timed(lambda: [list(corpus.db.iter_domains(suffix=suffix, limit=100)) for suffix in suffixes])
+    results = {'search_suffix_us': elapsed / calls * 1e6}
+    elapsed, _ = timed(lambda: list(corpus.db.iter_domains(contains=corpus.domains[0][1:6], limit=100)))
+    results['search_contains_scan_ms'] = elapsed * 1000
+    return results
+
+def bench_get_stats(corpus: Corpus) -> dict:
+    """Statistics queries."""
+    calls = 200
+    elapsed, _ = timed(lambda: [corpus.db.get_stats() for _ in range(calls)])
+    return {'get_stats_us': elapsed / calls * 1e6}
+
+def bench_export_to_file(corpus: Corpus) -> dict:
+    """Export of the active domains to a text file."""
+    elapsed, ok = timed(corpus.db.export_to_file, os.path.join(corpus.work_dir, 'export.txt'))
+    assert ok
+    return {'export_s': elapsed}
+
+def bench_matcher(corpus: Corpus) -> dict:
+    """Suffix matcher build and ignore-host lookups."""
+    lookups = 100000
+    hosts = generate_lookups(corpus.domains, lookups)
+    build, matcher = timed(HostMatcher, corpus.domains)
+    elapsed, _ = timed(lambda: [matcher.match(host) for host in hosts])
+    return {'matcher_build_s': build, 'matcher_lookup_us': elapsed / lookups * 1e6}
+
+def bench_snapshot(corpus: Corpus) -> dict:
+    """Snapshot export, mapping and ignore-host lookups on the mapped file."""
+    lookups = 100000
+    hosts = generate_lookups(corpus.domains, lookups)
+    export, result = timed(corpus.db.export_snapshot)
+    load, snapshot = timed(Snapshot, corpus.db.snapshot_path)
+    try:
+        matcher = SnapshotMatcher(snapshot)
+        elapsed, _ = timed(lambda: [matcher.match(host) for host in hosts])
+    finally:
+        snapshot.close()
+    return {'snapshot_export_s': export, 'snapshot_load_ms': load * 1000,
+            'snapshot_lookup_us': elapsed / lookups * 1e6, 'snapshot_bytes': result['bytes']}
+
+def bench_tls_manager(corpus: Corpus) -> dict:
+    """TlsManager startup (from the snapshot), ClientHello decisions and tls_failed_client bursts with a mocked ctx."""
+    tls = load_tls_plugin()
+    results = {}
+    with mock.patch.object(tls, 'ctx'):
+        elapsed, manager = timed(tls.TlsManager, corpus.db, os.path.join(corpus.work_dir, 'ignore-host.txt'))
+        results['tls_init_s'] = elapsed
+        elapsed, _ = timed(manager.start)
+        results['tls_start_s'] = elapsed
+        try:
+            lookups = 50000
+            hellos = [SimpleNamespace(client_hello=SimpleNamespace(sni=host),
+                                      context=SimpleNamespace(server=SimpleNamespace(address=('192.0.2.1', 443))),
+                                      ignore_connection=False)
+                      for host in generate_lookups(corpus.domains, lookups)]
+            elapsed, _ = timed(run_hook, manager.tls_clienthello, hellos)
+            results['tls_clienthello_us'] = elapsed / lookups * 1e6
+
+            # Bursts: many failures for a few endpoints, half of them not ignored yet
+            events = 50000
+            endpoints = [f"burst{i}.bench.example" for i in range(50)] + corpus.domains[:50]
+            failures = [SimpleNamespace(sni=endpoints[i % len(endpoints)]) for i in range(events)]
+            elapsed, _ = timed(run_hook, manager.tls_failed_client, failures)
+            results['tls_failed_client_us'] = elapsed / events * 1e6
+        finally:
+            elapsed, _ = timed(manager.done)
+            results['tls_done_s'] = elapsed
+    return results
+
+BENCHMARKS = [
+    ('import_from_file', bench_import_from_file),
+    ('add_domain', bench_add_domain),
+    ('get_active_domains', bench_get_active_domains),
+    ('iter_domains', bench_iter_domains),
+    ('search', bench_search),
+    ('get_stats', bench_get_stats),
+    ('export_to_file', bench_export_to_file),
+    ('matcher', bench_matcher),
+    ('snapshot', bench_snapshot),
+    ('tls_manager', bench_tls_manager),
+]
+
+def run(sizes, only=None):
+    """
+    Run the benchmarks for every corpus size.
+
+    Args:
+        sizes: Corpus sizes
+        only: Optional names of the benchmarks to run (the import always runs, it loads the database)
+
+    Returns:
+        dict: Result document with 'meta' and 'results' keyed by "<benchmark>[<size>]"
+    """
+    document = {
+        'meta': {
+            'date': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'sizes': list(sizes),
+        },
+        'results': {},
+    }
+    for size in sizes:
+        work_dir = tempfile.mkdtemp(prefix='httppro-bench-')
+        corpus = Corpus(size, work_dir)
+        try:
+            for name, benchmark in BENCHMARKS:
+                if only and name not in only and name != 'import_from_file':
+                    continue
+                results = benchmark(corpus)
+                document['results'][f"{name}[{size}]"] = results
+                print(f"{name + f'[{size}]':<28} " + "  ".join(_format(k, v) for k, v in results.items()))
+        finally:
+            corpus.close()
+            shutil.rmtree(work_dir)
+    return document
+
+def compare(current: dict, baseline: dict, threshold: float):
+    """
+    Compare timings with a baseline result document.
+
+    Args:
+        current: Result document of this run
+        baseline: Stored result document
+        threshold: Allowed relative slowdown, e.g. 0.2 for 20%
+
+    Returns:
+        list: (key, metric, baseline value, current value, ratio) of the regressions
+    """
+    regressions = []
+    for key, results in current['results'].items():
+        previous = baseline.get('results', {}).get(key, {})
+        for metric, value in results.items():
+            if not metric.endswith(TIMING_SUFFIXES) or not previous.get(metric):
+                continue
+            ratio = value / previous[metric]
+            if ratio > 1 + threshold:
+                regressions.append((key, metric, previous[metric], value, ratio))
+    return regressions
+
+def _format(metric: str, value: float) -> str:
+    """Format one metric for the console."""
+    return f"{metric}={value:.3g}"
+
+def main():
+    """Benchmark entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark database, matcher and TLS manager hot paths")
+    parser.add_argument("--sizes", default="1000,100000,1000000", help="Comma-separated corpus sizes")
+    parser.add_argument("--only", help="Comma-separated benchmark names: " + ", ".join(name for name, _ in BENCHMARKS))
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare with a previous JSON result file")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed relative slowdown against the baseline (default: 0.2)")
+    args = parser.parse_args()
+
+    # Keep the database and plugin info logs out of the results table
+    logging.basicConfig(level=logging.WARNING)
+
+    sizes = [int(value) for value in args.sizes.split(',')]
+    only = set(args.only.split(',')) if args.only else None
+    document = run(sizes, only)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(document, file, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+        regressions = compare(document, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} timings regressed by more than {args.threshold:.0%}:")
+            for key, metric, previous, value, ratio in regressions:
+                print(f"   {key} {metric}: {previous:.3g} -> {value:.3g} ({ratio:.2f}x)")
+            sys.exit(1)
+        print(f"\nNo regression beyond {args.threshold:.0%} against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Asyncio facade over IgnoreHostsDB for HttpPro.
+
+mitmproxy runs its hooks on one event loop, so a blocking SQLite call in a
+hook stalls every connection of the proxy. AsyncIgnoreHostsDB runs database
+operations on a dedicated writer thread, which serializes writes the way
+SQLite does anyway, and on a small pool of reader threads, which read
+concurrently through their own WAL connections, and exposes them as
+coroutines.
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from itertools import islice
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, Optional, Tuple, TypeVar
+
+from core.database import IgnoreHostsDB
+from core.metrics import REGISTRY
+
+logger = logging.getLogger('httppro.asyncdb')
+
+T = TypeVar('T')
+
+# Reader threads, and operations of each kind that may be queued before callers wait
+DEFAULT_READERS = 4
+DEFAULT_MAX_PENDING = 1000
+
+# Rows fetched per reader round trip by streaming queries
+DEFAULT_STREAM_BATCH_SIZE = 500
+
+_CANCELLED = REGISTRY.counter('httppro_db_async_cancelled_total',
+                              'Awaited database operations cancelled by their caller')
+
+
+class AsyncIgnoreHostsDB:
+    """
+    Awaitable IgnoreHostsDB operations on a single writer thread and a reader pool.
+
+    Backpressure: at most ``max_pending`` writes and as many reads are queued
+    or running at a time; further callers wait on the event loop until a
+    slot frees up instead of growing the thread pool queues.
+
+    Cancellation: cancelling the awaiting task withdraws an operation that
+    no thread has picked up yet. An operation already running in SQLite
+    completes (a write is committed or rolled back as a whole) and its result
+    is discarded.
+    """
+
+    def __init__(self, db: Optional[IgnoreHostsDB], readers: int = DEFAULT_READERS,
+                 max_pending: int = DEFAULT_MAX_PENDING, stream_batch_size: int = DEFAULT_STREAM_BATCH_SIZE):
+        """
+        Initialize the facade and its thread pools.
+
+        Args:
+            db: Database manager; None when it is created by open()
+            readers: Number of reader threads
+            max_pending: Maximum number of queued or running writes, and of reads
+            stream_batch_size: Rows fetched per round trip by streaming queries
+        """
+        self.db = db
+        self.readers = readers
+        self.max_pending = max_pending
+        self.stream_batch_size = stream_batch_size
+
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='httppro-db-writer')
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='httppro-db-reader')
+        # Created on first use, inside the running event loop
+        self._write_slots: Optional[asyncio.Semaphore] = None
+        self._read_slots: Optional[asyncio.Semaphore] = None
+        self._closed = False
+
+    @classmethod
+    async def open(cls, db_path: Optional[str] = None, **options) -> 'AsyncIgnoreHostsDB':
+        """
+        Open the database, schema creation and migrations included, on the writer thread.
+
+        Args:
+            db_path: Optional database path; defaults to the project database
+            **options: Keyword arguments of the constructor
+
+        Returns:
+            Facade over the opened database
+        """
+        facade = cls(None, **options)
+        facade.db = await facade.write(IgnoreHostsDB, db_path)
+        return facade
+
+    async def _run(self, executor: ThreadPoolExecutor, slots: asyncio.Semaphore, func: Callable[..., T],
+                   *args, **kwargs) -> T:
+        if self._closed:
+            raise RuntimeError("AsyncIgnoreHostsDB is closed")
+        async with slots:
+            future = asyncio.get_running_loop().run_in_executor(executor, functools.partial(func, *args, **kwargs))
+            try:
+                return await future
+            except asyncio.CancelledError:
+                _CANCELLED.inc()
+                raise
+
+    async def write(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Run a blocking callable on the writer thread.
+
+        Args:
+            func: Callable, typically a bound IgnoreHostsDB method
+            *args: Positional arguments
+            **kwargs: Keyword arguments
+
+        Returns:
+            The callable's result; its exception is raised in the caller
+        """
+        if self._write_slots is None:
+            self._write_slots = asyncio.Semaphore(self.max_pending)
+        return await self._run(self._writer, self._write_slots, func, *args, **kwargs)
+
+    async def read(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """Run a blocking, read-only callable on the reader pool; see write()."""
+        if self._read_slots is None:
+            self._read_slots = asyncio.Semaphore(self.max_pending)
+        return await self._run(self._readers, self._read_slots, func, *args, **kwargs)
+
+    async def add_domain(self, domain: str, origin: str) -> bool:
+        """Add a domain; see IgnoreHostsDB.add_domain."""
+        return await self.write(self.db.add_domain, domain, origin)
+
+    async def add_domain_batch(self, domains: Iterable[str], origin: str = "manual") -> Dict[str, str]:
+        """Add many domains in one transaction; see IgnoreHostsDB.add_domain_batch."""
+        return await self.write(self.db.add_domain_batch, list(domains), origin)
+
+    async def remove_domain(self, domain: str) -> bool:
+        """Deactivate a domain; see IgnoreHostsDB.remove_domain."""
+        return await self.write(self.db.remove_domain, domain)
+
+    async def remove_domain_batch(self, domains: Iterable[str]) -> Dict[str, str]:
+        """Deactivate many domains in one transaction; see IgnoreHostsDB.remove_domain_batch."""
+        return await self.write(self.db.remove_domain_batch, list(domains))
+
+    async def get_domain_info(self, domain: str) -> Optional[Tuple]:
+        """Get the (domain, origin, date_added, last_seen, count, active) row of a domain or network."""
+        return await self.read(self.db.get_domain_info, domain)
+
+    async def get_stats(self) -> dict:
+        """Get database statistics; see IgnoreHostsDB.get_stats."""
+        return await self.read(self.db.get_stats)
+
+    async def stream(self, rows: Iterator[T], batch_size: Optional[int] = None) -> AsyncIterator[T]:
+        """
+        Consume a blocking iterator on the reader pool, one batch per round trip.
+
+        The next batch is only fetched once the consumer has taken the
+        previous one, so a slow consumer slows the queries down instead of
+        buffering rows. Breaking out of the loop stops the stream.
+
+        Args:
+            rows: Iterator whose items are produced by database queries
+            batch_size: Items fetched per round trip; defaults to stream_batch_size
+
+        Yields:
+            The iterator's items
+        """
+        batch_size = batch_size or self.stream_batch_size
+        while True:
+            batch = await self.read(lambda: list(islice(rows, batch_size)))
+            for row in batch:
+                yield row
+            if len(batch) < batch_size:
+                return
+
+    def iter_domains(self, batch_size: Optional[int] = None, **filters) -> AsyncIterator[Tuple]:
+        """
+        Stream domains; see IgnoreHostsDB.iter_domains for the filters.
+
+        Example:
+            async for domain, origin, *_ in adb.iter_domains(origin='manual'):
+                ...
+        """
+        batch_size = batch_size or self.stream_batch_size
+        return self.stream(self.db.iter_domains(batch_size=batch_size, **filters), batch_size)
+
+    def search_domains(self, pattern: str, active: Optional[bool] = None,
+                       limit: Optional[int] = None) -> AsyncIterator[Tuple]:
+        """Stream the domains matching a wildcard pattern; see IgnoreHostsDB.search_domains."""
+        return self.stream(self.db.search_domains(pattern, active, limit))
+
+    def close(self, timeout: Optional[float] = 10.0):
+        """
+        Finish the queued operations, close the threads' connections and stop the threads.
+
+        Blocks until the threads are done; from a coroutine, use aclose().
+
+        Args:
+            timeout: Maximum number of seconds to wait for the queued operations
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self.db is not None:
+            # The barrier holds every close task until all readers run one, so each thread gets exactly one
+            barrier = threading.Barrier(self.readers)
+
+            def close_reader():
+                try:
+                    barrier.wait(timeout)
+                except threading.BrokenBarrierError:
+                    pass
+                self.db.connections.close()
+
+            futures = [self._readers.submit(close_reader) for _ in range(self.readers)]
+            futures.append(self._writer.submit(self.db.connections.close))
+            done, pending = wait(futures, timeout)
+            if pending:
+                logger.warning(f"{len(pending)} database threads did not close their connection in time")
+        self._readers.shutdown(wait=False)
+        self._writer.shutdown(wait=False)
+        logger.debug("Async database facade closed")
+
+    async def aclose(self, timeout: Optional[float] = 10.0):
+        """Close the facade without blocking the event loop; see close()."""
+        await asyncio.get_running_loop().run_in_executor(None, self.close, timeout)
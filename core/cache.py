@@ -0,0 +1,137 @@
+"""
+Deduplication cache for repeated TLS failures.
+
+This module remembers recently seen failing endpoints (SNI or server IP) so
+that bursts of identical failure events short-circuit in constant time. The
+repeats are not dropped: they are aggregated per endpoint and drained
+periodically, by the write-behind worker, so the database count and
+last_seen stay accurate.
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple
+
+logger = logging.getLogger('httppro.cache')
+
+
+class FailureCache:
+    """
+    Bounded TTL/LRU cache of recently failing endpoints.
+
+    An endpoint stays cached for ``ttl`` seconds after its first failure.
+    When more than ``maxsize`` endpoints are cached, the least recently seen
+    one is evicted. Repeated failures of cached endpoints are counted in a
+    separate pending table that survives eviction until it is drained.
+    The cache is thread-safe: hooks record failures on the event loop while
+    other threads drain the repeats and discard removed endpoints.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 60.0, flush_interval: float = 5.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize cache.
+
+        Args:
+            maxsize: Maximum number of cached endpoints
+            ttl: Seconds an endpoint stays cached after its first failure
+            flush_interval: Seconds between two drains of the aggregated repeats
+            clock: Monotonic time source
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._clock = clock
+
+        self._expiry: "OrderedDict[str, float]" = OrderedDict()
+        self._pending: Dict[str, Tuple[str, int]] = {}
+        self._next_flush = clock() + flush_interval
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def seen(self, endpoint: str, origin: str) -> bool:
+        """
+        Record a failure and check whether the endpoint was seen recently.
+
+        Args:
+            endpoint: Failing SNI or server IP
+            origin: Origin to report the repeat under
+
+        Returns:
+            True if the endpoint is cached (the failure was aggregated),
+            False if it is new or expired and must be fully processed
+        """
+        now = self._clock()
+        with self._lock:
+            expiry = self._expiry.get(endpoint)
+
+            if expiry is not None:
+                if expiry > now:
+                    self.hits += 1
+                    self._expiry.move_to_end(endpoint)
+                    pending = self._pending.get(endpoint)
+                    self._pending[endpoint] = (origin, pending[1] + 1) if pending else (origin, 1)
+                    return True
+                self.expirations += 1
+
+            self.misses += 1
+            self._expiry[endpoint] = now + self.ttl
+            self._expiry.move_to_end(endpoint)
+            if len(self._expiry) > self.maxsize:
+                self._expiry.popitem(last=False)
+                self.evictions += 1
+            return False
+
+    def flush_due(self) -> bool:
+        """Check whether the aggregated repeats should be drained."""
+        return bool(self._pending) and self._clock() >= self._next_flush
+
+    def drain(self) -> List[Tuple[str, str, int]]:
+        """
+        Take the aggregated repeats accumulated since the last drain.
+
+        Returns:
+            list: (endpoint, origin, hits) tuples
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._next_flush = self._clock() + self.flush_interval
+        return [(endpoint, origin, hits) for endpoint, (origin, hits) in pending.items()]
+
+    def discard(self, endpoint: str):
+        """
+        Forget an endpoint, for example after it was removed from the ignore list.
+
+        Its aggregated repeats are dropped too: writing them would reactivate
+        the removed rule.
+
+        Args:
+            endpoint: Cached SNI or canonical network
+        """
+        with self._lock:
+            self._expiry.pop(endpoint, None)
+            self._pending.pop(endpoint, None)
+
+    def stats(self) -> dict:
+        """Get hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._expiry),
+            'pending': len(self._pending),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+    def __len__(self) -> int:
+        """Get the number of cached endpoints."""
+        return len(self._expiry)
@@ -0,0 +1,221 @@
+"""
+Expiry and compaction of stale ignore list entries for HttpPro.
+
+Auto-learned domains stay ignored forever unless something retires them.
+This module replaces large groups of sibling subdomains by wildcard rules
+and crowded IP ranges by covering prefixes, deactivates domains not seen
+within a per-origin time to live, caps the number of active domains by
+evicting the least recently seen ones, deletes long-inactive rows, prunes
+the change log entries every reader has processed and returns the freed
+pages to the file system.
+"""
+
+import re
+import threading
+import logging
+from typing import Callable, Dict, Iterable, Optional, Union
+
+from core.metrics import REGISTRY
+
+logger = logging.getLogger('httppro.compaction')
+
+_COMPACTED = REGISTRY.counter('httppro_compaction_domains_total',
+                              'Domains touched, aggregated, expired, evicted or purged by compaction', label='action')
+
+DEFAULT_COMPACT_INTERVAL = 3600
+
+# Siblings that must be exceeded before manage_db.py aggregate replaces them by a wildcard rule
+DEFAULT_AGGREGATE_THRESHOLD = 10
+
+_DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+_DURATION_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([smhdw]?)\s*$', re.IGNORECASE)
+
+# Domains named in the eviction log line
+EVICTION_LOG_SAMPLE = 10
+
+
+def parse_duration(value: Union[str, float, int]) -> float:
+    """
+    Parse a duration such as ``30d``, ``12h``, ``90m``, ``45s`` or a number of seconds.
+
+    Args:
+        value: Duration string or number of seconds
+
+    Returns:
+        Duration in seconds
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _DURATION_RE.match(value)
+    if not match:
+        raise ValueError(f"Invalid duration: {value!r}")
+    return float(match.group(1)) * _DURATION_UNITS[(match.group(2) or 's').lower()]
+
+
+def parse_ttls(spec: Union[str, Iterable[str]]) -> Dict[str, float]:
+    """
+    Parse per-origin times to live given as ``origin=duration`` pairs.
+
+    Args:
+        spec: Comma-separated string or iterable of pairs, e.g. ``tcp_tls_error=30d``
+
+    Returns:
+        dict: Time to live in seconds per origin
+    """
+    pairs = spec.split(',') if isinstance(spec, str) else spec
+    ttls = {}
+    for pair in pairs:
+        pair = pair.strip()
+        if not pair:
+            continue
+        origin, sep, duration = pair.partition('=')
+        if not sep or not origin.strip():
+            raise ValueError(f"Invalid time to live {pair!r}, expected ORIGIN=DURATION")
+        ttls[origin.strip()] = parse_duration(duration)
+    return ttls
+
+
+class Compactor:
+    """
+    Applies aggregation, expiry, eviction and purge policies to an IgnoreHostsDB.
+
+    Every step works in small batches through the (active, last_seen) index,
+    so a run never holds the write lock for long. Deactivations go through
+    the change log like manual removals, which lets the running proxy, hot
+    reload and replication drop them.
+    """
+
+    def __init__(self, db, ttls: Optional[Dict[str, float]] = None, purge_after: Optional[float] = None,
+                 max_active: int = 0, exempt_origins: Iterable[str] = ('manual',),
+                 interval: float = DEFAULT_COMPACT_INTERVAL, vacuum_pages: int = 0,
+                 touched: Optional[Callable[[], Iterable[str]]] = None, aggregate_threshold: int = 0,
+                 keep_changes: Optional[int] = None, change_floor: Optional[Callable[[], int]] = None):
+        """
+        Initialize compactor.
+
+        Args:
+            db: IgnoreHostsDB instance to compact
+            ttls: Time to live in seconds per origin; origins not listed never expire
+            purge_after: Seconds after which inactive domains are deleted; None keeps them
+            max_active: Maximum number of active domains; 0 disables eviction
+            exempt_origins: Origins never evicted to honour max_active
+            interval: Seconds between two runs of the background thread
+            vacuum_pages: Maximum pages released per run; 0 releases all free pages
+            touched: Callback returning the domains seen since its previous call
+            aggregate_threshold: Replace more than this many sibling subdomains by a
+                wildcard rule, and more than this many networks in a /24 (IPv6: /64)
+                by that prefix; 0 disables aggregation
+            keep_changes: Most recent change log entries kept once processed, see
+                ``IgnoreHostsDB.prune_changes``; None never prunes the change log
+            change_floor: Callback returning the last change applied by this process's
+                ChangeWatcher; later entries are never pruned
+        """
+        self.db = db
+        self.ttls = dict(ttls or {})
+        self.purge_after = purge_after
+        self.max_active = max_active
+        self.exempt_origins = tuple(exempt_origins)
+        self.interval = interval
+        self.vacuum_pages = vacuum_pages
+        self.touched = touched
+        self.aggregate_threshold = aggregate_threshold
+        self.keep_changes = keep_changes
+        self.change_floor = change_floor
+
+        self._stopping = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+
+        # Counters
+        self.runs = 0
+        self.totals = {'touched': 0, 'aggregated': 0, 'expired': 0, 'evicted': 0, 'purged': 0,
+                       'pruned_changes': 0, 'vacuumed_pages': 0}
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any aggregation, expiry, eviction, purge or change log policy is configured."""
+        return bool(self.ttls or self.max_active or self.aggregate_threshold or self.purge_after is not None
+                    or self.keep_changes is not None)
+
+    def run(self) -> dict:
+        """
+        Run every configured policy once.
+
+        Returns:
+            dict: Counts of 'touched', 'aggregated' (replaced domains or networks per rule), 'expired'
+            (per origin), 'evicted' (domain list), 'purged', 'pruned_changes' and 'vacuumed_pages'
+        """
+        report = {'touched': 0, 'aggregated': {}, 'expired': {}, 'evicted': [], 'purged': 0,
+                  'pruned_changes': 0, 'vacuumed_pages': 0}
+
+        if self.touched is not None:
+            report['touched'] = self.db.touch_domains(self.touched())
+        if self.aggregate_threshold:
+            # Before eviction, so the cap counts the rules instead of their siblings
+            report['aggregated'] = self.db.aggregate_siblings(self.aggregate_threshold)
+            report['aggregated'].update(self.db.collapse_networks(self.aggregate_threshold))
+        if self.ttls:
+            report['expired'] = self.db.expire_domains(self.ttls)
+        if self.max_active:
+            report['evicted'] = self.db.evict_least_recent(self.max_active, self.exempt_origins)
+        if self.purge_after is not None:
+            report['purged'] = self.db.purge_inactive(self.purge_after)
+        if self.keep_changes is not None:
+            upto = self.change_floor() if self.change_floor is not None else None
+            report['pruned_changes'] = self.db.prune_changes(self.keep_changes, upto)
+        report['vacuumed_pages'] = self.db.incremental_vacuum(self.vacuum_pages)
+
+        counts = {
+            'touched': report['touched'],
+            'aggregated': sum(len(domains) for domains in report['aggregated'].values()),
+            'expired': sum(report['expired'].values()),
+            'evicted': len(report['evicted']),
+            'purged': report['purged'],
+            'pruned_changes': report['pruned_changes'],
+            'vacuumed_pages': report['vacuumed_pages'],
+        }
+        self.runs += 1
+        for action, count in counts.items():
+            self.totals[action] += count
+            if count and action not in ('pruned_changes', 'vacuumed_pages'):
+                _COMPACTED.labels(action).inc(count)
+
+        if report['evicted']:
+            sample = ', '.join(report['evicted'][:EVICTION_LOG_SAMPLE])
+            more = len(report['evicted']) - EVICTION_LOG_SAMPLE
+            logger.warning(f"Evicted {len(report['evicted'])} domains over the {self.max_active} active cap: "
+                           f"{sample}{f' and {more} more' if more > 0 else ''}")
+        if any(counts.values()):
+            logger.info(f"Compaction: {counts['aggregated']} aggregated, {counts['expired']} expired, "
+                        f"{counts['evicted']} evicted, {counts['purged']} purged, "
+                        f"{counts['pruned_changes']} change log entries pruned, {counts['vacuumed_pages']} pages released, "
+                        f"{counts['touched']} refreshed")
+        return report
+
+    def start(self):
+        """Start compacting in a background thread."""
+        if self._worker is not None:
+            return
+        self._worker = threading.Thread(target=self._run, name='httppro-compaction', daemon=True)
+        self._worker.start()
+        logger.info(f"Compacting database every {self.interval}s")
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """Stop the background thread."""
+        self._stopping.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+            self._worker = None
+
+    def stats(self) -> dict:
+        """Get compaction counters."""
+        return {'runs': self.runs, **self.totals}
+
+    def _run(self):
+        """Worker loop compacting every interval."""
+        while not self._stopping.wait(self.interval):
+            try:
+                self.run()
+            except Exception as e:
+                logger.error(f"Failed to compact database: {e}")
+        # Release this thread's connection
+        self.db.connections.close()
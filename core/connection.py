@@ -0,0 +1,200 @@
+"""
+SQLite connection manager for HttpPro.
+
+This module keeps one persistent connection per thread (and per process),
+configures WAL journaling and busy timeouts, and retries transactions that
+hit "database is locked" errors with exponential backoff.
+"""
+
+import os
+import random
+import sqlite3
+import threading
+import time
+import logging
+from typing import Callable, List, Optional, TypeVar
+from urllib.parse import quote
+
+from core.metrics import REGISTRY
+
+logger = logging.getLogger('httppro.connection')
+
+_DB_ERRORS = REGISTRY.counter('httppro_db_errors_total', 'Database operations that failed')
+_DB_RETRIES = REGISTRY.counter('httppro_db_busy_retries_total', 'Transactions retried on a locked database')
+
+T = TypeVar('T')
+
+SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+def is_busy_error(error: Exception) -> bool:
+    """Check whether an exception is a transient SQLITE_BUSY/SQLITE_LOCKED error."""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+class ConnectionManager:
+    """
+    Thread-local SQLite connection manager.
+
+    Each thread lazily opens its own connection, which is reused for the
+    lifetime of the thread. Connections run in autocommit mode so that
+    transactions are opened explicitly with ``BEGIN IMMEDIATE`` by
+    :meth:`execute`, which also retries on lock contention.
+    """
+
+    def __init__(self, db_path: str, synchronous: str = 'NORMAL', busy_timeout: float = 5.0,
+                 journal_mode: str = 'WAL', max_retries: int = 8, retry_backoff: float = 0.02,
+                 auto_vacuum: Optional[str] = 'INCREMENTAL', read_only: bool = False):
+        """
+        Initialize connection manager.
+
+        Args:
+            db_path: Path to the SQLite database file
+            synchronous: SQLite synchronous level (OFF, NORMAL, FULL or EXTRA)
+            busy_timeout: Seconds SQLite waits on a lock before raising
+            journal_mode: SQLite journal mode, WAL by default
+            max_retries: Number of times a busy transaction is retried
+            retry_backoff: Initial backoff delay in seconds, doubled on every retry
+            auto_vacuum: SQLite auto_vacuum mode applied to new databases and by the next
+                VACUUM of existing ones; None leaves the database default
+            read_only: Open the database file read-only; it must exist and is never
+                modified, not even its journal mode
+        """
+        synchronous = synchronous.upper()
+        if synchronous not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f"Invalid synchronous level: {synchronous}")
+
+        self.db_path = db_path
+        self.synchronous = synchronous
+        self.busy_timeout = busy_timeout
+        self.journal_mode = journal_mode
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.auto_vacuum = auto_vacuum
+        self.read_only = read_only
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+
+    def connection(self) -> sqlite3.Connection:
+        """Get the calling thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        if self.read_only:
+            conn = sqlite3.connect(f'file:{quote(os.path.abspath(self.db_path))}?mode=ro', uri=True,
+                                   timeout=self.busy_timeout, isolation_level=None, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout,
+                                   isolation_level=None, check_same_thread=False)
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}')
+        if (self.journal_mode or self.auto_vacuum) and not self.read_only:
+            self._set_journal_mode(conn)
+        conn.execute(f'PRAGMA synchronous = {self.synchronous}')
+
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        with self._lock:
+            self._connections.append(conn)
+        logger.debug(f"Opened connection to {self.db_path} in thread {threading.current_thread().name}")
+        return conn
+
+    def _set_journal_mode(self, conn: sqlite3.Connection):
+        """Set the auto_vacuum and journal modes, retrying while another writer holds the lock."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                if self.auto_vacuum:
+                    # Must precede the journal mode switch, which writes the header of a new database
+                    conn.execute(f'PRAGMA auto_vacuum = {self.auto_vacuum}')
+                if self.journal_mode:
+                    mode = conn.execute(f'PRAGMA journal_mode = {self.journal_mode}').fetchone()[0]
+                    if mode.upper() != self.journal_mode.upper():
+                        logger.warning(f"Requested journal mode {self.journal_mode}, database uses {mode}")
+                return
+            except sqlite3.OperationalError as e:
+                if not is_busy_error(e) or attempt == self.max_retries:
+                    raise
+                self._sleep(attempt)
+
+    def execute(self, operation: Callable[[sqlite3.Connection], T], write: bool = False) -> T:
+        """
+        Run an operation on the thread's connection, retrying on lock contention.
+
+        Write operations run inside a ``BEGIN IMMEDIATE`` transaction that is
+        committed when the operation returns and rolled back if it raises.
+
+        Args:
+            operation: Callable receiving the connection; it may be called again on retry
+            write: Whether the operation modifies the database
+
+        Returns:
+            The operation's return value
+        """
+        for attempt in range(self.max_retries + 1):
+            conn = self.connection()
+            try:
+                if write:
+                    conn.execute('BEGIN IMMEDIATE')
+                result = operation(conn)
+                if write:
+                    conn.commit()
+                return result
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                if not is_busy_error(e) or attempt == self.max_retries:
+                    _DB_ERRORS.inc()
+                    raise
+                _DB_RETRIES.inc()
+                logger.debug(f"Database busy, retrying (attempt {attempt + 1}/{self.max_retries}): {e}")
+                self._sleep(attempt)
+
+        raise RuntimeError("unreachable")  # pragma: no cover
+
+    def _sleep(self, attempt: int):
+        """Sleep with exponential backoff and jitter."""
+        delay = self.retry_backoff * (2 ** attempt)
+        time.sleep(delay + random.uniform(0, delay))  # nosec: B311 - jitter only
+
+    def close(self):
+        """Close the calling thread's connection."""
+        conn: Optional[sqlite3.Connection] = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
+
+    def cache_info(self) -> dict:
+        """
+        Get the page cache configuration of the open connections.
+
+        Returns:
+            dict: Number of 'connections' and their combined 'page_cache_limit' in bytes
+        """
+        with self._lock:
+            count = len(self._connections)
+        conn = self.connection()
+        cache_size = conn.execute('PRAGMA cache_size').fetchone()[0]
+        # Negative sizes are in KiB, positive ones in pages
+        per_connection = -cache_size * 1024 if cache_size < 0 else \
+            cache_size * conn.execute('PRAGMA page_size').fetchone()[0]
+        return {'connections': count, 'page_cache_limit': per_connection * count}
+
+    def close_all(self):
+        """Close every connection opened by this manager."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception as e:
+                logger.warning(f"Failed to close connection: {e}")
+        self._local = threading.local()
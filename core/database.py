@@ -7,12 +7,161 @@ with comprehensive metadata including origin tracking, timestamps, and statistic
 
 import sqlite3
 import os
+import gzip
+import time
 from datetime import datetime
-from typing import List, Tuple, Optional
+from functools import lru_cache
+from typing import Dict, IO, Iterable, Iterator, List, Tuple, Optional
 import logging
 
+from core.connection import ConnectionManager
+from core.exporter import file_digest
+from core.metrics import REGISTRY
+from core.migrations import SCHEMA_VERSION, get_version, migrate, reverse_domain
+from core import migrations
+from core.psl import PublicSuffixList, default_suffix_list
+from core.snapshot import write_snapshot
+from core.iptree import DEFAULT_IPV4_GROUP_PREFIX, DEFAULT_IPV6_GROUP_PREFIX, Network, canonical_network, \
+    collapse, is_network_rule, network_sort_key, parse_network
+
 logger = logging.getLogger('httppro.database')
 
+_DB_LATENCY = REGISTRY.histogram('httppro_db_operation_seconds', 'Latency of IgnoreHostsDB operations',
+                                 label='operation')
+
+# UPSERT ... RETURNING needs SQLite 3.35+, older libraries fall back to a lookup
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+_UPSERT_SQL = '''
+    INSERT INTO ignore_hosts (domain, domain_rev, origin_id, date_added, last_seen, count, active)
+    VALUES (?, ?, ?, ?, ?, ?, 1)
+    ON CONFLICT(domain) DO UPDATE
+    SET last_seen = excluded.last_seen, count = count + excluded.count, active = 1
+'''
+
+_NETWORK_UPSERT_SQL = '''
+    INSERT INTO ignore_networks (network, version, prefix_len, origin_id, date_added, last_seen, count, active)
+    VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+    ON CONFLICT(network) DO UPDATE
+    SET last_seen = excluded.last_seen, count = count + excluded.count, active = 1
+'''
+
+# Origin name of the current row; a primary key lookup in the small origins table
+_ORIGIN_NAME = '(SELECT name FROM origins WHERE id = origin_id)'
+
+# Stored form of the public (domain, origin, date_added, last_seen, count, active) rows
+_INFO_COLUMNS = 'domain, origin_id, date_added, last_seen, count, active'
+
+# Lines written per transaction by the bulk import path
+IMPORT_CHUNK_SIZE = 10000
+
+# Rows deactivated or deleted per transaction by the compaction methods
+COMPACTION_BATCH_SIZE = 1000
+
+# Most recent change log entries prune_changes keeps for readers that hold no cursor
+CHANGE_LOG_KEEP = 10000
+
+# replication_cursors entry holding the highest change log sequence deleted by prune_changes
+PRUNED_CURSOR = 'pruned'
+
+# Origin of the wildcard rules written by aggregate_siblings
+AGGREGATED_ORIGIN = 'aggregated'
+
+# Origins whose domains aggregate_siblings replaces by default: the auto-learned ones
+AGGREGATE_ORIGINS = ('tcp_tls_error', 'client_tls_error')
+
+def now_us() -> int:
+    """Get the current time as stored in the database: epoch microseconds."""
+    return time.time_ns() // 1000
+
+def to_epoch_us(timestamp: str) -> int:
+    """
+    Convert an ISO date or timestamp to epoch microseconds.
+    
+    Naive values are local time, as written by ``datetime.now().isoformat()``.
+    """
+    value = datetime.fromisoformat(timestamp)
+    return int(value.replace(microsecond=0).timestamp()) * 1000000 + value.microsecond
+
+@lru_cache(maxsize=4096)
+def _iso_seconds(seconds: int) -> str:
+    return datetime.fromtimestamp(seconds).strftime('%Y-%m-%dT%H:%M:%S')
+
+# Rows written by one import chunk or write-behind batch share their timestamps
+@lru_cache(maxsize=4096)
+def to_iso(us: int) -> str:
+    """Convert epoch microseconds to a local ISO timestamp, like ``datetime.isoformat()``."""
+    seconds, micros = divmod(us, 1000000)
+    text = _iso_seconds(seconds)
+    return f"{text}.{micros:06d}" if micros else text
+
+def _network_row(network: Network, origin_id: int, current_time: int, hits: int) -> Tuple:
+    """Build the _NETWORK_UPSERT_SQL parameters of a network."""
+    return (str(network), network.version, network.prefixlen, origin_id, current_time, current_time, hits)
+
+def _rule_table(rule: str) -> Tuple[str, str, str]:
+    """
+    Find where a rule is stored.
+    
+    Returns:
+        tuple: (stored rule, table, key column); IP addresses and CIDR prefixes
+        are stored in canonical form in ignore_networks, anything else in ignore_hosts
+    """
+    network = canonical_network(rule)
+    if network is None:
+        return rule, 'ignore_hosts', 'domain'
+    return network, 'ignore_networks', 'network'
+
+def _next_prefix(prefix: str) -> str:
+    """Get the smallest string greater than every string starting with prefix."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+def parse_pattern(pattern: str) -> dict:
+    """
+    Translate a wildcard search pattern into iter_domains filters.
+    
+    ``*.example.com`` matches subdomains, ``api.*`` matches a prefix and
+    ``*cdn*`` a substring. A pattern without ``*`` is an exact domain.
+    
+    Args:
+        pattern: Search pattern
+    
+    Returns:
+        dict: Keyword arguments for iter_domains ('suffix', 'prefix', 'contains' or 'domain')
+    
+    Raises:
+        ValueError: If the wildcards are in any other position
+    """
+    stars = pattern.count('*')
+    core = pattern.strip('*')
+    if stars == 0:
+        return {'domain': pattern}
+    if core and '*' not in core:
+        if stars == 2 and pattern.startswith('*') and pattern.endswith('*'):
+            return {'contains': core}
+        if stars == 1 and pattern.startswith('*.'):
+            return {'suffix': pattern[1:]}
+        if stars == 1 and pattern.endswith('*'):
+            return {'prefix': core}
+    raise ValueError(f"Unsupported pattern {pattern!r}: use *.suffix, prefix* or *substring*")
+
+def open_domain_file(file_path: str) -> IO[str]:
+    """
+    Open a domain list for reading, transparently decompressing gzip files.
+    
+    Args:
+        file_path: Path to a plain text or gzip-compressed domain list
+    
+    Returns:
+        Text file object
+    """
+    with open(file_path, 'rb') as probe:
+        is_gzip = probe.read(2) == b'\x1f\x8b'
+    
+    if is_gzip:
+        return gzip.open(file_path, 'rt', encoding='utf-8')
+    return open(file_path, 'r', encoding='utf-8')
+
 class IgnoreHostsDB:
     """
     Database manager for ignored hosts with comprehensive tracking.
@@ -21,56 +170,123 @@ class IgnoreHostsDB:
     be ignored by the proxy, with full audit trail and statistics.
     """
     
-    def __init__(self, db_path: Optional[str] = None):
+    def __init__(self, db_path: Optional[str] = None, synchronous: str = 'NORMAL',
+                 busy_timeout: float = 5.0, read_only: bool = False):
         """
         Initialize database manager.
         
         Args:
             db_path: Optional custom database path. If None, uses default location.
+            synchronous: SQLite synchronous level (OFF, NORMAL, FULL or EXTRA)
+            busy_timeout: Seconds to wait on a locked database before retrying
+            read_only: Open an existing database read-only, e.g. another node's;
+                it is never created or migrated
+        
+        Raises:
+            FileNotFoundError: If a read-only database does not exist
+            RuntimeError: If a read-only database is not at the current schema version
         """
         if db_path is None:
             # Place database in the same directory as this file
             db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'ignore_hosts.db')
         
         self.db_path = db_path
-        logger.info(f"Initializing database at: {self.db_path}")
-        self.init_database()
+        self.read_only = read_only
+        self.connections = ConnectionManager(db_path, synchronous=synchronous, busy_timeout=busy_timeout,
+                                             read_only=read_only)
+        self._origin_ids: Dict[str, int] = {}
+        self._origin_names: Dict[int, str] = {}
+        if read_only:
+            self.check_schema()
+        else:
+            logger.info(f"Initializing database at: {self.db_path}")
+            self.init_database()
+    
+    @property
+    def snapshot_path(self) -> str:
+        """Get the default snapshot path: the database path with a ``.snapshot`` extension."""
+        return os.path.splitext(self.db_path)[0] + '.snapshot'
+    
+    def close(self):
+        """Close all connections held by this database manager."""
+        self.connections.close_all()
     
     def init_database(self):
-        """Initialize the database and create tables if they don't exist."""
+        """Create the schema, or migrate an existing database to the current version."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS ignore_hosts (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        domain TEXT UNIQUE NOT NULL,
-                        origin TEXT NOT NULL,
-                        date_added TEXT NOT NULL,
-                        last_seen TEXT NOT NULL,
-                        count INTEGER DEFAULT 1,
-                        active BOOLEAN DEFAULT 1
-                    )
-                ''')
-                
-                cursor.execute('''
-                    CREATE INDEX IF NOT EXISTS idx_domain ON ignore_hosts(domain)
-                ''')
-                
-                cursor.execute('''
-                    CREATE INDEX IF NOT EXISTS idx_active ON ignore_hosts(active)
-                ''')
-                
-                conn.commit()
-                logger.info("Database initialized successfully")
+            migrate(self.connections)
+            logger.info("Database initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize database: {e}")
             raise
     
+    def check_schema(self):
+        """
+        Check that an existing database can be read as is, without migrating it.
+        
+        Raises:
+            FileNotFoundError: If the database file does not exist
+            RuntimeError: If its schema version is not the current one
+        """
+        if not os.path.isfile(self.db_path):
+            raise FileNotFoundError(f"Database not found: {self.db_path}")
+        version = self.connections.execute(get_version)
+        if version != SCHEMA_VERSION:
+            self.close()
+            raise RuntimeError(f"Database {self.db_path} has schema version {version}, expected "
+                               f"{SCHEMA_VERSION}; open it with this HttpPro version once to upgrade it")
+    
+    def _origin_ids_for(self, names: Iterable[str]) -> Dict[str, int]:
+        """
+        Get the ids of origin names, registering unknown names.
+    
+        Origins are never deleted, so resolved ids are cached for the
+        lifetime of this manager; only a new name costs a write.
+        """
+        missing = set(names) - self._origin_ids.keys()
+        if missing:
+            def _resolve(conn):
+                conn.executemany('INSERT OR IGNORE INTO origins (name) VALUES (?)', [(name,) for name in missing])
+                return {name: conn.execute('SELECT id FROM origins WHERE name = ?', (name,)).fetchone()[0]
+                        for name in missing}
+            resolved = self.connections.execute(_resolve, write=True)
+            self._origin_ids.update(resolved)
+            self._origin_names.update((origin_id, name) for name, origin_id in resolved.items())
+        return self._origin_ids
+    
+    def _info_row(self, row: Tuple) -> Tuple:
+        """Convert a stored row (see _INFO_COLUMNS) to the public form with origin name and ISO timestamps."""
+        name = self._origin_names.get(row[1])
+        if name is None:
+            # Registered by another process: the table is small, reload it whole
+            self._origin_names = dict(self.connections.execute(
+                lambda conn: conn.execute('SELECT id, name FROM origins').fetchall()))
+            name = self._origin_names.get(row[1])
+        return (row[0], name, to_iso(row[2]), to_iso(row[3]), row[4], row[5])
+    
+    @staticmethod
+    def _rebuild_stats(conn: sqlite3.Connection):
+        """Recompute the statistics counters from ignore_hosts and ignore_networks."""
+        conn.execute('DELETE FROM ignore_hosts_stats')
+        conn.execute(f'''
+            INSERT INTO ignore_hosts_stats (origin, active, domains)
+            SELECT {_ORIGIN_NAME}, active, COUNT(*) FROM ignore_hosts
+            GROUP BY origin_id, active
+        ''')
+        conn.execute('DELETE FROM ignore_networks_stats')
+        conn.execute(f'''
+            INSERT INTO ignore_networks_stats (origin, active, networks)
+            SELECT {_ORIGIN_NAME}, active, COUNT(*) FROM ignore_networks
+            GROUP BY origin_id, active
+        ''')
+    
+    @_DB_LATENCY.labels('add_domain').time()
     def add_domain(self, domain: str, origin: str) -> bool:
         """
         Add a domain to the ignore list with origin tracking.
         
+        IP addresses and CIDR prefixes are stored as network rules, see add_network.
+        
         Args:
             domain: The domain to ignore
             origin: Source of the ignore request (e.g., 'tls_error', 'manual', 'file_import')
@@ -78,115 +294,904 @@ class IgnoreHostsDB:
         Returns:
             True if domain was added, False if it already existed
         """
+        network = parse_network(domain)
+        if network is not None:
+            return self.add_network(str(network), origin)
+        
+        current_time = now_us()
+        origin_id = self._origin_ids_for((origin,))[origin]
+        params = (domain, reverse_domain(domain), origin_id, current_time, current_time, 1)
+        
+        def _add(conn):
+            if _HAS_RETURNING:
+                # A freshly inserted row is the only one left with count = 1
+                return conn.execute(_UPSERT_SQL + ' RETURNING count', params).fetchone()[0] == 1
+            exists = conn.execute('SELECT 1 FROM ignore_hosts WHERE domain = ?', (domain,)).fetchone()
+            conn.execute(_UPSERT_SQL, params)
+            return exists is None
+        
         try:
-            current_time = datetime.now().isoformat()
-            
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Try to insert new domain
-                try:
-                    cursor.execute('''
-                        INSERT INTO ignore_hosts (domain, origin, date_added, last_seen, count, active)
-                        VALUES (?, ?, ?, ?, 1, 1)
-                    ''', (domain, origin, current_time, current_time))
-                    
-                    conn.commit()
-                    logger.debug(f"Added new domain: {domain} (origin: {origin})")
-                    return True
-                    
-                except sqlite3.IntegrityError:
-                    # Domain already exists, update it
-                    cursor.execute('''
-                        UPDATE ignore_hosts 
-                        SET last_seen = ?, count = count + 1, active = 1
-                        WHERE domain = ?
-                    ''', (current_time, domain))
-                    
-                    conn.commit()
-                    logger.debug(f"Updated existing domain: {domain}")
-                    return False
+            added = self.connections.execute(_add, write=True)
+            if added:
+                logger.debug(f"Added new domain: {domain} (origin: {origin})")
+            else:
+                logger.debug(f"Updated existing domain: {domain}")
+            return added
                     
         except Exception as e:
             logger.error(f"Failed to add domain {domain}: {e}")
             return False
     
+    @_DB_LATENCY.labels('add_domains').time()
+    def add_domains(self, entries: Iterable[Tuple[str, str, int]]) -> int:
+        """
+        Add or refresh several domains inside a single transaction.
+
+        Args:
+            entries: Iterable of (domain, origin, hits) tuples. ``hits`` is the
+                number of occurrences to add to the domain's count. IP addresses
+                and CIDR prefixes are stored as network rules.
+
+        Returns:
+            Number of domains that were newly added
+        """
+        entries = list(entries)
+        current_time = now_us()
+        
+        try:
+            origin_ids = self._origin_ids_for(origin for _, origin, _ in entries)
+            rows = []
+            network_rows = []
+            for domain, origin, hits in entries:
+                network = parse_network(domain)
+                if network is None:
+                    rows.append((domain, reverse_domain(domain), origin_ids[origin], current_time, current_time, hits))
+                else:
+                    network_rows.append(_network_row(network, origin_ids[origin], current_time, hits))
+            added_count = self.connections.execute(
+                lambda conn: self._upsert_rows(conn, rows) + self._upsert_network_rows(conn, network_rows),
+                write=True)
+            logger.debug(f"Batch added {added_count} new domains")
+            return added_count
+
+        except Exception as e:
+            logger.error(f"Failed to add domain batch: {e}")
+            raise
+
+    @staticmethod
+    def _upsert_rows(conn: sqlite3.Connection, rows: List[Tuple]) -> int:
+        """
+        UPSERT rows inside the caller's transaction.
+
+        Returns:
+            Number of rows that were newly inserted
+        """
+        # AUTOINCREMENT ids are strictly increasing, so every new row lands above the current maximum
+        max_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM ignore_hosts').fetchone()[0]
+        conn.executemany(_UPSERT_SQL, rows)
+        return conn.execute('SELECT COUNT(*) FROM ignore_hosts WHERE id > ?', (max_id,)).fetchone()[0]
+    
+    @staticmethod
+    def _upsert_network_rows(conn: sqlite3.Connection, rows: List[Tuple]) -> int:
+        """
+        UPSERT network rows (see _network_row) inside the caller's transaction.
+        
+        Returns:
+            Number of rows that were newly inserted
+        """
+        if not rows:
+            return 0
+        max_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM ignore_networks').fetchone()[0]
+        conn.executemany(_NETWORK_UPSERT_SQL, rows)
+        return conn.execute('SELECT COUNT(*) FROM ignore_networks WHERE id > ?', (max_id,)).fetchone()[0]
+
+    @_DB_LATENCY.labels('get_active_domains').time()
     def get_active_domains(self) -> List[str]:
         """Get all active domains from the database."""
+        def _query(conn):
+            cursor = conn.execute('''
+                SELECT domain FROM ignore_hosts 
+                WHERE active = 1 
+                ORDER BY domain
+            ''')
+            return [row[0] for row in cursor]
+        
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT domain FROM ignore_hosts 
-                    WHERE active = 1 
-                    ORDER BY domain
-                ''')
-                
-                domains = [row[0] for row in cursor.fetchall()]
-                logger.debug(f"Retrieved {len(domains)} active domains from database")
-                return domains
+            domains = self.connections.execute(_query)
+            logger.debug(f"Retrieved {len(domains)} active domains from database")
+            return domains
                 
         except Exception as e:
             logger.error(f"Failed to get active domains: {e}")
             return []
     
+    @_DB_LATENCY.labels('get_domain_info').time()
     def get_domain_info(self, domain: str) -> Optional[Tuple]:
-        """Get detailed information about a specific domain."""
+        """Get detailed information about a specific domain, or an IP address or CIDR prefix."""
+        if parse_network(domain) is not None:
+            return self.get_network_info(domain)
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT domain, origin, date_added, last_seen, count, active
-                    FROM ignore_hosts 
-                    WHERE domain = ?
-                ''', (domain,))
-                
-                return cursor.fetchone()
+            row = self.connections.execute(lambda conn: conn.execute(f'''
+                SELECT {_INFO_COLUMNS}
+                FROM ignore_hosts 
+                WHERE domain = ?
+            ''', (domain,)).fetchone())
+            return None if row is None else self._info_row(row)
                 
         except Exception as e:
             logger.error(f"Failed to get domain info for {domain}: {e}")
             return None
     
+    @_DB_LATENCY.labels('get_all_domains_info').time()
     def get_all_domains_info(self) -> List[Tuple]:
         """Get detailed information about all domains."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT domain, origin, date_added, last_seen, count, active
-                    FROM ignore_hosts 
-                    ORDER BY date_added DESC
-                ''')
-                
-                return cursor.fetchall()
+            rows = self.connections.execute(lambda conn: conn.execute(f'''
+                SELECT {_INFO_COLUMNS}
+                FROM ignore_hosts 
+                ORDER BY date_added DESC
+            ''').fetchall())
+            return [self._info_row(row) for row in rows]
                 
         except Exception as e:
             logger.error(f"Failed to get all domains info: {e}")
             return []
     
+    def iter_domains(self, active: Optional[bool] = True, origin: Optional[str] = None,
+                     since: Optional[str] = None, until: Optional[str] = None,
+                     after: Optional[str] = None, limit: Optional[int] = None,
+                     batch_size: int = 1000, suffix: Optional[str] = None,
+                     prefix: Optional[str] = None, contains: Optional[str] = None) -> Iterator[Tuple]:
+        """
+        Stream domains, with the filters applied in SQL.
+        
+        Rows are read in pages of ``batch_size`` using keyset pagination
+        (``WHERE key > last``), so memory use is bounded and no read
+        transaction stays open between pages. The key is the domain, or the
+        reversed domain for suffix searches, which are range scans on the
+        ``domain_rev`` index and return a domain's subdomains together.
+        
+        Args:
+            active: True for active domains only, False for inactive only, None for both
+            origin: Only domains with this origin
+            since: Only domains added at or after this ISO date or timestamp
+            until: Only domains added before this ISO date or timestamp
+            after: Start after this domain (the last domain of the previous page)
+            limit: Maximum number of rows to yield
+            batch_size: Rows fetched per query
+            suffix: Only this domain and its subdomains; with a leading dot
+                (``.example.com``) only the subdomains
+            prefix: Only domains starting with this string
+            contains: Only domains containing this string, using the substring
+                index when it exists and the string has at least three characters
+        
+        Yields:
+            (domain, origin, date_added, last_seen, count, active) tuples
+        """
+        conditions = []
+        params = []
+        key = 'domain'
+        # Inclusive lower bound of the key; kept out of the WHERE clause so the
+        # keyset condition is the only lower bound the planner sees
+        lower = ''
+        if active is not None:
+            # Written literally so the planner can use the partial index on active domains
+            conditions.append('active = 1' if active else 'active = 0')
+        if origin is not None:
+            conditions.append('origin_id = (SELECT id FROM origins WHERE name = ?)')
+            params.append(origin)
+        if since is not None:
+            conditions.append('date_added >= ?')
+            params.append(to_epoch_us(since))
+        if until is not None:
+            conditions.append('date_added < ?')
+            params.append(to_epoch_us(until))
+        if suffix:
+            key = 'domain_rev'
+            lower = reverse_domain(suffix)
+            if suffix.startswith('.'):
+                conditions.append('domain_rev < ?')
+                params.append(_next_prefix(lower))
+            else:
+                # The domain itself, then its subdomains; skips e.g. example.com-cdn.net
+                conditions.append('domain_rev < ? AND (domain_rev = ? OR domain_rev > ?)')
+                params.extend((lower + '/', lower, lower + '.'))
+        if prefix:
+            if key == 'domain':
+                lower = prefix
+            else:
+                conditions.append('domain >= ?')
+                params.append(prefix)
+            conditions.append('domain < ?')
+            params.append(_next_prefix(prefix))
+        if contains:
+            if len(contains) >= 3 and self.has_substring_index():
+                conditions.append('id IN (SELECT rowid FROM ignore_hosts_fts WHERE ignore_hosts_fts MATCH ?)')
+                params.append('"' + contains.replace('"', '""') + '"')
+            else:
+                conditions.append('instr(domain, ?) > 0')
+                params.append(contains)
+        
+        def query(operator):
+            return ('SELECT ' + _INFO_COLUMNS + ', ' + key + ' FROM ignore_hosts '
+                    'WHERE ' + key + ' ' + operator + ' ?' +
+                    ''.join(f' AND {condition}' for condition in conditions) + ' ORDER BY ' + key + ' LIMIT ?')
+        
+        last = None if after is None else (reverse_domain(after) if key == 'domain_rev' else after)
+        if last is None or last < lower:
+            sql, last = query('>='), lower
+        else:
+            sql = query('>')
+        remaining = limit
+        
+        while remaining is None or remaining > 0:
+            size = batch_size if remaining is None else min(batch_size, remaining)
+            try:
+                rows = self.connections.execute(lambda conn: conn.execute(sql, (last, *params, size)).fetchall())
+            except Exception as e:
+                logger.error(f"Failed to list domains after {last!r}: {e}")
+                raise
+            
+            for row in rows:
+                yield self._info_row(row)
+            if len(rows) < size:
+                return
+            sql, last = query('>'), rows[-1][6]
+            if remaining is not None:
+                remaining -= len(rows)
+    
+    def search_domains(self, pattern: str, active: Optional[bool] = None,
+                       limit: Optional[int] = None) -> Iterator[Tuple]:
+        """
+        Stream the domains matching a wildcard pattern.
+        
+        Args:
+            pattern: ``*.example.com``, ``prefix*``, ``*substring*`` or an exact domain
+            active: True for active domains only, False for inactive only, None for both
+            limit: Maximum number of rows to yield
+        
+        Yields:
+            (domain, origin, date_added, last_seen, count, active) tuples
+        
+        Raises:
+            ValueError: If the pattern is not supported
+        """
+        filters = parse_pattern(pattern)
+        if 'domain' in filters:
+            info = self.get_domain_info(filters['domain'])
+            if info is not None and (active is None or bool(info[5]) == active):
+                yield info
+            return
+        yield from self.iter_domains(active=active, limit=limit, **filters)
+    
+    def has_substring_index(self) -> bool:
+        """Check whether the FTS5 trigram index for substring searches exists."""
+        return self.connections.execute(lambda conn: conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ignore_hosts_fts'").fetchone()) is not None
+    
+    def create_substring_index(self) -> bool:
+        """
+        Create the optional FTS5 trigram index used by ``contains`` searches.
+        
+        The index is kept up to date by triggers once created. It needs an
+        SQLite library with FTS5 and the trigram tokenizer (3.34+) and takes
+        roughly three times the space of the domain column.
+        
+        Returns:
+            True if the index exists after the call
+        """
+        try:
+            self.connections.execute(migrations.create_substring_index, write=True)
+            logger.info("Created the substring search index")
+            return True
+        except sqlite3.OperationalError as e:
+            logger.error(f"Failed to create the substring search index (FTS5 trigram support needed): {e}")
+            return False
+    
+    def drop_substring_index(self):
+        """Drop the FTS5 trigram index and its triggers."""
+        self.connections.execute(migrations.drop_substring_index, write=True)
+        logger.info("Dropped the substring search index")
+    
+    @_DB_LATENCY.labels('remove_domain').time()
     def remove_domain(self, domain: str) -> bool:
-        """Mark a domain as inactive."""
+        """
+        Mark a domain as inactive.
+        
+        last_seen is set to the removal time so that replicated peers can
+        order the removal against their own changes to the domain. IP
+        addresses and CIDR prefixes deactivate the matching network rule.
+        """
+        current_time = now_us()
+        domain, table, column = _rule_table(domain)
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    UPDATE ignore_hosts 
-                    SET active = 0 
-                    WHERE domain = ?
-                ''', (domain,))
-                
-                conn.commit()
-                if cursor.rowcount > 0:
-                    logger.info(f"Deactivated domain: {domain}")
-                    return True
-                else:
-                    logger.warning(f"Domain not found for deactivation: {domain}")
-                    return False
+            rowcount = self.connections.execute(lambda conn: conn.execute(f'''
+                UPDATE {table}
+                SET active = 0, last_seen = ?
+                WHERE {column} = ?
+            ''', (current_time, domain)).rowcount, write=True)
+            
+            if rowcount > 0:
+                logger.info(f"Deactivated domain: {domain}")
+                return True
+            else:
+                logger.warning(f"Domain not found for deactivation: {domain}")
+                return False
                     
         except Exception as e:
             logger.error(f"Failed to remove domain {domain}: {e}")
             return False
     
+    @_DB_LATENCY.labels('add_domain_batch').time()
+    def add_domain_batch(self, domains: Iterable[str], origin: str = "manual",
+                         chunk_size: int = IMPORT_CHUNK_SIZE) -> Dict[str, str]:
+        """
+        Add or refresh many domains in one transaction and report what happened to each.
+        
+        This is the batch form of add_domain: the whole batch is one write
+        transaction with one ``executemany`` UPSERT per ``chunk_size`` rules,
+        so it either applies completely or not at all.
+        
+        Args:
+            domains: Domains, IP addresses or CIDR prefixes; repeats count as hits
+            origin: Origin to assign to newly added domains
+            chunk_size: Number of rules per ``executemany`` call
+        
+        Returns:
+            dict: 'added', 'reactivated' or 'updated' per stored rule (networks
+            in canonical form), in input order
+        """
+        hits: Dict[str, int] = {}
+        for domain in domains:
+            rule = canonical_network(domain) or domain
+            hits[rule] = hits.get(rule, 0) + 1
+        current_time = now_us()
+        origin_id = self._origin_ids_for((origin,))[origin]
+        rules = list(hits)
+        
+        def apply(conn):
+            states = self._domain_states(conn, rules)
+            for start in range(0, len(rules), chunk_size):
+                rows = []
+                network_rows = []
+                for rule in rules[start:start + chunk_size]:
+                    network = parse_network(rule)
+                    if network is None:
+                        rows.append((rule, reverse_domain(rule), origin_id, current_time, current_time, hits[rule]))
+                    else:
+                        network_rows.append(_network_row(network, origin_id, current_time, hits[rule]))
+                conn.executemany(_UPSERT_SQL, rows)
+                conn.executemany(_NETWORK_UPSERT_SQL, network_rows)
+            return states
+        
+        try:
+            states = self.connections.execute(apply, write=True)
+        except Exception as e:
+            logger.error(f"Failed to add batch of {len(rules)} domains: {e}")
+            raise
+        
+        results = {rule: 'added' if rule not in states else ('updated' if states[rule][0] else 'reactivated')
+                   for rule in rules}
+        logger.info(f"Batch added {sum(1 for status in results.values() if status == 'added')} new domains "
+                    f"of {len(rules)}")
+        return results
+    
+    @_DB_LATENCY.labels('remove_domain_batch').time()
+    def remove_domain_batch(self, domains: Iterable[str], chunk_size: int = IMPORT_CHUNK_SIZE) -> Dict[str, str]:
+        """
+        Mark many domains as inactive in one transaction and report what happened to each.
+        
+        Domains that are already inactive are left untouched, so their
+        last_seen keeps recording the original removal.
+        
+        Args:
+            domains: Domains, IP addresses or CIDR prefixes
+            chunk_size: Number of rules per ``executemany`` call
+        
+        Returns:
+            dict: 'removed', 'inactive' (already inactive) or 'not_found' per
+            stored rule (networks in canonical form), in input order
+        """
+        rules = list(dict.fromkeys(canonical_network(domain) or domain for domain in domains))
+        current_time = now_us()
+        
+        def apply(conn):
+            states = self._domain_states(conn, rules)
+            active = [rule for rule in rules if rule in states and states[rule][0]]
+            for start in range(0, len(active), chunk_size):
+                chunk = active[start:start + chunk_size]
+                conn.executemany('UPDATE ignore_hosts SET active = 0, last_seen = ? WHERE domain = ?',
+                                 [(current_time, rule) for rule in chunk if not is_network_rule(rule)])
+                conn.executemany('UPDATE ignore_networks SET active = 0, last_seen = ? WHERE network = ?',
+                                 [(current_time, rule) for rule in chunk if is_network_rule(rule)])
+            return states
+        
+        try:
+            states = self.connections.execute(apply, write=True)
+        except Exception as e:
+            logger.error(f"Failed to remove batch of {len(rules)} domains: {e}")
+            raise
+        
+        results = {rule: 'not_found' if rule not in states else ('removed' if states[rule][0] else 'inactive')
+                   for rule in rules}
+        logger.info(f"Batch deactivated {sum(1 for status in results.values() if status == 'removed')} domains "
+                    f"of {len(rules)}")
+        return results
+    
+    @_DB_LATENCY.labels('touch_domains').time()
+    def touch_domains(self, domains: Iterable[str], seen_at: Optional[int] = None) -> int:
+        """
+        Refresh last_seen of active domains that were matched by connections.
+        
+        Ignored connections never fail, so without this last_seen would only
+        record when a domain was learned. Only last_seen changes: the count,
+        the change log and replication are not touched.
+        
+        Args:
+            domains: Domains seen since the previous call; a name also refreshes
+                its ``*.`` wildcard rule, which matches under the bare name
+            seen_at: Time in epoch microseconds; defaults to now
+        
+        Returns:
+            Number of rows refreshed
+        """
+        seen_at = now_us() if seen_at is None else seen_at
+        rows = []
+        network_rows = []
+        for domain in domains:
+            network = canonical_network(domain)
+            if network is None:
+                rows.append((seen_at, domain))
+            else:
+                network_rows.append((seen_at, network))
+        if not rows and not network_rows:
+            return 0
+        
+        def _touch(conn):
+            touched = 0
+            if rows:
+                touched += conn.executemany(
+                    "UPDATE ignore_hosts SET last_seen = MAX(last_seen, ?1) "
+                    "WHERE domain IN (?2, '*.' || ?2) AND active = 1", rows).rowcount
+            if network_rows:
+                touched += conn.executemany(
+                    'UPDATE ignore_networks SET last_seen = MAX(last_seen, ?) WHERE network = ? AND active = 1',
+                    network_rows).rowcount
+            return touched
+        
+        return self.connections.execute(_touch, write=True)
+    
+    @_DB_LATENCY.labels('expire_domains').time()
+    def expire_domains(self, ttls: Dict[str, float], batch_size: int = COMPACTION_BATCH_SIZE) -> Dict[str, int]:
+        """
+        Deactivate active domains not seen within their origin's time to live.
+        
+        Rows are deactivated ``batch_size`` per transaction, oldest first via
+        the (active, last_seen) index. Like remove_domain, last_seen is set
+        to the deactivation time, so the change replicates and purge_inactive
+        counts from it. Network rules expire like domains.
+        
+        Args:
+            ttls: Time to live in seconds per origin; other origins never expire
+            batch_size: Rows deactivated per transaction
+        
+        Returns:
+            dict: Number of expired domains per origin, for origins with any
+        """
+        now = now_us()
+        expired = {}
+        for origin, ttl in ttls.items():
+            cutoff = now - int(ttl * 1000000)
+            total = 0
+            for table in ('ignore_hosts', 'ignore_networks'):
+                while True:
+                    count = self.connections.execute(lambda conn: conn.execute(f'''
+                        UPDATE {table} SET active = 0, last_seen = ?
+                        WHERE id IN (
+                            SELECT id FROM {table}
+                            WHERE active = 1 AND last_seen < ? AND origin_id = (SELECT id FROM origins WHERE name = ?)
+                            LIMIT ?
+                        )
+                    ''', (now, cutoff, origin, batch_size)).rowcount, write=True)
+                    total += count
+                    if count < batch_size:
+                        break
+            if total:
+                expired[origin] = total
+                logger.info(f"Expired {total} {origin} domains not seen for {ttl / 86400:g} days")
+        return expired
+    
+    @_DB_LATENCY.labels('evict_least_recent').time()
+    def evict_least_recent(self, max_active: int, exempt_origins: Iterable[str] = (),
+                           batch_size: int = COMPACTION_BATCH_SIZE) -> List[str]:
+        """
+        Deactivate the least recently seen domains until at most ``max_active`` remain active.
+        
+        Args:
+            max_active: Maximum number of active domains
+            exempt_origins: Origins whose domains are counted but never evicted
+            batch_size: Rows deactivated per transaction
+        
+        Returns:
+            list: The evicted domains, least recently seen first
+        """
+        exempt = list(exempt_origins)
+        exempt_clause = ''
+        if exempt:
+            exempt_clause = (f' AND origin_id NOT IN (SELECT id FROM origins WHERE name IN '
+                             f'({",".join("?" * len(exempt))}))')
+        
+        excess = self.get_stats().get('active_domains', 0) - max_active
+        evicted = []
+        while excess > 0:
+            size = min(batch_size, excess)
+            
+            def _evict(conn):
+                now = now_us()
+                rows = conn.execute(f'''
+                    SELECT id, domain FROM ignore_hosts
+                    WHERE active = 1{exempt_clause}
+                    ORDER BY last_seen
+                    LIMIT ?
+                ''', (*exempt, size)).fetchall()
+                conn.executemany('UPDATE ignore_hosts SET active = 0, last_seen = ? WHERE id = ?',
+                                 [(now, row_id) for row_id, _ in rows])
+                return [domain for _, domain in rows]
+            
+            batch = self.connections.execute(_evict, write=True)
+            if not batch:
+                break
+            evicted.extend(batch)
+            excess -= len(batch)
+        
+        if evicted:
+            logger.info(f"Evicted {len(evicted)} least recently seen domains to stay within {max_active} active")
+        return evicted
+    
+    @_DB_LATENCY.labels('purge_inactive').time()
+    def purge_inactive(self, older_than: float, batch_size: int = COMPACTION_BATCH_SIZE) -> int:
+        """
+        Delete domains that have been inactive for longer than ``older_than`` seconds.
+        
+        Domains and networks replaced by a covering rule are kept, so the aggregation can be undone.
+        
+        Args:
+            older_than: Seconds since deactivation (last_seen of inactive rows)
+            batch_size: Rows deleted per transaction
+        
+        Returns:
+            Number of deleted rows
+        """
+        cutoff = now_us() - int(older_than * 1000000)
+        total = 0
+        for table, column in (('ignore_hosts', 'domain'), ('ignore_networks', 'network')):
+            while True:
+                count = self.connections.execute(lambda conn: conn.execute(f'''
+                    DELETE FROM {table} WHERE id IN (
+                        SELECT id FROM {table} WHERE active = 0 AND last_seen < ?
+                        AND {column} NOT IN (SELECT domain FROM aggregated_domains) LIMIT ?
+                    )
+                ''', (cutoff, batch_size)).rowcount, write=True)
+                total += count
+                if count < batch_size:
+                    break
+        if total:
+            logger.info(f"Purged {total} domains inactive for more than {older_than / 86400:g} days")
+        return total
+    
+    def incremental_vacuum(self, max_pages: int = 0) -> int:
+        """
+        Return free pages at the end of the database file to the file system.
+        
+        Needs ``auto_vacuum = INCREMENTAL``, the default of new databases;
+        older databases get it from one full vacuum().
+        
+        Args:
+            max_pages: Maximum number of pages to release; 0 releases all
+        
+        Returns:
+            Number of pages released, 0 if incremental vacuum is not enabled
+        """
+        def _vacuum(conn):
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                return 0
+            free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            pages = min(free, max_pages) if max_pages > 0 else free
+            # sqlite3 steps the pragma statement once, which releases a single page
+            for _ in range(pages):
+                conn.execute('PRAGMA incremental_vacuum(1)')
+            return free - conn.execute('PRAGMA freelist_count').fetchone()[0]
+        
+        return self.connections.execute(_vacuum, write=True)
+    
+    def vacuum(self) -> dict:
+        """
+        Rebuild the database file, enabling incremental vacuum on older databases.
+        
+        Holds the write lock for the whole rebuild; run it while the proxy is
+        idle or stopped.
+        
+        Returns:
+            dict: File 'size_before' and 'size_after' in bytes
+        """
+        def _size(conn):
+            return (conn.execute('PRAGMA page_count').fetchone()[0] *
+                    conn.execute('PRAGMA page_size').fetchone()[0])
+        
+        before = self.connections.execute(_size)
+        # VACUUM cannot run inside a transaction; the connection runs in autocommit mode
+        self.connections.execute(lambda conn: conn.execute('VACUUM'))
+        after = self.connections.execute(_size)
+        logger.info(f"Vacuumed database: {before} -> {after} bytes")
+        return {'size_before': before, 'size_after': after}
+    
+    @_DB_LATENCY.labels('aggregate_siblings').time()
+    def aggregate_siblings(self, threshold: int, origins: Iterable[str] = AGGREGATE_ORIGINS,
+                           suffix_list: Optional[PublicSuffixList] = None, dry_run: bool = False,
+                           batch_size: int = COMPACTION_BATCH_SIZE) -> Dict[str, List[str]]:
+        """
+        Replace groups of sibling subdomains by a single wildcard rule.
+        
+        When more than ``threshold`` active domains of ``origins`` share a
+        parent, such as ``a1.cdn.example.net`` and ``a2.cdn.example.net``, a
+        ``*.cdn.example.net`` rule is added with the origin ``aggregated`` and
+        every covered domain of those origins is deactivated. Parents that are
+        public suffixes (``*.co.uk``, ``*.cloudfront.net``) are never used. The
+        replaced domains are recorded in ``aggregated_domains`` so that
+        disaggregate() can restore them.
+        
+        Args:
+            threshold: Number of siblings that must be exceeded
+            origins: Origins of the domains that may be replaced
+            suffix_list: Public Suffix List; defaults to the bundled copy
+            dry_run: Only report what would be aggregated
+            batch_size: Domains replaced per transaction, rounded up to whole groups
+        
+        Returns:
+            dict: Replaced domains per wildcard rule
+        """
+        suffix_list = suffix_list or default_suffix_list()
+        origins = list(origins)
+        origin_clause = f'origin_id IN (SELECT id FROM origins WHERE name IN ({",".join("?" * len(origins))}))'
+        
+        # Candidate parents in one pass over the partial index of active domains
+        parents = self.connections.execute(lambda conn: [parent for (parent,) in conn.execute(f'''
+            SELECT substr(domain, instr(domain, '.') + 1) AS parent FROM ignore_hosts
+            WHERE active = 1 AND instr(domain, '.') > 0 AND domain NOT LIKE '*.%' AND {origin_clause}
+            GROUP BY parent HAVING COUNT(*) > ?
+        ''', (*origins, threshold))])
+        
+        # IP addresses have no registrable domain, and a numeric last label is never a TLD
+        parents = [parent for parent in parents
+                   if ':' not in parent and not parent.rsplit('.', 1)[-1].isdigit()
+                   and suffix_list.registrable_domain(parent) is not None]
+        origin_id = None if dry_run else self._origin_ids_for((AGGREGATED_ORIGIN,))[AGGREGATED_ORIGIN]
+        
+        def _aggregate(conn, pending):
+            # Parents are aggregated until about batch_size domains were replaced in this transaction
+            results, replaced = [], 0
+            while pending and replaced < batch_size:
+                parent = pending.pop()
+                lower = reverse_domain(parent) + '.'
+                # Every active descendant of the eligible origins is covered by the rule; the
+                # unary + keeps the planner on the domain_rev range instead of the active indexes
+                rows = conn.execute(f'''
+                    SELECT id, domain FROM ignore_hosts
+                    WHERE domain_rev > ? AND domain_rev < ? AND +active = 1 AND {origin_clause}
+                ''', (lower, _next_prefix(lower), *origins)).fetchall()
+                # Siblings deactivated by another process since the candidates were counted
+                if sum(1 for _, domain in rows if domain[domain.find('.') + 1:] == parent) <= threshold:
+                    continue
+                
+                rule = '*.' + parent
+                results.append((rule, sorted(domain for _, domain in rows)))
+                replaced += len(rows)
+                if dry_run:
+                    continue
+                now = now_us()
+                conn.execute(_UPSERT_SQL, (rule, reverse_domain(rule), origin_id, now, now, len(rows)))
+                conn.executemany('UPDATE ignore_hosts SET active = 0, last_seen = ? WHERE id = ?',
+                                 [(now, row_id) for row_id, _ in rows])
+                conn.executemany('INSERT OR REPLACE INTO aggregated_domains (domain, rule, aggregated_at) '
+                                 'VALUES (?, ?, ?)', [(domain, rule, now) for _, domain in rows])
+            return results
+        
+        aggregated = {}
+        pending = sorted(parents, reverse=True)
+        while pending:
+            # A retried transaction starts again from the same parents
+            batch = list(pending)
+            results = self.connections.execute(lambda conn: _aggregate(conn, batch), write=not dry_run)
+            pending = batch
+            for rule, domains in results:
+                aggregated[rule] = domains
+                if not dry_run:
+                    logger.info(f"Aggregated {len(domains)} domains into {rule}")
+        return aggregated
+    
+    @_DB_LATENCY.labels('disaggregate').time()
+    def disaggregate(self, rule: str) -> List[str]:
+        """
+        Undo an aggregation: reactivate the replaced domains and deactivate the rule.
+        
+        A rule that was not written by aggregate_siblings or collapse_networks,
+        e.g. one added manually, stays active.
+        
+        Args:
+            rule: Wildcard rule, e.g. ``*.cdn.example.net``, or covering network
+        
+        Returns:
+            list: The reactivated domains or networks
+        """
+        rule, table, column = _rule_table(rule)
+        
+        def _restore(conn):
+            now = now_us()
+            domains = [domain for (domain,) in conn.execute(
+                'SELECT domain FROM aggregated_domains WHERE rule = ? ORDER BY domain', (rule,))]
+            conn.executemany(f'UPDATE {table} SET active = 1, last_seen = ? WHERE {column} = ? AND active = 0',
+                             [(now, domain) for domain in domains])
+            conn.execute('DELETE FROM aggregated_domains WHERE rule = ?', (rule,))
+            conn.execute(f'''
+                UPDATE {table} SET active = 0, last_seen = ?
+                WHERE {column} = ? AND active = 1 AND origin_id = (SELECT id FROM origins WHERE name = ?)
+            ''', (now, rule, AGGREGATED_ORIGIN))
+            return domains
+        
+        domains = self.connections.execute(_restore, write=True)
+        if domains:
+            logger.info(f"Disaggregated {rule}: restored {len(domains)} domains")
+        else:
+            logger.warning(f"No aggregation recorded for {rule}")
+        return domains
+    
+    def get_aggregations(self) -> Dict[str, int]:
+        """
+        Get the recorded aggregations.
+        
+        Returns:
+            dict: Number of replaced domains or networks per covering rule
+        """
+        return dict(self.connections.execute(lambda conn: conn.execute(
+            'SELECT rule, COUNT(*) FROM aggregated_domains GROUP BY rule ORDER BY rule').fetchall()))
+    
+    @_DB_LATENCY.labels('add_network').time()
+    def add_network(self, network: str, origin: str) -> bool:
+        """
+        Add an IP address or CIDR prefix to the ignore list.
+        
+        Args:
+            network: Address or prefix; stored in canonical form, e.g. ``203.0.113.7/32``
+            origin: Source of the ignore request
+        
+        Returns:
+            True if the network was added, False if it already existed or is invalid
+        """
+        parsed = parse_network(network)
+        if parsed is None:
+            logger.error(f"Not an IP address or CIDR prefix: {network}")
+            return False
+        
+        current_time = now_us()
+        origin_id = self._origin_ids_for((origin,))[origin]
+        try:
+            added = self.connections.execute(
+                lambda conn: self._upsert_network_rows(conn, [_network_row(parsed, origin_id, current_time, 1)]),
+                write=True) == 1
+            logger.debug(f"{'Added new' if added else 'Updated existing'} network: {parsed} (origin: {origin})")
+            return added
+        
+        except Exception as e:
+            logger.error(f"Failed to add network {network}: {e}")
+            return False
+    
+    def remove_network(self, network: str) -> bool:
+        """Mark an IP address or CIDR prefix as inactive; see remove_domain."""
+        if parse_network(network) is None:
+            logger.warning(f"Not an IP address or CIDR prefix: {network}")
+            return False
+        return self.remove_domain(network)
+    
+    @_DB_LATENCY.labels('get_active_networks').time()
+    def get_active_networks(self) -> List[str]:
+        """Get all active IP addresses and CIDR prefixes, in canonical form."""
+        try:
+            return self.connections.execute(lambda conn: [network for (network,) in conn.execute(
+                'SELECT network FROM ignore_networks WHERE active = 1 ORDER BY version, network')])
+        
+        except Exception as e:
+            logger.error(f"Failed to get active networks: {e}")
+            return []
+    
+    def get_network_info(self, network: str) -> Optional[Tuple]:
+        """
+        Get detailed information about an IP address or CIDR prefix.
+        
+        Returns:
+            (network, origin, date_added, last_seen, count, active), like get_domain_info, or None
+        """
+        network = canonical_network(network)
+        if network is None:
+            return None
+        try:
+            row = self.connections.execute(lambda conn: conn.execute(
+                'SELECT network, origin_id, date_added, last_seen, count, active FROM ignore_networks '
+                'WHERE network = ?', (network,)).fetchone())
+            return None if row is None else self._info_row(row)
+        
+        except Exception as e:
+            logger.error(f"Failed to get network info for {network}: {e}")
+            return None
+    
+    def get_networks_info(self, active: Optional[bool] = True) -> List[Tuple]:
+        """
+        Get detailed information about network rules, in address order.
+        
+        Args:
+            active: True for active rules only, False for inactive only, None for all
+        
+        Returns:
+            list: (network, origin, date_added, last_seen, count, active) tuples
+        """
+        where = '' if active is None else f'WHERE active = {int(active)}'
+        rows = self.connections.execute(lambda conn: conn.execute(
+            f'SELECT network, origin_id, date_added, last_seen, count, active FROM ignore_networks {where}'
+        ).fetchall())
+        rows.sort(key=lambda row: network_sort_key(row[0]))
+        return [self._info_row(row) for row in rows]
+    
+    @_DB_LATENCY.labels('collapse_networks').time()
+    def collapse_networks(self, threshold: int = 0, origins: Iterable[str] = AGGREGATE_ORIGINS,
+                          ipv4_prefix: int = DEFAULT_IPV4_GROUP_PREFIX, ipv6_prefix: int = DEFAULT_IPV6_GROUP_PREFIX,
+                          dry_run: bool = False) -> Dict[str, List[str]]:
+        """
+        Replace active networks by covering prefixes.
+        
+        Adjacent networks are merged into the prefix they fill and networks
+        inside another one are dropped, which never changes the ignored
+        addresses. With a threshold, more than ``threshold`` networks in the
+        same /``ipv4_prefix`` or /``ipv6_prefix`` are also replaced by that
+        prefix. Covers are added with the origin ``aggregated`` and recorded
+        in ``aggregated_domains`` like wildcard rules, so disaggregate()
+        restores the replaced networks; earlier covers can be merged further.
+        
+        Args:
+            threshold: Networks per group prefix that must be exceeded; 0 only merges losslessly
+            origins: Origins of the networks that may be replaced
+            ipv4_prefix: Group prefix length for IPv4
+            ipv6_prefix: Group prefix length for IPv6
+            dry_run: Only report what would be replaced
+        
+        Returns:
+            dict: Replaced networks per covering prefix
+        """
+        origins = [*origins, AGGREGATED_ORIGIN]
+        origin_id = None if dry_run else self._origin_ids_for((AGGREGATED_ORIGIN,))[AGGREGATED_ORIGIN]
+        
+        def _collapse(conn):
+            ids = dict(conn.execute(f'''
+                SELECT network, id FROM ignore_networks
+                WHERE active = 1 AND origin_id IN (SELECT id FROM origins WHERE name IN ({",".join("?" * len(origins))}))
+            ''', origins).fetchall())
+            covers = collapse(ids, threshold, ipv4_prefix, ipv6_prefix)
+            if dry_run:
+                return covers
+        
+            now = now_us()
+            for cover, networks in covers.items():
+                conn.execute(_NETWORK_UPSERT_SQL, _network_row(parse_network(cover), origin_id, now, len(networks)))
+                conn.executemany('UPDATE ignore_networks SET active = 0, last_seen = ? WHERE id = ?',
+                                 [(now, ids[network]) for network in networks])
+                conn.executemany('INSERT OR REPLACE INTO aggregated_domains (domain, rule, aggregated_at) '
+                                 'VALUES (?, ?, ?)', [(network, cover, now) for network in networks])
+            return covers
+        
+        covers = self.connections.execute(_collapse, write=not dry_run)
+        if covers and not dry_run:
+            logger.info(f"Collapsed {sum(len(networks) for networks in covers.values())} networks "
+                        f"into {len(covers)} covering prefixes")
+        return covers
+    
     def import_from_file(self, file_path: str, origin: str = "file_import") -> int:
         """
         Import domains from a text file.
@@ -202,26 +1207,95 @@ class IgnoreHostsDB:
             logger.warning(f"Import file not found: {file_path}")
             return 0
         
-        imported_count = 0
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                for line in file:
-                    domain = line.strip()
-                    if domain and not domain.startswith('#') and domain != 'plugin-tls-loaded':
-                        if self.add_domain(domain, origin):
-                            imported_count += 1
-            
-            logger.info(f"Imported {imported_count} domains from {file_path}")
-            return imported_count
+            return self.bulk_import_file(file_path, origin)['inserted']
             
         except Exception as e:
             logger.error(f"Failed to import from file {file_path}: {e}")
             return 0
     
+    def bulk_import_file(self, file_path: str, origin: str = "file_import",
+                         chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+        """
+        Stream domains from a text file, optionally gzip-compressed, into the database.
+        
+        Args:
+            file_path: Path to the file containing domains (one per line)
+            origin: Origin to assign to newly imported domains
+            chunk_size: Number of lines written per transaction
+        
+        Returns:
+            dict: Counts of 'inserted', 'updated' and 'skipped' lines
+        """
+        with open_domain_file(file_path) as file:
+            result = self.import_domains(file, origin, chunk_size)
+        
+        logger.info(f"Imported {result['inserted']} new and {result['updated']} existing domains from {file_path}")
+        return result
+    
+    @_DB_LATENCY.labels('import_domains').time()
+    def import_domains(self, lines: Iterable[str], origin: str = "file_import",
+                       chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+        """
+        Import domains from an iterable of lines in bounded transactions.
+        
+        Lines are consumed lazily and written ``chunk_size`` at a time with a
+        single ``executemany`` UPSERT per chunk, so memory use does not depend
+        on the input size. Blank lines, comments and the plugin marker are skipped.
+        
+        Args:
+            lines: Iterable of lines, one domain per line
+            origin: Origin to assign to newly imported domains
+            chunk_size: Number of lines written per transaction
+        
+        Returns:
+            dict: Counts of 'inserted', 'updated' and 'skipped' lines
+        """
+        result = {'inserted': 0, 'updated': 0, 'skipped': 0}
+        chunk: Dict[str, int] = {}
+        chunk_lines = 0
+        
+        for line in lines:
+            domain = line.strip()
+            if not domain or domain.startswith('#') or domain == 'plugin-tls-loaded':
+                result['skipped'] += 1
+                continue
+            
+            chunk[domain] = chunk.get(domain, 0) + 1
+            chunk_lines += 1
+            if chunk_lines >= chunk_size:
+                self._import_chunk(chunk, chunk_lines, origin, result)
+                chunk = {}
+                chunk_lines = 0
+        
+        if chunk:
+            self._import_chunk(chunk, chunk_lines, origin, result)
+        return result
+    
+    def _import_chunk(self, chunk: Dict[str, int], chunk_lines: int, origin: str, result: dict):
+        """Write one chunk of aggregated domain hits and update the running counts."""
+        current_time = now_us()
+        origin_id = self._origin_ids_for((origin,))[origin]
+        rows = []
+        network_rows = []
+        for domain, hits in chunk.items():
+            network = parse_network(domain)
+            if network is None:
+                rows.append((domain, reverse_domain(domain), origin_id, current_time, current_time, hits))
+            else:
+                network_rows.append(_network_row(network, origin_id, current_time, hits))
+        inserted = self.connections.execute(
+            lambda conn: self._upsert_rows(conn, rows) + self._upsert_network_rows(conn, network_rows), write=True)
+        
+        # Every accepted line beyond the first occurrence of a new domain refreshed an existing row
+        result['inserted'] += inserted
+        result['updated'] += chunk_lines - inserted
+    
+    @_DB_LATENCY.labels('export_to_file').time()
     def export_to_file(self, file_path: str) -> bool:
-        """Export active domains to a text file."""
+        """Export active domains, then active networks, to a text file."""
         try:
-            domains = self.get_active_domains()
+            domains = self.get_active_domains() + self.get_active_networks()
             
             with open(file_path, 'w', encoding='utf-8') as file:
                 for domain in domains:
@@ -237,35 +1311,461 @@ class IgnoreHostsDB:
             logger.error(f"Failed to export to file {file_path}: {e}")
             return False
     
-    def get_stats(self) -> dict:
-        """Get statistics about the database."""
+    @_DB_LATENCY.labels('export_snapshot').time()
+    def export_snapshot(self, file_path: Optional[str] = None) -> dict:
+        """
+        Write the active domains and networks to a memory-mapped snapshot file.
+        
+        The snapshot records the change sequence read before the rules, so a
+        reader replaying the change log from there sees every later change
+        (see core/snapshot.py).
+        
+        Args:
+            file_path: Path of the snapshot, replaced atomically; defaults to snapshot_path
+        
+        Returns:
+            dict: Number of 'rules' and 'networks', file size in 'bytes' and 'change_seq'
+        """
+        file_path = file_path or self.snapshot_path
+        change_seq = self.get_change_seq()
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Total domains
-                cursor.execute('SELECT COUNT(*) FROM ignore_hosts')
-                total = cursor.fetchone()[0]
-                
-                # Active domains
-                cursor.execute('SELECT COUNT(*) FROM ignore_hosts WHERE active = 1')
-                active = cursor.fetchone()[0]
+            result = write_snapshot(file_path, self.get_active_domains() + self.get_active_networks(), change_seq)
+        except Exception as e:
+            logger.error(f"Failed to write snapshot {file_path}: {e}")
+            raise
+        result['change_seq'] = change_seq
+        return result
+    
+    def get_file_checkpoint(self, file_path: str) -> Optional[dict]:
+        """
+        Get the checkpoint recorded for a file.
+        
+        Returns:
+            dict with 'size', 'mtime_ns', 'sha256' and 'recorded_at', or None
+        """
+        row = self.connections.execute(lambda conn: conn.execute(
+            'SELECT size, mtime_ns, sha256, recorded_at FROM file_checkpoints WHERE path = ?',
+            (os.path.abspath(file_path),)).fetchone())
+        if row is None:
+            return None
+        return {'size': row[0], 'mtime_ns': row[1], 'sha256': row[2], 'recorded_at': row[3]}
+    
+    def record_file_checkpoint(self, file_path: str, digest: Optional[str] = None):
+        """
+        Record that a file's current content is reflected in the database.
+        
+        Called after the database was exported to the file or the file was
+        imported, so the next sync_from_file can skip it while it is unchanged.
+        
+        Args:
+            file_path: Path of the file
+            digest: SHA-256 hex digest of the content, computed from the file if omitted
+        """
+        stat = os.stat(file_path)
+        digest = digest or file_digest(file_path)
+        if digest is None:
+            return
+        self.connections.execute(lambda conn: conn.execute('''
+            INSERT INTO file_checkpoints (path, size, mtime_ns, sha256, recorded_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns,
+                sha256 = excluded.sha256, recorded_at = excluded.recorded_at
+        ''', (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, digest, datetime.now().isoformat())),
+            write=True)
+    
+    @_DB_LATENCY.labels('sync_from_file').time()
+    def sync_from_file(self, file_path: str, origin: str = "file_import") -> dict:
+        """
+        Import a domain file only if it changed since its checkpoint, and only the lines that differ.
+        
+        The file is skipped without being read when its size and mtime match
+        the checkpoint, and without touching the database when its hash does.
+        Otherwise only domains the database does not already reflect are
+        imported: unknown domains, and inactive domains removed before the
+        checkpoint (a line for a domain removed after it is a stale copy of
+        the old list). Domains that are already active keep their count and
+        last_seen.
+        
+        Args:
+            file_path: Path to the file containing domains (one per line)
+            origin: Origin to assign to newly imported domains
+        
+        Returns:
+            dict: 'changed' (bool) and counts of 'inserted', 'updated', 'unchanged' and 'skipped' lines
+        """
+        result = {'changed': False, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            logger.warning(f"Import file not found: {file_path}")
+            return result
+        
+        checkpoint = self.get_file_checkpoint(file_path)
+        if checkpoint and checkpoint['size'] == stat.st_size and checkpoint['mtime_ns'] == stat.st_mtime_ns:
+            logger.debug(f"{file_path} unchanged since its checkpoint")
+            return result
+        
+        digest = file_digest(file_path)
+        if checkpoint and digest == checkpoint['sha256']:
+            # Touched but identical: refresh the checkpoint so the next start skips the read
+            self.record_file_checkpoint(file_path, digest)
+            logger.debug(f"{file_path} content unchanged since its checkpoint")
+            return result
+        
+        result['changed'] = True
+        domains = set()
+        with open_domain_file(file_path) as file:
+            for line in file:
+                domain = line.strip()
+                if not domain or domain.startswith('#') or domain == 'plugin-tls-loaded':
+                    result['skipped'] += 1
+                else:
+                    # Addresses are compared in the canonical form they are stored in
+                    domains.add(canonical_network(domain) or domain)
+        
+        checkpoint_time = to_epoch_us(checkpoint['recorded_at']) if checkpoint else None
+        known = self.connections.execute(lambda conn: self._domain_states(conn, domains))
+        pending = []
+        for domain in domains:
+            state = known.get(domain)
+            if state is not None and (state[0] == 1 or (checkpoint_time and state[1] > checkpoint_time)):
+                result['unchanged'] += 1
+            else:
+                pending.append(domain)
+        
+        imported = self.import_domains(sorted(pending), origin)
+        result['inserted'] = imported['inserted']
+        result['updated'] = imported['updated']
+        self.record_file_checkpoint(file_path, digest)
+        
+        logger.info(f"Synced {file_path}: {result['inserted']} new, {result['updated']} reactivated, "
+                    f"{result['unchanged']} unchanged domains")
+        return result
+    
+    @staticmethod
+    def _domain_states(conn: sqlite3.Connection, domains: Iterable[str],
+                       batch_size: int = 500) -> Dict[str, Tuple[int, int]]:
+        """
+        Look up (active, last_seen in epoch microseconds) of the known domains among ``domains``.
+        
+        Canonical networks among ``domains`` are looked up in ignore_networks.
+        Each query binds at most ``batch_size`` parameters, below the limit of
+        999 of SQLite versions before 3.32.
+        """
+        states = {}
+        domains = list(domains)
+        networks = [rule for rule in domains if is_network_rule(rule)]
+        hosts = [rule for rule in domains if not is_network_rule(rule)] if networks else domains
+        for table, column, rules in (('ignore_hosts', 'domain', hosts), ('ignore_networks', 'network', networks)):
+            for start in range(0, len(rules), batch_size):
+                batch = rules[start:start + batch_size]
+                cursor = conn.execute(
+                    f'SELECT {column}, active, last_seen FROM {table} WHERE {column} IN ({",".join("?" * len(batch))})',
+                    batch)
+                for rule, active, last_seen in cursor:
+                    states[rule] = (active, last_seen)
+        return states
+    
+    def data_version(self) -> int:
+        """
+        Get SQLite's data version for the calling thread's connection.
+        
+        The value changes whenever another connection commits, which makes it
+        an O(1) way to detect external changes before querying the change log.
+        """
+        return self.connections.execute(lambda conn: conn.execute('PRAGMA data_version').fetchone()[0])
+    
+    def get_change_seq(self) -> int:
+        """Get the sequence number of the latest change, or 0 if there is none."""
+        try:
+            return self.connections.execute(
+                lambda conn: conn.execute('SELECT COALESCE(MAX(seq), 0) FROM ignore_hosts_changes').fetchone()[0])
+        except Exception as e:
+            logger.error(f"Failed to get change sequence: {e}")
+            return 0
+    
+    @_DB_LATENCY.labels('get_changes_since').time()
+    def get_changes_since(self, seq: int, limit: int = 10000) -> List[Tuple[int, str, bool]]:
+        """
+        Get activations and deactivations recorded after a sequence number.
+        
+        Args:
+            seq: Last sequence number already applied by the caller
+            limit: Maximum number of changes returned
+        
+        Returns:
+            List of (seq, domain, active) tuples in sequence order
+        """
+        try:
+            rows = self.connections.execute(lambda conn: conn.execute('''
+                SELECT seq, domain, active FROM ignore_hosts_changes
+                WHERE seq > ?
+                ORDER BY seq
+                LIMIT ?
+            ''', (seq, limit)).fetchall())
+            return [(change_seq, domain, bool(active)) for change_seq, domain, active in rows]
+        except Exception as e:
+            logger.error(f"Failed to get changes since {seq}: {e}")
+            return []
+    
+    def get_local_changes_since(self, seq: int, limit: int = 10000) -> List[Tuple[int, str, str, bool, int]]:
+        """
+        Get changes made on this node, for publishing to replication peers.
+        
+        Args:
+            seq: Last sequence number already published
+            limit: Maximum number of changes returned
+        
+        Returns:
+            List of (seq, domain, origin, active, last_seen) tuples in sequence order,
+            last_seen in epoch microseconds (UTC)
+        """
+        try:
+            rows = self.connections.execute(lambda conn: conn.execute('''
+                SELECT seq, domain, origin, active, seen_us FROM ignore_hosts_changes
+                WHERE seq > ? AND node IS NULL
+                ORDER BY seq
+                LIMIT ?
+            ''', (seq, limit)).fetchall())
+            return [(change_seq, domain, origin, bool(active), seen_us)
+                    for change_seq, domain, origin, active, seen_us in rows]
+        except Exception as e:
+            logger.error(f"Failed to get local changes since {seq}: {e}")
+            return []
+    
+    def get_replication_cursor(self, peer: str) -> int:
+        """Get the position up to which a replication peer has been processed, or 0."""
+        try:
+            row = self.connections.execute(lambda conn: conn.execute(
+                'SELECT position FROM replication_cursors WHERE peer = ?', (peer,)).fetchone())
+            return row[0] if row else 0
+        except Exception as e:
+            logger.error(f"Failed to get replication cursor for {peer}: {e}")
+            return 0
+    
+    def set_replication_cursor(self, peer: str, position: int):
+        """Record the position up to which a replication peer has been processed."""
+        self.connections.execute(lambda conn: conn.execute('''
+            INSERT INTO replication_cursors (peer, position) VALUES (?, ?)
+            ON CONFLICT(peer) DO UPDATE SET position = excluded.position
+        ''', (peer, position)), write=True)
+    
+    def get_pruned_seq(self) -> int:
+        """Get the highest change log sequence deleted by prune_changes, or 0."""
+        return self.get_replication_cursor(PRUNED_CURSOR)
+    
+    def prune_changes(self, keep: int = CHANGE_LOG_KEEP, upto: Optional[int] = None,
+                      batch_size: int = COMPACTION_BATCH_SIZE) -> int:
+        """
+        Delete change log entries that every reader with a cursor has processed.
+        
+        Entries not yet published to replication peers (``publish:`` cursors)
+        are kept, and so are the ``keep`` most recent ones (at least one), for
+        the watchers of other processes and peers reading this database with
+        ``Replicator.pull_database``, which hold no cursor here.
+        
+        Args:
+            keep: Number of most recent entries always kept
+            upto: Highest sequence processed by the caller's own reader, such as its ChangeWatcher
+            batch_size: Entries deleted per transaction
+        
+        Returns:
+            Number of deleted entries
+        """
+        first_seq, last_seq, published, pruned = self.connections.execute(lambda conn: conn.execute('''
+            SELECT (SELECT COALESCE(MIN(seq), 1) FROM ignore_hosts_changes),
+                   (SELECT COALESCE(MAX(seq), 0) FROM ignore_hosts_changes),
+                   (SELECT MIN(position) FROM replication_cursors WHERE peer LIKE 'publish:%'),
+                   (SELECT COALESCE(MAX(position), 0) FROM replication_cursors WHERE peer = ?)
+        ''', (PRUNED_CURSOR,)).fetchone())
+        limit = last_seq - max(keep, 1)
+        for bound in (published, upto):
+            if bound is not None:
+                limit = min(limit, bound)
+        
+        def _prune(conn, end):
+            count = conn.execute('DELETE FROM ignore_hosts_changes WHERE seq <= ?', (end,)).rowcount
+            conn.execute('''
+                INSERT INTO replication_cursors (peer, position) VALUES (?, ?)
+                ON CONFLICT(peer) DO UPDATE SET position = excluded.position
+            ''', (PRUNED_CURSOR, end))
+            return count
+        
+        # Start at the oldest entry left instead of walking empty sequence ranges
+        pruned = max(pruned, first_seq - 1)
+        total = 0
+        while pruned < limit:
+            pruned = min(pruned + batch_size, limit)
+            total += self.connections.execute(lambda conn: _prune(conn, pruned), write=True)
+        if total:
+            logger.info(f"Pruned {total} change log entries up to seq {pruned}")
+        return total
+    
+    @_DB_LATENCY.labels('apply_remote_changes').time()
+    def apply_remote_changes(self, node: str, changes: Iterable[Tuple[str, str, bool, int]],
+                             cursor: Optional[Tuple[str, int]] = None) -> dict:
+        """
+        Merge changes published by another node.
+        
+        Conflicts are resolved by last_seen: a remote change is applied only
+        if it is newer than the local row (on equal timestamps the active
+        state wins). When the local row is newer and
+        disagrees on the status, the local state is re-logged so it is
+        published back and the peer converges. Change log rows caused by the
+        merge are tagged with the peer's node id and never published again.
+        
+        Args:
+            node: Node id of the peer that published the changes
+            changes: (domain, origin, active, last_seen) tuples in publish order, last_seen
+                in epoch microseconds (UTC); IP addresses and CIDR prefixes are merged into
+                the network rules
+            cursor: Optional (peer, position) to record in the same transaction
+        
+        Returns:
+            dict: Numbers of 'applied', 'skipped' and 'conflicts' changes
+        """
+        changes = list(changes)
+        origin_ids = self._origin_ids_for(origin for _, origin, _, _ in changes)
+        
+        def _merge(conn):
+            result = {'applied': 0, 'skipped': 0, 'conflicts': 0}
+            reasserted = {}
+            start_seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM ignore_hosts_changes').fetchone()[0]
+            
+            for domain, origin, active, seen in changes:
+                network = parse_network(domain)
+                if network is not None:
+                    domain = str(network)
+                    local = conn.execute(
+                        f'SELECT {_ORIGIN_NAME}, active, last_seen FROM ignore_networks WHERE network = ?',
+                        (domain,)).fetchone()
+                else:
+                    local = conn.execute(
+                        f'SELECT {_ORIGIN_NAME}, active, last_seen FROM ignore_hosts WHERE domain = ?',
+                        (domain,)).fetchone()
                 
-                # Origins breakdown
-                cursor.execute('''
-                    SELECT origin, COUNT(*) FROM ignore_hosts 
-                    WHERE active = 1 
-                    GROUP BY origin
-                ''')
-                origins = dict(cursor.fetchall())
+                # Ties go to the active state, so every node picks the same winner
+                if local is not None and (local[2], local[1]) >= (seen, int(active)):
+                    if bool(local[1]) != active:
+                        result['conflicts'] += 1
+                        reasserted[domain] = local
+                    else:
+                        result['skipped'] += 1
+                    continue
                 
-                return {
-                    'total_domains': total,
-                    'active_domains': active,
-                    'inactive_domains': total - active,
-                    'origins': origins
-                }
+                if network is not None:
+                    conn.execute('''
+                        INSERT INTO ignore_networks (network, version, prefix_len, origin_id, date_added,
+                                                     last_seen, count, active)
+                        VALUES (?, ?, ?, ?, ?, ?, 1, ?)
+                        ON CONFLICT(network) DO UPDATE
+                        SET last_seen = excluded.last_seen, active = excluded.active
+                    ''', (domain, network.version, network.prefixlen, origin_ids[origin], seen, seen, int(active)))
+                else:
+                    conn.execute('''
+                        INSERT INTO ignore_hosts (domain, domain_rev, origin_id, date_added, last_seen, count, active)
+                        VALUES (?, ?, ?, ?, ?, 1, ?)
+                        ON CONFLICT(domain) DO UPDATE
+                        SET last_seen = excluded.last_seen, active = excluded.active
+                    ''', (domain, reverse_domain(domain), origin_ids[origin], seen, seen, int(active)))
+                reasserted.pop(domain, None)
+                result['applied'] += 1
+            
+            conn.execute('UPDATE ignore_hosts_changes SET node = ? WHERE seq > ? AND node IS NULL',
+                         (node, start_seq))
+            # Local wins: publish the local state again, as a change of this node
+            conn.executemany('''
+                INSERT INTO ignore_hosts_changes (domain, active, origin, seen_us) VALUES (?, ?, ?, ?)
+            ''', [(domain, local_active, local_origin, local_seen)
+                  for domain, (local_origin, local_active, local_seen) in reasserted.items()])
+            
+            if cursor is not None:
+                conn.execute('''
+                    INSERT INTO replication_cursors (peer, position) VALUES (?, ?)
+                    ON CONFLICT(peer) DO UPDATE SET position = excluded.position
+                ''', cursor)
+            return result
+        
+        result = self.connections.execute(_merge, write=True)
+        if result['applied'] or result['conflicts']:
+            logger.info(f"Merged changes from {node}: {result['applied']} applied, "
+                        f"{result['skipped']} skipped, {result['conflicts']} conflicts")
+        return result
+    
+    @_DB_LATENCY.labels('get_stats').time()
+    def get_stats(self) -> dict:
+        """
+        Get statistics about the database.
+        
+        Reads the trigger-maintained counters, so the cost depends on the
+        number of origins rather than the number of domains and networks.
+        """
+        def _query(conn):
+            return conn.execute('''
+                SELECT origin, active, domains FROM ignore_hosts_stats
+                WHERE domains != 0
+            ''').fetchall(), dict(conn.execute('''
+                SELECT active, SUM(networks) FROM ignore_networks_stats
+                GROUP BY active
+            '''))
+        
+        try:
+            total = 0
+            active = 0
+            origins = {}
+            counters, networks = self.connections.execute(_query)
+            for origin, is_active, domains in counters:
+                total += domains
+                if is_active:
+                    active += domains
+                    # Origins breakdown
+                    origins[origin] = domains
+            
+            return {
+                'total_domains': total,
+                'active_domains': active,
+                'inactive_domains': total - active,
+                'origins': origins,
+                'active_networks': networks.get(1, 0),
+                'inactive_networks': networks.get(0, 0)
+            }
                 
         except Exception as e:
             logger.error(f"Failed to get statistics: {e}")
             return {}
+    
+    @_DB_LATENCY.labels('reconcile_stats').time()
+    def reconcile_stats(self, fix: bool = True) -> dict:
+        """
+        Compare the statistics counters with a full table scan.
+        
+        Args:
+            fix: Rebuild the counters when they drifted
+        
+        Returns:
+            dict: Drifted (kind, origin, active) keys, kind being 'domains' or
+            'networks', mapped to (counted, actual) values; empty when the
+            counters are consistent
+        """
+        def _reconcile(conn):
+            counted = {}
+            actual = {}
+            for kind, stats, table in (('domains', 'ignore_hosts_stats', 'ignore_hosts'),
+                                       ('networks', 'ignore_networks_stats', 'ignore_networks')):
+                counted.update(((kind, origin, active), rules) for origin, active, rules in conn.execute(
+                    f'SELECT origin, active, {kind} FROM {stats} WHERE {kind} != 0'))
+                actual.update(((kind, origin, active), rules) for origin, active, rules in conn.execute(f'''
+                    SELECT {_ORIGIN_NAME}, active, COUNT(*) FROM {table}
+                    GROUP BY origin_id, active
+                '''))
+            
+            drift = {key: (counted.get(key, 0), actual.get(key, 0))
+                     for key in set(counted) | set(actual)
+                     if counted.get(key, 0) != actual.get(key, 0)}
+            if drift and fix:
+                self._rebuild_stats(conn)
+            return drift
+        
+        drift = self.connections.execute(_reconcile, write=fix)
+        if drift:
+            logger.warning(f"Statistics counters drifted for {len(drift)} origin(s){', rebuilt' if fix else ''}")
+        return drift
@@ -10,49 +10,63 @@ import sys
 # nosec: B404 - subprocess is used safely with a static command list
 import subprocess
 import logging
-import re
+
+# Add project root to Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.database import IgnoreHostsDB
 
 logger = logging.getLogger('httppro.entry')
 
+def sync_ignore_file(ignore_hosts_file: str):
+    """
+    Load ignore-host.txt into the database before the proxy starts.
+    
+    The TLS plugin builds its matcher from the database at startup, so the
+    ignore list never has to travel through the mitmdump command line. The
+    file is only read again once it changed since the last launch.
+    
+    Args:
+        ignore_hosts_file: Path to the ignore-host.txt file
+    """
+    if not os.path.exists(ignore_hosts_file):
+        logger.info("No ignore-host.txt file found")
+        return
+    
+    try:
+        db = IgnoreHostsDB()
+        try:
+            result = db.sync_from_file(ignore_hosts_file, "existing_file")
+        finally:
+            db.close()
+        if result['changed']:
+            logger.info(f"Loaded ignore-host.txt into database: {result['inserted']} new, "
+                        f"{result['updated']} reactivated, {result['unchanged']} unchanged")
+        else:
+            logger.info("ignore-host.txt unchanged since the last launch")
+    except Exception as e:
+        logger.error(f"Failed to read ignore-host.txt: {e}")
+
 def launch_proxy():
     """
     Launch mitmdump proxy server with ignore-host configuration.
     
-    Automatically loads domains from ignore-host.txt and configures
-    mitmproxy with appropriate ignore patterns.
+    Loads domains from ignore-host.txt into the database; the TLS plugin
+    then decides per connection which hosts to ignore. The command line
+    stays constant in size regardless of the number of ignored domains.
     """
     script_path = os.path.join(os.path.dirname(__file__), 'proxy.py')
-    # The command list is constructed only from static values and trusted file content (ignore-host.txt),
-    # which is sanitized using re.escape. No user input is directly passed to the command.
+    # The command list is constructed only from static values. No user input is passed to the command.
     command = ['mitmdump', '-s', script_path]
     
-    # Get the content of the ignore-host.txt file
     ignore_hosts_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'ignore-host.txt')
-    if os.path.exists(ignore_hosts_file):
-        try:
-            with open(ignore_hosts_file, 'r') as file:
-                hosts = [host.strip() for host in file if host.strip() and host.strip() != 'plugin-tls-loaded']
-            
-            if hosts:
-                # Create regex pattern for ignore hosts
-                pattern = '|'.join([re.escape(host) for host in hosts])
-                regex = rf'(?:^|\.)({pattern})$'
-                # Defensive: ensure regex is a string and not user input (already escaped)
-                assert isinstance(regex, str)
-                command.extend(['--ignore-hosts', regex])
-                logger.info(f"Configured ignore pattern for {len(hosts)} domains")
-            else:
-                logger.info("No valid hosts found in ignore-host.txt")
-        except Exception as e:
-            logger.error(f"Failed to read ignore-host.txt: {e}")
-    else:
-        logger.info("No ignore-host.txt file found")
+    sync_ignore_file(ignore_hosts_file)
     
-    logger.info(f"Starting proxy with command: {' '.join(command[:3])} [...]")
+    logger.info(f"Starting proxy with command: {' '.join(command)}")
     
     try:
         # Execute the proxy command
-        # nosec: B603 - command is a static list, not user input; all file content is sanitized
+        # nosec: B603 - command is a static list, not user input; no file content is passed
         assert isinstance(command, list) and all(isinstance(x, str) for x in command)
         subprocess.run(command, check=True)
     except subprocess.CalledProcessError as e:
@@ -0,0 +1,190 @@
+"""
+Debounced file exporter for HttpPro.
+
+This module keeps the ignore-host.txt compatibility file up to date without
+rewriting it on every change: exports are coalesced, rate limited, skipped
+when the content did not change, and written atomically.
+"""
+
+import os
+import hashlib
+import tempfile
+import threading
+import time
+import logging
+from typing import Callable, Optional, Union
+
+from core.metrics import REGISTRY
+
+logger = logging.getLogger('httppro.exporter')
+
+_EXPORTS = REGISTRY.counter('httppro_file_exports_total', 'Compatibility file exports by result', label='result')
+_EXPORTS_WRITTEN = _EXPORTS.labels('written')
+_EXPORTS_UNCHANGED = _EXPORTS.labels('unchanged')
+_EXPORTS_FAILED = _EXPORTS.labels('error')
+
+
+def write_atomic(file_path: str, data: bytes):
+    """
+    Atomically replace a file's content.
+
+    The data is written to a temporary file in the same directory, synced to
+    disk and renamed over the target, so readers never see a partial file.
+
+    Args:
+        file_path: Path of the file to replace
+        data: New file content
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(file_path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def file_digest(file_path: str) -> Optional[str]:
+    """Get the SHA-256 hex digest of a file, or None if it cannot be read."""
+    digest = hashlib.sha256()
+    try:
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+class DebouncedExporter:
+    """
+    Coalescing, rate-limited writer for a generated file.
+
+    Callers only mark the exporter dirty. A background thread renders the
+    content at most once per ``interval`` seconds, skips the write when the
+    content hash is unchanged and replaces the file atomically.
+    """
+
+    def __init__(self, file_path: str, render: Callable[[], Union[str, bytes]], interval: float = 5.0,
+                 on_write: Optional[Callable[[str], None]] = None):
+        """
+        Initialize exporter and start its background thread.
+
+        Args:
+            file_path: Path of the file to keep up to date
+            render: Callable returning the full file content, as text or UTF-8 bytes
+            interval: Minimum number of seconds between two writes
+            on_write: Optional callback receiving the file path after each write
+        """
+        self.file_path = file_path
+        self.render = render
+        self.interval = interval
+        self.on_write = on_write
+
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._stopping = threading.Event()
+        # The first export also waits one interval, so startup bursts are coalesced too
+        self._last_write = time.monotonic()
+        self._last_digest = file_digest(file_path)
+
+        # Counters
+        self.writes = 0
+        self.skipped = 0
+        self.errors = 0
+
+        self._worker = threading.Thread(target=self._run, name='httppro-exporter', daemon=True)
+        self._worker.start()
+
+    def mark_dirty(self):
+        """Schedule an export; repeated calls before the next write are coalesced."""
+        self._dirty.set()
+
+    def flush(self) -> bool:
+        """
+        Export immediately if the exporter is dirty.
+
+        Returns:
+            True if the file was written
+        """
+        if not self._dirty.is_set():
+            return False
+        return self._export()
+
+    def close(self, timeout: Optional[float] = 10.0):
+        """
+        Stop the background thread and write any pending change.
+
+        Args:
+            timeout: Maximum number of seconds to wait for the thread
+        """
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        self._dirty.set()
+        self._worker.join(timeout)
+        self.flush()
+        logger.debug(f"Exporter for {self.file_path} closed after {self.writes} writes ({self.skipped} unchanged)")
+
+    def stats(self) -> dict:
+        """Get write counters."""
+        return {
+            'writes': self.writes,
+            'skipped': self.skipped,
+            'errors': self.errors,
+            'dirty': self._dirty.is_set(),
+        }
+
+    def _run(self):
+        """Worker loop writing at most once per interval."""
+        while not self._stopping.is_set():
+            self._dirty.wait()
+            if self._stopping.is_set():
+                break
+
+            # Rate limit: wait out the rest of the interval, collecting more changes meanwhile
+            remaining = self._last_write + self.interval - time.monotonic()
+            if remaining > 0 and self._stopping.wait(remaining):
+                break
+            self._export()
+
+    def _export(self) -> bool:
+        """Render and write the file if its content changed."""
+        with self._lock:
+            self._dirty.clear()
+            self._last_write = time.monotonic()
+            try:
+                data = self.render()
+                if isinstance(data, str):
+                    data = data.encode('utf-8')
+                digest = hashlib.sha256(data).hexdigest()
+                if digest == self._last_digest:
+                    self.skipped += 1
+                    _EXPORTS_UNCHANGED.inc()
+                    logger.debug(f"Skipped export to {self.file_path}: content unchanged")
+                    return False
+
+                write_atomic(self.file_path, data)
+                self._last_digest = digest
+                self.writes += 1
+                _EXPORTS_WRITTEN.inc()
+                logger.debug(f"Exported {len(data)} bytes to {self.file_path}")
+            except Exception as e:
+                self.errors += 1
+                _EXPORTS_FAILED.inc()
+                logger.error(f"Failed to export {self.file_path}: {e}")
+                # Retry on the next interval
+                self._dirty.set()
+                return False
+
+        if self.on_write is not None:
+            try:
+                self.on_write(self.file_path)
+            except Exception as e:
+                logger.error(f"Export callback failed: {e}")
+        return True
@@ -0,0 +1,356 @@
+"""
+IP network matcher for HttpPro ignore decisions.
+
+This module keeps IPv4 and IPv6 ignore rules (single addresses or CIDR
+prefixes) in path-compressed binary radix trees, so that deciding whether a
+server address is ignored costs O(prefix length) regardless of how many
+networks are ignored, and collapses adjacent networks into covering prefixes.
+"""
+
+import ipaddress
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+logger = logging.getLogger('httppro.iptree')
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+# Group prefixes used by collapse() when a threshold is given
+DEFAULT_IPV4_GROUP_PREFIX = 24
+DEFAULT_IPV6_GROUP_PREFIX = 64
+
+
+def parse_network(value: str) -> Optional[Network]:
+    """
+    Parse an IP address or CIDR prefix.
+
+    Host bits are cleared (``10.0.0.5/24`` is ``10.0.0.0/24``), and a bare
+    address is a /32 or /128 network.
+
+    Args:
+        value: Address or CIDR string; IPv6 addresses may be bracketed
+
+    Returns:
+        The network, or None if the value is not an address (e.g. a domain)
+    """
+    value = value.strip()
+    # Cheap rejection of domain names: addresses end with a digit or contain a colon
+    if not value or not (value[-1].isdigit() or ':' in value or value[-1] == ']'):
+        return None
+    if value.startswith('[') and ']' in value:
+        value = value[1:value.index(']')] + value[value.index(']') + 1:]
+    try:
+        return ipaddress.ip_network(value, strict=False)
+    except ValueError:
+        return None
+
+
+def canonical_network(value: str) -> Optional[str]:
+    """Get the stored form of an address or CIDR prefix, e.g. ``203.0.113.7/32``, or None."""
+    network = parse_network(value)
+    return None if network is None else str(network)
+
+
+def network_sort_key(network: str) -> Tuple[int, int, int]:
+    """Sort key placing canonical networks in address order, IPv4 first."""
+    parsed = ipaddress.ip_network(network)
+    return parsed.version, int(parsed.network_address), parsed.prefixlen
+
+
+def is_network_rule(rule: str) -> bool:
+    """Tell a stored network rule from a domain: only canonical networks contain ``/``."""
+    return '/' in rule
+
+
+class _Node:
+    """Radix tree node: a prefix, its children by next bit and the rule stored on it."""
+
+    __slots__ = ('prefix', 'length', 'children', 'rule')
+
+    def __init__(self, prefix: int, length: int, rule: Optional[str] = None):
+        self.prefix = prefix
+        self.length = length
+        self.children = [None, None]
+        self.rule = rule
+
+
+class PrefixTree:
+    """
+    Path-compressed binary radix (Patricia) tree of prefixes of one address width.
+
+    Nodes only exist where a rule is stored or two branches diverge, so a
+    lookup visits at most one node per stored prefix length on its path and
+    never more than ``width`` nodes.
+    """
+
+    def __init__(self, width: int):
+        """
+        Initialize tree.
+
+        Args:
+            width: Address width in bits: 32 for IPv4, 128 for IPv6
+        """
+        self.width = width
+        self._root = _Node(0, 0)
+        self._size = 0
+
+    def _bit(self, value: int, index: int) -> int:
+        return (value >> (self.width - 1 - index)) & 1
+
+    def _mask(self, value: int, length: int) -> int:
+        shift = self.width - length
+        return (value >> shift) << shift
+
+    def _common_length(self, a: int, b: int, limit: int) -> int:
+        return min(self.width - (a ^ b).bit_length(), limit)
+
+    def insert(self, prefix: int, length: int, rule: str) -> bool:
+        """
+        Store a rule under a prefix.
+
+        Args:
+            prefix: Network address as an integer, host bits cleared
+            length: Prefix length in bits
+            rule: Value returned by lookups covered by the prefix
+
+        Returns:
+            True if the prefix was not stored before
+        """
+        node = self._root
+        while node.length < length:
+            index = self._bit(prefix, node.length)
+            child = node.children[index]
+            if child is None:
+                node.children[index] = _Node(prefix, length, rule)
+                self._size += 1
+                return True
+
+            common = self._common_length(prefix, child.prefix, min(length, child.length))
+            if common == child.length:
+                node = child
+                continue
+
+            # The new prefix diverges inside the child's compressed path: split it
+            if common == length:
+                branch = _Node(prefix, length, rule)
+                self._size += 1
+            else:
+                branch = _Node(self._mask(prefix, common), common)
+                branch.children[self._bit(prefix, common)] = _Node(prefix, length, rule)
+                self._size += 1
+            branch.children[self._bit(child.prefix, common)] = child
+            node.children[index] = branch
+            return True
+
+        added = node.rule is None
+        node.rule = rule
+        self._size += added
+        return added
+
+    def delete(self, prefix: int, length: int) -> bool:
+        """
+        Remove the rule stored under a prefix, pruning nodes left without a purpose.
+
+        Returns:
+            True if a rule was stored under the prefix
+        """
+        path = [self._root]
+        node = self._root
+        while node.length < length:
+            child = node.children[self._bit(prefix, node.length)]
+            if child is None or child.length > length or self._mask(prefix, child.length) != child.prefix:
+                return False
+            node = child
+            path.append(node)
+        if node.rule is None:
+            return False
+
+        node.rule = None
+        self._size -= 1
+        # Splice out rule-less nodes with fewer than two children, bottom up
+        for depth in range(len(path) - 1, 0, -1):
+            node, parent = path[depth], path[depth - 1]
+            if node.rule is not None:
+                break
+            children = [child for child in node.children if child is not None]
+            if len(children) == 2:
+                break
+            parent.children[self._bit(node.prefix, parent.length)] = children[0] if children else None
+        return True
+
+    def lookup(self, address: int) -> Optional[str]:
+        """
+        Find the rule of the longest stored prefix covering an address.
+
+        Args:
+            address: Address as an integer
+
+        Returns:
+            The rule, or None if no stored prefix covers the address
+        """
+        node = self._root
+        match = node.rule
+        while node.length < self.width:
+            child = node.children[self._bit(address, node.length)]
+            if child is None or self._mask(address, child.length) != child.prefix:
+                break
+            node = child
+            if node.rule is not None:
+                match = node.rule
+        return match
+
+    def rules(self) -> Iterator[str]:
+        """Iterate over the stored rules in address order."""
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node.rule is not None:
+                yield node.rule
+            stack.extend(child for child in reversed(node.children) if child is not None)
+
+    def __len__(self) -> int:
+        """Get the number of stored rules."""
+        return self._size
+
+
+class NetworkMatcher:
+    """
+    IPv4 and IPv6 ignore rules in two radix trees.
+
+    Rules are stored under their canonical CIDR form, which lookups return.
+    IPv4-mapped IPv6 addresses (``::ffff:192.0.2.1``) are looked up as IPv4.
+    """
+
+    def __init__(self, networks: Iterable[str] = ()):
+        """
+        Initialize matcher.
+
+        Args:
+            networks: Optional initial addresses or CIDR prefixes
+        """
+        self._trees = {4: PrefixTree(32), 6: PrefixTree(128)}
+        self.update(networks)
+
+    def add(self, network: str) -> bool:
+        """
+        Add an ignore rule.
+
+        Args:
+            network: Address or CIDR prefix
+
+        Returns:
+            True if the rule was not present before
+        """
+        parsed = parse_network(network)
+        if parsed is None:
+            return False
+        return self._trees[parsed.version].insert(int(parsed.network_address), parsed.prefixlen, str(parsed))
+
+    def update(self, networks: Iterable[str]):
+        """Add several ignore rules."""
+        for network in networks:
+            self.add(network)
+
+    def remove(self, network: str) -> bool:
+        """
+        Remove an ignore rule.
+
+        Returns:
+            True if the rule was present
+        """
+        parsed = parse_network(network)
+        if parsed is None:
+            return False
+        return self._trees[parsed.version].delete(int(parsed.network_address), parsed.prefixlen)
+
+    def match(self, address: Optional[str]) -> Optional[str]:
+        """
+        Find the rule covering an address.
+
+        Args:
+            address: IP address; anything else never matches
+
+        Returns:
+            The most specific matching network, or None if the address is not ignored
+        """
+        if not address:
+            return None
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return None
+        if ip.version == 6 and ip.ipv4_mapped is not None:
+            ip = ip.ipv4_mapped
+        return self._trees[ip.version].lookup(int(ip))
+
+    def __contains__(self, address: str) -> bool:
+        """Check whether an address is covered by any rule."""
+        return self.match(address) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the rules, IPv4 first, in address order."""
+        for version in (4, 6):
+            yield from self._trees[version].rules()
+
+    def __len__(self) -> int:
+        """Get the number of rules."""
+        return sum(len(tree) for tree in self._trees.values())
+
+    def clear(self):
+        """Remove all rules."""
+        self._trees = {4: PrefixTree(32), 6: PrefixTree(128)}
+
+
+def collapse(networks: Iterable[str], threshold: int = 0, ipv4_prefix: int = DEFAULT_IPV4_GROUP_PREFIX,
+             ipv6_prefix: int = DEFAULT_IPV6_GROUP_PREFIX) -> Dict[str, List[str]]:
+    """
+    Find covering prefixes that can replace several networks.
+
+    Without a threshold only exact merges are made: adjacent networks that
+    together fill a larger prefix (``10.0.0.0/32`` + ``10.0.0.1/32`` is
+    ``10.0.0.0/31``) and networks inside another one, so the set of ignored
+    addresses does not change. With a threshold, more than ``threshold``
+    networks inside the same /``ipv4_prefix`` or /``ipv6_prefix`` are also
+    replaced by that prefix, which widens the rule to its whole range.
+
+    Args:
+        networks: Addresses or CIDR prefixes
+        threshold: Networks per group prefix that must be exceeded; 0 disables widening
+        ipv4_prefix: Group prefix length for IPv4
+        ipv6_prefix: Group prefix length for IPv6
+
+    Returns:
+        dict: Replaced networks per covering prefix, for covers replacing at least one network
+    """
+    parsed = {}
+    for network in networks:
+        value = parse_network(network)
+        if value is not None:
+            parsed[str(value)] = value
+
+    covers = {}
+    for version, group_prefix in ((4, ipv4_prefix), (6, ipv6_prefix)):
+        family = [value for value in parsed.values() if value.version == version]
+        if threshold:
+            groups: Dict[Network, List[Network]] = {}
+            for value in family:
+                if value.prefixlen > group_prefix:
+                    groups.setdefault(value.supernet(new_prefix=group_prefix), []).append(value)
+            widened = {group for group, members in groups.items() if len(members) > threshold}
+            family = [value for value in family
+                      if value.prefixlen <= group_prefix or value.supernet(new_prefix=group_prefix) not in widened]
+            family.extend(widened)
+        covers.update({cover: [] for cover in ipaddress.collapse_addresses(family)})
+
+    # Map every input network onto the cover containing it
+    result: Dict[str, List[str]] = {}
+    tree_covers = {4: PrefixTree(32), 6: PrefixTree(128)}
+    for cover in covers:
+        tree_covers[cover.version].insert(int(cover.network_address), cover.prefixlen, str(cover))
+    for name, value in parsed.items():
+        cover = tree_covers[value.version].lookup(int(value.network_address))
+        if cover != name:
+            result.setdefault(cover, []).append(name)
+    for members in result.values():
+        members.sort(key=lambda name: parsed[name])
+    return result
@@ -1,88 +1,238 @@
 """
 Plugin Loader for HttpPro.
 
-This module provides dynamic plugin discovery and loading functionality
-for the HttpPro proxy system.
+This module discovers plugins from a manifest instead of executing every
+module in the plugins directory. Each plugin declares its addon class with
+a module-level ``entry_point = "ClassName"`` (and may set ``disabled =
+True``). The declarations are read from the source with ``ast``, without
+importing the module, and cached by file path, mtime, size and hash, so
+only enabled plugins are imported and only their entry point is
+instantiated.
 """
 
+import ast
+import json
+import hashlib
 import importlib.util
 import os
 import sys
+import time
 import logging
-from mitmproxy import ctx
+from typing import Dict, List
 
 logger = logging.getLogger('httppro.loader')
 
-def discover_plugins(plugins_dir):
+# Manifest cache, next to the bytecode cache of the plugins
+MANIFEST_CACHE = os.path.join('__pycache__', 'httppro-manifest.json')
+
+# Bump when the manifest entry format changes
+MANIFEST_VERSION = 1
+
+# Source hash of each plugin module imported by _import_plugin, by module name
+_loaded_digests: Dict[str, str] = {}
+
+
+def parse_plugin(source: bytes, filename: str = '<plugin>') -> dict:
     """
-    Dynamically discover and load plugins from the specified directory.
-    
+    Read a plugin's declarations from its source without executing it.
+
     Args:
-        plugins_dir: Directory path to search for plugins
-        
+        source: Python source of the plugin module
+        filename: File name used in syntax errors
+
     Returns:
-        list: List of loaded plugin modules
+        dict: 'entry_point' (class name or None), 'disabled' (bool) and
+        'legacy_addons' (True if the module only defines an ``addons`` list)
     """
-    # Navigate to the plugins directory
-    plugins_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'plugins'))
-    plugins = []
-    
-    if plugins_root not in sys.path:
-        sys.path.insert(0, plugins_root)
-        logger.debug(f"Added {plugins_root} to sys.path")
-
-    if os.path.isdir(plugins_root):
-        for filename in os.listdir(plugins_root):
-            if not (filename.endswith('.py') and not filename.startswith('_')):
+    tree = ast.parse(source, filename)
+    declarations = {'entry_point': None, 'disabled': False, 'legacy_addons': False}
+    for node in tree.body:
+        if isinstance(node, ast.Assign):
+            targets, value = node.targets, node.value
+        elif isinstance(node, ast.AnnAssign) and node.value is not None:
+            targets, value = [node.target], node.value
+        else:
+            continue
+        for target in targets:
+            if not isinstance(target, ast.Name):
                 continue
-                
-            mod_name = filename[:-3]
-            spec = importlib.util.spec_from_file_location(mod_name, os.path.join(plugins_root, filename))
-            
-            if spec is None or spec.loader is None:
-                logger.warning(f"Could not load plugin {filename}: spec or loader is None")
-                continue
-                
-            module = importlib.util.module_from_spec(spec)
-
-            try:
-                sys.modules[mod_name] = module
-                spec.loader.exec_module(module)
-                
-                # Check if module is disabled
-                if hasattr(module, 'disabled') and getattr(module, 'disabled', False):
-                    logger.info(f"Skipping disabled plugin: {mod_name}")
-                    continue
-                
-                # Check if module has addons
-                if hasattr(module, 'addons'):
-                    plugins.append(module)
-                    logger.info(f"Loaded plugin: {mod_name} (has addons)")
-                else:
-                    # Try to find classes that could be addons
-                    found_addon = False
-                    for attr_name in dir(module):
-                        attr = getattr(module, attr_name)
-                        if (isinstance(attr, type) and 
-                            not attr_name.startswith('_') and 
-                            hasattr(attr, '__init__')):
-                            # This looks like a potential addon class
-                            found_addon = True
-                            break
-                    
-                    if found_addon:
-                        plugins.append(module)
-                        logger.info(f"Loaded plugin: {mod_name} (has addon classes)")
-                    else:
-                        logger.warning(f"Plugin {mod_name} loaded but has no addons or addon classes")
-                        
-            except Exception as e:
-                logger.error(f"Failed to load plugin {mod_name}: {e}")
-                
-        loaded_names = [filename[:-3] for filename in os.listdir(plugins_root) 
-                       if filename.endswith('.py') and not filename.startswith('_')]
-        logger.info(f"Plugin discovery complete: {len(plugins)} loaded from {len(loaded_names)} found")
-    else:
-        logger.warning(f"Plugins directory does not exist: {plugins_root}")
-        
-    return plugins
\ No newline at end of file
+            if target.id == 'entry_point' and isinstance(value, ast.Constant) and isinstance(value.value, str):
+                declarations['entry_point'] = value.value
+            elif target.id == 'disabled' and isinstance(value, ast.Constant):
+                declarations['disabled'] = bool(value.value)
+            elif target.id == 'addons':
+                declarations['legacy_addons'] = True
+    return declarations
+
+
+def read_manifest(plugins_dir: str, use_cache: bool = True) -> List[dict]:
+    """
+    Build the plugin manifest, reusing cached entries of unchanged files.
+
+    Args:
+        plugins_dir: Directory containing the plugin modules
+        use_cache: Whether to read and update the manifest cache
+
+    Returns:
+        list: One dict per plugin with 'name', 'path' (absolute), 'entry_point',
+        'disabled', 'legacy_addons', 'mtime_ns', 'size' and 'sha256',
+        sorted by name
+    """
+    if not os.path.isdir(plugins_dir):
+        logger.warning(f"Plugins directory does not exist: {plugins_dir}")
+        return []
+
+    cache_path = os.path.join(plugins_dir, MANIFEST_CACHE)
+    cached = _read_cache(cache_path) if use_cache else {}
+    manifest = []
+    changed = False
+
+    with os.scandir(plugins_dir) as entries:
+        files = sorted((entry for entry in entries
+                        if entry.is_file() and entry.name.endswith('.py') and not entry.name.startswith('_')),
+                       key=lambda entry: entry.name)
+
+    for entry in files:
+        stat = entry.stat()
+        # Paths always come from the directory being read: a moved or copied tree
+        # keeps its cache file, and only the hash check below may reuse its entries
+        path = os.path.abspath(entry.path)
+        previous = cached.get(entry.name)
+        if previous and previous.get('path') == path and previous['mtime_ns'] == stat.st_mtime_ns \
+                and previous['size'] == stat.st_size:
+            manifest.append(previous)
+            continue
+
+        try:
+            with open(entry.path, 'rb') as file:
+                source = file.read()
+            digest = hashlib.sha256(source).hexdigest()
+            if previous and previous['sha256'] == digest:
+                # Touched but unchanged
+                declarations = {key: previous[key] for key in ('entry_point', 'disabled', 'legacy_addons')}
+            else:
+                declarations = parse_plugin(source, entry.path)
+        except (OSError, SyntaxError) as e:
+            logger.error(f"Failed to read plugin {entry.name}: {e}")
+            continue
+
+        manifest.append({
+            'name': entry.name[:-3],
+            'path': path,
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'sha256': digest,
+            **declarations,
+        })
+        changed = True
+
+    if use_cache and (changed or len(manifest) != len(cached)):
+        _write_cache(cache_path, manifest)
+    return manifest
+
+
+def load_addons(plugins_dir: str, use_cache: bool = True) -> List[object]:
+    """
+    Import the enabled plugins and instantiate their entry points.
+
+    Args:
+        plugins_dir: Directory containing the plugin modules
+        use_cache: Whether to use the manifest cache
+
+    Returns:
+        list: Addon instances in plugin name order
+    """
+    start = time.perf_counter()
+    manifest = read_manifest(plugins_dir, use_cache)
+    manifest_ms = (time.perf_counter() - start) * 1000
+
+    if plugins_dir not in sys.path:
+        sys.path.insert(0, plugins_dir)
+
+    addons = []
+    for plugin in manifest:
+        name = plugin['name']
+        if plugin['disabled']:
+            logger.info(f"Skipping disabled plugin: {name}")
+            continue
+        if not plugin['entry_point'] and not plugin['legacy_addons']:
+            logger.warning(f"Plugin {name} declares no entry_point, skipping it")
+            continue
+
+        try:
+            import_start = time.perf_counter()
+            module = _import_plugin(name, plugin['path'], plugin['sha256'])
+            import_ms = (time.perf_counter() - import_start) * 1000
+
+            init_start = time.perf_counter()
+            if plugin['entry_point']:
+                loaded = [getattr(module, plugin['entry_point'])()]
+            else:
+                loaded = module.addons if isinstance(module.addons, list) else [module.addons]
+            init_ms = (time.perf_counter() - init_start) * 1000
+        except Exception as e:
+            logger.error(f"Failed to load plugin {name}: {e}")
+            continue
+
+        addons.extend(loaded)
+        logger.info(f"Loaded plugin {name}: import {import_ms:.1f} ms, init {init_ms:.1f} ms")
+
+    logger.info(f"Plugin discovery complete: {len(addons)} addons from {len(manifest)} plugins "
+                f"(manifest {manifest_ms:.1f} ms, total {(time.perf_counter() - start) * 1000:.1f} ms)")
+    return addons
+
+
+def _import_plugin(name: str, path: str, digest: str):
+    """
+    Import a plugin module by file path.
+
+    A module already imported from the same file is reused only while its
+    source is unchanged, so a script reload executes an edited plugin again.
+
+    Args:
+        name: Module name
+        path: Path of the plugin file
+        digest: SHA-256 of the plugin source, from the manifest
+    """
+    module = sys.modules.get(name)
+    if module is not None and _loaded_digests.get(name) == digest \
+            and os.path.abspath(getattr(module, '__file__', '') or '') == os.path.abspath(path):
+        return module
+
+    spec = importlib.util.spec_from_file_location(name, path)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"no loader for {path}")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    _loaded_digests.pop(name, None)
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[name]
+        raise
+    _loaded_digests[name] = digest
+    return module
+
+
+def _read_cache(cache_path: str) -> Dict[str, dict]:
+    """Read the manifest cache, keyed by file name."""
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        if data.get('version') != MANIFEST_VERSION:
+            return {}
+        return {os.path.basename(plugin['path']): plugin for plugin in data['plugins']}
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+
+
+def _write_cache(cache_path: str, manifest: List[dict]):
+    """Write the manifest cache; failures only cost a re-parse on the next start."""
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({'version': MANIFEST_VERSION, 'plugins': manifest}, file, indent=1)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        logger.debug(f"Could not write plugin manifest cache {cache_path}: {e}")
@@ -0,0 +1,157 @@
+"""
+Host matcher for HttpPro ignore decisions.
+
+This module provides a hashed suffix set that decides whether a host is
+covered by the ignore list in O(number of labels), independently of how
+many domains are ignored.
+"""
+
+import logging
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger('httppro.matcher')
+
+# Rule modes
+MATCH_EXACT = 1       # the name itself only
+MATCH_WILDCARD = 2    # strict subdomains only ("*.example.com")
+MATCH_SUBDOMAIN = 4   # the name and all of its subdomains (plain "example.com")
+
+_MATCHES_SELF = MATCH_EXACT | MATCH_SUBDOMAIN
+_MATCHES_CHILDREN = MATCH_WILDCARD | MATCH_SUBDOMAIN
+
+
+def normalize_host(host: str) -> str:
+    """Lowercase a host name and strip its trailing dot."""
+    return host.strip().rstrip('.').lower()
+
+
+def parse_pattern(pattern: str, default_mode: int = MATCH_SUBDOMAIN):
+    """
+    Split an ignore pattern into its name and rule mode.
+
+    Args:
+        pattern: Domain pattern; a leading "*." makes it a wildcard rule
+        default_mode: Mode used for plain domain names
+
+    Returns:
+        tuple: (normalized name, mode)
+    """
+    name = normalize_host(pattern)
+    if name.startswith('*.'):
+        return name[2:], MATCH_WILDCARD
+    return name, default_mode
+
+
+class HostMatcher:
+    """
+    Hashed suffix set of ignore rules.
+
+    Every rule is stored under its normalized name with a bit mask of the
+    modes it was added with. A lookup checks the host itself and then each
+    of its parent suffixes, so its cost only depends on the number of labels
+    in the host name.
+
+    Plain names behave like the ``(?:^|\\.)(name)$`` regex previously built
+    by ``core/entry.py``: they match the name and all of its subdomains.
+    """
+
+    def __init__(self, patterns: Iterable[str] = ()):
+        """
+        Initialize matcher.
+
+        Args:
+            patterns: Optional initial domain patterns
+        """
+        self._rules: Dict[str, int] = {}
+        self.update(patterns)
+
+    def add(self, pattern: str, mode: Optional[int] = None) -> bool:
+        """
+        Add an ignore rule.
+
+        Args:
+            pattern: Domain name, or "*.name" for a wildcard rule
+            mode: Optional explicit mode overriding the pattern syntax
+
+        Returns:
+            True if the rule was not present before
+        """
+        name, parsed_mode = parse_pattern(pattern)
+        if mode is None:
+            mode = parsed_mode
+        if not name:
+            return False
+
+        current = self._rules.get(name, 0)
+        if current & mode == mode:
+            return False
+        self._rules[name] = current | mode
+        return True
+
+    def update(self, patterns: Iterable[str]):
+        """Add several ignore rules."""
+        for pattern in patterns:
+            self.add(pattern)
+
+    def remove(self, pattern: str, mode: Optional[int] = None) -> bool:
+        """
+        Remove an ignore rule.
+
+        Args:
+            pattern: Domain name, or "*.name" for a wildcard rule
+            mode: Optional explicit mode overriding the pattern syntax
+
+        Returns:
+            True if the rule was present
+        """
+        name, parsed_mode = parse_pattern(pattern)
+        if mode is None:
+            mode = parsed_mode
+
+        current = self._rules.get(name, 0)
+        if not current & mode:
+            return False
+        remaining = current & ~mode
+        if remaining:
+            self._rules[name] = remaining
+        else:
+            del self._rules[name]
+        return True
+
+    def match(self, host: Optional[str]) -> Optional[str]:
+        """
+        Find the rule covering a host.
+
+        Args:
+            host: Host name or IP address; it is expected to be lowercase
+
+        Returns:
+            The matching rule name, or None if the host is not ignored
+        """
+        if not host:
+            return None
+
+        rules = self._rules
+        if rules.get(host, 0) & _MATCHES_SELF:
+            return host
+
+        # Walk parent suffixes: a.b.example.com -> b.example.com -> example.com -> com
+        dot = host.find('.')
+        while dot != -1:
+            suffix = host[dot + 1:]
+            if rules.get(suffix, 0) & _MATCHES_CHILDREN:
+                return suffix
+            dot = host.find('.', dot + 1)
+        return None
+
+    def __contains__(self, host: str) -> bool:
+        """Check whether a host is covered by any rule."""
+        return self.match(normalize_host(host)) is not None
+
+    def __len__(self) -> int:
+        """Get the number of distinct rule names."""
+        return len(self._rules)
+
+    def clear(self):
+        """Remove all rules."""
+        self._rules.clear()
@@ -0,0 +1,898 @@
+"""
+Schema migrations for the HttpPro database.
+
+The schema version is stored in ``PRAGMA user_version``. A new database is
+created directly at the current version; an existing one is upgraded one
+version at a time by the functions in ``MIGRATIONS``. Every step re-checks
+the version inside its own write transaction, so several processes opening
+the same database at once upgrade it only once.
+
+Migrations that rewrite ``ignore_hosts`` copy the rows into the new table in
+small batches, each in its own short transaction, while triggers on the old
+table mirror every write made meanwhile by other processes. The proxy and
+``manage_db.py`` therefore keep working during the conversion, and only the
+final swap of the two tables holds the write lock for longer than a batch.
+
+Schema versions:
+
+- 0: unversioned; any layout written by HttpPro 1.0 or the development
+  versions that followed it
+- 1: the 1.0 layout with every side table and trigger (ISO text
+  timestamps, origin names in each row, indexes on domain and active)
+- 2: compact layout: integer epoch timestamps in microseconds, an ``origins``
+  lookup table, the reversed-domain column and a partial index on active
+  domains instead of the low-selectivity ``active`` index
+- 3: index on (active, last_seen) for expiry, purging and least-recently-seen
+  eviction
+- 4: ``aggregated_domains``, the record of domains replaced by a wildcard rule
+- 5: ``ignore_networks``, IP addresses and CIDR prefixes moved out of
+  ``ignore_hosts`` into their own typed table
+- 6: change log timestamps in UTC epoch microseconds (``seen_us``) instead of
+  local ISO text, so replicated changes compare correctly across time zones
+  and DST changes
+- 7: ``ignore_networks_stats``, trigger-maintained network counters, so
+  statistics never scan ``ignore_networks``
+"""
+
+import sqlite3
+import time
+import logging
+from typing import Callable, Dict, Tuple
+
+from core.iptree import parse_network
+
+logger = logging.getLogger('httppro.migrations')
+
+SCHEMA_VERSION = 7
+
+# Rows copied per transaction by table-rewriting migrations
+MIGRATION_BATCH_SIZE = 5000
+
+# Rows updated per transaction when filling domain_rev
+REVERSE_BACKFILL_BATCH = 10000
+
+
+def iso_to_us_sql(column: str) -> str:
+    """
+    SQL expression converting an ISO local timestamp to epoch microseconds.
+
+    Used where Python cannot run (triggers, INSERT ... SELECT); it matches
+    ``core.database.to_epoch_us`` for the timestamps HttpPro writes.
+    """
+    return (f"IFNULL(CAST(strftime('%s', substr({column}, 1, 19), 'utc') AS INTEGER) * 1000000 + "
+            f"CAST(substr({column} || '.000000', 21, 6) AS INTEGER), 0)")
+
+
+def us_to_iso_sql(column: str) -> str:
+    """
+    SQL expression converting epoch microseconds to an ISO local timestamp.
+
+    Like ``datetime.isoformat()`` and ``core.database.to_iso``, the
+    fraction is omitted when it is zero.
+    """
+    return (f"strftime('%Y-%m-%dT%H:%M:%S', {column} / 1000000, 'unixepoch', 'localtime') || "
+            f"CASE WHEN {column} % 1000000 THEN printf('.%06d', {column} % 1000000) ELSE '' END")
+
+
+def get_version(conn: sqlite3.Connection) -> int:
+    """Get the schema version of a database."""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def _set_version(conn: sqlite3.Connection, version: int):
+    # PRAGMA arguments cannot be bound; the version is always an int from this module
+    conn.execute(f'PRAGMA user_version = {int(version)}')
+
+
+def _has_table(conn: sqlite3.Connection, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+
+def reverse_domain(domain: str) -> str:
+    """
+    Get the value stored in ``domain_rev``: the domain spelled backwards.
+
+    Domains sharing a suffix share a prefix once reversed, so suffix
+    queries become range scans on the ``domain_rev`` index.
+    """
+    return domain[::-1]
+
+
+def migrate(connections, batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+    """
+    Create the schema or upgrade it to SCHEMA_VERSION.
+
+    Args:
+        connections: ConnectionManager of the database
+        batch_size: Rows copied per transaction by table-rewriting migrations
+
+    Returns:
+        int: Schema version before the upgrade (0 for a new database)
+
+    Raises:
+        RuntimeError: If the database was written by a newer HttpPro
+    """
+    initial = connections.execute(get_version)
+    if initial > SCHEMA_VERSION:
+        raise RuntimeError(f"Database schema version {initial} is newer than this HttpPro "
+                           f"(version {SCHEMA_VERSION}); upgrade HttpPro")
+
+    version = initial
+    if version == 0:
+        version = connections.execute(_create_or_adopt, write=True)
+
+    while version < SCHEMA_VERSION:
+        start = time.perf_counter()
+        logger.info(f"Migrating database schema from version {version} to {version + 1}")
+        MIGRATIONS[version + 1](connections, batch_size)
+        version = connections.execute(get_version)
+        logger.info(f"Database schema is at version {version} ({time.perf_counter() - start:.1f}s)")
+    return initial
+
+
+def _create_or_adopt(conn: sqlite3.Connection) -> int:
+    """Create a new database at the current version, or version an existing 1.0 layout."""
+    version = get_version(conn)
+    if version != 0:
+        # Another process got here first
+        return version
+    if not _has_table(conn, 'ignore_hosts'):
+        create_schema(conn)
+        _set_version(conn, SCHEMA_VERSION)
+        return SCHEMA_VERSION
+    _upgrade_unversioned(conn)
+    _set_version(conn, 1)
+    return 1
+
+
+# --- Current layout ---
+
+def _create_hosts_table(conn: sqlite3.Connection, name: str, indexes: bool = True):
+    """Create the compact ignore_hosts table under the given name, with its indexes unless told otherwise."""
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            domain TEXT UNIQUE NOT NULL,
+            domain_rev TEXT,
+            origin_id INTEGER NOT NULL REFERENCES origins(id),
+            date_added INTEGER NOT NULL,
+            last_seen INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 1,
+            active INTEGER NOT NULL DEFAULT 1
+        )
+    ''')
+    if indexes:
+        _create_hosts_indexes(conn, name)
+
+
+def _create_hosts_indexes(conn: sqlite3.Connection, name: str):
+    """Create the secondary indexes of the compact ignore_hosts table."""
+    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_hosts_domain_rev ON {name}(domain_rev)')
+    # Covers the ordered active-domain scans; inactive rows cost nothing in it
+    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_hosts_active_domain ON {name}(domain) WHERE active = 1')
+    _create_expiry_index(conn, name)
+
+
+def _create_expiry_index(conn: sqlite3.Connection, name: str):
+    """Create the index ordering active and inactive domains by last_seen, used by compaction."""
+    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_hosts_active_seen ON {name}(active, last_seen)')
+
+
+def create_schema(conn: sqlite3.Connection):
+    """Create every table, index and trigger of the current layout."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS origins (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL
+        )
+    ''')
+    _create_hosts_table(conn, 'ignore_hosts')
+    _create_side_tables(conn)
+    _create_triggers(conn)
+    _create_networks_table(conn)
+
+
+def _create_side_tables(conn: sqlite3.Connection):
+    """Create the statistics, change log, replication and checkpoint tables."""
+    # Counters per (origin, active) pair, so reading statistics never scans ignore_hosts
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ignore_hosts_stats (
+            origin TEXT NOT NULL,
+            active INTEGER NOT NULL,
+            domains INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (origin, active)
+        ) WITHOUT ROWID
+    ''')
+
+    # Every activation or deactivation, for hot reload and replication. Rows
+    # written by this node have a NULL node; rows caused by replicated changes
+    # carry the peer's node id so they are never published again. seen_us is
+    # the row's last_seen in epoch microseconds; last_seen holds the local ISO
+    # text written before schema version 6.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ignore_hosts_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            domain TEXT NOT NULL,
+            active INTEGER NOT NULL,
+            origin TEXT,
+            last_seen TEXT,
+            node TEXT,
+            seen_us INTEGER
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS replication_cursors (
+            peer TEXT PRIMARY KEY,
+            position INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+    # Last known state of imported or exported domain files
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS file_checkpoints (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            recorded_at TEXT NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    _create_aggregation_table(conn)
+
+
+def _create_aggregation_table(conn: sqlite3.Connection):
+    """Create the table mapping domains deactivated by aggregation to their wildcard rule."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS aggregated_domains (
+            domain TEXT PRIMARY KEY,
+            rule TEXT NOT NULL,
+            aggregated_at INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_aggregated_rule ON aggregated_domains(rule)')
+
+
+def _change_time(conn: sqlite3.Connection, row: str) -> Tuple[str, str]:
+    """
+    Get the change log column and value recording ``<row>.last_seen`` in a trigger.
+
+    Epoch microseconds in seen_us; tables created before schema version 6,
+    which lack the column until that migration, get local ISO text.
+    """
+    columns = {info[1] for info in conn.execute('PRAGMA table_info(ignore_hosts_changes)')}
+    if 'seen_us' in columns:
+        return 'seen_us', f'{row}.last_seen'
+    return 'last_seen', us_to_iso_sql(f'{row}.last_seen')
+
+
+def _create_networks_table(conn: sqlite3.Connection):
+    """Create the IP address and CIDR prefix table with its indexes and change log triggers."""
+    # network is the canonical CIDR form, e.g. 203.0.113.7/32 or 2001:db8::/32
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ignore_networks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            network TEXT UNIQUE NOT NULL,
+            version INTEGER NOT NULL,
+            prefix_len INTEGER NOT NULL,
+            origin_id INTEGER NOT NULL REFERENCES origins(id),
+            date_added INTEGER NOT NULL,
+            last_seen INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 1,
+            active INTEGER NOT NULL DEFAULT 1
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_networks_active_seen ON ignore_networks(active, last_seen)')
+    _create_network_stats(conn)
+
+    # Networks share the change log with domains; readers tell them apart by the '/'
+    origin_of = '(SELECT name FROM origins WHERE id = {}.origin_id)'
+    new_origin, old_origin = origin_of.format('NEW'), origin_of.format('OLD')
+    (column, new_seen), (_, old_seen) = _change_time(conn, 'NEW'), _change_time(conn, 'OLD')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_networks_changes_insert AFTER INSERT ON ignore_networks
+        WHEN NEW.active = 1
+        BEGIN
+            INSERT INTO ignore_hosts_changes (domain, active, origin, {column})
+            VALUES (NEW.network, 1, {new_origin}, {new_seen});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_networks_changes_update AFTER UPDATE OF active ON ignore_networks
+        WHEN OLD.active != NEW.active
+        BEGIN
+            INSERT INTO ignore_hosts_changes (domain, active, origin, {column})
+            VALUES (NEW.network, NEW.active, {new_origin}, {new_seen});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_networks_changes_delete AFTER DELETE ON ignore_networks
+        WHEN OLD.active = 1
+        BEGIN
+            INSERT INTO ignore_hosts_changes (domain, active, origin, {column})
+            VALUES (OLD.network, 0, {old_origin}, {old_seen});
+        END
+    ''')
+
+
+def _create_network_stats(conn: sqlite3.Connection):
+    """Create the network counters per (origin, active) pair and the triggers maintaining them."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ignore_networks_stats (
+            origin TEXT NOT NULL,
+            active INTEGER NOT NULL,
+            networks INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (origin, active)
+        ) WITHOUT ROWID
+    ''')
+
+    origin_of = '(SELECT name FROM origins WHERE id = {}.origin_id)'
+    new_origin, old_origin = origin_of.format('NEW'), origin_of.format('OLD')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_networks_stats_insert AFTER INSERT ON ignore_networks
+        BEGIN
+            INSERT INTO ignore_networks_stats (origin, active, networks)
+            VALUES ({new_origin}, NEW.active, 1)
+            ON CONFLICT(origin, active) DO UPDATE SET networks = networks + 1;
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_networks_stats_delete AFTER DELETE ON ignore_networks
+        BEGIN
+            UPDATE ignore_networks_stats SET networks = networks - 1
+            WHERE origin = {old_origin} AND active = OLD.active;
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_networks_stats_update AFTER UPDATE OF origin_id, active ON ignore_networks
+        WHEN OLD.origin_id != NEW.origin_id OR OLD.active != NEW.active
+        BEGIN
+            UPDATE ignore_networks_stats SET networks = networks - 1
+            WHERE origin = {old_origin} AND active = OLD.active;
+            INSERT INTO ignore_networks_stats (origin, active, networks)
+            VALUES ({new_origin}, NEW.active, 1)
+            ON CONFLICT(origin, active) DO UPDATE SET networks = networks + 1;
+        END
+    ''')
+
+
+def _create_triggers(conn: sqlite3.Connection):
+    """Create the triggers maintaining the statistics counters and the change log."""
+    origin_of = '(SELECT name FROM origins WHERE id = {}.origin_id)'
+    new_origin, old_origin = origin_of.format('NEW'), origin_of.format('OLD')
+
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_stats_insert AFTER INSERT ON ignore_hosts
+        BEGIN
+            INSERT INTO ignore_hosts_stats (origin, active, domains)
+            VALUES ({new_origin}, NEW.active, 1)
+            ON CONFLICT(origin, active) DO UPDATE SET domains = domains + 1;
+        END
+    ''')
+
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_stats_delete AFTER DELETE ON ignore_hosts
+        BEGIN
+            UPDATE ignore_hosts_stats SET domains = domains - 1
+            WHERE origin = {old_origin} AND active = OLD.active;
+        END
+    ''')
+
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_stats_update AFTER UPDATE OF origin_id, active ON ignore_hosts
+        WHEN OLD.origin_id != NEW.origin_id OR OLD.active != NEW.active
+        BEGIN
+            UPDATE ignore_hosts_stats SET domains = domains - 1
+            WHERE origin = {old_origin} AND active = OLD.active;
+            INSERT INTO ignore_hosts_stats (origin, active, domains)
+            VALUES ({new_origin}, NEW.active, 1)
+            ON CONFLICT(origin, active) DO UPDATE SET domains = domains + 1;
+        END
+    ''')
+
+    (column, new_seen), (_, old_seen) = _change_time(conn, 'NEW'), _change_time(conn, 'OLD')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_changes_insert AFTER INSERT ON ignore_hosts
+        WHEN NEW.active = 1
+        BEGIN
+            INSERT INTO ignore_hosts_changes (domain, active, origin, {column})
+            VALUES (NEW.domain, 1, {new_origin}, {new_seen});
+        END
+    ''')
+
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_changes_update AFTER UPDATE OF active ON ignore_hosts
+        WHEN OLD.active != NEW.active
+        BEGIN
+            INSERT INTO ignore_hosts_changes (domain, active, origin, {column})
+            VALUES (NEW.domain, NEW.active, {new_origin}, {new_seen});
+        END
+    ''')
+
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_changes_delete AFTER DELETE ON ignore_hosts
+        WHEN OLD.active = 1
+        BEGIN
+            INSERT INTO ignore_hosts_changes (domain, active, origin, {column})
+            VALUES (OLD.domain, 0, {old_origin}, {old_seen});
+        END
+    ''')
+
+    if _has_table(conn, 'ignore_hosts_fts'):
+        create_substring_triggers(conn)
+
+
+def create_substring_index(conn: sqlite3.Connection):
+    """Create the optional FTS5 trigram index over ignore_hosts.domain and fill it."""
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS ignore_hosts_fts USING fts5(
+            domain, content='ignore_hosts', content_rowid='id', tokenize='trigram'
+        )
+    ''')
+    create_substring_triggers(conn)
+    conn.execute("INSERT INTO ignore_hosts_fts (ignore_hosts_fts) VALUES ('rebuild')")
+
+
+def create_substring_triggers(conn: sqlite3.Connection):
+    """Create the triggers keeping the FTS5 index in step with ignore_hosts."""
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_fts_insert AFTER INSERT ON ignore_hosts
+        BEGIN
+            INSERT INTO ignore_hosts_fts (rowid, domain) VALUES (NEW.id, NEW.domain);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_fts_delete AFTER DELETE ON ignore_hosts
+        BEGIN
+            INSERT INTO ignore_hosts_fts (ignore_hosts_fts, rowid, domain) VALUES ('delete', OLD.id, OLD.domain);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_fts_update AFTER UPDATE OF domain ON ignore_hosts
+        BEGIN
+            INSERT INTO ignore_hosts_fts (ignore_hosts_fts, rowid, domain) VALUES ('delete', OLD.id, OLD.domain);
+            INSERT INTO ignore_hosts_fts (rowid, domain) VALUES (NEW.id, NEW.domain);
+        END
+    ''')
+
+
+def drop_substring_index(conn: sqlite3.Connection):
+    """Drop the FTS5 index and its triggers."""
+    for trigger in ('trg_fts_insert', 'trg_fts_delete', 'trg_fts_update'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    conn.execute('DROP TABLE IF EXISTS ignore_hosts_fts')
+
+
+# --- Version 1: the 1.0 layout ---
+
+def _upgrade_unversioned(conn: sqlite3.Connection):
+    """
+    Bring an unversioned database to the complete 1.0 layout.
+
+    Databases written by earlier development versions may lack the side
+    tables, their triggers or the reversed-domain column; they are added
+    here, in the form those versions created them.
+    """
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(ignore_hosts)')}
+    if 'domain_rev' not in columns:
+        conn.execute('ALTER TABLE ignore_hosts ADD COLUMN domain_rev TEXT')
+
+    has_stats = _has_table(conn, 'ignore_hosts_stats')
+    _create_side_tables(conn)
+
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_stats_insert AFTER INSERT ON ignore_hosts
+        BEGIN
+            INSERT INTO ignore_hosts_stats (origin, active, domains)
+            VALUES (NEW.origin, IFNULL(NEW.active = 1, 0), 1)
+            ON CONFLICT(origin, active) DO UPDATE SET domains = domains + 1;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_stats_delete AFTER DELETE ON ignore_hosts
+        BEGIN
+            UPDATE ignore_hosts_stats SET domains = domains - 1
+            WHERE origin = OLD.origin AND active = IFNULL(OLD.active = 1, 0);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_stats_update AFTER UPDATE OF origin, active ON ignore_hosts
+        WHEN OLD.origin IS NOT NEW.origin OR IFNULL(OLD.active = 1, 0) != IFNULL(NEW.active = 1, 0)
+        BEGIN
+            UPDATE ignore_hosts_stats SET domains = domains - 1
+            WHERE origin = OLD.origin AND active = IFNULL(OLD.active = 1, 0);
+            INSERT INTO ignore_hosts_stats (origin, active, domains)
+            VALUES (NEW.origin, IFNULL(NEW.active = 1, 0), 1)
+            ON CONFLICT(origin, active) DO UPDATE SET domains = domains + 1;
+        END
+    ''')
+    if not has_stats:
+        conn.execute('''
+            INSERT INTO ignore_hosts_stats (origin, active, domains)
+            SELECT origin, IFNULL(active = 1, 0), COUNT(*) FROM ignore_hosts
+            GROUP BY origin, IFNULL(active = 1, 0)
+        ''')
+
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_changes_insert AFTER INSERT ON ignore_hosts
+        WHEN IFNULL(NEW.active = 1, 0)
+        BEGIN
+            INSERT INTO ignore_hosts_changes (domain, active, origin, last_seen)
+            VALUES (NEW.domain, 1, NEW.origin, NEW.last_seen);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_changes_update AFTER UPDATE OF active ON ignore_hosts
+        WHEN IFNULL(OLD.active = 1, 0) != IFNULL(NEW.active = 1, 0)
+        BEGIN
+            INSERT INTO ignore_hosts_changes (domain, active, origin, last_seen)
+            VALUES (NEW.domain, IFNULL(NEW.active = 1, 0), NEW.origin, NEW.last_seen);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_changes_delete AFTER DELETE ON ignore_hosts
+        WHEN IFNULL(OLD.active = 1, 0)
+        BEGIN
+            INSERT INTO ignore_hosts_changes (domain, active, origin, last_seen)
+            VALUES (OLD.domain, 0, OLD.origin, OLD.last_seen);
+        END
+    ''')
+
+
+# --- Version 2: compact layout ---
+
+# Converted values of a legacy row; domain_rev is {1}, as mirror triggers run on
+# connections of older versions, which lack the reverse_domain SQL function
+_LEGACY_ROW = ('{0}.id, {0}.domain, {1}, (SELECT id FROM origins WHERE name = {0}.origin), ' +
+               iso_to_us_sql('{0}.date_added') + ', ' + iso_to_us_sql('{0}.last_seen') +
+               ', IFNULL({0}.count, 1), IFNULL({0}.active = 1, 0)')
+
+_NEXT_COLUMNS = '(id, domain, domain_rev, origin_id, date_added, last_seen, count, active)'
+
+
+def _migrate_compact_layout(connections, batch_size: int):
+    """
+    Rewrite ignore_hosts into the compact layout, online.
+
+    1. Create ``origins`` and ``ignore_hosts_next``, and triggers mirroring
+       every later write on ignore_hosts into the new table.
+    2. Copy the existing rows in id order, ``batch_size`` per transaction.
+       Rows already written by a mirror trigger are newer and kept.
+    3. Build the secondary indexes of the new table in one sorted pass.
+    4. In one transaction, drop the old table with its triggers, rename the
+       new one and create its triggers.
+    5. Fill domain_rev for rows written by older versions meanwhile.
+    """
+    if not connections.execute(_prepare_compact_copy, write=True):
+        return
+
+    last_id = 0
+    copied = 0
+    while True:
+        last_id, rows = connections.execute(lambda conn: _copy_batch(conn, last_id, batch_size), write=True)
+        if rows is None:
+            # Another process finished the migration
+            return
+        if rows == 0:
+            break
+        copied += rows
+        logger.debug(f"Copied {copied} rows to the compact layout")
+
+    connections.execute(_index_compact_table, write=True)
+    if connections.execute(_swap_compact_table, write=True):
+        logger.info(f"Converted {copied} domains to the compact layout")
+    fill_domain_rev(connections)
+
+
+def _prepare_compact_copy(conn: sqlite3.Connection) -> bool:
+    """Create the new tables and the mirror triggers (step 1)."""
+    if get_version(conn) != 1:
+        return False
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS origins (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL
+        )
+    ''')
+    # Secondary indexes are built after the copy: filled in id order they would
+    # cost a random B-tree insert per row, rewritten to the WAL by every batch
+    _create_hosts_table(conn, 'ignore_hosts_next', indexes=False)
+
+    mirror = f'''
+            INSERT OR IGNORE INTO origins (name) VALUES (NEW.origin);
+            INSERT OR REPLACE INTO ignore_hosts_next {_NEXT_COLUMNS}
+            VALUES ({_LEGACY_ROW.format('NEW', 'NEW.domain_rev')});
+    '''
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_migrate_insert AFTER INSERT ON ignore_hosts
+        BEGIN {mirror} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_migrate_update AFTER UPDATE ON ignore_hosts
+        BEGIN {mirror} END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_migrate_delete AFTER DELETE ON ignore_hosts
+        BEGIN
+            DELETE FROM ignore_hosts_next WHERE id = OLD.id;
+        END
+    ''')
+    return True
+
+
+def _copy_batch(conn: sqlite3.Connection, last_id: int, batch_size: int):
+    """Copy the next batch of rows after last_id (step 2); returns (last id, rows) or (last_id, None)."""
+    if get_version(conn) != 1:
+        return last_id, None
+
+    upper = conn.execute('SELECT MAX(id) FROM (SELECT id FROM ignore_hosts WHERE id > ? ORDER BY id LIMIT ?)',
+                         (last_id, batch_size)).fetchone()[0]
+    if upper is None:
+        return last_id, 0
+
+    conn.execute('INSERT OR IGNORE INTO origins (name) SELECT DISTINCT origin FROM ignore_hosts '
+                 'WHERE id > ? AND id <= ?', (last_id, upper))
+    conn.create_function('reverse_domain', 1, reverse_domain, deterministic=True)
+    cursor = conn.execute(f'''
+        INSERT OR IGNORE INTO ignore_hosts_next {_NEXT_COLUMNS}
+        SELECT {_LEGACY_ROW.format('h', 'IFNULL(h.domain_rev, reverse_domain(h.domain))')} FROM ignore_hosts h
+        WHERE h.id > ? AND h.id <= ?
+    ''', (last_id, upper))
+    return upper, max(cursor.rowcount, 1)
+
+
+def _index_compact_table(conn: sqlite3.Connection):
+    """Create the secondary indexes of the converted table (step 3)."""
+    if get_version(conn) == 1:
+        _create_hosts_indexes(conn, 'ignore_hosts_next')
+
+
+def _swap_compact_table(conn: sqlite3.Connection) -> bool:
+    """Replace ignore_hosts with the converted table (step 4)."""
+    if get_version(conn) != 1:
+        return False
+
+    triggers = conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'ignore_hosts'")
+    for (name,) in triggers.fetchall():
+        conn.execute(f'DROP TRIGGER "{name}"')
+    conn.execute('DROP TABLE ignore_hosts')
+    conn.execute('ALTER TABLE ignore_hosts_next RENAME TO ignore_hosts')
+    _create_triggers(conn)
+    _set_version(conn, 2)
+    return True
+
+
+def fill_domain_rev(connections, batch_size: int = REVERSE_BACKFILL_BATCH) -> int:
+    """
+    Fill domain_rev for rows written without it, in batches.
+
+    Returns:
+        int: Number of rows filled
+    """
+    def _fill(conn):
+        rows = conn.execute('SELECT id, domain FROM ignore_hosts WHERE domain_rev IS NULL LIMIT ?',
+                            (batch_size,)).fetchall()
+        conn.executemany('UPDATE ignore_hosts SET domain_rev = ? WHERE id = ?',
+                         [(reverse_domain(domain), row_id) for row_id, domain in rows])
+        return len(rows)
+
+    filled = 0
+    while True:
+        rows = connections.execute(_fill, write=True)
+        filled += rows
+        if rows < batch_size:
+            break
+    if filled:
+        logger.info(f"Filled the reversed-domain column for {filled} domains")
+    return filled
+
+
+# --- Version 3: expiry index ---
+
+def _migrate_expiry_index(connections, batch_size: int):
+    """Index domains by (active, last_seen); a single sorted pass, about a second per million rows."""
+    def _create(conn):
+        if get_version(conn) == 2:
+            _create_expiry_index(conn, 'ignore_hosts')
+            _set_version(conn, 3)
+
+    connections.execute(_create, write=True)
+
+
+# --- Version 4: aggregation record ---
+
+def _migrate_aggregation_table(connections, batch_size: int):
+    """Add the aggregated_domains table; no existing rows are touched."""
+    def _create(conn):
+        if get_version(conn) == 3:
+            _create_aggregation_table(conn)
+            _set_version(conn, 4)
+
+    connections.execute(_create, write=True)
+
+
+# --- Version 5: network rules ---
+
+def _migrate_network_table(connections, batch_size: int):
+    """
+    Move IP addresses and CIDR prefixes stored as domains into ignore_networks, online.
+
+    1. Create ignore_networks with its indexes and change log triggers.
+    2. Scan ignore_hosts in id order, ``batch_size`` rows per transaction,
+       and move the addresses and networks found, see _move_network_rows.
+    3. Move the rows written by other processes since the last batch and
+       bump the version, in one transaction.
+    """
+    def _prepare(conn):
+        if get_version(conn) != 4:
+            return False
+        _create_networks_table(conn)
+        return True
+
+    def _move_batch(conn, last_id):
+        # Returns (last id, rows moved), or (last_id, None) once no row is left
+        if get_version(conn) != 4:
+            return last_id, None
+        upper = conn.execute('SELECT MAX(id) FROM (SELECT id FROM ignore_hosts WHERE id > ? ORDER BY id LIMIT ?)',
+                             (last_id, batch_size)).fetchone()[0]
+        if upper is None:
+            return last_id, None
+        return upper, _move_network_rows(conn, last_id, upper)
+
+    def _finish(conn, last_id):
+        if get_version(conn) != 4:
+            return 0
+        upper = conn.execute('SELECT COALESCE(MAX(id), 0) FROM ignore_hosts').fetchone()[0]
+        moved = _move_network_rows(conn, last_id, upper) if upper > last_id else 0
+        _set_version(conn, 5)
+        return moved
+
+    if not connections.execute(_prepare, write=True):
+        return
+
+    last_id = 0
+    moved = 0
+    while True:
+        last_id, rows = connections.execute(lambda conn: _move_batch(conn, last_id), write=True)
+        if rows is None:
+            break
+        moved += rows
+        logger.debug(f"Scanned ignore_hosts up to id {last_id} for network rules")
+
+    moved += connections.execute(lambda conn: _finish(conn, last_id), write=True)
+    if moved:
+        logger.info(f"Moved {moved} IP addresses and networks to the network rules table")
+
+
+def _move_network_rows(conn: sqlite3.Connection, last_id: int, upper: int) -> int:
+    """
+    Move the addresses and networks among the ignore_hosts rows with last_id < id <= upper.
+
+    Only rows whose domain ends with a digit or contains a colon or a slash
+    are candidates; each is parsed in Python and moved with its origin,
+    timestamps, count and state. The change log rows written by the move are
+    dropped: readers see the rules under their new names on their next full
+    load, and replicating the move would make peers remove the moved rules.
+
+    Returns:
+        Number of rows moved
+    """
+    start_seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM ignore_hosts_changes').fetchone()[0]
+    rows = conn.execute('''
+        SELECT id, domain, origin_id, date_added, last_seen, count, active FROM ignore_hosts
+        WHERE id > ? AND id <= ? AND (domain GLOB '*[0-9]' OR domain GLOB '*:*' OR domain GLOB '*/*')
+    ''', (last_id, upper))
+    moved = []
+    for row_id, domain, origin_id, date_added, last_seen, count, active in rows:
+        network = parse_network(domain)
+        if network is not None:
+            moved.append((row_id, (str(network), network.version, network.prefixlen, origin_id,
+                                   date_added, last_seen, count, active)))
+    if not moved:
+        return 0
+
+    # Several spellings of one network (10.0.0.1 and 10.0.0.1/32) merge into one row
+    conn.executemany('''
+        INSERT INTO ignore_networks (network, version, prefix_len, origin_id, date_added, last_seen, count, active)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(network) DO UPDATE
+        SET date_added = MIN(date_added, excluded.date_added), last_seen = MAX(last_seen, excluded.last_seen),
+            count = count + excluded.count, active = MAX(active, excluded.active)
+    ''', [values for _, values in moved])
+    conn.executemany('DELETE FROM ignore_hosts WHERE id = ?', [(row_id,) for row_id, _ in moved])
+    conn.execute('DELETE FROM ignore_hosts_changes WHERE seq > ?', (start_seq,))
+    return len(moved)
+
+
+# --- Version 6: change log timestamps in epoch microseconds ---
+
+_CHANGE_TRIGGERS = ('trg_changes_insert', 'trg_changes_update', 'trg_changes_delete',
+                    'trg_networks_changes_insert', 'trg_networks_changes_update', 'trg_networks_changes_delete')
+
+
+def _migrate_change_timestamps(connections, batch_size: int):
+    """
+    Record change log timestamps as epoch microseconds, online.
+
+    1. Add the seen_us column and recreate the change log triggers, so every
+       later change is written in the new form.
+    2. Convert the local ISO text of the existing rows in seq order,
+       ``batch_size`` rows per transaction.
+    3. Bump the version once every row is converted.
+    """
+    def _prepare(conn):
+        if get_version(conn) != 5:
+            return False
+        columns = {info[1] for info in conn.execute('PRAGMA table_info(ignore_hosts_changes)')}
+        if 'seen_us' not in columns:
+            conn.execute('ALTER TABLE ignore_hosts_changes ADD COLUMN seen_us INTEGER')
+        for trigger in _CHANGE_TRIGGERS:
+            conn.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        _create_triggers(conn)
+        _create_networks_table(conn)
+        return True
+
+    def _convert(conn, last_seq):
+        # Returns (last seq, rows converted), or (last_seq, None) once no row is left
+        if get_version(conn) != 5:
+            return last_seq, None
+        upper = conn.execute('SELECT MAX(seq) FROM (SELECT seq FROM ignore_hosts_changes WHERE seq > ? '
+                             'ORDER BY seq LIMIT ?)', (last_seq, batch_size)).fetchone()[0]
+        if upper is None:
+            return last_seq, None
+        cursor = conn.execute(f'''
+            UPDATE ignore_hosts_changes SET seen_us = {iso_to_us_sql('last_seen')}
+            WHERE seq > ? AND seq <= ? AND seen_us IS NULL AND last_seen IS NOT NULL
+        ''', (last_seq, upper))
+        return upper, cursor.rowcount
+
+    def _finish(conn):
+        if get_version(conn) == 5:
+            _set_version(conn, 6)
+
+    if not connections.execute(_prepare, write=True):
+        return
+
+    last_seq = 0
+    converted = 0
+    while True:
+        last_seq, rows = connections.execute(lambda conn: _convert(conn, last_seq), write=True)
+        if rows is None:
+            break
+        converted += rows
+
+    connections.execute(_finish, write=True)
+    if converted:
+        logger.info(f"Converted {converted} change log timestamps to epoch microseconds")
+
+
+# --- Version 7: network counters ---
+
+def _migrate_network_stats(connections, batch_size: int):
+    """Add the network counters and fill them; one scan of ignore_networks, which holds few rows."""
+    def _create(conn):
+        if get_version(conn) != 6:
+            return
+        _create_network_stats(conn)
+        # The triggers may predate this step (see _create_networks_table), so count from scratch
+        conn.execute('DELETE FROM ignore_networks_stats')
+        conn.execute('''
+            INSERT INTO ignore_networks_stats (origin, active, networks)
+            SELECT (SELECT name FROM origins WHERE id = origin_id), active, COUNT(*) FROM ignore_networks
+            GROUP BY origin_id, active
+        ''')
+        _set_version(conn, 7)
+
+    connections.execute(_create, write=True)
+
+
+# Migration to each version from the previous one
+MIGRATIONS: Dict[int, Callable] = {
+    2: _migrate_compact_layout,
+    3: _migrate_expiry_index,
+    4: _migrate_aggregation_table,
+    5: _migrate_network_table,
+    6: _migrate_change_timestamps,
+    7: _migrate_network_stats,
+}
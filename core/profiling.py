@@ -0,0 +1,339 @@
+"""
+On-demand profiling for the running proxy.
+
+This module provides an opt-in mitmproxy addon that starts and stops a
+profiling session without restarting the proxy, from a signal, an option or
+a mitmproxy command. A session combines:
+
+- cProfile on the event loop thread, where all addon hooks run (``.pstats``)
+- a stack sampler covering every thread, written as flamegraph-compatible
+  collapsed stacks (``.collapsed``)
+- tracemalloc statistics and the size of the addons' in-memory structures,
+  such as the TLS ignore set and matcher (``-memory.txt``)
+"""
+
+import os
+import sys
+import time
+import signal
+import cProfile
+import threading
+import tracemalloc
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+from mitmproxy import command, ctx
+
+logger = logging.getLogger('httppro.profiling')
+
+# Default output directory, shared with the log files
+DEFAULT_PROFILE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs')
+
+# Default milliseconds between two stack samples
+DEFAULT_SAMPLE_INTERVAL = 5
+
+# Frames recorded per tracemalloc traceback
+TRACEMALLOC_FRAMES = 25
+
+
+def deep_sizeof(obj, seen: Optional[set] = None) -> int:
+    """
+    Estimate the memory held by a container and everything it references.
+
+    Containers and instance attributes are followed; classes and callables
+    are counted shallowly.
+
+    Args:
+        obj: Object to measure
+        seen: Ids of objects already counted
+
+    Returns:
+        Size in bytes
+    """
+    seen = set() if seen is None else seen
+    stack = [obj]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif hasattr(item, '__dict__') and not isinstance(item, type) and not callable(item):
+            stack.append(vars(item))
+    return total
+
+
+def _frame_name(code) -> str:
+    """Format a code object as a collapsed-stack frame."""
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Periodically samples the stacks of all threads.
+
+    Samples are aggregated as collapsed stacks, one line per distinct stack
+    with its sample count, root frame first, as read by flamegraph.pl and
+    speedscope.
+    """
+
+    def __init__(self, interval: float = DEFAULT_SAMPLE_INTERVAL / 1000):
+        """
+        Initialize sampler.
+
+        Args:
+            interval: Seconds between two samples
+        """
+        self.interval = interval
+        self.samples = 0
+        self._stacks: Counter = Counter()
+        self._stopping = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start sampling in a background thread."""
+        self._stopping.clear()
+        self._worker = threading.Thread(target=self._run, name='httppro-sampler', daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        """Stop sampling."""
+        self._stopping.set()
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
+
+    def sample(self):
+        """Record the current stack of every thread except the sampler."""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            frames = []
+            while frame is not None:
+                frames.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            frames.append(names.get(ident, f"thread-{ident}"))
+            self._stacks[';'.join(reversed(frames))] += 1
+        self.samples += 1
+
+    def collapsed(self) -> List[str]:
+        """Get the aggregated samples as collapsed stack lines."""
+        return [f"{stack} {count}" for stack, count in self._stacks.most_common()]
+
+    def _run(self):
+        """Worker loop sampling every interval."""
+        while not self._stopping.wait(self.interval):
+            self.sample()
+
+
+class ProfileSession:
+    """One profiling session writing its results to an output directory."""
+
+    def __init__(self, output_dir: str = DEFAULT_PROFILE_DIR, interval: float = DEFAULT_SAMPLE_INTERVAL / 1000,
+                 memory_sources: Optional[Callable[[], Dict[str, int]]] = None):
+        """
+        Initialize session.
+
+        Args:
+            output_dir: Directory receiving the result files
+            interval: Seconds between two stack samples
+            memory_sources: Optional callable returning named structure sizes in bytes
+        """
+        self.output_dir = output_dir
+        self.memory_sources = memory_sources
+        self.profiler = cProfile.Profile()
+        self.sampler = StackSampler(interval)
+        self.started_at: Optional[float] = None
+        self._started_tracemalloc = False
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+
+    def start(self):
+        """
+        Start profiling.
+
+        cProfile only follows the calling thread, so call this from the event
+        loop thread to profile the addon hooks.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracemalloc = True
+        self._baseline = tracemalloc.take_snapshot()
+        self.started_at = time.monotonic()
+        self.sampler.start()
+        self.profiler.enable()
+
+    def stop(self) -> List[str]:
+        """
+        Stop profiling and write the results.
+
+        Returns:
+            list: Paths of the files written
+        """
+        self.profiler.disable()
+        self.sampler.stop()
+        duration = time.monotonic() - self.started_at
+        snapshot = tracemalloc.take_snapshot()
+        traced = tracemalloc.get_traced_memory()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        prefix = os.path.join(self.output_dir, f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+        paths = [prefix + '.pstats', prefix + '.collapsed', prefix + '-memory.txt']
+
+        self.profiler.dump_stats(paths[0])
+        with open(paths[1], 'w', encoding='utf-8') as file:
+            file.write('\n'.join(self.sampler.collapsed()) + '\n')
+        with open(paths[2], 'w', encoding='utf-8') as file:
+            file.write('\n'.join(self._memory_report(snapshot, traced, duration)) + '\n')
+
+        logger.info(f"Profiled {duration:.1f}s ({self.sampler.samples} stack samples), results in {prefix}.*")
+        return paths
+
+    def _memory_report(self, snapshot: tracemalloc.Snapshot, traced: tuple, duration: float) -> List[str]:
+        """Render structure sizes and tracemalloc statistics."""
+        lines = [f"# Profiling session of {duration:.1f}s", ""]
+
+        if self.memory_sources is not None:
+            lines.append("## In-memory structures (bytes)")
+            try:
+                for name, size in sorted(self.memory_sources().items()):
+                    lines.append(f"{name:<40} {size:>14,}")
+            except Exception as e:
+                lines.append(f"Failed to measure structures: {e}")
+            lines.append("")
+
+        lines.append(f"Traced memory: {traced[0]:,} bytes (peak {traced[1]:,})")
+        lines.append("")
+
+        lines.append("## Allocation growth during the session (top 30)")
+        lines.extend(str(stat) for stat in snapshot.compare_to(self._baseline, 'lineno')[:30])
+        lines.append("")
+        lines.append("## Live allocations by line (top 30)")
+        lines.extend(str(stat) for stat in snapshot.statistics('lineno')[:30])
+        return lines
+
+
+class ProfilerAddon:
+    """
+    mitmproxy addon toggling profiling sessions at runtime.
+
+    A session is toggled by SIGUSR2, by setting the ``httppro_profile``
+    option (``:set httppro_profile=true`` in the console) or with the
+    ``httppro.profile`` command. Installing the signal handler replaces
+    mitmproxy's own SIGUSR2 stack dump.
+    """
+
+    def __init__(self, addons: Iterable = ()):
+        """
+        Initialize addon.
+
+        Args:
+            addons: Addons whose ``memory_usage()`` sizes are included in the memory report
+        """
+        self.addons = list(addons)
+        self.session: Optional[ProfileSession] = None
+        self.output_dir = DEFAULT_PROFILE_DIR
+        self.interval = DEFAULT_SAMPLE_INTERVAL / 1000
+        self.last_results: List[str] = []
+
+    def load(self, loader):
+        """
+        Register profiling options.
+
+        Args:
+            loader: mitmproxy addon loader
+        """
+        loader.add_option("httppro_profile", bool, False, "Profile the running proxy while enabled")
+        loader.add_option("httppro_profile_dir", str, DEFAULT_PROFILE_DIR, "Directory for profiling results")
+        loader.add_option("httppro_profile_interval", int, DEFAULT_SAMPLE_INTERVAL,
+                          "Milliseconds between two stack samples")
+
+    def running(self):
+        """Install the SIGUSR2 toggle once mitmproxy has registered its own handlers."""
+        if not hasattr(signal, 'SIGUSR2'):
+            return
+        try:
+            signal.signal(signal.SIGUSR2, lambda signum, frame: self.toggle())
+            logger.info(f"Profiling available: kill -USR2 {os.getpid()} to start or stop a session")
+        except ValueError as e:
+            # Not in the main thread
+            logger.warning(f"Could not install profiling signal handler: {e}")
+
+    def configure(self, updated):
+        """
+        Apply option changes.
+
+        Args:
+            updated: Set of option names that changed
+        """
+        if "httppro_profile_dir" in updated:
+            self.output_dir = ctx.options.httppro_profile_dir
+        if "httppro_profile_interval" in updated:
+            self.interval = max(1, ctx.options.httppro_profile_interval) / 1000
+        if "httppro_profile" in updated:
+            if ctx.options.httppro_profile:
+                self.start()
+            else:
+                self.stop()
+
+    @command.command("httppro.profile")
+    def profile(self) -> None:
+        """Start or stop a profiling session (mitmproxy command ``httppro.profile``)."""
+        self.toggle()
+
+    def done(self):
+        """Write the results of a session still running at shutdown."""
+        self.stop()
+
+    def toggle(self):
+        """Start a session, or stop the running one."""
+        if self.session is None:
+            self.start()
+        else:
+            self.stop()
+
+    def start(self):
+        """Start a session if none is running."""
+        if self.session is not None:
+            return
+        self.session = ProfileSession(self.output_dir, self.interval, self.memory_usage)
+        self.session.start()
+        logger.info("Profiling session started")
+
+    def stop(self) -> List[str]:
+        """
+        Stop the running session and write its results.
+
+        Returns:
+            list: Paths of the files written, empty if no session was running
+        """
+        if self.session is None:
+            return []
+        session, self.session = self.session, None
+        try:
+            self.last_results = session.stop()
+        except Exception as e:
+            logger.error(f"Failed to write profiling results: {e}")
+            self.last_results = []
+        return self.last_results
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Collect the structure sizes reported by the profiled addons."""
+        sizes = {}
+        for addon in self.addons:
+            if hasattr(addon, 'memory_usage'):
+                name = type(addon).__name__
+                for key, size in addon.memory_usage().items():
+                    sizes[f"{name}.{key}"] = size
+        return sizes
+
@@ -0,0 +1,125 @@
+"""
+Public Suffix List lookups for HttpPro.
+
+This module finds the registrable domain of a host (``example.co.uk`` for
+``a.cdn.example.co.uk``) from an offline copy of the Public Suffix List
+bundled in ``config/public_suffix_list.dat``, so that ignore rules are never
+widened to cover unrelated sites sharing a public suffix.
+"""
+
+import os
+import logging
+from functools import lru_cache
+from typing import Iterable, Optional
+
+logger = logging.getLogger('httppro.psl')
+
+# Refresh from https://publicsuffix.org/list/public_suffix_list.dat
+DEFAULT_PSL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'config', 'public_suffix_list.dat')
+
+
+def _to_ascii(name: str) -> str:
+    """Convert an internationalized rule to the punycode form hosts arrive in."""
+    try:
+        return name.encode('idna').decode('ascii')
+    except UnicodeError:
+        return name
+
+
+class PublicSuffixList:
+    """
+    Public Suffix List rules held in three hashed sets.
+
+    A lookup tries the host and each of its parent suffixes, longest first,
+    against the exception, plain and wildcard rules, so its cost depends
+    only on the number of labels in the host name.
+    """
+
+    def __init__(self, rules: Iterable[str] = ()):
+        """
+        Initialize suffix list.
+
+        Args:
+            rules: Rules in the list syntax: ``com``, ``*.ck`` or ``!www.ck``
+        """
+        self._rules = set()
+        self._wildcards = set()
+        self._exceptions = set()
+        for rule in rules:
+            self.add(rule)
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_PSL_PATH) -> 'PublicSuffixList':
+        """
+        Load a list in the publicsuffix.org file format, ICANN and private sections alike.
+
+        Args:
+            path: Path to public_suffix_list.dat
+
+        Returns:
+            PublicSuffixList: The loaded rules
+        """
+        with open(path, 'r', encoding='utf-8') as file:
+            suffix_list = cls(line.split()[0] for line in file if line.strip() and not line.startswith('//'))
+        logger.debug(f"Loaded {len(suffix_list)} public suffix rules from {path}")
+        return suffix_list
+
+    def add(self, rule: str):
+        """Add a rule in the list syntax."""
+        rule = _to_ascii(rule.strip().lower())
+        if rule.startswith('!'):
+            self._exceptions.add(rule[1:])
+        elif rule.startswith('*.'):
+            self._wildcards.add(rule[2:])
+        elif rule:
+            self._rules.add(rule)
+
+    def public_suffix(self, host: str) -> str:
+        """
+        Get the public suffix of a host.
+
+        Hosts under no rule fall back to their last label, the list's
+        implicit ``*`` rule.
+
+        Args:
+            host: Lowercase host name without a trailing dot
+
+        Returns:
+            The public suffix, e.g. ``co.uk`` for ``a.example.co.uk``
+        """
+        labels = host.split('.')
+        for i in range(len(labels)):
+            candidate = '.'.join(labels[i:])
+            if candidate in self._exceptions:
+                return '.'.join(labels[i + 1:])
+            if candidate in self._rules:
+                return candidate
+            if i + 1 < len(labels) and '.'.join(labels[i + 1:]) in self._wildcards:
+                return candidate
+        return labels[-1]
+
+    def registrable_domain(self, host: str) -> Optional[str]:
+        """
+        Get the registrable domain of a host: its public suffix plus one label.
+
+        Args:
+            host: Lowercase host name without a trailing dot
+
+        Returns:
+            The registrable domain, or None if the host is itself a public suffix
+        """
+        suffix = self.public_suffix(host)
+        if len(host) <= len(suffix):
+            return None
+        return host[host.rfind('.', 0, len(host) - len(suffix) - 1) + 1:]
+
+    def __len__(self) -> int:
+        """Get the number of rules."""
+        return len(self._rules) + len(self._wildcards) + len(self._exceptions)
+
+
+@lru_cache(maxsize=1)
+def default_suffix_list() -> PublicSuffixList:
+    """Get the bundled Public Suffix List, loaded on first use."""
+    return PublicSuffixList.from_file()
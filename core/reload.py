@@ -0,0 +1,155 @@
+"""
+Hot reload of ignore list changes for HttpPro.
+
+This module polls the database for changes made by other processes, such as
+``manage_db.py``, and hands the running proxy only the delta since the last
+change it applied. When compaction pruned change log entries the watcher had
+not read yet, the delta would be incomplete: the proxy is asked to reload the
+whole ignore list instead.
+"""
+
+import threading
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger('httppro.reload')
+
+
+class ChangeWatcher:
+    """
+    Polls IgnoreHostsDB for new entries in its change log.
+
+    Each poll first compares ``PRAGMA data_version``, which costs O(1) and
+    only changes when another connection committed. Only then is the change
+    log read, as an index range scan above the last applied sequence number,
+    so polling stays cheap regardless of the table size. The version is per
+    connection, so a reading is only compared with one taken on the same
+    thread's connection; the background thread takes its own baseline first.
+    """
+
+    def __init__(self, db, apply: Callable[[List[str], List[str]], None], interval: float = 1.0,
+                 start_seq: Optional[int] = None, batch_size: int = 10000,
+                 resync: Optional[Callable[[], None]] = None):
+        """
+        Initialize change watcher.
+
+        Args:
+            db: IgnoreHostsDB instance to watch
+            apply: Callback receiving (added domains, removed domains)
+            interval: Seconds between two polls
+            start_seq: Last change already reflected by the caller; defaults to the current one
+            batch_size: Maximum number of changes read per query
+            resync: Callback reloading the whole ignore list from the database, run
+                when changes after the last applied one were pruned unread
+        """
+        self.db = db
+        self.apply = apply
+        self.resync = resync
+        self.interval = interval
+        self.batch_size = batch_size
+        self.seq = db.get_change_seq() if start_seq is None else start_seq
+
+        # (thread id, PRAGMA data_version) of the last poll
+        self._data_version: Optional[Tuple[int, int]] = None
+        self._stopping = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+
+        # Counters
+        self.polls = 0
+        self.reloads = 0
+        self.changes_applied = 0
+        self.resyncs = 0
+
+    def start(self):
+        """Start polling in a background thread."""
+        if self._worker is not None:
+            return
+        self._worker = threading.Thread(target=self._run, name='httppro-reload', daemon=True)
+        self._worker.start()
+        logger.info(f"Watching database for changes every {self.interval}s (from seq {self.seq})")
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """Stop the background thread."""
+        self._stopping.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+            self._worker = None
+
+    def poll(self) -> int:
+        """
+        Apply pending changes once.
+
+        Returns:
+            Number of change log entries read
+        """
+        self.polls += 1
+        version = (threading.get_ident(), self.db.data_version())
+        if version == self._data_version:
+            return 0
+        self._data_version = version
+
+        total = 0
+        while True:
+            changes = self.db.get_changes_since(self.seq, self.batch_size)
+            # Checked after the read: entries pruned before it are missing from the batch
+            pruned = self.db.get_pruned_seq()
+            if self.seq < pruned:
+                if self.resync is not None:
+                    self._resync(pruned)
+                    continue
+                logger.error(f"Change log pruned up to seq {pruned} past the last applied seq {self.seq}: "
+                             f"changes in between are missed")
+                self.seq = pruned
+            if not changes:
+                break
+
+            # Coalesce per domain: the latest change wins
+            latest: Dict[str, bool] = {}
+            for _, domain, active in changes:
+                latest[domain] = active
+            added = [domain for domain, active in latest.items() if active]
+            removed = [domain for domain, active in latest.items() if not active]
+
+            self.apply(added, removed)
+            self.seq = changes[-1][0]
+            total += len(changes)
+            if len(changes) < self.batch_size:
+                break
+
+        if total:
+            self.reloads += 1
+            self.changes_applied += total
+            logger.info(f"Applied {total} database changes (up to seq {self.seq})")
+        return total
+
+    def stats(self) -> dict:
+        """Get polling counters."""
+        return {
+            'seq': self.seq,
+            'polls': self.polls,
+            'reloads': self.reloads,
+            'changes_applied': self.changes_applied,
+            'resyncs': self.resyncs,
+        }
+
+    def _resync(self, pruned: int):
+        """Reload the whole ignore list and continue from the change log position read before it."""
+        logger.warning(f"Change log pruned up to seq {pruned}, past the last applied seq {self.seq}: "
+                       f"reloading the ignore list")
+        # Read first, so changes committed during the reload are replayed afterwards
+        seq = self.db.get_change_seq()
+        self.resync()
+        self.seq = seq
+        self.resyncs += 1
+
+    def _run(self):
+        """Worker loop polling every interval, starting with a baseline on this thread's connection."""
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Failed to poll database changes: {e}")
+            if self._stopping.wait(self.interval):
+                break
+        # Release this thread's connection
+        self.db.connections.close()
@@ -0,0 +1,416 @@
+"""
+Change-feed replication for HttpPro.
+
+This module lets several proxy instances share one ignore list without a
+network service. Each node appends its own changes to a delta journal in a
+shared directory (``<node>.jsonl``) and pulls the other nodes' journals from
+the position it last processed, which it acknowledges in ``<node>.acks``
+so that the owner can cut the part every peer has merged. Peers can also be
+read directly from their SQLite database file. Conflicts are resolved by
+last_seen, carried as UTC epoch microseconds (``seen_us``), see
+``IgnoreHostsDB.apply_remote_changes``.
+"""
+
+import os
+import re
+import json
+import socket
+import threading
+import logging
+from typing import Dict, List, Optional
+
+from core.database import IgnoreHostsDB, to_epoch_us
+from core.exporter import write_atomic
+
+logger = logging.getLogger('httppro.replication')
+
+JOURNAL_SUFFIX = '.jsonl'
+ACK_SUFFIX = '.acks'
+
+# Journal bytes every peer must have merged before rotate() rewrites the journal without them
+JOURNAL_ROTATE_BYTES = 1 << 20
+
+# Length of the header line of a rotated journal, padded so that it never changes
+_HEADER_SIZE = 64
+
+_NODE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+
+def default_node_id() -> str:
+    """Get a node id derived from the host name."""
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', socket.gethostname()) or 'node'
+
+
+def _journal_header(base: int) -> bytes:
+    """Build the header line of a rotated journal whose byte 0 is at position ``base``."""
+    return (f'{{"base": {base}'.ljust(_HEADER_SIZE - 2) + '}\n').encode('ascii')
+
+
+def _journal_start(journal) -> tuple:
+    """
+    Read the header of an open journal.
+
+    Positions in a journal are byte offsets into everything ever appended
+    to it, so they stay valid when the start is cut by ``Replicator.rotate``.
+
+    Returns:
+        tuple: (position of byte 0 of the file, position of its first entry)
+    """
+    journal.seek(0)
+    head = journal.read(_HEADER_SIZE)
+    if len(head) == _HEADER_SIZE and head.startswith(b'{"base":') and head.endswith(b'\n'):
+        base = int(json.loads(head)['base'])
+        return base, base + _HEADER_SIZE
+    return 0, 0
+
+
+class Replicator:
+    """
+    Publishes local changes to a journal directory and merges peer changes.
+
+    Only changes made on this node are published; changes merged from a
+    peer are tagged with its node id in the change log, so nothing is sent
+    around in a loop. Every peer position is stored in the
+    ``replication_cursors`` table in the same transaction as the merge, so a
+    crash never applies a journal entry twice or skips one.
+    """
+
+    def __init__(self, db, journal_dir: str, node_id: Optional[str] = None,
+                 interval: float = 5.0, batch_size: int = 10000, rotate_bytes: int = JOURNAL_ROTATE_BYTES):
+        """
+        Initialize replicator.
+
+        Args:
+            db: IgnoreHostsDB instance of this node
+            journal_dir: Directory shared by all nodes
+            node_id: Unique, stable id of this node; defaults to the host name
+            interval: Seconds between two syncs of the background thread
+            batch_size: Maximum number of changes per transaction or journal write
+            rotate_bytes: Journal bytes every peer must have merged before they are cut
+        """
+        node_id = node_id or default_node_id()
+        if not _NODE_ID_PATTERN.match(node_id):
+            raise ValueError(f"Invalid node id: {node_id!r}")
+
+        self.db = db
+        self.journal_dir = journal_dir
+        self.node_id = node_id
+        self.interval = interval
+        self.batch_size = batch_size
+        self.rotate_bytes = rotate_bytes
+        self.journal_path = os.path.join(journal_dir, node_id + JOURNAL_SUFFIX)
+        self.ack_path = os.path.join(journal_dir, node_id + ACK_SUFFIX)
+
+        self._lock = threading.Lock()
+        self._peer_dbs: Dict[str, IgnoreHostsDB] = {}
+        self._acks: Optional[Dict[str, int]] = None
+        self._stopping = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+
+        # Counters
+        self.published = 0
+        self.applied = 0
+        self.conflicts = 0
+        self.errors = 0
+        self.rotated_bytes = 0
+
+        os.makedirs(journal_dir, exist_ok=True)
+
+    def start(self):
+        """Start syncing in a background thread."""
+        if self._worker is not None:
+            return
+        self._worker = threading.Thread(target=self._run, name='httppro-replication', daemon=True)
+        self._worker.start()
+        logger.info(f"Replicating as {self.node_id} through {self.journal_dir} every {self.interval}s")
+
+    def stop(self, timeout: Optional[float] = 10.0):
+        """Stop the background thread."""
+        self._stopping.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+            self._worker = None
+
+    def close(self):
+        """Stop syncing and close peer database handles."""
+        self.stop()
+        for peer_db in self._peer_dbs.values():
+            peer_db.close()
+        self._peer_dbs.clear()
+
+    def sync(self) -> dict:
+        """
+        Publish local changes, merge the changes of every peer journal, then rotate this node's journal.
+
+        Returns:
+            dict: Numbers of 'published', 'applied' and 'conflicts' changes
+        """
+        published = self.publish()
+        merged = self.pull()
+        self.rotate()
+        return {'published': published, **merged}
+
+    def publish(self) -> int:
+        """
+        Append changes made on this node since the last publish to its journal.
+
+        Returns:
+            Number of changes published
+        """
+        key = f'publish:{self.node_id}'
+        total = 0
+        with self._lock:
+            seq = self.db.get_replication_cursor(key)
+            while True:
+                changes = self.db.get_local_changes_since(seq, self.batch_size)
+                if not changes:
+                    break
+
+                lines = ''.join(json.dumps({
+                    'seq': change_seq, 'domain': domain, 'origin': origin,
+                    'active': active, 'seen_us': seen_us,
+                }, separators=(',', ':')) + '\n' for change_seq, domain, origin, active, seen_us in changes)
+                with open(self.journal_path, 'ab') as journal:
+                    journal.write(lines.encode('utf-8'))
+                    journal.flush()
+                    os.fsync(journal.fileno())
+
+                # A crash before this point republishes the batch, which peers skip as not newer
+                seq = changes[-1][0]
+                self.db.set_replication_cursor(key, seq)
+                total += len(changes)
+                if len(changes) < self.batch_size:
+                    break
+
+        if total:
+            self.published += total
+            logger.info(f"Published {total} changes to {self.journal_path}")
+        return total
+
+    def pull(self) -> dict:
+        """
+        Merge new entries of every other node's journal, then acknowledge the merged positions.
+
+        Returns:
+            dict: Numbers of 'applied' and 'conflicts' changes
+        """
+        result = {'applied': 0, 'conflicts': 0}
+        try:
+            names = sorted(os.listdir(self.journal_dir))
+        except OSError as e:
+            logger.error(f"Failed to list journal directory {self.journal_dir}: {e}")
+            return result
+
+        acks = {}
+        for name in names:
+            peer = name[:-len(JOURNAL_SUFFIX)]
+            if not name.endswith(JOURNAL_SUFFIX) or peer == self.node_id or not _NODE_ID_PATTERN.match(peer):
+                continue
+            merged = self.pull_journal(peer, os.path.join(self.journal_dir, name))
+            result['applied'] += merged['applied']
+            result['conflicts'] += merged['conflicts']
+            acks[peer] = self.db.get_replication_cursor(f'journal:{peer}')
+
+        if acks != self._acks:
+            try:
+                write_atomic(self.ack_path, json.dumps(acks, sort_keys=True).encode('utf-8'))
+                self._acks = acks
+            except OSError as e:
+                logger.error(f"Failed to acknowledge journal positions in {self.ack_path}: {e}")
+        return result
+
+    def rotate(self) -> int:
+        """
+        Cut the entries of this node's journal that every peer has merged.
+
+        The peers are the nodes with a journal or an acknowledgement file in
+        the journal directory; one that has not acknowledged this journal
+        keeps it whole. The remaining entries are written behind a header
+        recording their position, so the positions peers hold stay valid,
+        and the file is replaced atomically, so a peer reading the old one
+        finishes it unaffected. A node that joins later has to start from a
+        peer's database, e.g. with ``pull_database``.
+
+        Returns:
+            Number of bytes cut
+        """
+        peers = set()
+        try:
+            for name in os.listdir(self.journal_dir):
+                for suffix in (JOURNAL_SUFFIX, ACK_SUFFIX):
+                    peer = name[:-len(suffix)]
+                    if name.endswith(suffix) and peer != self.node_id and _NODE_ID_PATTERN.match(peer):
+                        peers.add(peer)
+        except OSError as e:
+            logger.error(f"Failed to list journal directory {self.journal_dir}: {e}")
+            return 0
+        if not peers:
+            return 0
+
+        cut = None
+        for peer in peers:
+            try:
+                with open(os.path.join(self.journal_dir, peer + ACK_SUFFIX), 'rb') as file:
+                    position = int(json.load(file).get(self.node_id, 0))
+            except FileNotFoundError:
+                position = 0
+            except (OSError, ValueError, TypeError, AttributeError) as e:
+                logger.error(f"Failed to read the acknowledgements of {peer}: {e}")
+                position = 0
+            cut = position if cut is None else min(cut, position)
+
+        with self._lock:
+            try:
+                with open(self.journal_path, 'rb') as journal:
+                    base, first = _journal_start(journal)
+                    size = base + os.fstat(journal.fileno()).st_size
+                    # Positions past the end were acknowledged for a journal that has since been recreated
+                    if cut - first < max(self.rotate_bytes, 1) or cut > size:
+                        return 0
+                    journal.seek(cut - base)
+                    rest = journal.read()
+                write_atomic(self.journal_path, _journal_header(cut - _HEADER_SIZE) + rest)
+            except FileNotFoundError:
+                return 0
+            except OSError as e:
+                # e.g. on Windows while a peer has the journal open
+                logger.warning(f"Failed to rotate journal {self.journal_path}, retrying on the next sync: {e}")
+                return 0
+
+        self.rotated_bytes += cut - first
+        logger.info(f"Rotated {self.journal_path}: cut {cut - first} bytes merged by every peer")
+        return cut - first
+
+    def pull_journal(self, peer: str, journal_path: str) -> dict:
+        """
+        Merge the entries of one peer journal after the recorded byte offset.
+
+        A trailing line without newline is still being written and is left
+        for the next pull. Entries written before ``seen_us`` carry a local
+        ISO ``last_seen``, read in this node's time zone. If the journal was
+        rotated past the recorded offset, the entries cut are skipped.
+
+        Args:
+            peer: Node id of the journal's owner
+            journal_path: Path of the journal file
+
+        Returns:
+            dict: Numbers of 'applied' and 'conflicts' changes
+        """
+        key = f'journal:{peer}'
+        result = {'applied': 0, 'conflicts': 0}
+        with self._lock:
+            offset = self.db.get_replication_cursor(key)
+            try:
+                journal = open(journal_path, 'rb')
+            except OSError as e:
+                logger.error(f"Failed to read journal {journal_path}: {e}")
+                return result
+
+            with journal:
+                base, first = _journal_start(journal)
+                size = base + os.fstat(journal.fileno()).st_size
+                if size < offset:
+                    logger.warning(f"Journal {journal_path} shrank, replaying it from the start")
+                    offset = 0
+                if size == offset:
+                    return result
+                if offset < first:
+                    logger.warning(f"Journal {journal_path} was rotated past position {offset}, "
+                                   f"skipping {first - offset} bytes not merged from it")
+                    offset = first
+
+                journal.seek(offset - base)
+                while True:
+                    batch_start = offset
+                    changes: List[tuple] = []
+                    while len(changes) < self.batch_size:
+                        line = journal.readline()
+                        if not line.endswith(b'\n'):
+                            break
+                        offset += len(line)
+                        try:
+                            record = json.loads(line)
+                            seen_us = int(record['seen_us']) if 'seen_us' in record else \
+                                to_epoch_us(record['last_seen'])
+                            changes.append((record['domain'], record['origin'], bool(record['active']), seen_us))
+                        except (ValueError, KeyError, TypeError) as e:
+                            self.errors += 1
+                            logger.error(f"Skipping malformed entry in {journal_path}: {e}")
+
+                    if offset > batch_start:
+                        self._merge(peer, changes, (key, offset), result)
+                    if len(changes) < self.batch_size:
+                        break
+        return result
+
+    def pull_database(self, peer_db_path: str, peer: Optional[str] = None) -> dict:
+        """
+        Merge the changes made on a peer directly from its database file.
+
+        The peer's database is opened read-only and never migrated, so it
+        must exist and be at the schema version of this node.
+
+        Args:
+            peer_db_path: Path of the peer's SQLite database
+            peer: Node id of the peer; defaults to the database file name
+
+        Returns:
+            dict: Numbers of 'applied' and 'conflicts' changes
+
+        Raises:
+            FileNotFoundError: If the peer database does not exist
+            RuntimeError: If the peer database has another schema version
+        """
+        peer_db_path = os.path.abspath(peer_db_path)
+        peer = peer or os.path.splitext(os.path.basename(peer_db_path))[0]
+        key = f'db:{peer_db_path}'
+        result = {'applied': 0, 'conflicts': 0}
+        with self._lock:
+            peer_db = self._peer_dbs.get(peer_db_path)
+            if peer_db is None:
+                peer_db = self._peer_dbs[peer_db_path] = IgnoreHostsDB(peer_db_path, read_only=True)
+
+            seq = self.db.get_replication_cursor(key)
+            while True:
+                changes = peer_db.get_local_changes_since(seq, self.batch_size)
+                if not changes:
+                    break
+                seq = changes[-1][0]
+                self._merge(peer, [(domain, origin, active, seen_us)
+                                   for _, domain, origin, active, seen_us in changes], (key, seq), result)
+                if len(changes) < self.batch_size:
+                    break
+        return result
+
+    def stats(self) -> dict:
+        """Get replication counters."""
+        return {
+            'node_id': self.node_id,
+            'published': self.published,
+            'applied': self.applied,
+            'conflicts': self.conflicts,
+            'errors': self.errors,
+            'rotated_bytes': self.rotated_bytes,
+        }
+
+    def _merge(self, peer: str, changes: List[tuple], cursor: tuple, result: dict):
+        """Merge a batch of peer changes and advance its cursor in the same transaction."""
+        merged = self.db.apply_remote_changes(peer, changes, cursor=cursor)
+        result['applied'] += merged['applied']
+        result['conflicts'] += merged['conflicts']
+        self.applied += merged['applied']
+        self.conflicts += merged['conflicts']
+
+    def _run(self):
+        """Worker loop syncing every interval."""
+        while not self._stopping.wait(self.interval):
+            try:
+                self.sync()
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Replication sync failed: {e}")
+        # Release this thread's connections
+        self.db.connections.close()
+        for peer_db in self._peer_dbs.values():
+            peer_db.connections.close()
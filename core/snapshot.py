@@ -0,0 +1,534 @@
+"""
+Memory-mapped snapshot of the HttpPro ignore list.
+
+A snapshot is a read-only binary file holding the active ignore rules in a
+form that is used in place instead of being loaded: rule names sorted by their
+reversed labels (``com.example.api``), so that a domain and its subdomains are
+stored together, each one length-prefixed, an offset index over them, an
+open-addressing hash table of the names and the rules rendered as text, one
+per line, for the compatibility file export. Processes map
+the file with ``mmap``, so starting the proxy no longer turns every domain
+into a Python string, and all proxy processes on a host share one page-cache
+copy of the list.
+
+File layout (integers in the byte order recorded in the header)::
+
+    header    _HEADER
+    index     uint32 offset of each name in the names section, in key order
+    lines     uint32 offset of each name's first line in the text section, in key order
+    table     per hash slot: uint32 CRC-32 of the key, uint32 index position + 1 (0 for an empty slot)
+    names     per name: uint16 length, uint8 rule modes, UTF-8 name
+    text      per name: "name\n" if it matches itself, then "*.name\n" if it matches subdomains only
+    networks  canonical networks, each followed by a newline; the text section continues into it
+"""
+
+import array
+import logging
+import mmap
+import struct
+import sys
+import time
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from core.exporter import write_atomic
+from core.iptree import is_network_rule
+from core.matcher import MATCH_EXACT, MATCH_SUBDOMAIN, MATCH_WILDCARD, normalize_host, parse_pattern
+
+logger = logging.getLogger('httppro.snapshot')
+
+MAGIC = b'HPSNAP\r\n'
+FORMAT_VERSION = 2
+
+# magic, format version, byte order (0 little, 1 big), names, rules, networks, hash slots,
+# change seq, created at (epoch us), offsets of the index, lines, table, names, text and networks sections
+_HEADER = struct.Struct('<8sHHIIIIQQQQQQQQ')
+_ENTRY = struct.Struct('<HB')
+
+_BYTE_ORDER = 0 if sys.byteorder == 'little' else 1
+
+_MATCHES_SELF = MATCH_EXACT | MATCH_SUBDOMAIN
+_MATCHES_CHILDREN = MATCH_WILDCARD | MATCH_SUBDOMAIN
+
+
+def reverse_labels(name: bytes) -> bytes:
+    """Get the sort key of a name: its labels in reverse order, ``api.example.com`` -> ``com.example.api``."""
+    return b'.'.join(reversed(name.split(b'.')))
+
+
+def _align(buffer: bytearray, size: int = 8):
+    buffer.extend(b'\0' * (-len(buffer) % size))
+
+
+def write_snapshot(file_path: str, rules: Iterable[str], change_seq: int = 0) -> dict:
+    """
+    Write a snapshot file.
+
+    The file is replaced atomically, so processes that mapped the previous
+    snapshot keep a consistent view until they reopen it.
+
+    Args:
+        file_path: Path of the snapshot
+        rules: Active rules: domains, ``*.`` wildcard rules and canonical networks
+        change_seq: Sequence number of the last change log entry the rules reflect
+
+    Returns:
+        dict: Number of domain 'rules' and 'networks', and the file size in 'bytes'
+    """
+    modes: Dict[bytes, int] = {}
+    networks: List[str] = []
+    rule_count = 0
+    for rule in rules:
+        if is_network_rule(rule):
+            networks.append(rule)
+            continue
+        name, mode = parse_pattern(rule)
+        key = name.encode('utf-8')
+        if not name or len(key) > 0xFFFF:
+            continue
+        current = modes.get(key, 0)
+        if not current & mode:
+            rule_count += 1
+        modes[key] = current | mode
+
+    keys = sorted(modes, key=reverse_labels)
+    slots = 8
+    while slots < 2 * len(keys):
+        slots <<= 1
+    mask = slots - 1
+
+    index = array.array('I')
+    lines = array.array('I')
+    table = array.array('I', bytes(8 * slots))
+    names = bytearray()
+    text = bytearray()
+    for position, key in enumerate(keys, 1):
+        index.append(len(names))
+        names += _ENTRY.pack(len(key), modes[key])
+        names += key
+        lines.append(len(text))
+        if modes[key] & _MATCHES_SELF:
+            text += key + b'\n'
+        if modes[key] & MATCH_WILDCARD:
+            text += b'*.' + key + b'\n'
+        digest = zlib.crc32(key)
+        slot = digest & mask
+        while table[2 * slot + 1]:
+            slot = (slot + 1) & mask
+        table[2 * slot] = digest
+        table[2 * slot + 1] = position
+
+    body = bytearray(_HEADER.size)
+    _align(body)
+    index_offset = len(body)
+    body += index.tobytes()
+    lines_offset = len(body)
+    body += lines.tobytes()
+    _align(body)
+    table_offset = len(body)
+    body += table.tobytes()
+    names_offset = len(body)
+    body += names
+    text_offset = len(body)
+    body += text
+    networks_offset = len(body)
+    body += ''.join(network + '\n' for network in networks).encode('ascii')
+    _HEADER.pack_into(body, 0, MAGIC, FORMAT_VERSION, _BYTE_ORDER, len(keys), rule_count, len(networks), slots,
+                      change_seq, time.time_ns() // 1000, index_offset, lines_offset, table_offset, names_offset,
+                      text_offset, networks_offset)
+
+    write_atomic(file_path, bytes(body))
+    logger.info(f"Wrote snapshot of {rule_count} rules and {len(networks)} networks to {file_path} "
+                f"({len(body)} bytes, seq {change_seq})")
+    return {'rules': rule_count, 'networks': len(networks), 'bytes': len(body)}
+
+
+class Snapshot:
+    """
+    Read-only view of a snapshot file mapped into memory.
+
+    Lookups hash the encoded name and compare it with the mapped bytes, so
+    only the probed names are ever read and no Python string is built per
+    stored rule.
+    """
+
+    def __init__(self, file_path: str):
+        """
+        Map a snapshot file.
+
+        Args:
+            file_path: Path of a file written by write_snapshot
+
+        Raises:
+            OSError: If the file cannot be read
+            ValueError: If the file is not a snapshot of this format and byte order
+        """
+        self.file_path = file_path
+        with open(file_path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self._map) < _HEADER.size:
+                raise ValueError(f"{file_path} is not a snapshot")
+            (magic, version, byte_order, self.name_count, self.rule_count, self.network_count, slots,
+             self.change_seq, self.created_at, index_offset, lines_offset, table_offset, names_offset,
+             text_offset, networks_offset) = _HEADER.unpack_from(self._map)
+            if magic != MAGIC or version != FORMAT_VERSION or byte_order != _BYTE_ORDER:
+                raise ValueError(f"{file_path} is not a snapshot of format {FORMAT_VERSION}")
+
+            view = memoryview(self._map)
+            self._index = view[index_offset:index_offset + 4 * self.name_count].cast('I')
+            self._lines = view[lines_offset:lines_offset + 4 * self.name_count].cast('I')
+            self._table = view[table_offset:table_offset + 8 * slots].cast('I')
+            view.release()
+        except Exception:
+            self._map.close()
+            raise
+        self._mask = slots - 1
+        self._names_offset = names_offset
+        self._text_offset = text_offset
+        self._networks_offset = networks_offset
+        self._network_set: Optional[set] = None
+
+    def close(self):
+        """Unmap the file."""
+        self._index.release()
+        self._lines.release()
+        self._table.release()
+        self._map.close()
+
+    @property
+    def size(self) -> int:
+        """Get the size of the mapped file in bytes."""
+        return len(self._map)
+
+    def mode_of(self, key: bytes) -> int:
+        """
+        Get the rule modes stored for a name.
+
+        Args:
+            key: UTF-8 encoded name
+
+        Returns:
+            Bit mask of MATCH_* modes, 0 if the name is not in the snapshot
+        """
+        position = self._position(key)
+        return self._map[self._names_offset + self._index[position - 1] + 2] if position else 0
+
+    def _position(self, key: bytes) -> int:
+        """Get the index position + 1 of a name, 0 if it is not in the snapshot."""
+        table = self._table
+        mask = self._mask
+        digest = zlib.crc32(key)
+        slot = digest & mask
+        while True:
+            position = table[2 * slot + 1]
+            if not position:
+                return 0
+            # Only a matching CRC-32 reads the name itself
+            if table[2 * slot] == digest:
+                data = self._map
+                offset = self._names_offset + self._index[position - 1]
+                length = len(key)
+                if data[offset] | data[offset + 1] << 8 == length and data[offset + 3:offset + 3 + length] == key:
+                    return position
+            slot = (slot + 1) & mask
+
+    def _line_of(self, rule: str) -> Optional[tuple]:
+        """Get the (start, end) offsets of a rule's line in the text or networks section, None if absent."""
+        data = self._map
+        if is_network_rule(rule):
+            line = rule.encode('ascii') + b'\n'
+            start = data.find(line, self._networks_offset)
+            while start > self._networks_offset and data[start - 1] != 0x0A:
+                start = data.find(line, start + 1)
+            return (start, start + len(line)) if start != -1 else None
+
+        name, mode = parse_pattern(rule)
+        key = name.encode('utf-8')
+        position = self._position(key) if name else 0
+        if not position:
+            return None
+        stored = data[self._names_offset + self._index[position - 1] + 2]
+        start = self._text_offset + self._lines[position - 1]
+        if mode & MATCH_WILDCARD:
+            if not stored & MATCH_WILDCARD:
+                return None
+            if stored & _MATCHES_SELF:
+                start += len(key) + 1
+            return start, start + len(key) + 3
+        if not stored & _MATCHES_SELF:
+            return None
+        return start, start + len(key) + 1
+
+    def names(self) -> Iterator[tuple]:
+        """Iterate over (name, modes) in reversed-label order."""
+        data = self._map
+        for relative in self._index:
+            offset = self._names_offset + relative
+            length, mode = _ENTRY.unpack_from(data, offset)
+            yield data[offset + 3:offset + 3 + length].decode('utf-8'), mode
+
+    def networks(self) -> List[str]:
+        """Get the network rules."""
+        return self._map[self._networks_offset:].decode('ascii').splitlines()
+
+    def render(self, removed: Iterable[str] = ()) -> bytes:
+        """
+        Render the rules one per line, in the order of iteration.
+
+        The text and networks sections are copied as they are, so no Python
+        string is built per rule; only the lines of removed rules are cut.
+
+        Args:
+            removed: Rules of the snapshot to leave out
+
+        Returns:
+            bytes: UTF-8 text with a newline after every rule
+        """
+        data = self._map
+        parts = []
+        position = self._text_offset
+        for start, end in sorted(filter(None, map(self._line_of, removed))):
+            parts.append(data[position:start])
+            position = end
+        parts.append(data[position:])
+        return b''.join(parts)
+
+    def __contains__(self, rule: str) -> bool:
+        """Check whether a rule, as stored in the database, is in the snapshot."""
+        if is_network_rule(rule):
+            if self._network_set is None:
+                self._network_set = set(self.networks())
+            return rule in self._network_set
+        name, mode = parse_pattern(rule)
+        return bool(name) and self.mode_of(name.encode('utf-8')) & mode == mode
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the rules: domains and ``*.`` wildcard rules, then networks."""
+        for name, mode in self.names():
+            if mode & (MATCH_SUBDOMAIN | MATCH_EXACT):
+                yield name
+            if mode & MATCH_WILDCARD:
+                yield '*.' + name
+        yield from self.networks()
+
+    def __len__(self) -> int:
+        """Get the number of rules, networks included."""
+        return self.rule_count + self.network_count
+
+
+def open_snapshot(file_path: str) -> Optional[Snapshot]:
+    """
+    Map a snapshot file if there is a valid one.
+
+    Returns:
+        The snapshot, or None if the file is missing or not a snapshot of this format
+    """
+    try:
+        return Snapshot(file_path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unusable snapshot {file_path}: {e}")
+        return None
+
+
+class SnapshotMatcher:
+    """
+    HostMatcher over a snapshot, with in-memory changes on top.
+
+    Rules added or removed after the snapshot was written are kept as mode
+    bits added to or masked from the snapshot's, keyed by encoded name, so
+    memory only grows with the changes.
+    """
+
+    def __init__(self, snapshot: Snapshot):
+        """
+        Initialize matcher.
+
+        Args:
+            snapshot: Mapped snapshot holding the initial rules
+        """
+        self.snapshot = snapshot
+        self._added: Dict[bytes, int] = {}
+        self._removed: Dict[bytes, int] = {}
+
+    def _modes(self, key: bytes) -> int:
+        modes = self.snapshot.mode_of(key)
+        if self._removed:
+            modes &= ~self._removed.get(key, 0)
+        if self._added:
+            modes |= self._added.get(key, 0)
+        return modes
+
+    def add(self, pattern: str, mode: Optional[int] = None) -> bool:
+        """
+        Add an ignore rule.
+
+        Args:
+            pattern: Domain name, or "*.name" for a wildcard rule
+            mode: Optional explicit mode overriding the pattern syntax
+
+        Returns:
+            True if the rule was not present before
+        """
+        name, parsed_mode = parse_pattern(pattern)
+        if mode is None:
+            mode = parsed_mode
+        if not name:
+            return False
+
+        key = name.encode('utf-8')
+        if self._modes(key) & mode == mode:
+            return False
+        removed = self._removed.get(key, 0) & ~mode
+        if removed:
+            self._removed[key] = removed
+        else:
+            self._removed.pop(key, None)
+        added = mode & ~self.snapshot.mode_of(key)
+        if added:
+            self._added[key] = self._added.get(key, 0) | added
+        return True
+
+    def update(self, patterns: Iterable[str]):
+        """Add several ignore rules."""
+        for pattern in patterns:
+            self.add(pattern)
+
+    def remove(self, pattern: str, mode: Optional[int] = None) -> bool:
+        """
+        Remove an ignore rule.
+
+        Returns:
+            True if the rule was present
+        """
+        name, parsed_mode = parse_pattern(pattern)
+        if mode is None:
+            mode = parsed_mode
+
+        key = name.encode('utf-8')
+        if not self._modes(key) & mode:
+            return False
+        added = self._added.get(key, 0) & ~mode
+        if added:
+            self._added[key] = added
+        else:
+            self._added.pop(key, None)
+        removed = mode & self.snapshot.mode_of(key)
+        if removed:
+            self._removed[key] = self._removed.get(key, 0) | removed
+        return True
+
+    def match(self, host: Optional[str]) -> Optional[str]:
+        """
+        Find the rule covering a host, like HostMatcher.match.
+
+        Args:
+            host: Host name or IP address; it is expected to be lowercase
+
+        Returns:
+            The matching rule name, or None if the host is not ignored
+        """
+        if not host:
+            return None
+
+        encoded = host.encode('utf-8')
+        modes = self._modes
+        if modes(encoded) & _MATCHES_SELF:
+            return host
+
+        dot = encoded.find(b'.')
+        while dot != -1:
+            suffix = encoded[dot + 1:]
+            if modes(suffix) & _MATCHES_CHILDREN:
+                return suffix.decode('utf-8')
+            dot = encoded.find(b'.', dot + 1)
+        return None
+
+    def __contains__(self, host: str) -> bool:
+        """Check whether a host is covered by any rule."""
+        return self.match(normalize_host(host)) is not None
+
+    def __len__(self) -> int:
+        """Get the number of distinct rule names."""
+        count = self.snapshot.name_count
+        for key in self._removed:
+            if not self._modes(key):
+                count -= 1
+        for key in self._added:
+            if not self.snapshot.mode_of(key):
+                count += 1
+        return count
+
+
+class SnapshotRules:
+    """
+    Set of rule strings over a snapshot, with in-memory additions and removals.
+
+    Provides the set operations the TLS plugin uses on its ignore list
+    (``in``, add, discard, iteration, len and copy) without materializing
+    the rules of the snapshot.
+    """
+
+    def __init__(self, snapshot: Snapshot, added: Iterable[str] = (), removed: Iterable[str] = ()):
+        """
+        Initialize rule set.
+
+        Args:
+            snapshot: Mapped snapshot holding the initial rules
+            added: Rules added on top of the snapshot
+            removed: Rules of the snapshot removed since
+        """
+        self.snapshot = snapshot
+        self._added = set(added)
+        self._removed = set(removed)
+
+    def __contains__(self, rule: str) -> bool:
+        """Check whether a rule is in the set."""
+        return rule in self._added or (rule not in self._removed and rule in self.snapshot)
+
+    def add(self, rule: str):
+        """Add a rule."""
+        if rule in self.snapshot:
+            self._removed.discard(rule)
+        else:
+            self._added.add(rule)
+
+    def discard(self, rule: str):
+        """Remove a rule if present."""
+        self._added.discard(rule)
+        if rule in self.snapshot:
+            self._removed.add(rule)
+
+    def copy(self) -> 'SnapshotRules':
+        """Get a copy sharing the snapshot; only the in-memory changes are copied."""
+        return SnapshotRules(self.snapshot, self._added.copy(), self._removed.copy())
+
+    def render(self, skip: Iterable[str] = ()) -> bytes:
+        """
+        Render the rules one per line for a text export.
+
+        The rules of the snapshot are copied from its text section, so only
+        the in-memory additions become Python strings.
+
+        Args:
+            skip: Added rules to leave out, such as a marker
+
+        Returns:
+            bytes: Rules of the snapshot still present in iteration order, then the added ones sorted
+        """
+        added = sorted(self._added.difference(skip))
+        return self.snapshot.render(self._removed) + ''.join(rule + '\n' for rule in added).encode('utf-8')
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the rules: those of the snapshot still present, then the added ones."""
+        removed = self._removed
+        for rule in self.snapshot:
+            if rule not in removed:
+                yield rule
+        yield from self._added
+
+    def __len__(self) -> int:
+        """Get the number of rules."""
+        return len(self.snapshot) - len(self._removed) + len(self._added)
@@ -0,0 +1,337 @@
+"""
+Write-behind recorder for HttpPro ignore hosts.
+
+This module queues domain failures in memory and persists them from a
+background thread in batched transactions, so that mitmproxy event hooks
+never wait on SQLite commits.
+"""
+
+import queue
+import threading
+import time
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger('httppro.writer')
+
+# Stand-in for an item when the worker wakes up because a timer elapsed
+_TIMER = object()
+
+
+class _FlushRequest:
+    """Queued by flush(): wakes the worker up and reports whether the pending entries were written."""
+
+    __slots__ = ('done', 'written')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.written = False
+
+    def resolve(self, written: bool):
+        """Record the outcome and wake the caller up."""
+        self.written = written
+        self.done.set()
+
+
+class WriteBehindQueue:
+    """
+    Batching write-behind queue in front of IgnoreHostsDB.
+
+    Failures are appended to an in-memory queue and flushed by a daemon
+    worker thread whenever ``batch_size`` entries are pending or
+    ``flush_interval`` seconds have elapsed since the first pending entry.
+    Repeated domains within a batch are coalesced into a single row update.
+    A batch that fails to write is kept, merged with newer entries and retried
+    with exponential backoff; it is only dropped after ``max_retries`` failures.
+    Entries aggregated elsewhere, such as the repeats of the failure cache,
+    are collected by the worker every ``pull_interval`` seconds, on flush and
+    on close.
+    """
+
+    def __init__(self, db, batch_size: int = 256, flush_interval: float = 0.5,
+                 max_queue_size: int = 100000, on_flush: Optional[Callable[[int], None]] = None,
+                 max_retries: int = 3, retry_backoff: float = 0.5,
+                 pull: Optional[Callable[[], Iterable[Tuple[str, str, int]]]] = None,
+                 pull_interval: float = 5.0):
+        """
+        Initialize the write-behind queue and start its worker thread.
+
+        Args:
+            db: IgnoreHostsDB instance used to persist batches
+            batch_size: Maximum number of queued entries written per transaction
+            flush_interval: Maximum delay in seconds before pending entries are written
+            max_queue_size: Upper bound on queued entries; submissions beyond it are dropped
+            on_flush: Optional callback run on the worker thread after each batch,
+                receiving the number of newly added domains
+            max_retries: Failed writes of a batch retried before its entries are dropped
+            retry_backoff: Delay in seconds before the first retry, doubled after each failure
+            pull: Optional callable run on the worker thread, returning aggregated
+                (domain, origin, hits) entries to write, e.g. FailureCache.drain
+            pull_interval: Seconds between two calls of ``pull``
+        """
+        self.db = db
+        self.on_flush = on_flush
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.pull = pull
+        self.pull_interval = pull_interval
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # Counters
+        self.submitted = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+
+        self._worker = threading.Thread(target=self._run, name='httppro-writer', daemon=True)
+        self._worker.start()
+        logger.debug(f"Write-behind queue started (batch_size={batch_size}, flush_interval={flush_interval}s)")
+
+    def submit(self, domain: str, origin: str, hits: int = 1) -> bool:
+        """
+        Queue a domain for persistence without blocking.
+
+        Args:
+            domain: The domain to record
+            origin: Source of the ignore request
+            hits: Number of occurrences to add to the domain's count
+
+        Returns:
+            True if the entry was queued, False if the queue is closed or full
+        """
+        if self._closed:
+            logger.warning(f"Write-behind queue closed, dropping {domain}")
+            return False
+
+        try:
+            self._queue.put_nowait((domain, origin, hits))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            logger.error(f"Write-behind queue full, dropping {domain}")
+            return False
+
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Ask the worker to write all pending entries and wait until they are committed.
+
+        A batch that is being retried is waited for until it is written or
+        dropped after ``max_retries`` failures.
+
+        Args:
+            timeout: Optional maximum number of seconds to wait
+
+        Returns:
+            True if every entry queued before the call was written, False if
+            some were dropped, the wait timed out or the queue is closed
+        """
+        if self._closed:
+            return False
+        request = _FlushRequest()
+        self._queue.put(request)
+        if not request.done.wait(timeout):
+            logger.warning("Timed out waiting for write-behind flush")
+            return False
+        if not request.written:
+            logger.warning("Write-behind flush gave up: queued entries were dropped")
+        return request.written
+
+    def close(self, timeout: Optional[float] = 10.0):
+        """
+        Flush pending entries and stop the worker thread.
+
+        Args:
+            timeout: Maximum number of seconds to wait for the final flush
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join(timeout)
+        if self._worker.is_alive():
+            logger.error(f"Write-behind worker did not stop, {self._queue.qsize()} entries pending")
+        else:
+            logger.info(f"Write-behind queue closed after writing {self.written} entries in {self.batches} batches")
+
+    def stats(self) -> dict:
+        """Get queue depth and flush latency counters."""
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'submitted': self.submitted,
+                'dropped': self.dropped,
+                'written': self.written,
+                'batches': self.batches,
+                'errors': self.errors,
+                'last_flush_latency': self.last_flush_latency,
+                'max_flush_latency': self.max_flush_latency,
+                'avg_flush_latency': self.total_flush_latency / self.batches if self.batches else 0.0,
+            }
+
+    def _wait_drained(self, timeout: Optional[float]):
+        """Block until the worker has processed everything queued so far."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                logger.warning("Timed out waiting for write-behind flush")
+                return
+            time.sleep(0.005)
+
+    def _run(self):
+        """Worker loop collecting entries into size- and time-bounded batches."""
+        pending: Dict[str, Tuple[str, int]] = {}
+        pending_items = 0
+        deadline = None
+        failures = 0
+        next_pull = None if self.pull is None else time.monotonic() + self.pull_interval
+        # flush() callers waiting until the pending entries are written or dropped
+        waiters: List[_FlushRequest] = []
+
+        while True:
+            wakeup = min((t for t in (deadline, next_pull) if t is not None), default=None)
+            timeout = None if wakeup is None else max(0.0, wakeup - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+                dequeued = True
+            except queue.Empty:
+                # Flush interval, retry backoff or pull interval elapsed without new entries
+                item = _TIMER
+                dequeued = False
+
+            if item is None:
+                self._queue.task_done()
+                break
+            flush = isinstance(item, _FlushRequest)
+            if flush:
+                waiters.append(item)
+            elif item is not _TIMER:
+                pending_items += self._merge(pending, item)
+            if next_pull is not None and (flush or time.monotonic() >= next_pull):
+                pending_items += self._pull(pending)
+                next_pull = time.monotonic() + self.pull_interval
+            if pending and deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+
+            # While retrying, flushes and new entries wait for the backoff instead of triggering writes
+            if pending and ((flush and not failures) or time.monotonic() >= deadline
+                            or (not failures and pending_items >= self.batch_size)):
+                if self._write(pending, pending_items):
+                    pending, pending_items, deadline, failures = {}, 0, None, 0
+                else:
+                    failures += 1
+                    if failures > self.max_retries:
+                        self._drop(pending, pending_items, failures)
+                        pending, pending_items, deadline, failures = {}, 0, None, 0
+                        self._resolve(waiters, False)
+                    else:
+                        deadline = time.monotonic() + self._backoff(failures)
+            if not pending:
+                self._resolve(waiters, True)
+
+            if dequeued:
+                self._queue.task_done()
+
+        # Drain anything submitted concurrently with close()
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, _FlushRequest):
+                waiters.append(item)
+            elif item is not None:
+                pending_items += self._merge(pending, item)
+            self._queue.task_done()
+        if self.pull is not None:
+            pending_items += self._pull(pending)
+        while pending and not self._write(pending, pending_items):
+            failures += 1
+            if failures > self.max_retries:
+                self._drop(pending, pending_items, failures)
+                self._resolve(waiters, False)
+                break
+            time.sleep(self._backoff(failures))
+        self._resolve(waiters, True)
+
+    @staticmethod
+    def _merge(pending: Dict[str, Tuple[str, int]], item: Tuple[str, str, int]) -> int:
+        """Coalesce a queued entry into the pending batch and return the number of entries merged."""
+        domain, origin, hits = item
+        if domain in pending:
+            pending[domain] = (pending[domain][0], pending[domain][1] + hits)
+        else:
+            pending[domain] = (origin, hits)
+        return 1
+
+    def _pull(self, pending: Dict[str, Tuple[str, int]]) -> int:
+        """Coalesce the entries returned by ``pull`` into the pending batch and return their number."""
+        try:
+            items = self.pull()
+        except Exception as e:
+            logger.error(f"Failed to collect aggregated entries: {e}")
+            return 0
+        return sum(self._merge(pending, item) for item in items)
+
+    @staticmethod
+    def _resolve(waiters: List[_FlushRequest], written: bool):
+        """Report the outcome of the pending entries to the waiting flush() callers."""
+        for request in waiters:
+            request.resolve(written)
+        waiters.clear()
+
+    def _backoff(self, failures: int) -> float:
+        """Delay before retrying a batch that failed ``failures`` times in a row."""
+        return self.retry_backoff * 2 ** (failures - 1)
+
+    def _drop(self, pending: Dict[str, Tuple[str, int]], item_count: int, failures: int):
+        """Give up on a batch that kept failing."""
+        with self._lock:
+            self.dropped += item_count
+        logger.error(f"Dropping {item_count} queued entries for {len(pending)} domains after {failures} failed writes")
+
+    def _write(self, pending: Dict[str, Tuple[str, int]], item_count: int) -> bool:
+        """
+        Persist one coalesced batch and update latency counters.
+
+        Returns:
+            True if the batch was written, False if it should be retried
+        """
+        start = time.perf_counter()
+        try:
+            added = self.db.add_domains(
+                (domain, origin, hits) for domain, (origin, hits) in pending.items()
+            )
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            logger.error(f"Failed to flush {len(pending)} queued domains: {e}")
+            return False
+
+        latency = time.perf_counter() - start
+        with self._lock:
+            self.written += item_count
+            self.batches += 1
+            self.last_flush_latency = latency
+            self.total_flush_latency += latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+        logger.debug(f"Flushed {len(pending)} domains ({added} new) in {latency * 1000:.1f} ms")
+
+        if self.on_flush is not None:
+            try:
+                self.on_flush(added)
+            except Exception as e:
+                logger.error(f"Write-behind flush callback failed: {e}")
+        return True
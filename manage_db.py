@@ -10,6 +10,9 @@ import sys
 import os
 import argparse
 import logging
+import csv
+import json
+from collections import Counter
 from datetime import datetime
 
 # Fix encoding for Windows console
@@ -22,7 +25,10 @@ if sys.platform == "win32":
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'core'))
 
 try:
-    from core.database import IgnoreHostsDB
+    from core.database import CHANGE_LOG_KEEP, IgnoreHostsDB, open_domain_file, parse_pattern
+    from core.replication import Replicator
+    from core.compaction import Compactor, DEFAULT_AGGREGATE_THRESHOLD, parse_duration, parse_ttls
+    from core.iptree import NetworkMatcher, canonical_network
 except ImportError:
     print("Error: Could not import database module. Make sure you're running from the correct directory.")
     sys.exit(1)
@@ -33,28 +39,60 @@ logging.basicConfig(
     format='%(levelname)s: %(message)s'
 )
 
-def list_domains(db: IgnoreHostsDB, show_inactive: bool = False):
-    """List all domains with their information."""
-    domains = db.get_all_domains_info()
-    
-    if not domains:
-        print("No domains found in database.")
-        return
-    
-    active_count = sum(1 for _, _, _, _, _, active in domains if active)
-    total_count = len(domains)
-    
-    print(f"Found {total_count} domains in database ({active_count} active, {total_count - active_count} inactive)\n")
-    print(f"{'Domain':<40} {'Origin':<20} {'Added':<20} {'Count':<6} {'Status'}")
-    print("-" * 95)
+LIST_FIELDS = ('domain', 'origin', 'date_added', 'last_seen', 'count', 'active')
+
+def list_domains(db: IgnoreHostsDB, show_inactive: bool = False, origin: str = None, since: str = None,
+                 until: str = None, after: str = None, limit: int = None, output_format: str = "table"):
+    """Stream domains in domain order as a table, CSV or JSON lines."""
+    rows = db.iter_domains(active=None if show_inactive else True, origin=origin, since=since,
+                           until=until, after=after, limit=limit)
     
-    for domain, origin, date_added, last_seen, count, active in domains:
-        if not show_inactive and not active:
-            continue
-            
-        status = "Active" if active else "Inactive"
-        date_str = datetime.fromisoformat(date_added).strftime("%Y-%m-%d %H:%M")
-        print(f"{domain:<40} {origin:<20} {date_str:<20} {count:<6} {status}")
+    header = None
+    if output_format == "table":
+        stats = db.get_stats()
+        header = (f"Database has {stats.get('total_domains', 0)} domains ({stats.get('active_domains', 0)} active, "
+                  f"{stats.get('inactive_domains', 0)} inactive)\n")
+    print_domains(rows, output_format, limit, header)
+
+def print_domains(rows, output_format: str = "table", limit: int = None, header: str = None):
+    """Stream domain rows as a table, CSV or JSON lines."""
+    try:
+        if output_format == "csv":
+            writer = csv.writer(sys.stdout)
+            writer.writerow(LIST_FIELDS)
+            for row in rows:
+                writer.writerow(row[:5] + (int(bool(row[5])),))
+            return
+        
+        if output_format == "jsonl":
+            for row in rows:
+                record = dict(zip(LIST_FIELDS, row))
+                record['active'] = bool(record['active'])
+                sys.stdout.write(json.dumps(record) + "\n")
+            return
+        
+        if header:
+            print(header)
+        print(f"{'Domain':<40} {'Origin':<20} {'Added':<20} {'Count':<6} {'Status'}")
+        print("-" * 95)
+        
+        listed = 0
+        last = None
+        for domain, origin, date_added, last_seen, count, active in rows:
+            status = "Active" if active else "Inactive"
+            # ISO timestamps sort and slice as text, no need to parse every row
+            date_str = date_added[:16].replace('T', ' ')
+            print(f"{domain:<40} {origin:<20} {date_str:<20} {count:<6} {status}")
+            listed += 1
+            last = domain
+        
+        if listed == 0:
+            print("No domains found.")
+        elif limit is not None and listed == limit:
+            print(f"\n{listed} domains listed; next page: --after {last}")
+    except BrokenPipeError:
+        # Output piped into head or similar; silence the flush at exit
+        sys.stdout = open(os.devnull, 'w')
 
 def add_domain(db: IgnoreHostsDB, domain: str, origin: str = "manual"):
     """Add a domain to the database."""
@@ -70,14 +108,87 @@ def remove_domain(db: IgnoreHostsDB, domain: str):
     else:
         print(f"Domain not found: {domain}")
 
-def show_stats(db: IgnoreHostsDB):
+def read_batch(domain: str = None, files=()) -> tuple:
+    """
+    Collect the domains of a batch add or remove.
+    
+    Args:
+        domain: A single domain, or '-' to read domains from stdin
+        files: Files (plain text or gzip) with one domain per line
+    
+    Returns:
+        tuple: (domains in input order, number of blank, comment and marker lines skipped)
+    """
+    def lines():
+        if domain == "-":
+            yield from sys.stdin
+        elif domain:
+            yield domain
+        for file_path in files:
+            with open_domain_file(file_path) as file:
+                yield from file
+    
+    domains = []
+    skipped = 0
+    for line in lines():
+        value = line.strip()
+        if not value or value.startswith('#') or value == 'plugin-tls-loaded':
+            skipped += 1
+        else:
+            domains.append(value)
+    return domains, skipped
+
+def print_batch_results(domains, results: dict, output_format: str):
+    """Print one JSON line per input domain, or nothing for the summary format."""
+    if output_format != "jsonl":
+        return
+    try:
+        for domain in domains:
+            rule = canonical_network(domain) or domain
+            sys.stdout.write(json.dumps({'domain': domain, 'rule': rule, 'status': results[rule]}) + "\n")
+    except BrokenPipeError:
+        sys.stdout = open(os.devnull, 'w')
+
+def add_domains_batch(db: IgnoreHostsDB, domains, skipped: int = 0, origin: str = "manual",
+                      output_format: str = "summary"):
+    """Add many domains in one transaction."""
+    results = db.add_domain_batch(domains, origin)
+    print_batch_results(domains, results, output_format)
+    if output_format == "summary":
+        counts = Counter(results.values())
+        print(f"Added {counts['added']} new domains ({counts['reactivated']} reactivated, "
+              f"{counts['updated']} existing updated, {skipped} lines skipped)")
+
+def remove_domains_batch(db: IgnoreHostsDB, domains, skipped: int = 0, output_format: str = "summary"):
+    """Remove (deactivate) many domains in one transaction."""
+    results = db.remove_domain_batch(domains)
+    print_batch_results(domains, results, output_format)
+    if output_format == "summary":
+        counts = Counter(results.values())
+        print(f"Deactivated {counts['removed']} domains ({counts['inactive']} already inactive, "
+              f"{counts['not_found']} not found, {skipped} lines skipped)")
+
+def show_stats(db: IgnoreHostsDB, check: bool = False):
     """Show database statistics."""
+    if check:
+        drift = db.reconcile_stats()
+        if drift:
+            print("Statistics counters were out of sync and have been rebuilt:")
+            for (kind, origin, active), (counted, actual) in sorted(drift.items()):
+                status = "active" if active else "inactive"
+                print(f"   {origin} ({status} {kind}): counted {counted}, actual {actual}")
+            print()
+        else:
+            print("Statistics counters are consistent.\n")
+    
     stats = db.get_stats()
     
     print("Database Statistics:")
     print(f"   Total domains: {stats.get('total_domains', 0)}")
     print(f"   Active domains: {stats.get('active_domains', 0)}")
     print(f"   Inactive domains: {stats.get('inactive_domains', 0)}")
+    print(f"   Active networks: {stats.get('active_networks', 0)}")
+    print(f"   Inactive networks: {stats.get('inactive_networks', 0)}")
     
     origins = stats.get('origins', {})
     if origins:
@@ -86,13 +197,20 @@ def show_stats(db: IgnoreHostsDB):
             print(f"   {origin}: {count}")
 
 def import_file(db: IgnoreHostsDB, file_path: str, origin: str = "file_import"):
-    """Import domains from a file."""
+    """Import domains from a file, or from stdin if the path is '-'."""
+    if file_path == "-":
+        result = db.import_domains(sys.stdin, origin)
+        print(f"Imported {result['inserted']} new domains from stdin "
+              f"({result['updated']} existing updated, {result['skipped']} lines skipped)")
+        return
+    
     if not os.path.exists(file_path):
         print(f"File not found: {file_path}")
         return
     
-    count = db.import_from_file(file_path, origin)
-    print(f"Imported {count} domains from {file_path}")
+    result = db.bulk_import_file(file_path, origin)
+    print(f"Imported {result['inserted']} new domains from {file_path} "
+          f"({result['updated']} existing updated, {result['skipped']} lines skipped)")
 
 def export_file(db: IgnoreHostsDB, file_path: str):
     """Export active domains to a file."""
@@ -101,6 +219,13 @@ def export_file(db: IgnoreHostsDB, file_path: str):
     else:
         print(f"Failed to export to {file_path}")
 
+def write_snapshot_file(db: IgnoreHostsDB, file_path: str = None):
+    """Write the ignore list snapshot mapped by the TLS plugin at startup."""
+    file_path = file_path or db.snapshot_path
+    result = db.export_snapshot(file_path)
+    print(f"Wrote snapshot of {result['rules']} domains and {result['networks']} networks to {file_path} "
+          f"({result['bytes']} bytes, change {result['change_seq']})")
+
 def search_domain(db: IgnoreHostsDB, domain: str):
     """Search for a specific domain."""
     info = db.get_domain_info(domain)
@@ -121,6 +246,120 @@ def search_domain(db: IgnoreHostsDB, domain: str):
     else:
         print(f"Domain not found: {domain}")
 
+def search_domains(db: IgnoreHostsDB, pattern: str = None, suffix: str = None, prefix: str = None,
+                   contains: str = None, active_only: bool = False, after: str = None, limit: int = None,
+                   output_format: str = "table"):
+    """Search domains by wildcard pattern, suffix, prefix or substring."""
+    filters = {'suffix': suffix, 'prefix': prefix, 'contains': contains}
+    if pattern is not None:
+        try:
+            filters.update(parse_pattern(pattern))
+        except ValueError as e:
+            print(e)
+            return
+    
+    if 'domain' in filters and not (suffix or prefix or contains):
+        search_domain(db, filters['domain'])
+        return
+    filters.pop('domain', None)
+    
+    rows = db.iter_domains(active=True if active_only else None, after=after, limit=limit, **filters)
+    print_domains(rows, output_format, limit)
+
+def create_index(db: IgnoreHostsDB, drop: bool = False):
+    """Create or drop the substring search index."""
+    if drop:
+        db.drop_substring_index()
+        print("Dropped the substring search index")
+    elif db.create_substring_index():
+        print("Substring search index is ready")
+    else:
+        print("This SQLite library does not support FTS5 trigram indexes; --contains searches scan the table")
+
+def replicate(db: IgnoreHostsDB, journal_dir: str, node_id: str = None, peer_dbs=()):
+    """Publish local changes and merge changes from peer journals and databases."""
+    replicator = Replicator(db, journal_dir, node_id)
+    try:
+        result = replicator.sync()
+        for peer_db in peer_dbs:
+            merged = replicator.pull_database(peer_db)
+            result['applied'] += merged['applied']
+            result['conflicts'] += merged['conflicts']
+    finally:
+        replicator.close()
+    
+    print(f"Replicated as {replicator.node_id}: {result['published']} changes published, "
+          f"{result['applied']} applied, {result['conflicts']} conflicts resolved locally")
+
+def compact(db: IgnoreHostsDB, ttls=(), max_active: int = 0, exempt=None, purge_after: str = None,
+            full_vacuum: bool = False, keep_changes: int = CHANGE_LOG_KEEP):
+    """Expire, evict and purge stale domains, prune the change log, then release free pages."""
+    compactor = Compactor(db, ttls=parse_ttls(ttls),
+                          purge_after=parse_duration(purge_after) if purge_after else None,
+                          max_active=max_active, exempt_origins=exempt if exempt is not None else ('manual',),
+                          keep_changes=keep_changes if keep_changes >= 0 else None)
+    report = compactor.run()
+    
+    for origin, count in sorted(report['expired'].items()):
+        print(f"Expired {count} {origin} domains")
+    if report['evicted']:
+        print(f"Evicted {len(report['evicted'])} least recently seen domains:")
+        for domain in report['evicted']:
+            print(f"  {domain}")
+    print(f"Purged {report['purged']} inactive domains and {report['pruned_changes']} change log entries, "
+          f"released {report['vacuumed_pages']} free pages")
+    
+    if full_vacuum:
+        sizes = db.vacuum()
+        print(f"Vacuumed database: {sizes['size_before']} -> {sizes['size_after']} bytes")
+
+def aggregate(db: IgnoreHostsDB, threshold: int = DEFAULT_AGGREGATE_THRESHOLD, dry_run: bool = False,
+              undo: str = None, show: bool = False):
+    """Replace groups of sibling subdomains by wildcard rules, list or undo aggregations."""
+    if undo:
+        restored = db.disaggregate(undo)
+        print(f"Restored {len(restored)} domains replaced by {undo}")
+        return
+    if show:
+        aggregations = db.get_aggregations()
+        for rule, count in aggregations.items():
+            print(f"{rule:<50} {count} domains")
+        print(f"{len(aggregations)} aggregation rules")
+        return
+    
+    aggregated = db.aggregate_siblings(threshold, dry_run=dry_run)
+    for rule, domains in aggregated.items():
+        print(f"{rule}: {'would replace' if dry_run else 'replaced'} {len(domains)} domains")
+        for domain in domains:
+            print(f"  {domain}")
+    print(f"{len(aggregated)} wildcard rules {'would be ' if dry_run else ''}created")
+
+def networks(db: IgnoreHostsDB, show_inactive: bool = False, match: str = None, collapse: bool = False,
+             threshold: int = 0, dry_run: bool = False):
+    """List IP and CIDR rules, find the rule covering an address, or collapse rules into covering prefixes."""
+    if match:
+        rule = NetworkMatcher(db.get_active_networks()).match(match)
+        print(f"{match} is ignored by {rule}" if rule else f"{match} is not covered by any network rule")
+        return
+    if collapse:
+        covers = db.collapse_networks(threshold, dry_run=dry_run)
+        for cover, replaced in covers.items():
+            print(f"{cover}: {'would replace' if dry_run else 'replaced'} {len(replaced)} networks")
+            for network in replaced:
+                print(f"  {network}")
+        print(f"{len(covers)} covering prefixes {'would be ' if dry_run else ''}created")
+        return
+    
+    rows = db.get_networks_info(active=None if show_inactive else True)
+    print_domains(rows, header=f"{len(rows)} network rules\n")
+
+def _iso_date(value: str) -> str:
+    """Validate an ISO date or timestamp argument, keeping it in the stored format."""
+    try:
+        return datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not an ISO date: {value}")
+
 def main():
     parser = argparse.ArgumentParser(description="Manage ignore hosts database")
     parser.add_argument("--db", help="Database file path (optional)")
@@ -130,31 +369,112 @@ def main():
     # List command
     list_parser = subparsers.add_parser("list", help="List domains")
     list_parser.add_argument("--all", action="store_true", help="Show inactive domains too")
+    list_parser.add_argument("--origin", help="Only domains with this origin")
+    list_parser.add_argument("--since", type=_iso_date, help="Only domains added at or after this ISO date")
+    list_parser.add_argument("--until", type=_iso_date, help="Only domains added before this ISO date")
+    list_parser.add_argument("--after", help="Start after this domain (keyset pagination)")
+    list_parser.add_argument("--limit", type=int, help="Maximum number of domains to list")
+    list_parser.add_argument("--format", choices=("table", "csv", "jsonl"), default="table",
+                             help="Output format (default: table)")
     
     # Add command
-    add_parser = subparsers.add_parser("add", help="Add a domain")
-    add_parser.add_argument("domain", help="Domain to add")
+    add_parser = subparsers.add_parser("add", help="Add a domain, or many from stdin or files")
+    add_parser.add_argument("domain", nargs="?",
+                            help="Domain, IP address or CIDR prefix to add; - reads one per line from stdin")
     add_parser.add_argument("--origin", default="manual", help="Origin of the domain")
+    add_parser.add_argument("--from-file", action="append", default=[], metavar="FILE",
+                            help="Add the domains listed in FILE, plain text or gzip (repeatable)")
+    add_parser.add_argument("--format", choices=("summary", "jsonl"),
+                            help="Batch output: a summary line (default) or one JSON result per input line")
     
     # Remove command
-    remove_parser = subparsers.add_parser("remove", help="Remove (deactivate) a domain")
-    remove_parser.add_argument("domain", help="Domain to remove")
+    remove_parser = subparsers.add_parser("remove", help="Remove (deactivate) a domain, or many from stdin or files")
+    remove_parser.add_argument("domain", nargs="?",
+                               help="Domain, IP address or CIDR prefix to remove; - reads one per line from stdin")
+    remove_parser.add_argument("--from-file", action="append", default=[], metavar="FILE",
+                               help="Remove the domains listed in FILE, plain text or gzip (repeatable)")
+    remove_parser.add_argument("--format", choices=("summary", "jsonl"),
+                               help="Batch output: a summary line (default) or one JSON result per input line")
     
     # Stats command
-    subparsers.add_parser("stats", help="Show database statistics")
+    stats_parser = subparsers.add_parser("stats", help="Show database statistics")
+    stats_parser.add_argument("--check", action="store_true",
+                              help="Reconcile the statistics counters with a full table scan")
     
     # Import command
     import_parser = subparsers.add_parser("import", help="Import domains from file")
-    import_parser.add_argument("file", help="File to import from")
+    import_parser.add_argument("file", help="File to import from (plain text or gzip); - reads stdin")
     import_parser.add_argument("--origin", default="file_import", help="Origin to assign to imported domains")
     
     # Export command
     export_parser = subparsers.add_parser("export", help="Export domains to file")
     export_parser.add_argument("file", help="File to export to")
     
+    # Snapshot command
+    snapshot_parser = subparsers.add_parser("snapshot", help="Write the memory-mapped ignore list snapshot")
+    snapshot_parser.add_argument("file", nargs="?", help="Snapshot path (default: database path with .snapshot)")
+    
     # Search command
-    search_parser = subparsers.add_parser("search", help="Search for a domain")
-    search_parser.add_argument("domain", help="Domain to search for")
+    search_parser = subparsers.add_parser("search", help="Search for a domain or a pattern")
+    search_parser.add_argument("domain", nargs="?",
+                               help="Exact domain, or a pattern: *.example.com, prefix* or *substring*")
+    search_parser.add_argument("--suffix", help="This domain and its subdomains (.example.com: subdomains only)")
+    search_parser.add_argument("--prefix", help="Domains starting with this string")
+    search_parser.add_argument("--contains", help="Domains containing this string")
+    search_parser.add_argument("--active", action="store_true", help="Only active domains")
+    search_parser.add_argument("--after", help="Start after this domain (pagination)")
+    search_parser.add_argument("--limit", type=int, help="Maximum number of domains to list")
+    search_parser.add_argument("--format", choices=("table", "csv", "jsonl"), default="table",
+                               help="Output format (default: table)")
+    
+    # Index command
+    index_parser = subparsers.add_parser("index", help="Create the FTS5 substring search index")
+    index_parser.add_argument("--drop", action="store_true", help="Drop the index instead")
+    
+    # Replicate command
+    replicate_parser = subparsers.add_parser("replicate", help="Sync with other proxy instances")
+    replicate_parser.add_argument("journal_dir", help="Directory of delta journals shared by all nodes")
+    replicate_parser.add_argument("--node", help="Unique id of this node (defaults to the host name)")
+    replicate_parser.add_argument("--peer-db", action="append", default=[],
+                                  help="Also merge changes directly from a peer database file (repeatable)")
+    
+    # Compact command
+    compact_parser = subparsers.add_parser("compact", help="Expire, evict and purge stale domains")
+    compact_parser.add_argument("--ttl", action="append", default=[], metavar="ORIGIN=DURATION",
+                                help="Deactivate domains of ORIGIN not seen for DURATION, e.g. "
+                                     "tcp_tls_error=30d (repeatable)")
+    compact_parser.add_argument("--max-active", type=int, default=0,
+                                help="Evict the least recently seen domains above this many active ones")
+    compact_parser.add_argument("--exempt", action="append", metavar="ORIGIN",
+                                help="Origin never evicted by --max-active (repeatable, default: manual)")
+    compact_parser.add_argument("--purge-after", metavar="DURATION",
+                                help="Delete domains inactive for longer than DURATION, e.g. 90d")
+    compact_parser.add_argument("--keep-changes", type=int, default=CHANGE_LOG_KEEP, metavar="N",
+                                help="Most recent change log entries kept once published to replication "
+                                     f"peers; -1 never prunes the change log (default: {CHANGE_LOG_KEEP})")
+    compact_parser.add_argument("--vacuum", action="store_true",
+                                help="Rebuild the database file; enables incremental vacuum on older databases")
+    
+    # Aggregate command
+    aggregate_parser = subparsers.add_parser("aggregate", help="Replace sibling subdomains by wildcard rules")
+    aggregate_parser.add_argument("--threshold", type=int, default=DEFAULT_AGGREGATE_THRESHOLD,
+                                  help="Aggregate parents with more than this many auto-learned "
+                                       f"subdomains (default: {DEFAULT_AGGREGATE_THRESHOLD})")
+    aggregate_parser.add_argument("--dry-run", action="store_true", help="Only show what would be aggregated")
+    aggregate_parser.add_argument("--list", action="store_true", help="List the recorded aggregations")
+    aggregate_parser.add_argument("--undo", metavar="RULE",
+                                  help="Restore the domains replaced by a rule such as *.cdn.example.net")
+    
+    # Networks command
+    networks_parser = subparsers.add_parser("networks", help="List, match or collapse IP and CIDR rules")
+    networks_parser.add_argument("--all", action="store_true", help="Show inactive networks too")
+    networks_parser.add_argument("--match", metavar="IP", help="Show the rule covering this address")
+    networks_parser.add_argument("--collapse", action="store_true",
+                                 help="Merge auto-learned networks into covering prefixes")
+    networks_parser.add_argument("--threshold", type=int, default=0,
+                                 help="With --collapse, also replace more than this many networks in a /24 "
+                                      "(IPv6: /64) by that prefix (default: 0, lossless merges only)")
+    networks_parser.add_argument("--dry-run", action="store_true", help="Only show what would be collapsed")
     
     args = parser.parse_args()
     
@@ -162,6 +482,10 @@ def main():
         parser.print_help()
         return
     
+    batch = args.command in ("add", "remove") and (args.domain == "-" or args.from_file or args.format)
+    if args.command in ("add", "remove") and not (args.domain or args.from_file):
+        parser.error(f"{args.command} needs a domain, - for stdin or --from-file")
+    
     # Initialize database
     try:
         db = IgnoreHostsDB(args.db)
@@ -172,19 +496,40 @@ def main():
     # Execute command
     try:
         if args.command == "list":
-            list_domains(db, args.all)
+            list_domains(db, args.all, args.origin, args.since, args.until, args.after, args.limit, args.format)
+        elif args.command == "add" and batch:
+            domains, skipped = read_batch(args.domain, args.from_file)
+            add_domains_batch(db, domains, skipped, args.origin, args.format or "summary")
         elif args.command == "add":
             add_domain(db, args.domain, args.origin)
+        elif args.command == "remove" and batch:
+            domains, skipped = read_batch(args.domain, args.from_file)
+            remove_domains_batch(db, domains, skipped, args.format or "summary")
         elif args.command == "remove":
             remove_domain(db, args.domain)
         elif args.command == "stats":
-            show_stats(db)
+            show_stats(db, args.check)
         elif args.command == "import":
             import_file(db, args.file, args.origin)
         elif args.command == "export":
             export_file(db, args.file)
+        elif args.command == "snapshot":
+            write_snapshot_file(db, args.file)
         elif args.command == "search":
-            search_domain(db, args.domain)
+            if not (args.domain or args.suffix or args.prefix or args.contains):
+                parser.error("search needs a domain, a pattern or one of --suffix, --prefix, --contains")
+            search_domains(db, args.domain, args.suffix, args.prefix, args.contains, args.active,
+                           args.after, args.limit, args.format)
+        elif args.command == "index":
+            create_index(db, args.drop)
+        elif args.command == "replicate":
+            replicate(db, args.journal_dir, args.node, args.peer_db)
+        elif args.command == "compact":
+            compact(db, args.ttl, args.max_active, args.exempt, args.purge_after, args.vacuum, args.keep_changes)
+        elif args.command == "aggregate":
+            aggregate(db, args.threshold, args.dry_run, args.undo, args.list)
+        elif args.command == "networks":
+            networks(db, args.all, args.match, args.collapse, args.threshold, args.dry_run)
     except Exception as e:
         print(f"Error executing command: {e}")
         sys.exit(1)
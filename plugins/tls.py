@@ -7,15 +7,63 @@ domains to the ignore list to prevent future interception attempts.
 
 import os
 import sys
+import time
+import asyncio
 import logging
-from mitmproxy import ctx, tcp
+from typing import Union
+from mitmproxy import ctx, tcp, tls
 
-# Add the core directory to sys.path to import database module
-sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), 'core'))
-from database import IgnoreHostsDB
+# Add the project root to sys.path to import core modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.database import CHANGE_LOG_KEEP, IgnoreHostsDB
+from core.asyncdb import AsyncIgnoreHostsDB
+from core.matcher import HostMatcher, normalize_host
+from core.iptree import NetworkMatcher, canonical_network, is_network_rule
+from core.writer import WriteBehindQueue
+from core.exporter import DebouncedExporter
+from core.cache import FailureCache
+from core.reload import ChangeWatcher
+from core.replication import Replicator
+from core.compaction import Compactor, DEFAULT_COMPACT_INTERVAL, parse_duration, parse_ttls
+from core.metrics import REGISTRY, MetricsServer
+from core.profiling import deep_sizeof
+from core.snapshot import SnapshotMatcher, SnapshotRules, open_snapshot
 
 logger = logging.getLogger('httppro.tls')
 
+# Default minimum number of seconds between two rewrites of ignore-host.txt
+DEFAULT_EXPORT_INTERVAL = 5
+
+# Default number of seconds between two replication syncs
+DEFAULT_REPLICATION_INTERVAL = 5
+
+# Changes replayed on top of the ignore list snapshot at startup; an older snapshot is rewritten first
+SNAPSHOT_MAX_REPLAY = 100000
+
+# Seconds a connection hook waits for the startup task before deciding without the ignore list
+STARTUP_WAIT_TIMEOUT = 30.0
+
+# Options registered by TlsManager.load
+PLUGIN_OPTIONS = ("httppro_export_interval", "httppro_replication_dir", "httppro_node_id",
+                  "httppro_replication_interval", "httppro_metrics", "httppro_ttl", "httppro_max_active",
+                  "httppro_purge_after", "httppro_compact_interval", "httppro_aggregate_threshold",
+                  "httppro_keep_changes")
+
+# Options that recreate the compactor when changed
+COMPACTION_OPTIONS = {"httppro_ttl", "httppro_max_active", "httppro_purge_after", "httppro_compact_interval",
+                      "httppro_aggregate_threshold", "httppro_keep_changes"}
+
+_HOOK_LATENCY = REGISTRY.histogram('httppro_hook_duration_seconds', 'Latency of TlsManager hook invocations',
+                                   label='hook')
+_FAILURES = REGISTRY.counter('httppro_tls_failures_total', 'TLS failures detected', label='origin')
+_CLIENT_FAILURES = _FAILURES.labels('client_tls_error')
+_TCP_FAILURES = _FAILURES.labels('tcp_tls_error')
+_FAILURES_DEDUPLICATED = REGISTRY.counter('httppro_tls_failures_deduplicated_total',
+                                          'TLS failures absorbed by the failure cache')
+_DOMAINS_ADDED = REGISTRY.counter('httppro_domains_added_total', 'Domains added to the ignore list by the plugin')
+_CONNECTIONS_IGNORED = REGISTRY.counter('httppro_connections_ignored_total',
+                                        'TLS connections passed through without interception')
+
 class TlsManager:
     """
     TLS Error Management Plugin.
@@ -23,30 +71,138 @@ class TlsManager:
     Automatically detects TLS handshake failures and manages domain ignore list
     through database storage with comprehensive tracking and statistics.
     """
-    def __init__(self):
+    def __init__(self, db: IgnoreHostsDB = None, ignore_hosts_file: str = None, snapshot_file: str = None):
         """
         Initialize TLS Manager plugin.
         
-        Sets up database connection, imports existing domains, and configures
-        the mitmproxy ignore hosts option.
+        Only cheap in-memory state is created here, so the addon can be
+        instantiated before mitmproxy is configured. The database, background
+        threads and ignore list are set up by start(), from the running hook.
+        
+        Args:
+            db: Optional database manager; defaults to the project database
+            ignore_hosts_file: Optional compatibility file path; defaults to plugins/ignore-host.txt
+            snapshot_file: Optional ignore list snapshot path; defaults to the database path with a
+                ``.snapshot`` extension, an empty string loads the list from the database instead
+        """
+        self.db = db
+        self.ignore_hosts_file = ignore_hosts_file or os.path.join(os.path.dirname(__file__), 'ignore-host.txt')
+        self.snapshot_file = snapshot_file
+        self.snapshot = None
+        self.failure_cache = FailureCache()
+        self.ignore_hosts = {'plugin-tls-loaded'}
+        self.matcher = HostMatcher()
+        self.networks = NetworkMatcher()
+        # Rules matched since the compactor last refreshed their last_seen
+        self.seen_rules = set()
+        self.started = False
+        
+        # Created by start()
+        self.writer = None
+        self.exporter = None
+        self.watcher = None
+        
+        # Created by running(): database access off the event loop, and the task starting the plugin
+        self.aio = None
+        self._startup = None
+        
+        # Started by configure when httppro_replication_dir / httppro_metrics / a compaction policy are set
+        self.replicator = None
+        self.metrics_server = None
+        self.compactor = None
+
+    def start(self):
+        """
+        Open the database, load the ignore list and start the background threads.
+        
+        Sets up database connection, imports existing domains, and builds
+        the in-memory ignore set used to decide on new connections.
         """
+        if self.started:
+            return
+        start = time.perf_counter()
         logger.info("Initializing TLS Manager plugin")
         
-        self.db = IgnoreHostsDB()
-        self.ignore_hosts_file = os.path.join(os.path.dirname(__file__), 'ignore-host.txt')
+        if self.db is None:
+            self.db = IgnoreHostsDB()
+        # The worker also collects the repeats aggregated by the failure cache on its own timer
+        self.writer = WriteBehindQueue(self.db, on_flush=self.update_ignore_hosts,
+                                       pull=self.failure_cache.drain,
+                                       pull_interval=self.failure_cache.flush_interval)
+        self.exporter = DebouncedExporter(self.ignore_hosts_file, self.render_ignore_hosts,
+                                          interval=DEFAULT_EXPORT_INTERVAL, on_write=self.on_export)
         
-        # Import existing file into database if it exists
+        # Import the file only if it was edited since this plugin last wrote it
         if os.path.exists(self.ignore_hosts_file):
-            imported = self.db.import_from_file(self.ignore_hosts_file, "file_import")
-            if imported > 0:
-                logger.info(f"Imported {imported} domains from ignore-host.txt to database")
+            result = self.db.sync_from_file(self.ignore_hosts_file, "file_import")
+            if result['inserted'] or result['updated']:
+                logger.info(f"Imported {result['inserted'] + result['updated']} domains from ignore-host.txt to database")
         
-        # Load ignore hosts from database
-        self.ignore_hosts = set(self.db.get_active_domains())
+        self.snapshot = self.open_snapshot()
+        if self.snapshot is not None:
+            # Match against the mapped snapshot; the change log since it was written is replayed below
+            change_seq = self.snapshot.change_seq
+            networks = self.snapshot.networks()
+            self.ignore_hosts = SnapshotRules(self.snapshot)
+            self.matcher = SnapshotMatcher(self.snapshot)
+            domain_count = self.snapshot.rule_count
+        else:
+            # Load ignore hosts from database; the change sequence is read first so that
+            # changes committed while loading are replayed by the watcher
+            change_seq = self.db.get_change_seq()
+            domains = self.db.get_active_domains()
+            networks = self.db.get_active_networks()
+            self.ignore_hosts = set(domains)
+            self.ignore_hosts.update(networks)
+            self.matcher = HostMatcher(domains)
+            domain_count = len(domains)
         self.ignore_hosts.add('plugin-tls-loaded')
-        self.update_ignore_hosts()
+        self.networks = NetworkMatcher(networks)
+        self.save_ignore_hosts()
+        
+        # Pick up domains added or removed by other processes such as manage_db.py
+        self.watcher = ChangeWatcher(self.db, self.apply_changes, start_seq=change_seq,
+                                     resync=self.reload_ignore_hosts)
+        if self.snapshot is not None:
+            self.watcher.poll()
+        self.watcher.start()
         
-        logger.info(f"TLS Manager initialized with {len(self.ignore_hosts)-1} domains")
+        REGISTRY.gauge('httppro_ignored_domains', 'Domains in the in-memory ignore list',
+                       lambda: len(self.ignore_hosts) - 1)
+        REGISTRY.gauge('httppro_write_queue_depth', 'Failures waiting in the write-behind queue',
+                       lambda: self.writer.stats()['queue_depth'])
+        
+        self.started = True
+        logger.info(f"TLS Manager initialized with {domain_count} domains and {len(networks)} networks "
+                    f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def open_snapshot(self):
+        """
+        Map the ignore list snapshot, writing it first if it is missing or too old.
+        
+        Returns:
+            Snapshot, or None if snapshots are disabled or cannot be used
+        """
+        if self.snapshot_file == '':
+            return None
+        file_path = self.snapshot_file or self.db.snapshot_path
+        try:
+            change_seq = self.db.get_change_seq()
+            snapshot = open_snapshot(file_path)
+            # The changes to replay must all still be in the change log
+            if snapshot is not None and (not 0 <= change_seq - snapshot.change_seq <= SNAPSHOT_MAX_REPLAY
+                                         or snapshot.change_seq < self.db.get_pruned_seq()):
+                logger.info(f"Snapshot {file_path} is at change {snapshot.change_seq}, the database at "
+                            f"{change_seq}: rewriting it")
+                snapshot.close()
+                snapshot = None
+            if snapshot is None:
+                self.db.export_snapshot(file_path)
+                snapshot = open_snapshot(file_path)
+            return snapshot
+        except Exception as e:
+            logger.error(f"Failed to use snapshot {file_path}, loading the ignore list from the database: {e}")
+            return None
 
     def load_ignore_hosts(self):
         """
@@ -58,58 +214,418 @@ class TlsManager:
         domains = self.db.get_active_domains()
         return set(domains)
 
+    def render_ignore_hosts(self) -> Union[str, bytes]:
+        """
+        Render the compatibility file content.
+        
+        Over a snapshot, its rules are copied from the mapped text section in
+        their snapshot order, followed by the rules added since, sorted.
+        
+        Returns:
+            str or bytes: Domains, one per line, followed by the plugin marker
+        """
+        # set.copy() runs without releasing the GIL, so it is safe while hooks add domains
+        rules = self.ignore_hosts.copy()
+        if isinstance(rules, SnapshotRules):
+            return rules.render(skip=('plugin-tls-loaded',)) + b'plugin-tls-loaded\n'
+        domains_to_export = sorted(domain for domain in rules if domain != 'plugin-tls-loaded')
+        domains_to_export.append('plugin-tls-loaded')
+        return '\n'.join(domains_to_export) + '\n'
+
+    def on_export(self, file_path: str):
+        """
+        Checkpoint the compatibility file after each export.
+        
+        The file then matches the database, so the next start skips importing it.
+        
+        Args:
+            file_path: Path of the file that was written
+        """
+        self.db.record_file_checkpoint(file_path)
+
     def save_ignore_hosts(self):
-        """Export current domains to file for backward compatibility."""
-        domains_to_export = [domain for domain in self.ignore_hosts if domain != 'plugin-tls-loaded']
+        """
+        Export current domains to file for backward compatibility.
+        
+        The write is deferred to the debounced exporter, which coalesces
+        bursts of changes and replaces the file atomically.
+        """
+        self.exporter.mark_dirty()
+
+    @_HOOK_LATENCY.labels('load').time()
+    def load(self, loader):
+        """
+        Register plugin options.
+        
+        Args:
+            loader: mitmproxy addon loader
+        """
+        loader.add_option(
+            "httppro_export_interval", int, DEFAULT_EXPORT_INTERVAL,
+            "Minimum number of seconds between two rewrites of ignore-host.txt"
+        )
+        loader.add_option(
+            "httppro_replication_dir", str, "",
+            "Directory of delta journals shared with other proxy instances; empty disables replication"
+        )
+        loader.add_option(
+            "httppro_node_id", str, "",
+            "Unique, stable id of this proxy instance for replication; defaults to the host name"
+        )
+        loader.add_option(
+            "httppro_replication_interval", int, DEFAULT_REPLICATION_INTERVAL,
+            "Number of seconds between two replication syncs"
+        )
+        loader.add_option(
+            "httppro_metrics", str, "",
+            "Serve Prometheus metrics on host:port ([addr]:port for IPv6) or unix:/path; empty disables the endpoint"
+        )
+        loader.add_option(
+            "httppro_ttl", str, "",
+            "Deactivate domains not seen for a per-origin duration, e.g. tcp_tls_error=30d,client_tls_error=30d"
+        )
+        loader.add_option(
+            "httppro_max_active", int, 0,
+            "Maximum number of active domains, evicting the least recently seen; 0 disables the cap"
+        )
+        loader.add_option(
+            "httppro_purge_after", str, "",
+            "Delete domains inactive for longer than this duration, e.g. 90d; empty keeps them"
+        )
+        loader.add_option(
+            "httppro_compact_interval", int, DEFAULT_COMPACT_INTERVAL,
+            "Number of seconds between two expiry and compaction runs"
+        )
+        loader.add_option(
+            "httppro_aggregate_threshold", int, 0,
+            "Replace more than this many auto-learned sibling subdomains by one wildcard rule; 0 disables it"
+        )
+        loader.add_option(
+            "httppro_keep_changes", int, CHANGE_LOG_KEEP,
+            "Most recent change log entries kept after this proxy and replication have processed them; "
+            "-1 never prunes the change log"
+        )
+
+    @_HOOK_LATENCY.labels('running').time()
+    def running(self):
+        """
+        Start the plugin once mitmproxy is configured, then apply all plugin options.
         
+        mitmproxy also calls this hook synchronously when the script is
+        reloaded, so it never awaits. On the event loop it schedules a task
+        opening the database and loading the ignore list on the writer thread
+        of an AsyncIgnoreHostsDB, so the loop is not blocked meanwhile;
+        without a running loop the plugin is started directly.
+        """
+        if self.started or self._startup is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.start()
+            self.configure(set(PLUGIN_OPTIONS))
+            return
+        self._startup = loop.create_task(self._start_off_loop())
+
+    async def _start_off_loop(self):
+        """Run start() on the async facade's writer thread, then apply all plugin options."""
         try:
-            with open(self.ignore_hosts_file, 'w') as file:
-                for host in sorted(domains_to_export):
-                    file.write(f"{host}\n")
-                file.write("plugin-tls-loaded\n")
-            logger.debug(f"Exported {len(domains_to_export)} domains to compatibility file")
+            if self.aio is None:
+                self.aio = AsyncIgnoreHostsDB(self.db) if self.db is not None else await AsyncIgnoreHostsDB.open()
+                self.db = self.aio.db
+            await self.aio.write(self.start)
         except Exception as e:
-            logger.error(f"Failed to save compatibility file: {e}")
+            logger.error(f"Failed to start TLS Manager, connections are intercepted without the ignore list: {e}")
+            # A script reload may try again
+            self._startup = None
+            return
+        self.configure(set(PLUGIN_OPTIONS))
 
-    def update_ignore_hosts(self):
+    async def wait_started(self) -> bool:
         """
-        Update mitmproxy ignore hosts configuration.
+        Wait for the startup task of running() to load the ignore list.
+        
+        Waits at most STARTUP_WAIT_TIMEOUT seconds; a cancelled hook does not
+        cancel the startup.
         
-        Combines existing command-line ignore hosts with database domains
-        and updates mitmproxy runtime configuration.
+        Returns:
+            bool: True if the plugin is started, False if it is not starting, its startup failed or took too long
         """
-        self.save_ignore_hosts()
+        if self.started:
+            return True
+        if self._startup is None:
+            return False
+        done, _ = await asyncio.wait({self._startup}, timeout=STARTUP_WAIT_TIMEOUT)
+        if not done:
+            logger.warning(f"TLS Manager still starting after {STARTUP_WAIT_TIMEOUT:g}s, "
+                           f"deciding the connection without the ignore list")
+        return self.started
+
+    @_HOOK_LATENCY.labels('configure').time()
+    def configure(self, updated):
+        """
+        Apply option changes.
         
-        # Preserve existing ignore_hosts from command line or other sources
-        existing_ignore_hosts = list(ctx.options.ignore_hosts) if ctx.options.ignore_hosts else []
-        
-        if self.ignore_hosts:
-            # Filter out the plugin marker and convert to list for mitmproxy
-            domains_to_ignore = [domain for domain in self.ignore_hosts if domain != 'plugin-tls-loaded']
-            if domains_to_ignore:
-                # Combine existing ignore hosts with our domains, avoiding duplicates
-                combined_ignore_hosts = existing_ignore_hosts.copy()
-                for domain in domains_to_ignore:
-                    if domain not in combined_ignore_hosts:
-                        combined_ignore_hosts.append(domain)
-                
-                ctx.options.ignore_hosts = combined_ignore_hosts
-                logger.info(f"Combined ignore hosts: {len(existing_ignore_hosts)} existing + {len(domains_to_ignore)} from DB = {len(combined_ignore_hosts)} total")
+        Options set before the plugin is started are applied by running().
+        
+        Args:
+            updated: Set of option names that changed
+        """
+        if not self.started:
+            return
+        
+        if "httppro_export_interval" in updated:
+            self.exporter.interval = max(0, ctx.options.httppro_export_interval)
+        
+        if {"httppro_replication_dir", "httppro_node_id"} & updated:
+            if self.replicator is not None:
+                self.replicator.close()
+                self.replicator = None
+            if ctx.options.httppro_replication_dir:
+                self.replicator = Replicator(self.db, ctx.options.httppro_replication_dir,
+                                             ctx.options.httppro_node_id or None,
+                                             interval=max(1, ctx.options.httppro_replication_interval))
+                self.replicator.start()
+        elif "httppro_replication_interval" in updated and self.replicator is not None:
+            self.replicator.interval = max(1, ctx.options.httppro_replication_interval)
+        
+        if "httppro_metrics" in updated:
+            if self.metrics_server is not None:
+                self.metrics_server.stop()
+                self.metrics_server = None
+            if ctx.options.httppro_metrics:
+                server = MetricsServer(ctx.options.httppro_metrics)
+                try:
+                    server.start()
+                    self.metrics_server = server
+                except (OSError, ValueError) as e:
+                    # A bad endpoint must not break the other options
+                    logger.error(f"Failed to serve metrics on {ctx.options.httppro_metrics}: {e}")
+        
+        if COMPACTION_OPTIONS & updated:
+            if self.compactor is not None:
+                self.compactor.stop()
+                self.compactor = None
+            try:
+                compactor = Compactor(
+                    self.db, ttls=parse_ttls(ctx.options.httppro_ttl),
+                    purge_after=parse_duration(ctx.options.httppro_purge_after)
+                    if ctx.options.httppro_purge_after else None,
+                    max_active=max(0, ctx.options.httppro_max_active),
+                    interval=max(1, ctx.options.httppro_compact_interval),
+                    touched=self.take_seen_rules,
+                    aggregate_threshold=max(0, ctx.options.httppro_aggregate_threshold),
+                    keep_changes=ctx.options.httppro_keep_changes if ctx.options.httppro_keep_changes >= 0 else None,
+                    change_floor=self.applied_change_seq,
+                )
+            except ValueError as e:
+                logger.error(f"Invalid compaction option: {e}")
             else:
-                # Keep existing ignore hosts if we only have the plugin marker
-                ctx.options.ignore_hosts = existing_ignore_hosts
-                logger.info("Keeping existing ignore hosts (only plugin marker found in DB)")
-        else:
-            # Keep existing ignore hosts if database is empty
-            ctx.options.ignore_hosts = existing_ignore_hosts
-            logger.info("Keeping existing ignore hosts (ignore hosts DB is empty)")
+                if compactor.enabled:
+                    self.compactor = compactor
+                    self.compactor.start()
+
+    def memory_usage(self) -> dict:
+        """
+        Estimate the size of the in-memory structures, for profiling reports.
         
-        # Get and log database statistics
-        stats = self.db.get_stats()
-        logger.debug(f"Database statistics: {stats.get('active_domains', 0)} active domains")
-        logger.debug(f"Total active ignore hosts: {len(ctx.options.ignore_hosts)}")
+        Returns:
+            dict: Bytes held by the ignore set, matcher and failure cache, the
+            size of the mapped snapshot (shared page cache) and the page cache
+            limit of the database connections
+        """
+        return {
+            'ignore_hosts': deep_sizeof(self.ignore_hosts),
+            'matcher': deep_sizeof(self.matcher),
+            'networks': deep_sizeof(self.networks),
+            'snapshot_mapped': self.snapshot.size if self.snapshot else 0,
+            'failure_cache': deep_sizeof(self.failure_cache),
+            'db_page_cache_limit': self.db.connections.cache_info()['page_cache_limit'] if self.db else 0,
+        }
 
-    def tcp_end(self, flow: tcp.TCPFlow):
+    def ignore_domain(self, domain: str, origin: str):
+        """
+        Start ignoring a domain.
+        
+        Costs O(1): the domain is added to the in-memory set and matcher, so the
+        next connection to it is passed through by tls_clienthello, and it is
+        queued for the database. Global mitmproxy options are left untouched.
+        
+        Args:
+            domain: The domain, or the canonical IP network, to ignore
+            origin: Source of the ignore request
+        """
+        self.ignore_hosts.add(domain)
+        self._matcher_for(domain).add(domain)
+        self.writer.submit(domain, origin)
+        _DOMAINS_ADDED.inc()
+
+    def apply_changes(self, added, removed):
+        """
+        Apply a delta from the database change log to the in-memory ignore set.
+        
+        Runs on the change watcher thread; only the changed domains are touched.
+        
+        Args:
+            added: Domains that became active
+            removed: Domains that were deactivated
+        """
+        changed = False
+        for domain in added:
+            if domain not in self.ignore_hosts:
+                self.ignore_hosts.add(domain)
+                self._matcher_for(domain).add(domain)
+                changed = True
+        for domain in removed:
+            if domain in self.ignore_hosts:
+                self.ignore_hosts.discard(domain)
+                self._matcher_for(domain).remove(domain)
+                self.failure_cache.discard(domain)
+                changed = True
+        
+        if changed:
+            logger.info(f"Reloaded ignore list: +{len(added)} -{len(removed)} domains")
+            self.save_ignore_hosts()
+
+    def _matcher_for(self, rule: str):
+        """Get the matcher holding a rule: the network matcher for IP networks, the suffix matcher otherwise."""
+        return self.networks if is_network_rule(rule) else self.matcher
+
+    def take_seen_rules(self) -> set:
+        """
+        Hand over the rules matched since the previous call.
+        
+        Called by the compactor to refresh last_seen of ignored domains that
+        are still in use, so that expiry and eviction only retire idle ones.
+        
+        Returns:
+            set: Matched rules, i.e. domains and networks of the ignore list
+        """
+        seen, self.seen_rules = self.seen_rules, set()
+        return seen
+
+    def applied_change_seq(self) -> int:
+        """
+        Get the last change log entry applied to the in-memory ignore list.
+        
+        Called by the compactor, which never prunes entries after it.
+        
+        Returns:
+            int: Sequence number of the watcher, or 0 before it started
+        """
+        return self.watcher.seq if self.watcher is not None else 0
+
+    def update_ignore_hosts(self, added: int = 0):
+        """
+        Refresh the compatibility file and log the write-behind counters.
+        
+        Runs on the write-behind worker thread after each flush, so the file
+        export does not block mitmproxy hooks.
+        
+        Args:
+            added: Number of domains newly added by the flush
+        """
+        if added:
+            self.save_ignore_hosts()
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            stats = self.writer.stats()
+            logger.debug(f"Write-behind: {stats['written']} failures in {stats['batches']} batches, "
+                         f"{len(self.ignore_hosts) - 1} active ignore hosts")
+
+    @_HOOK_LATENCY.labels('done').time()
+    def done(self):
+        """
+        Handle addon shutdown.
+        
+        Flushes all queued failures to the database, publishes them to the
+        replication journal and writes the pending compatibility file export
+        before mitmproxy exits.
+        """
+        if self._startup is not None and not self._startup.done():
+            # Withdraw a queued start(), or let a running one finish so its threads are stopped below
+            self._startup.cancel()
+            if self.aio is not None:
+                self.aio.close()
+        if not self.started:
+            return
+        self.watcher.stop()
+        if self.compactor is not None:
+            self.compactor.stop()
+            self.compactor = None
+        self.writer.close()
+        if self.replicator is not None:
+            # Hand the domains learned since the last sync to the other instances
+            self.replicator.close()
+            self.replicator.publish()
+        self.exporter.close()
+        stats = self.writer.stats()
+        cache_stats = self.failure_cache.stats()
+        logger.info(f"TLS Manager stopped: {stats['written']} failures recorded in {stats['batches']} batches "
+                    f"(max flush latency {stats['max_flush_latency'] * 1000:.1f} ms)")
+        logger.info(f"Failure cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                    f"({cache_stats['hit_ratio']:.0%} hit ratio)")
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        if self.aio is not None:
+            self.aio.close()
+
+    @_HOOK_LATENCY.labels('tls_clienthello').time()
+    async def tls_clienthello(self, data: tls.ClientHelloData):
+        """
+        Decide whether to intercept a new TLS connection.
+        
+        Looks up the SNI in the suffix matcher and the server address in the
+        network matcher, and passes the connection through untouched when
+        either is ignored. Connections arriving during startup wait for the
+        ignore list instead of being decided against an empty one.
+        
+        Args:
+            data: ClientHello data from mitmproxy
+        """
+        if not self.started and not await self.wait_started():
+            return
+        sni = data.client_hello.sni
+        rule = self.matcher.match(normalize_host(sni)) if sni else None
+        
+        if rule is None:
+            server_address = data.context.server.address
+            if server_address:
+                rule = self.networks.match(server_address[0])
+        
+        if rule is not None:
+            data.ignore_connection = True
+            self.seen_rules.add(rule)
+            _CONNECTIONS_IGNORED.inc()
+            logger.debug(f"Ignoring connection to {sni or data.context.server.address} (rule: {rule})")
+
+    def reload_ignore_hosts(self):
+        """
+        Rebuild the in-memory ignore list from the database.
+        
+        Called on the change watcher thread when change log entries it had not
+        read yet were pruned, so the delta since its last poll is incomplete.
+        The new set and matchers replace the old ones at once; rules added by
+        the hooks meanwhile are in the change log and replayed by the watcher.
+        """
+        domains = self.db.get_active_domains()
+        networks = self.db.get_active_networks()
+        rules = set(domains)
+        rules.update(networks)
+        rules.add('plugin-tls-loaded')
+        for rule in self.ignore_hosts.copy():
+            if rule not in rules:
+                self.failure_cache.discard(rule)
+        
+        self.matcher = HostMatcher(domains)
+        self.networks = NetworkMatcher(networks)
+        self.ignore_hosts = rules
+        logger.warning(f"Reloaded the whole ignore list: {len(domains)} domains and {len(networks)} networks")
+        self.save_ignore_hosts()
+
+    @_HOOK_LATENCY.labels('tcp_end').time()
+    async def tcp_end(self, flow: tcp.TCPFlow):
         """
         Handle TCP connection end events.
         
@@ -126,24 +642,57 @@ class TlsManager:
         if not sni:
             return
             
+        if not self.started and not await self.wait_started():
+            return
         if hasattr(flow, "error") and flow.error and "TLS" in flow.error.msg:
-            if sni not in self.ignore_hosts:
-                logger.info(f"TCP TLS handshake failure detected for {sni}, adding to ignore list")
-                self.db.add_domain(sni, "tcp_tls_error")
-                self.ignore_hosts.add(sni)
-                self.update_ignore_hosts()
+            _TCP_FAILURES.inc()
+            # Cached under the stored form of the rule, so that removing the rule discards it
+            endpoint = canonical_network(sni) or sni
+            if self.failure_cache.seen(endpoint, "tcp_tls_error"):
+                _FAILURES_DEDUPLICATED.inc()
+                return
+            self.record_failure(endpoint, "tcp_tls_error", "TCP TLS handshake failure detected")
             return
 
-    def tls_failed_client(self, data):
+    @_HOOK_LATENCY.labels('tls_failed_client').time()
+    async def tls_failed_client(self, data):
         """
         Handle TLS client failures.
         
         Detects TLS handshake failures from client side and automatically
-        adds failing domains to the ignore list.
+        adds failing domains to the ignore list. Repeated failures of the
+        same endpoint are absorbed by the failure cache.
         
         Args:
             data: TLS failure data from mitmproxy
         """
+        sni, from_server_ip = self._failure_endpoint(data)
+        if not sni:
+            return
+        
+        if not self.started and not await self.wait_started():
+            return
+        _CLIENT_FAILURES.inc()
+        # Cached under the stored form of the rule, so that removing the rule discards it
+        endpoint = canonical_network(sni) or sni
+        if self.failure_cache.seen(endpoint, "client_tls_error"):
+            _FAILURES_DEDUPLICATED.inc()
+            return
+        
+        if from_server_ip:
+            logger.warning(f"TLS failed, SNI not available, using server IP: {sni}")
+        self.record_failure(endpoint, "client_tls_error", "Client TLS handshake failure")
+
+    def _failure_endpoint(self, data):
+        """
+        Extract the failing endpoint from TLS failure data.
+        
+        Args:
+            data: TLS failure data from mitmproxy
+        
+        Returns:
+            tuple: (SNI, domain or server IP, or None; True if the server IP fallback was used)
+        """
         sni = getattr(data, "sni", None) or getattr(data, "server_name", None) or getattr(data, "server_hostname", None)
         
         if not sni:
@@ -159,19 +708,30 @@ class TlsManager:
             try:
                 server_address = data.server_conn.address
                 if server_address:
-                    sni = server_address[0]
-                    logger.warning(f"TLS failed, SNI not available, using server IP: {sni}")
+                    return server_address[0], True
             except Exception:
                 logger.error("TLS failed but SNI/domain/IP could not be extracted")
-                return
-                
-        if sni and sni not in self.ignore_hosts:
-            logger.info(f"Client TLS handshake failure for {sni}, adding to ignore list")
-            self.db.add_domain(sni, "client_tls_error")
-            self.ignore_hosts.add(sni)
-            self.update_ignore_hosts()
-
-# Export addon for mitmproxy
-addons = [
-    TlsManager()
-]
+            return None, False
+        
+        return sni, False
+
+    def record_failure(self, endpoint: str, origin: str, description: str):
+        """
+        Process the first failure of an endpoint within the cache TTL.
+        
+        Args:
+            endpoint: Failing SNI or server IP; an IP is recorded as a single-address network
+            origin: Origin to record the failure under
+            description: Log message prefix describing the failure
+        """
+        endpoint = canonical_network(endpoint) or endpoint
+        if endpoint in self.ignore_hosts:
+            # Already ignored, e.g. learned before a restart: only refresh count and last_seen
+            self.writer.submit(endpoint, origin)
+            return
+        
+        logger.info(f"{description} for {endpoint}, adding to ignore list")
+        self.ignore_domain(endpoint, origin)
+
+# Addon class instantiated by the plugin loader (see core/loader.py)
+entry_point = "TlsManager"
@@ -2,7 +2,7 @@
 Migration script for upgrading from old HttpPro versions.
 
 This script helps migrate from file-based ignore lists to the new
-database-driven system.
+database-driven system, and upgrades the database schema.
 """
 
 import os
@@ -16,6 +16,8 @@ from datetime import datetime
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from core.database import IgnoreHostsDB
+from core.connection import ConnectionManager
+from core import migrations
 
 logger = logging.getLogger(__name__)
 
@@ -34,9 +36,10 @@ def migrate_ignore_file(file_path: str, db_path: Optional[str] = None, origin: s
     
     try:
         db = IgnoreHostsDB(db_path)
-        count = db.import_from_file(file_path, origin)
+        result = db.bulk_import_file(file_path, origin)
         
-        logger.info(f"Successfully migrated {count} domains from {file_path}")
+        logger.info(f"Successfully migrated {result['inserted']} new domains from {file_path} "
+                    f"({result['updated']} already present)")
         
         # Create backup of original file
         backup_path = f"{file_path}.backup.{datetime.now().strftime('%Y%m%d_%H%M%S')}"
@@ -53,15 +56,53 @@ def migrate_ignore_file(file_path: str, db_path: Optional[str] = None, origin: s
         logger.error(f"Migration failed: {e}")
         return False
 
+def migrate_schema(db_path: Optional[str] = None, status_only: bool = False) -> bool:
+    """
+    Report the database schema version and upgrade it to the current one.
+    
+    The upgrade runs online in batches, so the proxy may keep running;
+    proxies of older versions must be restarted once it completed.
+    
+    Args:
+        db_path: Optional path to the database file
+        status_only: Only report the version, without upgrading
+    """
+    if db_path is None:
+        db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ignore_hosts.db')
+    if not os.path.exists(db_path):
+        logger.error(f"Database not found: {db_path}")
+        return False
+    
+    connections = ConnectionManager(db_path)
+    try:
+        version = connections.execute(migrations.get_version)
+    finally:
+        connections.close_all()
+    print(f"Schema version: {version} (current: {migrations.SCHEMA_VERSION})")
+    if status_only or version == migrations.SCHEMA_VERSION:
+        return version <= migrations.SCHEMA_VERSION
+    
+    try:
+        IgnoreHostsDB(db_path).close()
+        print(f"Database upgraded to schema version {migrations.SCHEMA_VERSION}")
+        return True
+    except Exception as e:
+        logger.error(f"Schema migration failed: {e}")
+        return False
+
 def main():
     """Main migration script entry point."""
     parser = argparse.ArgumentParser(description="Migrate HttpPro to database format")
-    parser.add_argument("--file", required=True, help="Path to ignore-host.txt file to migrate")
+    parser.add_argument("--file", help="Path to ignore-host.txt file to migrate")
+    parser.add_argument("--schema", action="store_true", help="Upgrade the database schema to the current version")
+    parser.add_argument("--status", action="store_true", help="Only report the database schema version")
     parser.add_argument("--db", help="Database file path (optional)")
     parser.add_argument("--origin", default="migration", help="Origin tag for migrated domains")
     parser.add_argument("--verbose", "-v", action="store_true", help="Enable verbose logging")
     
     args = parser.parse_args()
+    if not (args.file or args.schema or args.status):
+        parser.error("one of --file, --schema or --status is required")
     
     # Setup logging
     level = logging.DEBUG if args.verbose else logging.INFO
@@ -70,6 +111,12 @@ def main():
         format='%(asctime)s - %(levelname)s - %(message)s'
     )
     
+    if args.schema or args.status:
+        if not migrate_schema(args.db, status_only=args.status):
+            sys.exit(1)
+        if not args.file:
+            return
+    
     logger.info("Starting HttpPro migration")
     
     success = migrate_ignore_file(args.file, args.db, args.origin)
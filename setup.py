@@ -41,7 +41,7 @@ setup(
     },
     include_package_data=True,
     package_data={
-        "httppro": ["config/*.yaml"],
+        "httppro": ["config/*.yaml", "config/*.dat"],
     },
     project_urls={
         "Bug Reports": "https://github.com/yourusername/httppro/issues",
@@ -0,0 +1,100 @@
+"""
+Test suite for the asyncio database facade.
+"""
+
+import unittest
+import tempfile
+import shutil
+import os
+import asyncio
+import threading
+from core.asyncdb import AsyncIgnoreHostsDB
+from core.database import IgnoreHostsDB
+
+class TestAsyncIgnoreHostsDB(unittest.TestCase):
+    """Test cases for AsyncIgnoreHostsDB."""
+
+    def setUp(self):
+        """Set up a temporary database."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'test.db')
+
+    def tearDown(self):
+        """Clean up."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_operations(self):
+        """Test awaitable writes and reads, and that they run off the event loop thread."""
+        async def main():
+            adb = await AsyncIgnoreHostsDB.open(self.db_path, readers=2)
+            try:
+                self.assertTrue(await adb.add_domain('example.com', 'manual'))
+                self.assertEqual(await adb.add_domain_batch(['a.com', '10.0.0.0/8']),
+                                 {'a.com': 'added', '10.0.0.0/8': 'added'})
+                self.assertTrue(await adb.remove_domain('a.com'))
+                self.assertEqual((await adb.get_domain_info('example.com'))[:2], ('example.com', 'manual'))
+                self.assertEqual((await adb.get_stats())['active_domains'], 1)
+
+                loop_thread = threading.current_thread()
+                self.assertIsNot(await adb.read(threading.current_thread), loop_thread)
+                self.assertTrue((await adb.write(threading.current_thread)).name.startswith('httppro-db-writer'))
+                with self.assertRaises(ValueError):
+                    await adb.write(int, 'not a number')
+            finally:
+                await adb.aclose()
+            with self.assertRaises(RuntimeError):
+                await adb.get_stats()
+
+        asyncio.run(main())
+
+    def test_streaming(self):
+        """Test that iter_domains and search_domains stream every row in batches."""
+        db = IgnoreHostsDB(self.db_path)
+        db.add_domains([(f"host{i}.example.com", 'manual', 1) for i in range(25)])
+        adb = AsyncIgnoreHostsDB(db, stream_batch_size=10)
+
+        async def main():
+            domains = [row[0] async for row in adb.iter_domains()]
+            found = [row[0] async for row in adb.search_domains('*.example.com', limit=12)]
+            first = None
+            async for row in adb.iter_domains(batch_size=5):
+                first = row[0]
+                break
+            return domains, found, first
+
+        try:
+            domains, found, first = asyncio.run(main())
+        finally:
+            adb.close()
+            db.close()
+        self.assertEqual(sorted(domains), sorted(f"host{i}.example.com" for i in range(25)))
+        self.assertEqual(len(found), 12)
+        self.assertEqual(first, domains[0])
+
+    def test_backpressure_and_cancellation(self):
+        """Test that writes beyond max_pending wait, and that a cancelled queued write never runs."""
+        db = IgnoreHostsDB(self.db_path)
+        adb = AsyncIgnoreHostsDB(db, max_pending=1)
+        release = threading.Event()
+
+        async def main():
+            blocker = asyncio.ensure_future(adb.write(release.wait))
+            queued = asyncio.ensure_future(adb.add_domain('cancelled.com', 'manual'))
+            await asyncio.sleep(0.05)
+            # The blocker holds the only slot, so the second write is waiting on the event loop
+            self.assertFalse(queued.done())
+            queued.cancel()
+            release.set()
+            await blocker
+            with self.assertRaises(asyncio.CancelledError):
+                await queued
+            return await adb.get_domain_info('cancelled.com')
+
+        try:
+            self.assertIsNone(asyncio.run(main()))
+        finally:
+            adb.close()
+            db.close()
+
+if __name__ == '__main__':
+    unittest.main()
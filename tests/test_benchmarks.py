@@ -0,0 +1,28 @@
+"""
+Smoke tests for the benchmark suite.
+"""
+
+import unittest
+from benchmarks import run as bench
+
+class TestBenchmarkSuite(unittest.TestCase):
+    """Test cases for the benchmark runner."""
+
+    def test_small_run(self):
+        """Test that every benchmark runs on a small corpus and reports timings."""
+        document = bench.run([200])
+        self.assertEqual(set(document['results']), {f"{name}[200]" for name, _ in bench.BENCHMARKS})
+        self.assertGreater(document['results']['tls_manager[200]']['tls_failed_client_us'], 0)
+
+    def test_compare(self):
+        """Test that only timings slower than the threshold are regressions."""
+        baseline = {'results': {'get_stats[1000]': {'get_stats_us': 10.0, 'calls': 5}}}
+        current = {'results': {'get_stats[1000]': {'get_stats_us': 11.0, 'calls': 50},
+                               'matcher[1000]': {'matcher_lookup_us': 1.0}}}
+        self.assertEqual(bench.compare(current, baseline, 0.2), [])
+        current['results']['get_stats[1000]']['get_stats_us'] = 13.0
+        self.assertEqual(bench.compare(current, baseline, 0.2),
+                         [('get_stats[1000]', 'get_stats_us', 10.0, 13.0, 1.3)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+"""
+Test suite for the TLS failure deduplication cache.
+"""
+
+import unittest
+from core.cache import FailureCache
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestFailureCache(unittest.TestCase):
+    """Test cases for FailureCache class."""
+
+    def setUp(self):
+        """Set up cache with a fake clock."""
+        self.clock = FakeClock()
+        self.cache = FailureCache(maxsize=2, ttl=10.0, flush_interval=5.0, clock=self.clock)
+
+    def test_repeats_are_aggregated(self):
+        """Test that repeats hit the cache and are drained as one count."""
+        self.assertFalse(self.cache.seen("example.com", "test"))
+        self.assertTrue(self.cache.seen("example.com", "test"))
+        self.assertTrue(self.cache.seen("example.com", "test"))
+
+        self.assertEqual(self.cache.drain(), [("example.com", "test", 2)])
+        self.assertEqual(self.cache.drain(), [])
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+
+    def test_entries_expire(self):
+        """Test that an endpoint is processed again after its TTL."""
+        self.cache.seen("example.com", "test")
+        self.clock.now = 11.0
+        self.assertFalse(self.cache.seen("example.com", "test"))
+        self.assertEqual(self.cache.stats()['expirations'], 1)
+
+    def test_lru_eviction_keeps_pending_counts(self):
+        """Test that evicting an endpoint does not lose its aggregated repeats."""
+        self.cache.seen("a.com", "test")
+        self.cache.seen("a.com", "test")
+        self.cache.seen("b.com", "test")
+        self.cache.seen("c.com", "test")
+
+        self.assertEqual(len(self.cache), 2)
+        self.assertFalse(self.cache.seen("a.com", "test"))
+        self.assertEqual(self.cache.drain(), [("a.com", "test", 1)])
+
+    def test_flush_due(self):
+        """Test that draining is due only with pending repeats after the interval."""
+        self.cache.seen("example.com", "test")
+        self.cache.seen("example.com", "test")
+        self.assertFalse(self.cache.flush_due())
+        self.clock.now = 5.0
+        self.assertTrue(self.cache.flush_due())
+        self.cache.drain()
+        self.assertFalse(self.cache.flush_due())
+
+    def test_discard_drops_pending_repeats(self):
+        """Test that a discarded endpoint is neither cached nor drained."""
+        self.cache.seen("a.com", "test")
+        self.cache.seen("a.com", "test")
+        self.cache.discard("a.com")
+
+        self.assertEqual(self.cache.drain(), [])
+        self.assertFalse(self.cache.seen("a.com", "test"))
+
+if __name__ == '__main__':
+    unittest.main()
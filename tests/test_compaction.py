@@ -0,0 +1,225 @@
+"""
+Test suite for expiry and compaction of stale domains.
+"""
+
+import unittest
+import tempfile
+import os
+from core.database import IgnoreHostsDB, now_us
+from core.compaction import Compactor, parse_duration, parse_ttls
+from core.reload import ChangeWatcher
+
+DAY_US = 86400 * 1000000
+
+class TestCompaction(unittest.TestCase):
+    """Test cases for the compaction methods and Compactor class."""
+
+    def setUp(self):
+        """Set up a test database."""
+        self.temp_db = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        self.temp_db.close()
+        os.unlink(self.temp_db.name)
+        self.db = IgnoreHostsDB(self.temp_db.name)
+
+    def tearDown(self):
+        """Clean up the test database."""
+        self.db.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.temp_db.name + suffix):
+                os.unlink(self.temp_db.name + suffix)
+
+    def _age(self, domain: str, days: float):
+        """Move a domain's last_seen the given number of days into the past."""
+        self.db.connections.execute(lambda conn: conn.execute(
+            'UPDATE ignore_hosts SET last_seen = ? WHERE domain = ?', (now_us() - int(days * DAY_US), domain)
+        ), write=True)
+
+    def _active(self):
+        """Get the set of active domains."""
+        return set(self.db.get_active_domains())
+
+    def test_parse_duration_and_ttls(self):
+        """Test duration and per-origin TTL parsing."""
+        self.assertEqual(parse_duration('30d'), 30 * 86400)
+        self.assertEqual(parse_duration('12h'), 12 * 3600)
+        self.assertEqual(parse_duration('90m'), 90 * 60)
+        self.assertEqual(parse_duration('45'), 45)
+        self.assertEqual(parse_duration(1.5), 1.5)
+        self.assertEqual(parse_ttls('tcp_tls_error=30d, client_tls_error=1w'),
+                         {'tcp_tls_error': 30 * 86400, 'client_tls_error': 7 * 86400})
+        self.assertEqual(parse_ttls(''), {})
+        for invalid in ('30x', 'soon'):
+            with self.assertRaises(ValueError):
+                parse_duration(invalid)
+        with self.assertRaises(ValueError):
+            parse_ttls('30d')
+
+    def test_expire_per_origin(self):
+        """Test that only stale domains of origins with a TTL are deactivated and logged."""
+        self.db.add_domain('stale.com', 'tcp_tls_error')
+        self.db.add_domain('fresh.com', 'tcp_tls_error')
+        self.db.add_domain('manual.com', 'manual')
+        self._age('stale.com', 40)
+        self._age('manual.com', 400)
+        removed_sets = []
+        watcher = ChangeWatcher(self.db, lambda added, removed: removed_sets.append(removed))
+
+        expired = self.db.expire_domains({'tcp_tls_error': 30 * 86400}, batch_size=1)
+        self.assertEqual(expired, {'tcp_tls_error': 1})
+        self.assertEqual(self._active(), {'fresh.com', 'manual.com'})
+        self.assertEqual(self.db.get_stats()['active_domains'], 2)
+
+        # The deactivation reaches the change log and counts as recent for purging
+        watcher.poll()
+        self.assertEqual(removed_sets, [['stale.com']])
+        self.assertEqual(self.db.purge_inactive(86400), 0)
+
+    def test_touch_keeps_domains_alive(self):
+        """Test that refreshed domains are not expired."""
+        self.db.add_domain('used.com', 'tcp_tls_error')
+        self.db.add_domain('idle.com', 'tcp_tls_error')
+        self._age('used.com', 40)
+        self._age('idle.com', 40)
+
+        self.assertEqual(self.db.touch_domains(['used.com', 'unknown.com']), 1)
+        self.db.expire_domains({'tcp_tls_error': 30 * 86400})
+        self.assertEqual(self._active(), {'used.com'})
+
+    def test_purge_inactive(self):
+        """Test that long-inactive domains are deleted and statistics follow."""
+        for domain in ('old.com', 'recent.com', 'active.com'):
+            self.db.add_domain(domain, 'manual')
+        self.db.remove_domain('old.com')
+        self.db.remove_domain('recent.com')
+        self._age('old.com', 100)
+
+        self.assertEqual(self.db.purge_inactive(90 * 86400, batch_size=1), 1)
+        self.assertIsNone(self.db.get_domain_info('old.com'))
+        self.assertIsNotNone(self.db.get_domain_info('recent.com'))
+        self.assertEqual(self.db.reconcile_stats(fix=False), {})
+
+    def test_evict_least_recent(self):
+        """Test that the cap evicts the least recently seen domains, sparing exempt origins."""
+        for i in range(5):
+            self.db.add_domain(f'auto{i}.com', 'tcp_tls_error')
+            self._age(f'auto{i}.com', 10 - i)
+        self.db.add_domain('pinned.com', 'manual')
+        self._age('pinned.com', 100)
+
+        evicted = self.db.evict_least_recent(3, exempt_origins=['manual'], batch_size=2)
+        self.assertEqual(evicted, ['auto0.com', 'auto1.com', 'auto2.com'])
+        self.assertEqual(self._active(), {'pinned.com', 'auto3.com', 'auto4.com'})
+        self.assertEqual(self.db.evict_least_recent(3, exempt_origins=['manual']), [])
+
+    def test_compactor_run(self):
+        """Test a compactor run applying every policy and reporting it."""
+        self.db.add_domain('seen.com', 'tcp_tls_error')
+        self.db.add_domain('stale.com', 'tcp_tls_error')
+        self.db.add_domain('gone.com', 'client_tls_error')
+        self.db.remove_domain('gone.com')
+        for domain in ('seen.com', 'stale.com', 'gone.com'):
+            self._age(domain, 60)
+
+        compactor = Compactor(self.db, ttls={'tcp_tls_error': 30 * 86400}, purge_after=30 * 86400,
+                              touched=lambda: {'seen.com'})
+        report = compactor.run()
+        self.assertEqual(report['touched'], 1)
+        self.assertEqual(report['expired'], {'tcp_tls_error': 1})
+        self.assertEqual(report['purged'], 1)
+        self.assertEqual(self._active(), {'seen.com'})
+        self.assertEqual(compactor.stats()['runs'], 1)
+        self.assertFalse(Compactor(self.db).enabled)
+
+    def test_aggregate_siblings(self):
+        """Test that siblings above the threshold are replaced by a wildcard rule, never under a public suffix."""
+        self.db.add_domains([(f'a{i}.cdn.example.net', 'tcp_tls_error', 1) for i in range(4)] +
+                            [('x.a0.cdn.example.net', 'client_tls_error', 1),
+                             ('pinned.cdn.example.net', 'manual', 1)] +
+                            [(f'd{i}.cloudfront.net', 'tcp_tls_error', 1) for i in range(4)] +
+                            [(f'10.0.0.{i}', 'tcp_tls_error', 1) for i in range(4)])
+
+        self.assertEqual(list(self.db.aggregate_siblings(3, dry_run=True)), ['*.cdn.example.net'])
+        self.assertEqual(self.db.get_aggregations(), {})
+        self.assertEqual(self.db.aggregate_siblings(4), {})
+
+        aggregated = self.db.aggregate_siblings(3)
+        self.assertEqual(aggregated, {'*.cdn.example.net': ['a0.cdn.example.net', 'a1.cdn.example.net',
+                                                            'a2.cdn.example.net', 'a3.cdn.example.net',
+                                                            'x.a0.cdn.example.net']})
+        active = self._active()
+        self.assertIn('*.cdn.example.net', active)
+        self.assertIn('pinned.cdn.example.net', active)
+        self.assertIn('d0.cloudfront.net', active)
+        self.assertIn('10.0.0.1/32', self.db.get_active_networks())
+        self.assertNotIn('a0.cdn.example.net', active)
+        self.assertEqual(self.db.get_domain_info('*.cdn.example.net')[1], 'aggregated')
+        self.assertEqual(self.db.get_aggregations(), {'*.cdn.example.net': 5})
+
+        # Replaced domains are kept by purges so the aggregation stays reversible
+        self._age('a0.cdn.example.net', 100)
+        self.assertEqual(self.db.purge_inactive(86400), 0)
+
+    def test_disaggregate(self):
+        """Test that undoing an aggregation restores the replaced domains and retires the rule."""
+        self.db.add_domains([(f'a{i}.cdn.example.net', 'tcp_tls_error', 1) for i in range(3)])
+        self.db.aggregate_siblings(2)
+        removed_sets = []
+        watcher = ChangeWatcher(self.db, lambda added, removed: removed_sets.append((sorted(added), removed)))
+
+        self.assertEqual(self.db.disaggregate('*.cdn.example.net'),
+                         ['a0.cdn.example.net', 'a1.cdn.example.net', 'a2.cdn.example.net'])
+        self.assertEqual(self._active(), {'a0.cdn.example.net', 'a1.cdn.example.net', 'a2.cdn.example.net'})
+        self.assertEqual(self.db.get_domain_info('a0.cdn.example.net')[1], 'tcp_tls_error')
+        self.assertEqual(self.db.get_aggregations(), {})
+        watcher.poll()
+        self.assertEqual(removed_sets, [(['a0.cdn.example.net', 'a1.cdn.example.net', 'a2.cdn.example.net'],
+                                         ['*.cdn.example.net'])])
+        self.assertEqual(self.db.disaggregate('*.cdn.example.net'), [])
+
+    def test_touch_refreshes_wildcard_rule(self):
+        """Test that a match reported under the bare name refreshes its wildcard rule."""
+        self.db.add_domain('*.cdn.example.net', 'aggregated')
+        self._age('*.cdn.example.net', 40)
+        self.assertEqual(self.db.touch_domains(['cdn.example.net']), 1)
+        self.db.expire_domains({'aggregated': 30 * 86400})
+        self.assertEqual(self._active(), {'*.cdn.example.net'})
+
+    def test_incremental_vacuum_releases_pages(self):
+        """Test that pages freed by a purge are returned to the file system."""
+        self.db.import_domains((f'host{i}.example.com' for i in range(5000)), 'file_import')
+        self.db.connections.execute(lambda conn: conn.execute('UPDATE ignore_hosts SET active = 0'), write=True)
+        self.db.purge_inactive(0)
+
+        self.assertEqual(self.db.incremental_vacuum(5), 5)
+        self.assertGreater(self.db.incremental_vacuum(), 0)
+        self.assertEqual(self.db.connections.execute(
+            lambda conn: conn.execute('PRAGMA freelist_count').fetchone()[0]), 0)
+
+    def test_prune_changes(self):
+        """Test that only change log entries every reader has processed are pruned."""
+        self.db.add_domains([(f'host{i}.example.com', 'manual', 1) for i in range(20)])
+        last = self.db.get_change_seq()
+        self.db.set_replication_cursor('publish:a', last - 5)
+
+        self.assertEqual(self.db.prune_changes(keep=10, batch_size=3), last - 10)
+        self.assertEqual(self.db.get_pruned_seq(), last - 10)
+        self.assertEqual(self.db.get_changes_since(0)[0][0], last - 9)
+
+        # The caller's watcher and unpublished changes are kept, and so is the newest entry
+        self.assertEqual(self.db.prune_changes(keep=0, upto=last - 7), 3)
+        self.assertEqual(self.db.prune_changes(keep=0), 2)
+        self.db.set_replication_cursor('publish:a', last)
+        self.assertEqual(self.db.prune_changes(keep=0), 4)
+        self.assertEqual(self.db.get_change_seq(), last)
+
+        self.db.add_domain('new.example.com', 'manual')
+        floor = [last - 1]
+        compactor = Compactor(self.db, keep_changes=0, change_floor=lambda: floor[0])
+        self.assertTrue(compactor.enabled)
+        self.assertEqual(compactor.run()['pruned_changes'], 0)
+        floor[0] = last
+        self.assertEqual(compactor.run()['pruned_changes'], 1)
+        self.assertEqual(compactor.stats()['pruned_changes'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
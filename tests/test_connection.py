@@ -0,0 +1,117 @@
+"""
+Test suite for the SQLite connection manager.
+"""
+
+import unittest
+import tempfile
+import threading
+import multiprocessing
+import sqlite3
+import os
+from core.connection import ConnectionManager
+from core.database import IgnoreHostsDB
+
+WRITERS = 4
+DOMAINS_PER_WRITER = 150
+
+def _writer_process(db_path, writer_id):
+    """Add a range of domains, plus a shared one, from a separate process."""
+    db = IgnoreHostsDB(db_path, busy_timeout=0.05)
+    for i in range(DOMAINS_PER_WRITER):
+        db.add_domain(f"host{i}.writer{writer_id}.example.com", "test")
+        db.add_domain("shared.example.com", "test")
+    db.close()
+
+def _remove_db_files(path):
+    """Remove a database file together with its WAL and shared-memory files."""
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.unlink(path + suffix)
+
+class TestConnectionManager(unittest.TestCase):
+    """Test cases for ConnectionManager class."""
+
+    def setUp(self):
+        """Set up test database."""
+        self.temp_db = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        self.temp_db.close()
+        self.manager = ConnectionManager(self.temp_db.name, synchronous='FULL', busy_timeout=0.05)
+
+    def tearDown(self):
+        """Clean up test database."""
+        self.manager.close_all()
+        _remove_db_files(self.temp_db.name)
+
+    def test_pragmas(self):
+        """Test that WAL mode and the synchronous level are applied."""
+        conn = self.manager.connection()
+        self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        self.assertEqual(conn.execute('PRAGMA synchronous').fetchone()[0], 2)
+
+    def test_invalid_synchronous_level(self):
+        """Test that unknown synchronous levels are rejected."""
+        with self.assertRaises(ValueError):
+            ConnectionManager(self.temp_db.name, synchronous='SOMETIMES')
+
+    def test_connection_is_thread_local(self):
+        """Test that each thread reuses its own connection."""
+        main_conn = self.manager.connection()
+        self.assertIs(self.manager.connection(), main_conn)
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(self.manager.connection()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], main_conn)
+
+    def test_write_rolls_back_on_error(self):
+        """Test that a failing write operation leaves no partial changes."""
+        self.manager.execute(lambda conn: conn.execute('CREATE TABLE t (x INTEGER)'), write=True)
+
+        def _fail(conn):
+            conn.execute('INSERT INTO t VALUES (1)')
+            raise RuntimeError("boom")
+
+        with self.assertRaises(RuntimeError):
+            self.manager.execute(_fail, write=True)
+        count = self.manager.execute(lambda conn: conn.execute('SELECT COUNT(*) FROM t').fetchone()[0])
+        self.assertEqual(count, 0)
+
+    def test_retries_while_locked(self):
+        """Test that a write waits out another connection's lock."""
+        self.manager.execute(lambda conn: conn.execute('CREATE TABLE t (x INTEGER)'), write=True)
+        blocker = sqlite3.connect(self.temp_db.name, isolation_level=None, check_same_thread=False)
+        blocker.execute('BEGIN IMMEDIATE')
+        timer = threading.Timer(0.2, blocker.rollback)
+        timer.start()
+        try:
+            self.manager.execute(lambda conn: conn.execute('INSERT INTO t VALUES (1)'), write=True)
+        finally:
+            timer.join()
+            blocker.close()
+        count = self.manager.execute(lambda conn: conn.execute('SELECT COUNT(*) FROM t').fetchone()[0])
+        self.assertEqual(count, 1)
+
+    def test_concurrent_writer_processes(self):
+        """Test that several processes can write to the same database without losing rows."""
+        IgnoreHostsDB(self.temp_db.name).close()
+
+        context = multiprocessing.get_context('spawn')
+        processes = [context.Process(target=_writer_process, args=(self.temp_db.name, i))
+                     for i in range(WRITERS)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+            self.assertEqual(process.exitcode, 0)
+
+        db = IgnoreHostsDB(self.temp_db.name)
+        try:
+            stats = db.get_stats()
+            self.assertEqual(stats['total_domains'], WRITERS * DOMAINS_PER_WRITER + 1)
+            self.assertEqual(db.get_domain_info("shared.example.com")[4], WRITERS * DOMAINS_PER_WRITER)
+        finally:
+            db.close()
+
+if __name__ == '__main__':
+    unittest.main()
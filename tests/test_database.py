@@ -4,8 +4,10 @@ Test suite for HttpPro core functionality.
 
 import unittest
 import tempfile
+import gzip
+import sqlite3
 import os
-from core.database import IgnoreHostsDB
+from core.database import IgnoreHostsDB, parse_pattern
 
 class TestIgnoreHostsDB(unittest.TestCase):
     """Test cases for IgnoreHostsDB class."""
@@ -18,8 +20,10 @@ class TestIgnoreHostsDB(unittest.TestCase):
     
     def tearDown(self):
         """Clean up test database."""
-        if os.path.exists(self.temp_db.name):
-            os.unlink(self.temp_db.name)
+        self.db.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.temp_db.name + suffix):
+                os.unlink(self.temp_db.name + suffix)
     
     def test_add_domain(self):
         """Test adding a domain to the database."""
@@ -62,5 +66,213 @@ class TestIgnoreHostsDB(unittest.TestCase):
         self.assertEqual(stats['origins']['test'], 1)
         self.assertEqual(stats['origins']['manual'], 1)
 
+    def test_stats_follow_status_changes(self):
+        """Test that counters track deactivation and reactivation."""
+        self.db.add_domain("example.com", "test")
+        self.db.add_domain("test.com", "test")
+        self.db.remove_domain("example.com")
+        
+        stats = self.db.get_stats()
+        self.assertEqual(stats['active_domains'], 1)
+        self.assertEqual(stats['inactive_domains'], 1)
+        self.assertEqual(stats['origins'], {'test': 1})
+        
+        self.db.add_domain("example.com", "other")
+        stats = self.db.get_stats()
+        self.assertEqual(stats['active_domains'], 2)
+        self.assertEqual(stats['origins'], {'test': 2})
+    
+    def test_reconcile_stats(self):
+        """Test that drifted counters are detected and rebuilt."""
+        self.db.add_domain("example.com", "test")
+        self.assertEqual(self.db.reconcile_stats(), {})
+        
+        self.db.connections.execute(
+            lambda conn: conn.execute("UPDATE ignore_hosts_stats SET domains = 5"), write=True)
+        self.assertEqual(self.db.reconcile_stats(), {('domains', 'test', 1): (5, 1)})
+        self.assertEqual(self.db.get_stats()['active_domains'], 1)
+        
+        self.db.add_network("203.0.113.0/24", "test")
+        self.db.add_network("198.51.100.7", "manual")
+        self.db.remove_network("198.51.100.7")
+        self.db.connections.execute(
+            lambda conn: conn.execute("DELETE FROM ignore_networks_stats WHERE origin = 'manual'"), write=True)
+        self.assertEqual(self.db.reconcile_stats(), {('networks', 'manual', 0): (0, 1)})
+        stats = self.db.get_stats()
+        self.assertEqual((stats['active_networks'], stats['inactive_networks']), (1, 1))
+    
+    def test_bulk_import_counts(self):
+        """Test that bulk import reports inserted, updated and skipped lines."""
+        self.db.add_domain("existing.com", "manual")
+        lines = ["# comment\n", "new.com\n", "\n", "existing.com\n", "new.com\n", "plugin-tls-loaded\n"]
+        
+        result = self.db.import_domains(lines, "file_import", chunk_size=2)
+        self.assertEqual(result, {'inserted': 1, 'updated': 2, 'skipped': 3})
+        self.assertEqual(self.db.get_domain_info("new.com")[4], 2)
+        self.assertEqual(self.db.get_domain_info("existing.com")[1], "manual")
+    
+    def test_import_gzip_file(self):
+        """Test importing a gzip-compressed domain list."""
+        path = self.temp_db.name + '.txt.gz'
+        with gzip.open(path, 'wt', encoding='utf-8') as file:
+            file.write("example.com\ntest.com\n")
+        try:
+            self.assertEqual(self.db.import_from_file(path), 2)
+        finally:
+            os.unlink(path)
+        self.assertEqual(self.db.get_active_domains(), ["example.com", "test.com"])
+
+    def test_sync_from_file_skips_checkpointed_file(self):
+        """Test that an exported file is not imported again and edits import only new lines."""
+        path = self.temp_db.name + '.txt'
+        self.db.add_domain("example.com", "test")
+        self.db.add_domain("stale.com", "test")
+        try:
+            self.db.export_to_file(path)
+            self.db.record_file_checkpoint(path)
+            self.assertFalse(self.db.sync_from_file(path)['changed'])
+            self.assertEqual(self.db.get_domain_info("example.com")[4], 1)
+
+            # Removed after the export: the line in the file is stale
+            self.db.remove_domain("stale.com")
+            with open(path, 'a') as file:
+                file.write("new.com\n")
+            result = self.db.sync_from_file(path)
+        finally:
+            os.unlink(path)
+
+        self.assertEqual((result['changed'], result['inserted'], result['updated'], result['unchanged']),
+                         (True, 1, 0, 2))
+        self.assertEqual(self.db.get_domain_info("example.com")[4], 1)
+        self.assertEqual(self.db.get_active_domains(), ["example.com", "new.com"])
+        self.assertIsNotNone(self.db.get_file_checkpoint(path))
+
+    def test_iter_domains_pages_and_filters(self):
+        """Test that iter_domains streams pages in domain order with SQL filters."""
+        for i in range(25):
+            self.db.add_domain(f"host{i:02d}.example.com", "manual" if i % 5 == 0 else "test")
+        self.db.remove_domain("host01.example.com")
+
+        active = [row[0] for row in self.db.iter_domains(batch_size=4)]
+        self.assertEqual(len(active), 24)
+        self.assertEqual(active, sorted(active))
+
+        page = list(self.db.iter_domains(active=None, after="host09.example.com", limit=3, batch_size=2))
+        self.assertEqual([row[0] for row in page], [f"host{i}.example.com" for i in (10, 11, 12)])
+        self.assertEqual([row[0] for row in self.db.iter_domains(active=False)], ["host01.example.com"])
+        self.assertEqual(len(list(self.db.iter_domains(origin="manual"))), 5)
+        self.assertEqual(list(self.db.iter_domains(until="2000-01-01")), [])
+        self.assertEqual(len(list(self.db.iter_domains(since="2000-01-01", limit=0))), 0)
+
+    def test_suffix_prefix_and_substring_search(self):
+        """Test indexed suffix, prefix and substring searches."""
+        for domain in ("example.com", "a.example.com", "b.a.example.com", "example.com-cdn.net",
+                       "myexample.com", "cdn.other.org"):
+            self.db.add_domain(domain, "test")
+
+        def search(**filters):
+            return [row[0] for row in self.db.iter_domains(**filters)]
+
+        self.assertEqual(search(suffix="example.com"), ["example.com", "a.example.com", "b.a.example.com"])
+        self.assertEqual(search(suffix=".example.com", batch_size=1), ["a.example.com", "b.a.example.com"])
+        self.assertEqual(search(suffix=".example.com", after="a.example.com"), ["b.a.example.com"])
+        self.assertEqual(search(prefix="example.com"), ["example.com", "example.com-cdn.net"])
+        self.assertEqual(search(contains="cdn"), ["cdn.other.org", "example.com-cdn.net"])
+
+        if self.db.create_substring_index():
+            self.db.add_domain("new-cdn.net", "test")
+            self.assertEqual(search(contains="cdn"), ["cdn.other.org", "example.com-cdn.net", "new-cdn.net"])
+            self.db.drop_substring_index()
+        self.assertFalse(self.db.has_substring_index())
+
+        self.assertEqual(parse_pattern("*.example.com"), {'suffix': '.example.com'})
+        self.assertEqual(parse_pattern("api.*"), {'prefix': 'api.'})
+        self.assertEqual(parse_pattern("*cdn*"), {'contains': 'cdn'})
+        with self.assertRaises(ValueError):
+            parse_pattern("a*b")
+        self.assertEqual([row[0] for row in self.db.search_domains("*.a.example.com")], ["b.a.example.com"])
+
+    def test_reversed_column_added_to_existing_database(self):
+        """Test that a database without domain_rev gets the column filled on open."""
+        self.db.close()
+        os.unlink(self.temp_db.name)
+        conn = sqlite3.connect(self.temp_db.name)
+        conn.execute('''
+            CREATE TABLE ignore_hosts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, domain TEXT UNIQUE NOT NULL, origin TEXT NOT NULL,
+                date_added TEXT NOT NULL, last_seen TEXT NOT NULL, count INTEGER DEFAULT 1, active BOOLEAN DEFAULT 1
+            )
+        ''')
+        conn.execute("INSERT INTO ignore_hosts (domain, origin, date_added, last_seen) "
+                     "VALUES ('a.example.com', 'old', '2025-01-01', '2025-01-01')")
+        conn.commit()
+        conn.close()
+
+        self.db = IgnoreHostsDB(self.temp_db.name)
+        self.assertEqual([row[0] for row in self.db.iter_domains(suffix="example.com")], ["a.example.com"])
+
+    def test_ip_and_cidr_routed_to_networks(self):
+        """Test that addresses and prefixes are stored as canonical network rules."""
+        self.assertTrue(self.db.add_domain("203.0.113.7", "client_tls_error"))
+        self.assertFalse(self.db.add_domain("203.0.113.7/32", "client_tls_error"))
+        self.assertEqual(self.db.add_domains([("10.0.0.0/8", "manual", 1), ("example.com", "manual", 1)]), 2)
+        self.assertEqual(self.db.import_domains(["2001:db8::1", "2001:DB8::1", "test.com"])["inserted"], 2)
+        
+        self.assertEqual(self.db.get_active_domains(), ["example.com", "test.com"])
+        self.assertEqual(self.db.get_active_networks(), ["10.0.0.0/8", "203.0.113.7/32", "2001:db8::1/128"])
+        self.assertEqual(self.db.get_domain_info("203.0.113.7")[:2], ("203.0.113.7/32", "client_tls_error"))
+        self.assertEqual(self.db.get_domain_info("2001:db8::1")[4], 2)
+        
+        self.assertTrue(self.db.remove_domain("203.0.113.7"))
+        stats = self.db.get_stats()
+        self.assertEqual((stats["active_networks"], stats["inactive_networks"]), (2, 1))
+        self.assertEqual(stats["active_domains"], 2)
+        changes = [(domain, active) for _, domain, active in self.db.get_changes_since(0)]
+        self.assertIn(("203.0.113.7/32", False), changes)
+    
+    def test_collapse_networks_and_undo(self):
+        """Test that adjacent networks merge into covers that disaggregate restores."""
+        self.db.add_domains([(f"10.0.0.{i}", "client_tls_error", 1) for i in range(4)] +
+                            [("10.0.0.9", "manual", 1)])
+        
+        self.assertEqual(self.db.collapse_networks(dry_run=True),
+                         {"10.0.0.0/30": ["10.0.0.0/32", "10.0.0.1/32", "10.0.0.2/32", "10.0.0.3/32"]})
+        self.assertEqual(len(self.db.get_active_networks()), 5)
+        self.db.collapse_networks()
+        self.assertEqual(self.db.get_active_networks(), ["10.0.0.0/30", "10.0.0.9/32"])
+        self.assertEqual(self.db.get_network_info("10.0.0.0/30")[1], "aggregated")
+        
+        self.assertEqual(len(self.db.disaggregate("10.0.0.0/30")), 4)
+        self.assertEqual(len(self.db.get_active_networks()), 5)
+    
+    def test_add_and_remove_domain_batch(self):
+        """Test per-domain batch results for new, refreshed, reactivated and missing domains."""
+        self.db.add_domain("old.com", "manual")
+        self.db.add_domain("gone.com", "manual")
+        self.db.remove_domain("gone.com")
+        
+        results = self.db.add_domain_batch(["new.com", "old.com", "gone.com", "new.com", "192.0.2.1"],
+                                           "manual", chunk_size=2)
+        self.assertEqual(results, {"new.com": "added", "old.com": "updated", "gone.com": "reactivated",
+                                   "192.0.2.1/32": "added"})
+        self.assertEqual(self.db.get_domain_info("new.com")[4], 2)
+        self.assertEqual(self.db.get_active_networks(), ["192.0.2.1/32"])
+        
+        self.db.remove_domain("old.com")
+        results = self.db.remove_domain_batch(["new.com", "old.com", "missing.com", "192.0.2.1"], chunk_size=2)
+        self.assertEqual(results, {"new.com": "removed", "old.com": "inactive", "missing.com": "not_found",
+                                   "192.0.2.1/32": "removed"})
+        self.assertEqual(self.db.get_active_domains(), ["gone.com"])
+        self.assertEqual(self.db.get_active_networks(), [])
+    
+    def test_batch_lookups_within_old_variable_limit(self):
+        """Test that batch writes bind at most 999 parameters, the limit before SQLite 3.32."""
+        self.db.connections.connection().setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        domains = [f"host{i}.example.com" for i in range(1200)] + [f"10.0.{i // 256}.{i % 256}" for i in range(600)]
+        results = self.db.add_domain_batch(domains, "manual")
+        self.assertEqual(len(results), 1800)
+        self.assertEqual(set(self.db.add_domain_batch(domains, "manual").values()), {"updated"})
+        self.assertEqual(set(self.db.remove_domain_batch(domains).values()), {"removed"})
+    
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,81 @@
+"""
+Test suite for the debounced file exporter.
+"""
+
+import unittest
+import tempfile
+import shutil
+import os
+from core.exporter import DebouncedExporter, write_atomic
+
+class TestDebouncedExporter(unittest.TestCase):
+    """Test cases for DebouncedExporter class."""
+
+    def setUp(self):
+        """Set up a temporary directory and exporter."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'ignore-host.txt')
+        self.domains = ["example.com"]
+        self.renders = 0
+        self.exporter = DebouncedExporter(self.path, self._render, interval=60.0)
+
+    def tearDown(self):
+        """Clean up exporter and temporary directory."""
+        self.exporter.close()
+        shutil.rmtree(self.temp_dir)
+
+    def _render(self):
+        """Render the test domain list."""
+        self.renders += 1
+        return ''.join(f"{domain}\n" for domain in self.domains)
+
+    def test_write_atomic_leaves_no_temporary_files(self):
+        """Test that atomic writes replace the file and clean up."""
+        write_atomic(self.path, b"one\n")
+        write_atomic(self.path, b"two\n")
+        with open(self.path) as file:
+            self.assertEqual(file.read(), "two\n")
+        self.assertEqual(os.listdir(self.temp_dir), ['ignore-host.txt'])
+
+    def test_unchanged_content_is_not_rewritten(self):
+        """Test that identical content is skipped by hash."""
+        self.exporter.mark_dirty()
+        self.assertTrue(self.exporter.flush())
+        self.exporter.mark_dirty()
+        self.assertFalse(self.exporter.flush())
+        self.assertEqual(self.exporter.stats()['writes'], 1)
+        self.assertEqual(self.exporter.stats()['skipped'], 1)
+
+    def test_changes_are_coalesced(self):
+        """Test that several changes within an interval produce one write."""
+        self.exporter.mark_dirty()
+        self.assertTrue(self.exporter.flush())
+        for domain in ("a.com", "b.com", "c.com"):
+            self.domains.append(domain)
+            self.exporter.mark_dirty()
+
+        # The interval has not elapsed, so the background thread must not have written yet
+        self.assertEqual(self.exporter.stats()['writes'], 1)
+        self.exporter.close()
+        self.assertEqual(self.exporter.stats()['writes'], 2)
+        with open(self.path) as file:
+            self.assertEqual(file.read().split(), ["example.com", "a.com", "b.com", "c.com"])
+
+    def test_clean_exporter_does_not_render(self):
+        """Test that flushing without changes does nothing."""
+        self.assertFalse(self.exporter.flush())
+        self.assertEqual(self.renders, 0)
+
+    def test_bytes_content_is_written_as_is(self):
+        """Test that a render callable may return bytes."""
+        exporter = DebouncedExporter(self.path, lambda: b"bytes.example.com\n", interval=60.0)
+        try:
+            exporter.mark_dirty()
+            self.assertTrue(exporter.flush())
+        finally:
+            exporter.close()
+        with open(self.path, 'rb') as file:
+            self.assertEqual(file.read(), b"bytes.example.com\n")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+"""
+Test suite for the IP network matcher.
+"""
+
+import unittest
+import ipaddress
+import random
+from core.iptree import NetworkMatcher, canonical_network, collapse
+
+class TestNetworkMatcher(unittest.TestCase):
+    """Test cases for NetworkMatcher class and collapse function."""
+
+    def test_canonical_network(self):
+        """Test that addresses and prefixes are stored in canonical form and domains rejected."""
+        self.assertEqual(canonical_network('203.0.113.7'), '203.0.113.7/32')
+        self.assertEqual(canonical_network('10.1.2.3/8'), '10.0.0.0/8')
+        self.assertEqual(canonical_network('[2001:DB8::1]'), '2001:db8::1/128')
+        for value in ('example.com', 'host1', '1.2.3', '10.0.0.1.example.com', ''):
+            self.assertIsNone(canonical_network(value))
+
+    def test_longest_prefix_match(self):
+        """Test that the most specific covering rule is returned for IPv4, IPv6 and mapped addresses."""
+        matcher = NetworkMatcher(['10.0.0.0/8', '10.1.0.0/16', '10.1.2.3', '2001:db8::/32'])
+        self.assertEqual(matcher.match('10.1.2.3'), '10.1.2.3/32')
+        self.assertEqual(matcher.match('10.1.2.4'), '10.1.0.0/16')
+        self.assertEqual(matcher.match('10.200.0.1'), '10.0.0.0/8')
+        self.assertEqual(matcher.match('::ffff:10.1.2.3'), '10.1.2.3/32')
+        self.assertEqual(matcher.match('2001:db8:5::1'), '2001:db8::/32')
+        for address in ('11.0.0.1', '2001:db9::1', 'example.com', None):
+            self.assertIsNone(matcher.match(address))
+
+        self.assertTrue(matcher.remove('10.1.0.0/16'))
+        self.assertFalse(matcher.remove('10.1.0.0/16'))
+        self.assertEqual(matcher.match('10.1.2.4'), '10.0.0.0/8')
+        self.assertEqual(len(matcher), 3)
+        self.assertEqual(list(matcher), ['10.0.0.0/8', '10.1.2.3/32', '2001:db8::/32'])
+
+    def test_matches_linear_scan(self):
+        """Test random rules, lookups and removals against a linear scan of the networks."""
+        rng = random.Random(7)
+        networks = {ipaddress.ip_network((rng.getrandbits(bits), rng.randint(bits // 4, bits)), strict=False)
+                    for bits in (32, 128) for _ in range(300)}
+        matcher = NetworkMatcher(str(network) for network in networks)
+        for network in rng.sample(sorted(networks, key=str), 200):
+            self.assertTrue(matcher.remove(str(network)))
+            networks.discard(network)
+
+        for network in list(networks)[:200]:
+            address = network.network_address + rng.getrandbits(network.max_prefixlen - network.prefixlen)
+            covering = [candidate for candidate in networks
+                        if candidate.version == address.version and address in candidate]
+            self.assertEqual(matcher.match(str(address)), str(max(covering, key=lambda n: n.prefixlen)))
+
+    def test_collapse(self):
+        """Test lossless merges and threshold-based covering prefixes."""
+        self.assertEqual(collapse(['10.0.0.0', '10.0.0.1', '10.0.0.7', '192.168.0.0/16', '192.168.4.1']),
+                         {'10.0.0.0/31': ['10.0.0.0/32', '10.0.0.1/32'], '192.168.0.0/16': ['192.168.4.1/32']})
+        self.assertEqual(collapse(['10.0.0.1', '10.0.0.9', '10.0.0.200', '10.0.1.1', '2001:db8::1']), {})
+        self.assertEqual(collapse(['10.0.0.1', '10.0.0.9', '10.0.0.200', '10.0.1.1', '2001:db8::1'], threshold=2),
+                         {'10.0.0.0/24': ['10.0.0.1/32', '10.0.0.9/32', '10.0.0.200/32']})
+
+if __name__ == '__main__':
+    unittest.main()
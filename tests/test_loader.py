@@ -0,0 +1,128 @@
+"""
+Test suite for the plugin manifest loader.
+"""
+
+import unittest
+import tempfile
+import shutil
+import sys
+import os
+from unittest import mock
+from core import loader
+
+PLUGIN = '''
+calls = []
+
+class Addon:
+    def __init__(self):
+        calls.append("init")
+
+class Helper:
+    def __init__(self):
+        calls.append("helper")
+
+entry_point = "Addon"
+'''
+
+class TestPluginLoader(unittest.TestCase):
+    """Test cases for the plugin manifest and addon loading."""
+
+    def setUp(self):
+        """Set up a temporary plugins directory."""
+        self.plugins_dir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.plugins_dir, loader.MANIFEST_CACHE)
+
+    def tearDown(self):
+        """Clean up the plugins directory and imported test modules."""
+        for name in ('sample', 'off', 'legacy', 'bare'):
+            sys.modules.pop(name, None)
+        if self.plugins_dir in sys.path:
+            sys.path.remove(self.plugins_dir)
+        shutil.rmtree(self.plugins_dir)
+
+    def _write(self, name, source):
+        """Write a plugin module."""
+        with open(os.path.join(self.plugins_dir, f"{name}.py"), 'w') as file:
+            file.write(source)
+
+    def test_parse_plugin(self):
+        """Test that declarations are read without executing the module."""
+        declarations = loader.parse_plugin(b'raise SystemExit\nentry_point = "A"\ndisabled: bool = True\n')
+        self.assertEqual(declarations, {'entry_point': 'A', 'disabled': True, 'legacy_addons': False})
+        self.assertTrue(loader.parse_plugin(b'addons = [object()]\n')['legacy_addons'])
+
+    def test_manifest_cache_reused_while_unchanged(self):
+        """Test that unchanged files are not parsed again and edits are picked up."""
+        self._write('sample', PLUGIN)
+        manifest = loader.read_manifest(self.plugins_dir)
+        self.assertEqual([(p['name'], p['entry_point']) for p in manifest], [('sample', 'Addon')])
+        self.assertTrue(os.path.exists(self.cache_path))
+
+        with mock.patch.object(loader, 'parse_plugin') as parse:
+            self.assertEqual(loader.read_manifest(self.plugins_dir), manifest)
+            parse.assert_not_called()
+
+        self._write('sample', PLUGIN + 'disabled = True\n')
+        self.assertTrue(loader.read_manifest(self.plugins_dir)[0]['disabled'])
+
+    def test_manifest_cache_of_moved_tree(self):
+        """Test that a copied plugins directory never uses the cached paths of the original."""
+        self._write('sample', PLUGIN)
+        loader.read_manifest(self.plugins_dir)
+        copy_dir = os.path.join(tempfile.mkdtemp(), 'plugins')
+        try:
+            # copytree keeps mtimes, so only the path tells the entries apart
+            shutil.copytree(self.plugins_dir, copy_dir)
+            with mock.patch.object(loader, 'parse_plugin', side_effect=AssertionError("parsed again")):
+                manifest = loader.read_manifest(copy_dir)
+            self.assertEqual(manifest[0]['path'], os.path.join(os.path.abspath(copy_dir), 'sample.py'))
+            self.assertEqual(loader.read_manifest(self.plugins_dir)[0]['path'],
+                             os.path.join(os.path.abspath(self.plugins_dir), 'sample.py'))
+        finally:
+            shutil.rmtree(os.path.dirname(copy_dir))
+
+    def test_only_enabled_entry_points_are_loaded(self):
+        """Test that disabled plugins are not imported and only the entry point is instantiated."""
+        self._write('sample', PLUGIN)
+        self._write('off', 'raise RuntimeError("imported")\nentry_point = "Addon"\ndisabled = True\n')
+        self._write('legacy', 'addons = ["legacy-addon"]\n')
+        self._write('bare', 'raise RuntimeError("imported")\n')
+
+        addons = loader.load_addons(self.plugins_dir)
+        self.assertEqual([type(addon).__name__ for addon in addons], ['str', 'Addon'])
+        self.assertEqual(sys.modules['sample'].calls, ['init'])
+        self.assertNotIn('off', sys.modules)
+        self.assertNotIn('bare', sys.modules)
+
+    def test_edited_plugin_is_executed_again(self):
+        """Test that loading again reuses an unchanged module and re-executes an edited one."""
+        self._write('sample', PLUGIN)
+        first = loader.load_addons(self.plugins_dir)[0]
+        module = sys.modules['sample']
+        self.assertIs(type(loader.load_addons(self.plugins_dir)[0]), type(first))
+        self.assertIs(sys.modules['sample'], module)
+
+        self._write('sample', PLUGIN.replace('calls.append("init")', 'calls.append("edited")'))
+        second = loader.load_addons(self.plugins_dir)[0]
+        self.assertIsNot(type(second), type(first))
+        self.assertEqual(sys.modules['sample'].calls, ['edited'])
+
+    def test_missing_directory(self):
+        """Test that a missing plugins directory yields no addons."""
+        self.assertEqual(loader.load_addons(os.path.join(self.plugins_dir, 'missing')), [])
+
+    def test_tls_manager_construction_has_no_side_effects(self):
+        """Test that the TLS plugin only touches the database and files once started."""
+        from plugins import tls
+        with mock.patch.object(tls, 'IgnoreHostsDB') as database:
+            manager = tls.TlsManager(ignore_hosts_file=os.path.join(self.plugins_dir, 'ignore-host.txt'))
+            manager.configure({'httppro_export_interval'})
+            manager.done()
+        database.assert_not_called()
+        self.assertFalse(manager.started)
+        self.assertEqual(os.listdir(self.plugins_dir), [])
+        with open(tls.__file__, 'rb') as file:
+            self.assertEqual(loader.parse_plugin(file.read())['entry_point'], 'TlsManager')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+"""
+Test suite for the ignore-host matcher.
+"""
+
+import unittest
+from core.matcher import HostMatcher, MATCH_EXACT
+
+class TestHostMatcher(unittest.TestCase):
+    """Test cases for HostMatcher class."""
+
+    def setUp(self):
+        """Set up matcher."""
+        self.matcher = HostMatcher(["example.com", "*.cdn.net", "10.0.0.1"])
+
+    def test_plain_rule_matches_domain_and_subdomains(self):
+        """Test that plain names behave like the legacy ignore regex."""
+        self.assertEqual(self.matcher.match("example.com"), "example.com")
+        self.assertEqual(self.matcher.match("a.b.example.com"), "example.com")
+        self.assertIsNone(self.matcher.match("badexample.com"))
+        self.assertIsNone(self.matcher.match("example.com.evil.org"))
+
+    def test_wildcard_rule_matches_subdomains_only(self):
+        """Test that "*." rules do not match the apex domain."""
+        self.assertEqual(self.matcher.match("img.cdn.net"), "cdn.net")
+        self.assertIsNone(self.matcher.match("cdn.net"))
+
+    def test_exact_rule(self):
+        """Test that exact rules do not cover subdomains."""
+        self.matcher.add("api.service.io", MATCH_EXACT)
+        self.assertEqual(self.matcher.match("api.service.io"), "api.service.io")
+        self.assertIsNone(self.matcher.match("v1.api.service.io"))
+
+    def test_ip_address(self):
+        """Test that IP fallback entries match the address itself."""
+        self.assertEqual(self.matcher.match("10.0.0.1"), "10.0.0.1")
+        self.assertIsNone(self.matcher.match("10.0.0.2"))
+
+    def test_normalization(self):
+        """Test that membership checks ignore case and trailing dots."""
+        self.assertIn("WWW.Example.COM.", self.matcher)
+
+    def test_remove(self):
+        """Test that removing one mode keeps the others."""
+        self.matcher.add("*.example.com")
+        self.assertTrue(self.matcher.remove("example.com"))
+        self.assertIsNone(self.matcher.match("example.com"))
+        self.assertEqual(self.matcher.match("www.example.com"), "example.com")
+        self.assertFalse(self.matcher.remove("missing.org"))
+
+if __name__ == '__main__':
+    unittest.main()
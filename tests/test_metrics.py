@@ -0,0 +1,164 @@
+"""
+Test suite for metrics collection and the Prometheus endpoint.
+"""
+
+import unittest
+import asyncio
+import inspect
+import tempfile
+import socket
+import os
+import urllib.request
+from core.metrics import MetricsRegistry, MetricsServer, REGISTRY
+from core.database import IgnoreHostsDB
+
+class TestMetricsRegistry(unittest.TestCase):
+    """Test cases for MetricsRegistry class."""
+
+    def setUp(self):
+        """Set up an empty registry."""
+        self.registry = MetricsRegistry()
+
+    def test_counter_labels(self):
+        """Test that labelled counters render one sample per label value."""
+        failures = self.registry.counter('failures_total', 'Failures', label='origin')
+        failures.labels('tcp').inc()
+        failures.labels('client').inc(2)
+        text = self.registry.render()
+        self.assertIn('# TYPE failures_total counter', text)
+        self.assertIn('failures_total{origin="client"} 2', text)
+        self.assertIn('failures_total{origin="tcp"} 1', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test that histogram buckets, sum and count follow the Prometheus format."""
+        latency = self.registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            latency.observe(value)
+        lines = self.registry.render().splitlines()
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{le="1"} 3', lines)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 4', lines)
+        self.assertIn('latency_seconds_sum 6.05', lines)
+        self.assertIn('latency_seconds_count 4', lines)
+
+    def test_time_decorator(self):
+        """Test that decorated calls are observed, including failing ones."""
+        latency = self.registry.histogram('calls_seconds', 'Calls', label='call')
+
+        @latency.labels('fail').time()
+        def fail():
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            fail()
+        self.assertEqual(latency.labels('fail').count, 1)
+
+        @latency.labels('async').time()
+        async def sleep():
+            await asyncio.sleep(0.01)
+
+        self.assertTrue(inspect.iscoroutinefunction(sleep))
+        asyncio.run(sleep())
+        self.assertEqual(latency.labels('async').count, 1)
+        self.assertGreaterEqual(latency.labels('async').sum, 0.01)
+
+    def test_gauge_callback(self):
+        """Test that callback gauges are read at collection time."""
+        values = [3]
+        self.registry.gauge('queue_depth', 'Depth', lambda: values[0])
+        values[0] = 5
+        self.assertIn('queue_depth 5', self.registry.render())
+
+    def test_conflicting_registration(self):
+        """Test that a name cannot be reused for another metric type."""
+        self.registry.counter('events_total', 'Events')
+        self.assertIs(self.registry.counter('events_total', 'Events'), self.registry.counter('events_total', 'Events'))
+        with self.assertRaises(ValueError):
+            self.registry.histogram('events_total', 'Events')
+
+    def test_database_operations_are_instrumented(self):
+        """Test that IgnoreHostsDB calls are recorded in the process registry."""
+        temp_db = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        temp_db.close()
+        db = IgnoreHostsDB(temp_db.name)
+        try:
+            histogram = REGISTRY.histogram('httppro_db_operation_seconds', '', label='operation')
+            before = histogram.labels('add_domain').count
+            db.add_domain("example.com", "test")
+            self.assertEqual(histogram.labels('add_domain').count, before + 1)
+        finally:
+            db.close()
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(temp_db.name + suffix):
+                    os.unlink(temp_db.name + suffix)
+
+class TestMetricsServer(unittest.TestCase):
+    """Test cases for MetricsServer class."""
+
+    def setUp(self):
+        """Set up a registry with one counter."""
+        self.registry = MetricsRegistry()
+        self.registry.counter('requests_total', 'Requests').inc()
+
+    def test_tcp_endpoint(self):
+        """Test that metrics are served over HTTP."""
+        server = MetricsServer('127.0.0.1:0', self.registry)
+        server.start()
+        try:
+            with urllib.request.urlopen(server.url, timeout=5) as response:
+                self.assertTrue(response.headers['Content-Type'].startswith('text/plain'))
+                self.assertIn(b'requests_total 1', response.read())
+        finally:
+            server.stop()
+
+    @unittest.skipUnless(socket.has_ipv6, "IPv6 is not available")
+    def test_bracketed_ipv6_endpoint(self):
+        """Test that a bracketed IPv6 host is bound and reported in brackets."""
+        server = MetricsServer('[::1]:0', self.registry)
+        try:
+            server.start()
+        except OSError as e:
+            self.skipTest(f"cannot bind ::1: {e}")
+        try:
+            self.assertTrue(server.url.startswith('http://[::1]:'))
+            with urllib.request.urlopen(server.url, timeout=5) as response:
+                self.assertIn(b'requests_total 1', response.read())
+        finally:
+            server.stop()
+
+    def test_port_in_use(self):
+        """Test that binding a busy port raises OSError and leaves the first server running."""
+        server = MetricsServer('127.0.0.1:0', self.registry)
+        server.start()
+        try:
+            port = server.url.rsplit(':', 1)[1].split('/')[0]
+            with self.assertRaises(OSError):
+                MetricsServer(f'127.0.0.1:{port}', self.registry).start()
+            with urllib.request.urlopen(server.url, timeout=5) as response:
+                self.assertIn(b'requests_total 1', response.read())
+        finally:
+            server.stop()
+
+    @unittest.skipUnless(hasattr(socket, 'AF_UNIX'), "Unix sockets are not available")
+    def test_unix_socket_endpoint(self):
+        """Test that metrics are served over a Unix socket."""
+        path = os.path.join(tempfile.mkdtemp(), 'metrics.sock')
+        server = MetricsServer(f'unix:{path}', self.registry)
+        server.start()
+        try:
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            client.settimeout(5)
+            client.connect(path)
+            client.sendall(b'GET /metrics HTTP/1.0\r\n\r\n')
+            response = b''
+            while chunk := client.recv(4096):
+                response += chunk
+            client.close()
+            self.assertTrue(response.startswith(b'HTTP/1.0 200'))
+            self.assertIn(b'requests_total 1', response)
+        finally:
+            server.stop()
+        self.assertFalse(os.path.exists(path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,253 @@
+"""
+Test suite for the schema migrations.
+"""
+
+import unittest
+import tempfile
+import sqlite3
+import os
+from datetime import datetime
+from unittest import mock
+from core import migrations
+from core.connection import ConnectionManager
+from core.database import IgnoreHostsDB, to_epoch_us, to_iso
+
+# The layout written by HttpPro 1.0
+LEGACY_SCHEMA = '''
+    CREATE TABLE ignore_hosts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, domain TEXT UNIQUE NOT NULL, origin TEXT NOT NULL,
+        date_added TEXT NOT NULL, last_seen TEXT NOT NULL, count INTEGER DEFAULT 1, active BOOLEAN DEFAULT 1
+    );
+    CREATE INDEX idx_domain ON ignore_hosts(domain);
+    CREATE INDEX idx_active ON ignore_hosts(active);
+'''
+
+class TestMigrations(unittest.TestCase):
+    """Test cases for creating and upgrading the database schema."""
+
+    def setUp(self):
+        """Set up an empty database path."""
+        self.temp_db = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        self.temp_db.close()
+        os.unlink(self.temp_db.name)
+        self.db = None
+
+    def tearDown(self):
+        """Clean up the test database."""
+        if self.db is not None:
+            self.db.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.temp_db.name + suffix):
+                os.unlink(self.temp_db.name + suffix)
+
+    def _legacy_database(self, rows):
+        """Write a 1.0 database with (domain, origin, date_added, last_seen, count, active) rows."""
+        conn = sqlite3.connect(self.temp_db.name)
+        conn.executescript(LEGACY_SCHEMA)
+        conn.executemany('INSERT INTO ignore_hosts (domain, origin, date_added, last_seen, count, active) '
+                         'VALUES (?, ?, ?, ?, ?, ?)', rows)
+        conn.commit()
+        conn.close()
+
+    def _schema(self):
+        """Get the names of the tables, indexes and triggers of the database."""
+        return {name for (name,) in self.db.connections.execute(lambda conn: conn.execute(
+            'SELECT name FROM sqlite_master WHERE name NOT LIKE "sqlite_%"').fetchall())}
+
+    def test_new_database_created_at_current_version(self):
+        """Test that a new database starts at the latest version without migrating."""
+        with mock.patch.dict(migrations.MIGRATIONS, clear=True):
+            self.db = IgnoreHostsDB(self.temp_db.name)
+        self.assertEqual(self.db.connections.execute(migrations.get_version), migrations.SCHEMA_VERSION)
+        self.assertIn('idx_hosts_active_domain', self._schema())
+        self.assertNotIn('idx_active', self._schema())
+
+    def test_legacy_database_converted(self):
+        """Test that a 1.0 database keeps its data and statistics in the compact layout."""
+        self._legacy_database([
+            ('a.example.com', 'manual', '2025-01-01T10:00:00.250000', '2025-02-01T10:00:00', 3, 1),
+            ('b.example.com', 'tcp_tls_error', '2025-01-02T10:00:00.000001', '2025-01-03T10:00:00', 1, 0),
+            ('c.example.org', 'manual', '2025-01-03', '2025-01-03', 1, True),
+        ])
+
+        self.db = IgnoreHostsDB(self.temp_db.name)
+        self.assertEqual(self.db.connections.execute(migrations.get_version), migrations.SCHEMA_VERSION)
+        self.assertEqual(self.db.get_domain_info('a.example.com'),
+                         ('a.example.com', 'manual', '2025-01-01T10:00:00.250000', '2025-02-01T10:00:00', 3, 1))
+        self.assertEqual(self.db.get_domain_info('b.example.com')[2:], ('2025-01-02T10:00:00.000001',
+                                                                        '2025-01-03T10:00:00', 1, 0))
+        self.assertEqual(self.db.get_domain_info('c.example.org')[2], '2025-01-03T00:00:00')
+        self.assertEqual(self.db.get_stats()['origins'], {'manual': 2})
+        self.assertEqual(self.db.reconcile_stats(fix=False), {})
+        self.assertEqual([row[0] for row in self.db.iter_domains(suffix='example.com', active=None)],
+                         ['a.example.com', 'b.example.com'])
+
+        schema = self._schema()
+        self.assertTrue({'origins', 'idx_hosts_domain_rev', 'idx_hosts_active_domain'} <= schema)
+        self.assertFalse({'ignore_hosts_next', 'idx_domain', 'idx_active', 'trg_migrate_insert'} & schema)
+
+        # New rows continue the id sequence
+        self.db.add_domain('d.example.com', 'manual')
+        row_id = self.db.connections.execute(lambda conn: conn.execute(
+            "SELECT id FROM ignore_hosts WHERE domain = 'd.example.com'").fetchone()[0])
+        self.assertEqual(row_id, 4)
+
+    def test_writes_during_copy_are_mirrored(self):
+        """Test that rows written by older processes between copy batches reach the new table."""
+        self._legacy_database([(f'host{i}.example.com', 'manual', '2025-01-01T00:00:00',
+                                '2025-01-01T00:00:00', 1, 1) for i in range(10)])
+        legacy = sqlite3.connect(self.temp_db.name, isolation_level=None)
+        copy_batch = migrations._copy_batch
+
+        def copy_then_write(conn, last_id, batch_size):
+            result = copy_batch(conn, last_id, batch_size)
+            if last_id == 0:
+                # Rows 1-4 are copied: change copied and uncopied rows the way 1.0 does
+                conn.commit()
+                legacy.execute("INSERT INTO ignore_hosts (domain, origin, date_added, last_seen) "
+                               "VALUES ('new.example.com', 'tcp_tls_error', '2025-03-01T00:00:00', "
+                               "'2025-03-01T00:00:00')")
+                legacy.execute("UPDATE ignore_hosts SET active = 0 WHERE domain IN ('host1.example.com', "
+                               "'host8.example.com')")
+                legacy.execute("DELETE FROM ignore_hosts WHERE domain IN ('host2.example.com', 'host9.example.com')")
+                conn.execute('BEGIN IMMEDIATE')
+            return result
+
+        with mock.patch.object(migrations, '_copy_batch', copy_then_write):
+            connections = ConnectionManager(self.temp_db.name)
+            migrations.migrate(connections, batch_size=4)
+            connections.close_all()
+        legacy.close()
+
+        self.db = IgnoreHostsDB(self.temp_db.name)
+        domains = {row[0]: row for row in self.db.iter_domains(active=None)}
+        self.assertEqual(len(domains), 9)
+        self.assertNotIn('host2.example.com', domains)
+        self.assertNotIn('host9.example.com', domains)
+        self.assertEqual(domains['host1.example.com'][5], 0)
+        self.assertEqual(domains['host8.example.com'][5], 0)
+        self.assertEqual(domains['new.example.com'][1:3], ('tcp_tls_error', '2025-03-01T00:00:00'))
+        self.assertEqual(self.db.get_stats()['active_domains'], 7)
+        self.assertEqual(self.db.reconcile_stats(fix=False), {})
+        self.assertEqual([row[0] for row in self.db.iter_domains(suffix='new.example.com')], ['new.example.com'])
+
+    def test_ip_domains_moved_to_networks(self):
+        """Test that addresses stored as domains become network rules without change log noise."""
+        self._legacy_database([
+            ('10.0.0.1', 'client_tls_error', '2025-01-01T10:00:00', '2025-02-01T10:00:00', 2, 1),
+            ('10.0.0.1/32', 'manual', '2025-01-05T10:00:00', '2025-01-06T10:00:00', 1, 1),
+            ('2001:db8::1', 'client_tls_error', '2025-01-01T10:00:00', '2025-01-02T10:00:00', 1, 0),
+            ('v2.example.com', 'manual', '2025-01-01T10:00:00', '2025-01-01T10:00:00', 1, 1),
+        ])
+
+        self.db = IgnoreHostsDB(self.temp_db.name)
+        self.assertEqual(self.db.get_network_info('10.0.0.1'),
+                         ('10.0.0.1/32', 'client_tls_error', '2025-01-01T10:00:00', '2025-02-01T10:00:00', 3, 1))
+        self.assertEqual(self.db.get_network_info('2001:db8::1')[5], 0)
+        self.assertEqual([row[0] for row in self.db.iter_domains(active=None)], ['v2.example.com'])
+        stats = self.db.get_stats()
+        self.assertEqual((stats['total_domains'], stats['active_networks'], stats['inactive_networks']), (1, 1, 1))
+        self.assertEqual(self.db.reconcile_stats(fix=False), {})
+        self.assertEqual(self.db.get_changes_since(0), [])
+
+    def test_network_move_in_batches(self):
+        """Test that the network move takes one transaction per batch and picks up rows written meanwhile."""
+        self._legacy_database([(f'10.0.0.{i}', 'client_tls_error', '2025-01-01T10:00:00',
+                                '2025-01-01T10:00:00', 1, 1) for i in range(5)] +
+                              [(f'host{i}.example.com', 'manual', '2025-01-01T10:00:00',
+                                '2025-01-01T10:00:00', 1, 1) for i in range(5)])
+        move_rows = migrations._move_network_rows
+        batches = []
+
+        def move_then_write(conn, last_id, upper):
+            batches.append((last_id, upper))
+            if last_id == 0:
+                # An older process adds an address between two batches
+                conn.execute("INSERT INTO ignore_hosts (domain, origin_id, date_added, last_seen) "
+                             "VALUES ('192.0.2.1', 1, 0, 0)")
+            return move_rows(conn, last_id, upper)
+
+        with mock.patch.object(migrations, '_move_network_rows', move_then_write):
+            connections = ConnectionManager(self.temp_db.name)
+            migrations.migrate(connections, batch_size=3)
+            connections.close_all()
+
+        self.assertEqual(batches, [(0, 3), (3, 6), (6, 9), (9, 11)])
+        self.db = IgnoreHostsDB(self.temp_db.name)
+        self.assertEqual(sorted(self.db.get_active_networks()),
+                         ['10.0.0.0/32', '10.0.0.1/32', '10.0.0.2/32', '10.0.0.3/32', '10.0.0.4/32', '192.0.2.1/32'])
+        self.assertEqual(len(self.db.get_active_domains()), 5)
+        self.assertEqual(self.db.reconcile_stats(fix=False), {})
+        # Only the other process's addition is logged, not the moves
+        self.assertEqual(self.db.get_changes_since(0), [(1, '192.0.2.1', True)])
+
+    def test_change_log_timestamps_converted(self):
+        """Test that change log rows written as local ISO text get epoch microseconds, batch by batch."""
+        self._legacy_database([('a.example.com', 'manual', '2025-01-01T10:00:00', '2025-01-01T10:00:00', 1, 1)])
+        conn = sqlite3.connect(self.temp_db.name)
+        conn.execute('CREATE TABLE ignore_hosts_changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+                     'domain TEXT NOT NULL, active INTEGER NOT NULL, origin TEXT, last_seen TEXT, node TEXT)')
+        conn.executemany('INSERT INTO ignore_hosts_changes (domain, active, origin, last_seen) VALUES (?, 1, ?, ?)',
+                         [(f'host{i}.example.com', 'manual', f'2025-03-30T0{i}:30:00.000100') for i in range(5)])
+        conn.commit()
+        conn.close()
+
+        connections = ConnectionManager(self.temp_db.name)
+        migrations.migrate(connections, batch_size=2)
+        connections.close_all()
+
+        self.db = IgnoreHostsDB(self.temp_db.name)
+        self.assertEqual(self.db.connections.execute(migrations.get_version), migrations.SCHEMA_VERSION)
+        changes = self.db.get_local_changes_since(0)
+        self.assertEqual([seen for *_, seen in changes],
+                         [to_epoch_us(f'2025-03-30T0{i}:30:00.000100') for i in range(5)])
+
+        self.db.add_domain('new.example.com', 'manual')
+        seen = self.db.get_local_changes_since(changes[-1][0])[0][4]
+        self.assertEqual(to_iso(seen), self.db.get_domain_info('new.example.com')[3])
+
+    def test_network_counters_added(self):
+        """Test that a version 6 database gets network counters matching its rows."""
+        self.db = IgnoreHostsDB(self.temp_db.name)
+        self.db.add_network('203.0.113.0/24', 'manual')
+        self.db.add_network('198.51.100.7', 'client_tls_error')
+        self.db.remove_network('198.51.100.7')
+        self.db.close()
+
+        conn = sqlite3.connect(self.temp_db.name)
+        for trigger in ('trg_networks_stats_insert', 'trg_networks_stats_delete', 'trg_networks_stats_update'):
+            conn.execute(f'DROP TRIGGER {trigger}')
+        conn.execute('DROP TABLE ignore_networks_stats')
+        conn.execute('PRAGMA user_version = 6')
+        conn.commit()
+        conn.close()
+
+        self.db = IgnoreHostsDB(self.temp_db.name)
+        self.assertEqual(self.db.connections.execute(migrations.get_version), migrations.SCHEMA_VERSION)
+        stats = self.db.get_stats()
+        self.assertEqual((stats['active_networks'], stats['inactive_networks']), (1, 1))
+        self.db.add_network('192.0.2.1', 'manual')
+        self.assertEqual(self.db.get_stats()['active_networks'], 2)
+        self.assertEqual(self.db.reconcile_stats(fix=False), {})
+
+    def test_newer_schema_rejected(self):
+        """Test that a database written by a newer version is not opened."""
+        conn = sqlite3.connect(self.temp_db.name)
+        conn.execute(f'PRAGMA user_version = {migrations.SCHEMA_VERSION + 1}')
+        conn.close()
+        with self.assertRaises(RuntimeError):
+            IgnoreHostsDB(self.temp_db.name)
+
+    def test_sql_and_python_timestamps_agree(self):
+        """Test that the SQL conversions used by migrations and triggers match the Python ones."""
+        conn = sqlite3.connect(':memory:')
+        for value in ('2025-01-01T10:00:00', '2025-07-06T23:59:59.999999', '2025-10-17T02:30:00.000100',
+                      datetime.now().isoformat()):
+            us = conn.execute(f"SELECT {migrations.iso_to_us_sql('?1')}", (value,)).fetchone()[0]
+            self.assertEqual(us, to_epoch_us(value))
+            self.assertEqual(to_iso(us), value)
+            self.assertEqual(conn.execute(f"SELECT {migrations.us_to_iso_sql('?1')}", (us,)).fetchone()[0], value)
+        conn.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+"""
+Test suite for on-demand profiling.
+"""
+
+import unittest
+import tempfile
+import threading
+import signal
+import pstats
+import shutil
+import time
+import os
+from core.profiling import ProfileSession, ProfilerAddon, StackSampler, deep_sizeof
+
+def _busy_function(stop):
+    """Spin until stopped, so samples land in a known frame."""
+    while not stop.is_set():
+        sum(range(100))
+
+class FakeAddon:
+    """Addon reporting its structure sizes."""
+
+    def __init__(self):
+        self.hosts = {f"host{i}.example.com" for i in range(100)}
+
+    def memory_usage(self):
+        return {'hosts': deep_sizeof(self.hosts)}
+
+class TestProfiling(unittest.TestCase):
+    """Test cases for the profiling session and addon."""
+
+    def setUp(self):
+        """Set up an output directory."""
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Clean up profiling results."""
+        shutil.rmtree(self.output_dir)
+
+    def test_sampler_collapsed_stacks(self):
+        """Test that samples are aggregated root first with a count per stack."""
+        stop = threading.Event()
+        worker = threading.Thread(target=_busy_function, args=(stop,), name='busy')
+        worker.start()
+        sampler = StackSampler(interval=0.001)
+        try:
+            for _ in range(5):
+                sampler.sample()
+        finally:
+            stop.set()
+            worker.join()
+
+        busy = [line for line in sampler.collapsed() if line.startswith('busy;')]
+        self.assertTrue(busy)
+        stack, count = busy[0].rsplit(' ', 1)
+        self.assertIn('_busy_function (test_profiling.py:', stack)
+        self.assertGreater(int(count), 0)
+
+    def test_session_writes_results(self):
+        """Test that a session writes pstats, collapsed stacks and a memory report."""
+        session = ProfileSession(self.output_dir, interval=0.001,
+                                 memory_sources=lambda: {'TlsManager.ignore_hosts': 1234})
+        session.start()
+        sorted(str(i) for i in range(20000))
+        time.sleep(0.02)
+        paths = session.stop()
+
+        self.assertEqual([os.path.dirname(path) for path in paths], [self.output_dir] * 3)
+        self.assertGreater(pstats.Stats(paths[0]).total_calls, 0)
+        with open(paths[2]) as report:
+            text = report.read()
+        self.assertIn('TlsManager.ignore_hosts', text)
+        self.assertIn('1,234', text)
+
+    def test_addon_toggle_and_memory_usage(self):
+        """Test that toggling starts and stops a session with the addons' structure sizes."""
+        addon = ProfilerAddon([FakeAddon()])
+        addon.output_dir = self.output_dir
+        addon.toggle()
+        self.assertIsNotNone(addon.session)
+        addon.toggle()
+        self.assertIsNone(addon.session)
+        self.assertEqual(len(addon.last_results), 3)
+        self.assertGreater(addon.memory_usage()['FakeAddon.hosts'], 100 * 50)
+        self.assertEqual(addon.stop(), [])
+
+    @unittest.skipUnless(hasattr(signal, 'SIGUSR2'), "SIGUSR2 is not available")
+    def test_signal_toggles_session(self):
+        """Test that SIGUSR2 starts and stops a session."""
+        previous = signal.getsignal(signal.SIGUSR2)
+        addon = ProfilerAddon()
+        addon.output_dir = self.output_dir
+        try:
+            addon.running()
+            os.kill(os.getpid(), signal.SIGUSR2)
+            self.assertIsNotNone(addon.session)
+            os.kill(os.getpid(), signal.SIGUSR2)
+            self.assertIsNone(addon.session)
+            self.assertEqual(len(os.listdir(self.output_dir)), 3)
+        finally:
+            addon.done()
+            signal.signal(signal.SIGUSR2, previous)
+
+    def test_deep_sizeof_follows_containers(self):
+        """Test that nested containers and instance attributes are measured."""
+        self.assertGreater(deep_sizeof({'a': ['x' * 1000]}), 1000)
+        self.assertGreater(deep_sizeof(FakeAddon()), deep_sizeof(set()))
+
+if __name__ == '__main__':
+    unittest.main()
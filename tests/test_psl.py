@@ -0,0 +1,33 @@
+"""
+Test suite for Public Suffix List lookups.
+"""
+
+import unittest
+from core.psl import PublicSuffixList, default_suffix_list
+
+class TestPublicSuffixList(unittest.TestCase):
+    """Test cases for PublicSuffixList class."""
+
+    def test_rule_types(self):
+        """Test plain, wildcard and exception rules and the implicit default rule."""
+        suffix_list = PublicSuffixList(['com', 'co.uk', '*.ck', '!www.ck'])
+        self.assertEqual(suffix_list.public_suffix('a.example.co.uk'), 'co.uk')
+        self.assertEqual(suffix_list.registrable_domain('a.b.example.co.uk'), 'example.co.uk')
+        self.assertEqual(suffix_list.public_suffix('a.b.ck'), 'b.ck')
+        self.assertEqual(suffix_list.registrable_domain('a.b.ck'), 'a.b.ck')
+        self.assertEqual(suffix_list.registrable_domain('www.ck'), 'www.ck')
+        self.assertEqual(suffix_list.registrable_domain('host.internal'), 'host.internal')
+        for suffix in ('com', 'co.uk', 'b.ck', 'internal'):
+            self.assertIsNone(suffix_list.registrable_domain(suffix))
+
+    def test_bundled_list(self):
+        """Test that the bundled list covers ICANN and private suffixes."""
+        suffix_list = default_suffix_list()
+        self.assertGreater(len(suffix_list), 1000)
+        self.assertEqual(suffix_list.registrable_domain('a1.cdn.example.net'), 'example.net')
+        self.assertEqual(suffix_list.registrable_domain('img.bbc.co.uk'), 'bbc.co.uk')
+        self.assertIsNone(suffix_list.registrable_domain('cloudfront.net'))
+        self.assertEqual(suffix_list.registrable_domain('d1.cloudfront.net'), 'd1.cloudfront.net')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""
+Test suite for hot reload of database changes.
+"""
+
+import unittest
+import tempfile
+import os
+import threading
+from core.database import IgnoreHostsDB
+from core.reload import ChangeWatcher
+
+class TestChangeWatcher(unittest.TestCase):
+    """Test cases for ChangeWatcher class."""
+
+    def setUp(self):
+        """Set up a proxy-side and a CLI-side database handle."""
+        self.temp_db = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        self.temp_db.close()
+        self.db = IgnoreHostsDB(self.temp_db.name)
+        self.cli = IgnoreHostsDB(self.temp_db.name)
+        self.applied = []
+        self.watcher = ChangeWatcher(self.db, lambda added, removed: self.applied.append((added, removed)))
+
+    def tearDown(self):
+        """Clean up test databases."""
+        self.watcher.stop()
+        self.db.close()
+        self.cli.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.temp_db.name + suffix):
+                os.unlink(self.temp_db.name + suffix)
+
+    def test_change_log_records_status_changes_only(self):
+        """Test that refreshing an active domain does not log a change."""
+        self.cli.add_domain("example.com", "manual")
+        self.cli.add_domain("example.com", "manual")
+        self.cli.remove_domain("example.com")
+
+        changes = self.db.get_changes_since(0)
+        self.assertEqual([(domain, active) for _, domain, active in changes],
+                         [("example.com", True), ("example.com", False)])
+
+    def test_poll_applies_only_the_delta(self):
+        """Test that external adds and removals are applied once."""
+        self.cli.add_domain("old.com", "manual")
+        self.watcher.poll()
+        self.applied.clear()
+
+        self.cli.add_domain("new.com", "manual")
+        self.cli.remove_domain("old.com")
+        self.assertEqual(self.watcher.poll(), 2)
+        self.assertEqual(self.applied, [(["new.com"], ["old.com"])])
+
+        # Nothing committed since: data_version is unchanged and the log is not read
+        self.assertEqual(self.watcher.poll(), 0)
+
+    def test_poll_on_another_thread_reads_its_own_version(self):
+        """Test that a data_version reading is never compared across connections."""
+        # Fresh connections start from the same value, so the thread's first reading after
+        # the commit equals the stale one taken on this thread before it
+        db = IgnoreHostsDB(self.temp_db.name)
+        watcher = ChangeWatcher(db, lambda added, removed: self.applied.append((added, removed)))
+        try:
+            watcher.poll()
+            self.cli.add_domain("new.com", "manual")
+            thread = threading.Thread(target=watcher.poll)
+            thread.start()
+            thread.join()
+        finally:
+            db.close()
+        self.assertEqual(self.applied, [(["new.com"], [])])
+
+    def test_latest_change_wins(self):
+        """Test that a domain added then removed is reported as removed."""
+        self.cli.add_domain("example.com", "manual")
+        self.cli.remove_domain("example.com")
+        self.watcher.poll()
+        self.assertEqual(self.applied, [([], ["example.com"])])
+
+    def test_batches(self):
+        """Test that large deltas are read in bounded batches."""
+        self.watcher.batch_size = 2
+        self.cli.add_domains((f"host{i}.com", "manual", 1) for i in range(5))
+        self.assertEqual(self.watcher.poll(), 5)
+        self.assertEqual(len(self.applied), 3)
+        self.assertEqual(self.watcher.seq, self.db.get_change_seq())
+
+    def test_pruned_changes_trigger_resync(self):
+        """Test that a watcher behind the pruned change log reloads instead of applying a partial delta."""
+        resyncs = []
+        watcher = ChangeWatcher(self.db, lambda added, removed: self.applied.append((added, removed)),
+                                resync=lambda: resyncs.append(self.db.get_change_seq()))
+        self.cli.add_domains((f"host{i}.com", "manual", 1) for i in range(5))
+        self.cli.remove_domain("host0.com")
+        self.assertEqual(self.cli.prune_changes(keep=1), 5)
+
+        watcher.poll()
+        self.assertEqual(resyncs, [6])
+        self.assertEqual(self.applied, [])
+        self.assertEqual(watcher.stats()['resyncs'], 1)
+
+        self.cli.add_domain("new.com", "manual")
+        self.assertEqual(watcher.poll(), 1)
+        self.assertEqual(self.applied, [(["new.com"], [])])
+        self.assertEqual(resyncs, [6])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,228 @@
+"""
+Test suite for change-feed replication between proxy instances.
+"""
+
+import unittest
+import tempfile
+import multiprocessing
+import shutil
+import json
+import os
+import sqlite3
+from core.database import IgnoreHostsDB, to_epoch_us
+from core.migrations import SCHEMA_VERSION
+from core.replication import Replicator
+
+NODES = 3
+DOMAINS_PER_NODE = 50
+
+def _node_process(directory, node, add=(), remove=()):
+    """Change the node's own database, then sync it through the shared journal directory."""
+    db = IgnoreHostsDB(os.path.join(directory, f"{node}.db"))
+    for domain in add:
+        db.add_domain(domain, "test")
+    for domain in remove:
+        db.remove_domain(domain)
+    replicator = Replicator(db, os.path.join(directory, "journal"), node)
+    replicator.sync()
+    replicator.close()
+    db.close()
+
+class TestReplicator(unittest.TestCase):
+    """Test cases for Replicator class."""
+
+    def setUp(self):
+        """Set up two nodes sharing a journal directory."""
+        self.directory = tempfile.mkdtemp()
+        self.journal_dir = os.path.join(self.directory, "journal")
+        self.db_a = IgnoreHostsDB(os.path.join(self.directory, "a.db"))
+        self.db_b = IgnoreHostsDB(os.path.join(self.directory, "b.db"))
+        self.node_a = Replicator(self.db_a, self.journal_dir, "a")
+        self.node_b = Replicator(self.db_b, self.journal_dir, "b")
+
+    def tearDown(self):
+        """Clean up databases and journals."""
+        self.node_a.close()
+        self.node_b.close()
+        self.db_a.close()
+        self.db_b.close()
+        shutil.rmtree(self.directory)
+
+    def _active(self, db, domain):
+        """Get whether a domain is active in a node's database."""
+        info = db.get_domain_info(domain)
+        return bool(info and info[5])
+
+    def test_changes_propagate_without_loops(self):
+        """Test that merged changes reach the peer and are not published back."""
+        self.db_a.add_domain("example.com", "test")
+        self.assertEqual(self.node_a.sync()['published'], 1)
+        self.assertEqual(self.node_b.sync(), {'published': 0, 'applied': 1, 'conflicts': 0})
+        self.assertTrue(self._active(self.db_b, "example.com"))
+        self.assertEqual(self.db_b.get_domain_info("example.com")[1], "test")
+
+        # Nothing new on either side
+        self.assertEqual(self.node_a.sync(), {'published': 0, 'applied': 0, 'conflicts': 0})
+        self.assertFalse(os.path.exists(os.path.join(self.journal_dir, "b.jsonl")))
+
+        self.db_b.remove_domain("example.com")
+        self.node_b.sync()
+        self.assertEqual(self.node_a.sync()['applied'], 1)
+        self.assertFalse(self._active(self.db_a, "example.com"))
+
+    def test_newer_local_change_wins(self):
+        """Test that an older remote change loses and the local state is republished."""
+        self.db_a.add_domain("example.com", "test")
+        self.node_a.sync()
+        self.node_b.sync()
+
+        # a removes, then b sees the domain fail again before syncing
+        self.db_a.remove_domain("example.com")
+        self.db_b.add_domain("example.com", "test")
+        self.db_b.remove_domain("example.com")
+        self.db_b.add_domain("example.com", "test")
+
+        self.node_a.sync()
+        self.assertEqual(self.node_b.sync()['conflicts'], 1)
+        self.assertTrue(self._active(self.db_b, "example.com"))
+
+        self.node_b.sync()
+        self.node_a.sync()
+        self.assertTrue(self._active(self.db_a, "example.com"))
+        self.assertEqual(self.db_a.get_domain_info("example.com")[3], self.db_b.get_domain_info("example.com")[3])
+
+    def test_journal_carries_epoch_microseconds(self):
+        """Test that published changes carry last_seen as UTC epoch microseconds."""
+        self.db_a.add_domain("example.com", "test")
+        self.node_a.publish()
+        with open(os.path.join(self.journal_dir, "a.jsonl")) as journal:
+            record = json.loads(journal.readline())
+        self.assertNotIn('last_seen', record)
+        self.assertEqual(record['seen_us'], to_epoch_us(self.db_a.get_domain_info("example.com")[3]))
+
+        # A later removal on another node wins whatever its local time zone
+        later = dict(record, active=False, seen_us=record['seen_us'] + 1)
+        with open(os.path.join(self.journal_dir, "c.jsonl"), 'w') as journal:
+            journal.write(json.dumps(later) + '\n')
+        self.assertEqual(self.node_a.pull()['applied'], 1)
+        self.assertFalse(self._active(self.db_a, "example.com"))
+
+    def test_partial_and_malformed_journal_lines(self):
+        """Test that an unterminated line waits and a malformed one is skipped."""
+        os.makedirs(self.journal_dir, exist_ok=True)
+        record = {'domain': 'example.com', 'origin': 'test', 'active': True, 'last_seen': '2025-01-01T00:00:00'}
+        path = os.path.join(self.journal_dir, "c.jsonl")
+        with open(path, 'w') as journal:
+            journal.write('not json\n' + json.dumps(record))
+
+        self.assertEqual(self.node_a.pull()['applied'], 0)
+        with open(path, 'a') as journal:
+            journal.write('\n')
+        self.assertEqual(self.node_a.pull()['applied'], 1)
+        self.assertEqual(self.node_a.stats()['errors'], 1)
+        self.assertEqual(self.db_a.get_replication_cursor("journal:c"), os.path.getsize(path))
+
+    def test_journal_rotation(self):
+        """Test that the part of a journal every peer has merged is cut and positions stay valid."""
+        self.node_a.rotate_bytes = 1
+        for i in range(10):
+            self.db_a.add_domain(f"host{i}.example.com", "test")
+        self.node_a.publish()
+        journal_path = os.path.join(self.journal_dir, "a.jsonl")
+        size = os.path.getsize(journal_path)
+
+        # Nothing is cut before a peer has acknowledged it
+        self.assertEqual(self.node_a.rotate(), 0)
+        self.assertEqual(self.node_b.pull()['applied'], 10)
+        self.assertEqual(self.node_a.rotate(), size)
+        with open(journal_path, 'rb') as journal:
+            self.assertEqual(len(journal.readlines()), 1)
+
+        self.db_a.add_domain("late.example.com", "test")
+        self.assertEqual(self.node_a.sync()['published'], 1)
+        self.assertEqual(self.node_b.sync()['applied'], 1)
+        self.assertTrue(self._active(self.db_b, "late.example.com"))
+        with open(journal_path, 'rb') as journal:
+            header, late = journal.readlines()
+        self.assertEqual(self.db_b.get_replication_cursor("journal:a"), size + len(late))
+
+        # A node joining later only reads what is left, and acknowledges it too
+        db_c = IgnoreHostsDB(os.path.join(self.directory, "c.db"))
+        node_c = Replicator(db_c, self.journal_dir, "c")
+        try:
+            self.assertEqual(node_c.pull()['applied'], 1)
+            self.assertTrue(self._active(db_c, "late.example.com"))
+            self.assertFalse(self._active(db_c, "host0.example.com"))
+            self.assertGreater(self.node_a.rotate(), 0)
+            self.assertEqual(self.node_a.stats()['rotated_bytes'], self.db_b.get_replication_cursor("journal:a"))
+        finally:
+            node_c.close()
+            db_c.close()
+
+    def test_pull_database(self):
+        """Test that changes can be read directly from a peer's database file."""
+        self.db_b.add_domain("example.com", "test")
+        self.assertEqual(self.node_a.pull_database(self.db_b.db_path, "b")['applied'], 1)
+        self.assertEqual(self.node_a.pull_database(self.db_b.db_path, "b")['applied'], 0)
+        self.assertTrue(self._active(self.db_a, "example.com"))
+
+    def test_pull_database_is_read_only(self):
+        """Test that a peer database is never created, migrated or written."""
+        with self.assertRaises(FileNotFoundError):
+            self.node_a.pull_database(os.path.join(self.directory, "missing.db"))
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "missing.db")))
+
+        self.db_b.add_domain("example.com", "test")
+        self.db_b.close()
+        with sqlite3.connect(self.db_b.db_path) as conn:
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION - 1}')
+        with self.assertRaises(RuntimeError):
+            self.node_a.pull_database(self.db_b.db_path, "b")
+        with sqlite3.connect(self.db_b.db_path) as conn:
+            self.assertEqual(conn.execute('PRAGMA user_version').fetchone()[0], SCHEMA_VERSION - 1)
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+        self.assertEqual(self.node_a.pull_database(self.db_b.db_path, "b")['applied'], 1)
+        peer_db = self.node_a._peer_dbs[self.db_b.db_path]
+        with self.assertRaises(sqlite3.OperationalError):
+            peer_db.connections.execute(lambda conn: conn.execute('DELETE FROM ignore_hosts'), write=True)
+
+    def test_invalid_node_id(self):
+        """Test that node ids must be usable as journal file names."""
+        with self.assertRaises(ValueError):
+            Replicator(self.db_a, self.journal_dir, "../a")
+
+    def test_node_processes_converge(self):
+        """Test that several node processes end up with the same ignore list."""
+        context = multiprocessing.get_context('spawn')
+
+        def run_round(changes):
+            processes = [context.Process(target=_node_process, args=(self.directory, f"node{i}", *changes(i)))
+                         for i in range(NODES)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join(60)
+                self.assertEqual(process.exitcode, 0)
+
+        run_round(lambda i: ([f"host{j}.node{i}.example.com" for j in range(DOMAINS_PER_NODE)], ()))
+        # Nodes that synced before a peer published catch up here
+        run_round(lambda i: ((), ()))
+        run_round(lambda i: ((), [f"host0.node{(i + 1) % NODES}.example.com"]))
+        run_round(lambda i: ((), ()))
+
+        expected = None
+        for i in range(NODES):
+            db = IgnoreHostsDB(os.path.join(self.directory, f"node{i}.db"))
+            try:
+                active = db.get_active_domains()
+                stats = db.get_stats()
+            finally:
+                db.close()
+            self.assertEqual(len(active), NODES * (DOMAINS_PER_NODE - 1))
+            self.assertEqual(stats['total_domains'], NODES * DOMAINS_PER_NODE)
+            expected = expected or active
+            self.assertEqual(active, expected)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+Test suite for the memory-mapped ignore list snapshot.
+"""
+
+import unittest
+import tempfile
+import shutil
+import os
+import random
+from core.database import IgnoreHostsDB
+from core.matcher import HostMatcher
+from core.snapshot import Snapshot, SnapshotMatcher, SnapshotRules, open_snapshot, write_snapshot
+
+RULES = ['example.com', '*.cdn.net', 'cdn.net', 'a.b.c.org', '10.0.0.0/8', '2001:db8::1/128']
+
+class TestSnapshot(unittest.TestCase):
+    """Test cases for the snapshot format, matcher and rule set."""
+
+    def setUp(self):
+        """Set up a temporary directory with a snapshot of RULES."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'ignore.snapshot')
+        write_snapshot(self.path, RULES, change_seq=42)
+        self.snapshot = Snapshot(self.path)
+
+    def tearDown(self):
+        """Unmap the snapshot and clean up."""
+        self.snapshot.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_round_trip(self):
+        """Test that rules, networks and the change sequence are read back in reversed-label order."""
+        self.assertEqual(self.snapshot.change_seq, 42)
+        self.assertEqual(len(self.snapshot), 6)
+        self.assertEqual(list(self.snapshot), ['example.com', 'cdn.net', '*.cdn.net', 'a.b.c.org',
+                                               '10.0.0.0/8', '2001:db8::1/128'])
+        for rule in RULES:
+            self.assertIn(rule, self.snapshot)
+        for rule in ('*.example.com', 'b.c.org', '10.0.0.0/16'):
+            self.assertNotIn(rule, self.snapshot)
+
+        with open(os.path.join(self.temp_dir, 'other'), 'wb') as file:
+            file.write(b'not a snapshot' * 10)
+        self.assertIsNone(open_snapshot(os.path.join(self.temp_dir, 'other')))
+        self.assertIsNone(open_snapshot(os.path.join(self.temp_dir, 'missing')))
+
+    def test_matcher_agrees_with_host_matcher(self):
+        """Test random lookups, additions and removals against HostMatcher."""
+        rng = random.Random(3)
+        labels = ['a', 'b', 'cdn', 'api']
+
+        def host():
+            return '.'.join(rng.choice(labels) for _ in range(rng.randint(1, 4))) + '.com'
+
+        rules = [('*.' if rng.random() < 0.3 else '') + host() for _ in range(500)]
+        write_snapshot(self.path, rules)
+        snapshot = Snapshot(self.path)
+        matcher, expected = SnapshotMatcher(snapshot), HostMatcher(rules)
+        try:
+            for _ in range(2000):
+                name = host()
+                self.assertEqual(matcher.match(name), expected.match(name))
+                if rng.random() < 0.1:
+                    rule = rng.choice(rules)
+                    self.assertEqual(matcher.remove(rule), expected.remove(rule))
+                if rng.random() < 0.1:
+                    rule = ('*.' if rng.random() < 0.5 else '') + host()
+                    self.assertEqual(matcher.add(rule), expected.add(rule))
+            self.assertEqual(len(matcher), len(expected))
+        finally:
+            snapshot.close()
+
+    def test_rules_overlay(self):
+        """Test set operations on top of the snapshot."""
+        rules = SnapshotRules(self.snapshot)
+        rules.discard('example.com')
+        rules.add('new.com')
+        rules.add('cdn.net')
+        copy = rules.copy()
+        rules.add('example.com')
+
+        self.assertNotIn('example.com', copy)
+        self.assertIn('new.com', copy)
+        self.assertEqual(len(copy), 6)
+        self.assertEqual(sorted(copy), sorted(RULES[1:] + ['new.com']))
+        self.assertEqual(len(rules), 7)
+
+    def test_render(self):
+        """Test that the text export is copied from the snapshot with removals cut and additions appended."""
+        self.assertEqual(self.snapshot.render(), ''.join(rule + '\n' for rule in self.snapshot).encode())
+
+        rules = SnapshotRules(self.snapshot)
+        for rule in ('*.cdn.net', '10.0.0.0/8', 'a.b.c.org', 'missing.com'):
+            rules.discard(rule)
+        rules.add('new.com')
+        rules.add('marker')
+        self.assertEqual(rules.render(skip=('marker',)),
+                         b'example.com\ncdn.net\n2001:db8::1/128\nnew.com\n')
+        rules.discard('cdn.net')
+        rules.discard('2001:db8::1/128')
+        rules.add('*.cdn.net')
+        self.assertEqual(rules.render(skip=('marker',)), b'example.com\n*.cdn.net\nnew.com\n')
+
+    def test_export_from_database(self):
+        """Test that IgnoreHostsDB writes active domains and networks with the current change sequence."""
+        db = IgnoreHostsDB(os.path.join(self.temp_dir, 'test.db'))
+        try:
+            db.add_domains([('example.com', 'manual', 1), ('*.cdn.net', 'aggregated', 1),
+                            ('gone.com', 'manual', 1), ('192.0.2.1', 'manual', 1)])
+            db.remove_domain('gone.com')
+            result = db.export_snapshot(self.path)
+            self.assertEqual((result['rules'], result['networks'], result['change_seq']),
+                             (2, 1, db.get_change_seq()))
+        finally:
+            db.close()
+
+        snapshot = Snapshot(self.path)
+        try:
+            self.assertEqual(sorted(snapshot), ['*.cdn.net', '192.0.2.1/32', 'example.com'])
+            self.assertEqual(SnapshotMatcher(snapshot).match('img.cdn.net'), 'cdn.net')
+        finally:
+            snapshot.close()
+
+if __name__ == '__main__':
+    unittest.main()
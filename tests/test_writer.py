@@ -0,0 +1,172 @@
+"""
+Test suite for the write-behind queue.
+"""
+
+import unittest
+import tempfile
+import os
+import sqlite3
+import time
+from unittest import mock
+from core.cache import FailureCache
+from core.database import IgnoreHostsDB
+from core.writer import WriteBehindQueue
+
+class TestWriteBehindQueue(unittest.TestCase):
+    """Test cases for WriteBehindQueue class."""
+
+    def setUp(self):
+        """Set up test database and queue."""
+        self.temp_db = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        self.temp_db.close()
+        self.db = IgnoreHostsDB(self.temp_db.name)
+        self.writer = WriteBehindQueue(self.db, batch_size=10, flush_interval=60.0)
+
+    def tearDown(self):
+        """Clean up queue and test database."""
+        self.writer.close()
+        self.db.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.temp_db.name + suffix):
+                os.unlink(self.temp_db.name + suffix)
+
+    def test_flush_writes_pending_entries(self):
+        """Test that an explicit flush persists queued domains."""
+        self.writer.submit("example.com", "test")
+        self.writer.submit("test.com", "test")
+        self.assertTrue(self.writer.flush(timeout=5))
+
+        domains = self.db.get_active_domains()
+        self.assertEqual(domains, ["example.com", "test.com"])
+        self.assertEqual(self.writer.stats()['queue_depth'], 0)
+
+    def test_repeated_domains_are_coalesced(self):
+        """Test that duplicates in one batch become a single row update."""
+        for _ in range(3):
+            self.writer.submit("example.com", "test")
+        self.writer.flush(timeout=5)
+
+        info = self.db.get_domain_info("example.com")
+        self.assertEqual(info[4], 3)
+        stats = self.writer.stats()
+        self.assertEqual(stats['written'], 3)
+        self.assertEqual(stats['batches'], 1)
+
+    def test_batch_size_triggers_flush(self):
+        """Test that reaching batch_size flushes without waiting for the interval."""
+        for i in range(10):
+            self.writer.submit(f"host{i}.example.com", "test")
+        self.writer._wait_drained(timeout=5)
+
+        self.assertEqual(len(self.db.get_active_domains()), 10)
+
+    def test_close_flushes_and_rejects_new_entries(self):
+        """Test that close() writes pending entries and stops accepting more."""
+        self.writer.submit("example.com", "test")
+        self.writer.close()
+
+        self.assertIn("example.com", self.db.get_active_domains())
+        self.assertFalse(self.writer.submit("late.com", "test"))
+    def test_on_flush_callback(self):
+        """Test that the flush callback receives the number of new domains."""
+        calls = []
+        writer = WriteBehindQueue(self.db, flush_interval=60.0, on_flush=calls.append)
+        try:
+            writer.submit("example.com", "test")
+            writer.submit("example.com", "test")
+            writer.flush(timeout=5)
+        finally:
+            writer.close()
+
+        self.assertEqual(calls, [1])
+
+    def test_failed_batch_is_retried(self):
+        """Test that a failed batch is kept, merged with newer entries and written on retry."""
+        writer = WriteBehindQueue(self.db, flush_interval=0.01, retry_backoff=0.01)
+        failure = sqlite3.OperationalError("database is locked")
+        try:
+            with mock.patch.object(self.db, 'add_domains', side_effect=[failure, failure, 2]) as add_domains:
+                writer.submit("example.com", "test")
+                writer._wait_drained(timeout=5)
+                writer.submit("example.com", "test")
+                writer.submit("test.com", "test")
+                writer.close()
+        finally:
+            writer.close()
+
+        self.assertEqual(add_domains.call_count, 3)
+        self.assertEqual(sorted(add_domains.call_args[0][0]), [("example.com", "test", 2), ("test.com", "test", 1)])
+        stats = writer.stats()
+        self.assertEqual((stats['errors'], stats['written'], stats['dropped']), (2, 3, 0))
+
+    def test_batch_dropped_after_max_retries(self):
+        """Test that a batch is dropped and counted once its retries are exhausted."""
+        writer = WriteBehindQueue(self.db, flush_interval=0.01, max_retries=2, retry_backoff=0.01)
+        with mock.patch.object(self.db, 'add_domains', side_effect=sqlite3.OperationalError("locked")) as add_domains:
+            writer.submit("example.com", "test")
+            writer.submit("example.com", "test")
+            writer.close()
+
+        self.assertEqual(add_domains.call_count, 3)
+        stats = writer.stats()
+        self.assertEqual((stats['errors'], stats['written'], stats['dropped']), (3, 0, 2))
+
+    def test_flush_waits_for_retries(self):
+        """Test that flush() returns once a retried batch is committed, or reports that it was dropped."""
+        writer = WriteBehindQueue(self.db, flush_interval=60.0, max_retries=2, retry_backoff=0.05)
+        failure = sqlite3.OperationalError("database is locked")
+        try:
+            with mock.patch.object(self.db, 'add_domains', side_effect=[failure, 1]) as add_domains:
+                writer.submit("example.com", "test")
+                self.assertTrue(writer.flush(timeout=5))
+                self.assertEqual(add_domains.call_count, 2)
+
+            with mock.patch.object(self.db, 'add_domains', side_effect=failure) as add_domains:
+                writer.submit("example.com", "test")
+                self.assertFalse(writer.flush(timeout=5))
+                self.assertEqual(add_domains.call_count, 3)
+        finally:
+            writer.close()
+
+        self.assertEqual(writer.stats()['dropped'], 1)
+        self.assertFalse(writer.flush())
+
+    def test_pull_writes_aggregated_repeats_on_a_timer(self):
+        """Test that cached repeats reach the database without any further failure."""
+        cache = FailureCache(flush_interval=0.05)
+        writer = WriteBehindQueue(self.db, flush_interval=0.01, pull=cache.drain, pull_interval=0.05)
+        try:
+            self.db.add_domain("example.com", "test")
+            cache.seen("example.com", "test")
+            cache.seen("example.com", "test")
+            cache.seen("example.com", "test")
+
+            deadline = time.monotonic() + 5
+            while self.db.get_domain_info("example.com")[4] < 3 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            writer.close()
+
+        self.assertEqual(self.db.get_domain_info("example.com")[4], 3)
+        self.assertEqual(cache.stats()['pending'], 0)
+
+    def test_removed_rule_stays_inactive(self):
+        """Test that repeats aggregated before a removal do not reactivate the rule."""
+        cache = FailureCache()
+        writer = WriteBehindQueue(self.db, flush_interval=60.0, pull=cache.drain, pull_interval=60.0)
+        try:
+            for rule in ("a.com", "203.0.113.7/32"):
+                self.db.add_domain(rule, "test")
+                cache.seen(rule, "test")
+                cache.seen(rule, "test")
+                self.db.remove_domain(rule)
+                cache.discard(rule)
+            writer.flush(timeout=5)
+        finally:
+            writer.close()
+
+        self.assertFalse(self.db.get_domain_info("a.com")[5])
+        self.assertFalse(self.db.get_network_info("203.0.113.7")[5])
+
+if __name__ == '__main__':
+    unittest.main()